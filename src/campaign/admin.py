@@ -1,33 +1,30 @@
 from functools import update_wrapper
 from io import BytesIO
+from itertools import chain
 import json
 import logging
 from typing import Any
 
 from django.conf import settings
 from django.contrib import admin, messages
-from django.core.exceptions import ValidationError
 from django.db.models import (
     Case,
     CharField,
     Count,
-    DateField,
     DecimalField,
-    Exists,
     ExpressionWrapper,
     F,
     FilteredRelation,
     FloatField,
     OuterRef,
-    Prefetch,
     Q,
     Subquery,
     Sum,
     Value,
     When,
 )
-from django.db.models.functions import Cast, Coalesce, Concat, ExtractHour, Round
-from django.http import HttpResponse
+from django.db.models.functions import Cast, Coalesce, Concat, Round
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
 from django.urls import path, reverse
@@ -41,11 +38,23 @@ from openpyxl import Workbook, load_workbook
 from openpyxl.formatting.rule import CellIsRule
 from openpyxl.styles import PatternFill
 
-from campaign.tasks import send_campaign_employee_invitation
+from campaign.tasks import generate_campaign_report, send_campaign_employee_invitation
+from imports.jobs import start_import_job
 from inventory.models import Product
 from inventory.utils import fill_message_template_email, fill_message_template_sms
-from lib.admin import ImportableExportableAdmin, RecordImportError, custom_titled_filter
+from lib.admin import (
+    ImportableExportableAdmin,
+    add_import_error,
+    custom_titled_filter,
+)
+from lib.export_utils import (
+    ExportFormatEnum,
+    get_export_fingerprint,
+    get_export_format,
+    get_export_response,
+)
 from lib.filters import MultiSelectFilter
+from lib.iter_utils import chunked
 from lib.models import StringAgg
 from logistics.models import PurchaseOrder, PurchaseOrderProduct
 
@@ -71,9 +80,13 @@ from .admin_views import (
     QuickOfferCreationWizard,
     QuickOfferImpersonateView,
 )
+from .analytics import get_campaign_group_totals
+from .imports import connect_employees_to_active_campaigns
 from .models import (
     Campaign,
     CampaignEmployee,
+    CampaignInvitationJob,
+    CampaignReportJob,
     DeliveryLocationEnum,
     Employee,
     EmployeeAuthEnum,
@@ -87,22 +100,22 @@ from .models import (
     QuickOffer,
     QuickOfferTag,
 )
-from .serializers import (
-    EmployeeReportSerializer,
-    MoneyProductSerializerCampaignAdmin,
-    PhysicalProductSerializerCampaignAdmin,
-)
-from .utils import (
-    format_with_none_replacement,
-    get_campaign_employees,
-    get_xlsx_http_campaign_response,
-    get_xlsx_http_products_response,
-    get_xlsx_http_response,
+from .reports import (
+    get_reusable_campaign_report_job,
 )
+from .utils import format_with_none_replacement
 
 
 logger = logging.getLogger(__name__)
 
+# the campaign status page's export types, which are generated in the background
+CAMPAIGN_REPORT_EXPORT_TYPES = {
+    'product': CampaignReportJob.ReportTypeEnum.PRODUCTS,
+    'employee_orders': CampaignReportJob.ReportTypeEnum.EMPLOYEE_ORDERS,
+    'employee_budgets': CampaignReportJob.ReportTypeEnum.EMPLOYEE_BUDGETS,
+    'campaign': CampaignReportJob.ReportTypeEnum.CAMPAIGN_SELECTION,
+}
+
 
 class EmployeeGroupInline(admin.TabularInline):
     model = EmployeeGroup
@@ -130,7 +143,7 @@ class OrganizationAdmin(ImportableExportableAdmin):
     ]
     readonly_fields = ('organization_products_link',)
 
-    actions = ['export_as_xlsx']
+    actions = ['export_as_xlsx', 'export_as_csv']
     change_list_template = 'admin/import_changelist.html'
     list_display = (
         'name',
@@ -172,8 +185,8 @@ class OrganizationAdmin(ImportableExportableAdmin):
                     )
                     return redirect(reverse(viewname, args=(object_id,)))
 
-                xlsx = form.clean().get('xlsx')
-                workbook = load_workbook(xlsx)
+                xlsx_file = form.clean().get('xlsx')
+                workbook = load_workbook(xlsx_file, read_only=True)
                 xlsx = workbook.active
 
                 required_column_indices = {
@@ -200,102 +213,27 @@ class OrganizationAdmin(ImportableExportableAdmin):
                     )
                     return redirect(reverse(viewname, args=(object_id,)))
 
-                org = Organization.objects.filter(pk=object_id).first()
-                success = []
-                errors = []
+                workbook.close()
+
+                # the rows are imported in the background, and the job's
+                # progress and errors are listed in the import jobs page
+                import_job = start_import_job(
+                    'campaign.organization_pricelist',
+                    xlsx_file,
+                    requested_by=request.user,
+                    params={
+                        'organization_id': int(object_id),
+                        'sku_column': required_column_indices['sku'],
+                        'price_column': required_column_indices['organization price'],
+                    },
+                )
 
-                for index, row in enumerate(
-                    xlsx.iter_rows(min_row=2, max_col=10, values_only=True)
-                ):
-                    row_num = index + 2
-
-                    empty_row = all(cell is None for cell in row)
-                    if empty_row:
-                        continue
-
-                    # get product current values so that we don't depend on
-                    # any value set in the excel file
-                    sku = row[required_column_indices['sku']]
-                    product = Product.objects.filter(sku=sku).first()
-
-                    if not product:
-                        errors.append(f'Could not find product with SKU "{sku}"')
-                        continue
-
-                    google_price = product.google_price
-                    # total_cost = product.total_cost
-
-                    org_price = row[required_column_indices['organization price']]
-                    if org_price is not None:
-                        if not isinstance(org_price, (float, int)):
-                            errors.append(
-                                f'Organization price is invalid for SKU ({sku}) at '
-                                f'row number {row_num}.'
-                            )
-                            continue
-                        else:
-                            org_price = int(org_price)
-
-                            # TODO: re-enable as a warning which requires
-                            # confirmation to continue
-                            # # validate organization price is not lower than total cost
-                            # if org_price < total_cost:
-                            #     errors.append(
-                            #         'Organization price cannot be less than product '
-                            #         f'total cost for SKU ({sku}) at row number '
-                            #         f'{row_num}.'
-                            #     )
-                            #     continue
-
-                    # validate organization price is not higher than google price
-                    if (
-                        google_price is not None
-                        and org_price is not None
-                        and org_price > google_price
-                    ):
-                        errors.append(
-                            'Organization price cannot be higher than product google '
-                            f'price for SKU ({sku}) at row number {row_num}.'
-                        )
-                        continue
-
-                    org_product = OrganizationProduct.objects.filter(
-                        organization=org,
-                        product=product,
-                    ).first()
-
-                    # there are two cases - one is organization price is set to
-                    # any value in which organization product must exist or be
-                    # created, and one is organization price is None in which
-                    # case if an organization product object exists we should
-                    # remove it as the price was unset
-                    if org_price is not None:
-                        if org_product:
-                            org_product.price = org_price
-                            org_product.save()
-                        else:
-                            OrganizationProduct.objects.create(
-                                organization=org,
-                                product=product,
-                                price=org_price,
-                            )
-
-                        success.append(sku)
-                    elif org_price is None and org_product:
-                        org_product.delete()
-                        success.append(sku)
-
-                if success:
-                    message = 'Success updating organization price for products: '
-                    message += ', '.join(success)
-                    self.message_user(request, message, level=messages.SUCCESS)
-
-                if errors:
-                    errors.insert(
-                        0, 'Errors updating organization price for following products:'
-                    )
-                    for message in errors:
-                        self.message_user(request, message, level=messages.ERROR)
+                self.message_user(
+                    request,
+                    f'The pricelist is being imported as import job #{import_job.id}, '
+                    'its progress and errors are listed in the import jobs page',
+                    level=messages.SUCCESS,
+                )
 
                 return redirect(reverse(viewname, args=(object_id,)))
             except Exception as ex:
@@ -387,6 +325,14 @@ class OrganizationAdmin(ImportableExportableAdmin):
                 + list(export_forumla_columns.keys())
             )
 
+            export_format = get_export_format(request.GET.get('export_format'))
+            if export_format == ExportFormatEnum.CSV:
+                return get_export_response(
+                    f'{org.name}_pricelist',
+                    chain([columns], self._iter_pricelist_csv_rows(products)),
+                    export_format,
+                )
+
             workbook = Workbook()
             xlsx = workbook.active
             xlsx.append(columns)
@@ -487,6 +433,20 @@ class OrganizationAdmin(ImportableExportableAdmin):
             self.message_user(request, message, level=messages.ERROR)
             return redirect(reverse(change_view, args=(object_id,)))
 
+    def _iter_pricelist_csv_rows(self, products):
+        # formulas and formatting are xlsx features, so the profit is
+        # calculated here instead
+        for product in products.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            organization_price = product['organization_price']
+            cost_price = product['cost_price']
+
+            if organization_price is not None and cost_price:
+                profit = round((organization_price - cost_price) / cost_price, 2)
+            else:
+                profit = ''
+
+            yield [*product.values(), profit]
+
     def organization_products_link(self, obj):
         count = obj.products.count()
 
@@ -529,7 +489,7 @@ class EmployeeAdmin(ImportableExportableAdmin):
         'auth_id',
     )
     list_filter = ('employee_group__organization',)
-    actions = ['export_as_xlsx']
+    actions = ['export_as_xlsx', 'export_as_csv']
     form = EmployeeForm
     change_form_template = 'admin/employee_form.html'
     change_list_template = 'campaign/employee_change_list.html'
@@ -590,35 +550,46 @@ class EmployeeAdmin(ImportableExportableAdmin):
 
         return record_field_values
 
-    def import_parse_and_save_xlsx_data(
-        self, extra_params: dict[str, Any], request_files: MultiValueDict
-    ) -> tuple[int, int]:
-        # load main xlsx file
-        workbook = load_workbook(
-            request_files.pop('xlsx_file')[0], data_only=True, read_only=True
-        )
-        worksheet = workbook.active
+    def import_read_columns(self, worksheet) -> list[str]:
+        return list(self.export_fields)
+
+    def import_load_context(
+        self, columns: list[str], extra_params: dict[str, Any]
+    ) -> dict[str, Any]:
+        # the organization's groups are loaded once and passed to the field
+        # parser with the extra params
+        employee_groups = {}
+        for employee_group in EmployeeGroup.objects.filter(
+            organization=Organization.objects.get(id=extra_params['organization_id'])
+        ).order_by('id'):
+            employee_groups.setdefault(employee_group.name, []).append(employee_group)
+
+        return {
+            'columns': columns,
+            'parse_params': {
+                **extra_params,
+                'import_lookups': {'employee_group': employee_groups},
+            },
+        }
 
-        columns = self.export_fields
+    def import_save_rows(
+        self,
+        import_context: dict[str, Any],
+        rows: list[tuple[int, tuple]],
+        request_files: MultiValueDict,
+    ) -> tuple[int, int, dict[str, list[int]]]:
+        """
+        Imports rows of the organization's employees. The rows are normalized
+        and validated in memory, the employees are upserted in batches and the
+        employees are then connected to their groups' active campaigns at once
+        """
+        columns = import_context['columns']
+        parse_params = import_context['parse_params']
 
         errors = {}
 
-        records_created = 0
-        records_updated = 0
-
-        for row_idx, row in enumerate(
-            worksheet.iter_rows(
-                min_row=2,
-                max_row=worksheet.max_row,
-                max_col=len(columns) + 1,
-                values_only=True,
-            )
-        ):
-            # break if we hit an empty row since this should be th end of the
-            # sheet
-            if not row or all(v is None for v in row):
-                break
-
+        parsed_rows = []
+        for row_number, row in rows:
             record_field_values = {}
 
             try:
@@ -632,7 +603,7 @@ class EmployeeAdmin(ImportableExportableAdmin):
                     parsed_value = self.import_parse_field(
                         current_column,
                         row[col_idx + shift],
-                        extra_params,
+                        parse_params,
                         request_files,
                     )
                     record_field_values[current_column] = parsed_value
@@ -641,61 +612,83 @@ class EmployeeAdmin(ImportableExportableAdmin):
                     record_field_values=record_field_values
                 )
 
-                # the pk may or may not have been supplied
-                record_pk = record_field_values.pop(self.model._meta.pk.name, None)
+                parsed_rows.append((row_number, record_field_values))
+            except Exception as ex:
+                add_import_error(errors, ex, row_number)
 
-                if record_pk:
-                    # update existing record
-                    try:
-                        record = self.model.objects.get(pk=record_pk)
-                        for k, v in record_field_values.items():
-                            setattr(record, k, v)
-                        record.save()
+        records_created = 0
+        records_updated = 0
+        imported_records = []
 
-                        records_updated += 1
-                    # handle the case when the product is not found
-                    except self.model.DoesNotExist:
-                        record = self.model(**record_field_values)
-                        record.full_clean()
-                        record.save()
+        pk_name = self.model._meta.pk.name
 
-                        records_created += 1
-                else:
-                    # create record
-                    record = self.model(**record_field_values)
-                    record.full_clean()
-                    record.save()
+        for batch in chunked(parsed_rows, settings.IMPORT_BATCH_SIZE):
+            # the pk may or may not have been supplied
+            existing_records = self.model.objects.in_bulk(
+                [v[pk_name] for _, v in batch if v.get(pk_name)]
+            )
 
-                    records_created += 1
+            records = {}
+            for row_number, record_field_values in batch:
+                record_pk = record_field_values.pop(pk_name, None)
+                record = existing_records.get(record_pk) if record_pk else None
 
-            except ValidationError as ex:
-                for mk in ex.message_dict.keys():
-                    msg_details = ', '.join(
-                        [m.removesuffix('.') for m in ex.message_dict[mk]]
-                    )
-                    msg = f'{mk} - {msg_details}'
+                try:
+                    if record:
+                        # update existing record
+                        for k, v in record_field_values.items():
+                            setattr(record, k, v)
+                    else:
+                        # create record (also when the supplied pk was not
+                        # found). the group was resolved from the import
+                        # lookups and there are no unique fields to check, so
+                        # validating requires no queries
+                        record = self.model(**record_field_values)
+                        record.full_clean(
+                            exclude=['employee_group'], validate_unique=False
+                        )
 
-                    if msg not in errors:
-                        errors[msg] = []
+                    record.normalize_login_fields()
+                    if (
+                        not record.auth_id
+                        and not record.email
+                        and not record.phone_number
+                    ):
+                        raise Exception(
+                            'Either auth_id, email or phone_number must be provided'
+                        )
+
+                    # the same employee may be updated by more than one row
+                    records[record.pk or id(record)] = record
+                except Exception as ex:
+                    add_import_error(errors, ex, row_number)
+
+            # new employees have no pk, so they never conflict and are inserted
+            # while existing ones are updated
+            self.model.objects.bulk_create(
+                records.values(),
+                update_conflicts=True,
+                unique_fields=[pk_name],
+                update_fields=[
+                    f.name
+                    for f in self.model._meta.concrete_fields
+                    if not f.primary_key
+                ],
+            )
 
-                    # row_idx is 0-based, plus the first row is the field names
-                    errors[msg].append(row_idx + 2)
-            except (ValueError, Exception) as ex:
-                # ValueErrors are raised by model-specific import logic (for
-                # example product image matching). any other Exception should
-                # also be caught here and handled the same way
-                msg = str(ex)
+            for record in records.values():
+                if record.pk in existing_records:
+                    records_updated += 1
+                else:
+                    records_created += 1
 
-                if msg not in errors:
-                    errors[msg] = []
+            imported_records.extend(records.values())
 
-                # row_idx is 0-based, plus the first row is the field names
-                errors[msg].append(row_idx + 2)
+        # bulk writes skip the post_save signal which connects each employee to
+        # its group's active campaigns
+        connect_employees_to_active_campaigns(imported_records)
 
-        if errors:
-            raise RecordImportError(errors)
-        else:
-            return records_created, records_updated
+        return records_created, records_updated, errors
 
     def import_parse_field(
         self,
@@ -705,8 +698,22 @@ class EmployeeAdmin(ImportableExportableAdmin):
         extra_files: MultiValueDict,
     ):
         if name == 'employee_group':
-            organization = Organization.objects.get(id=extra_params['organization_id'])
-            return EmployeeGroup.objects.get(name=value, organization=organization)
+            employee_groups = extra_params['import_lookups']['employee_group'].get(
+                value, []
+            )
+
+            # raise the same errors a `.get(name=value)` query would
+            if not employee_groups:
+                raise EmployeeGroup.DoesNotExist(
+                    'EmployeeGroup matching query does not exist.'
+                )
+            elif len(employee_groups) > 1:
+                raise EmployeeGroup.MultipleObjectsReturned(
+                    'get() returned more than one EmployeeGroup -- it returned '
+                    f'{len(employee_groups)}!'
+                )
+
+            return employee_groups[0]
         if name == 'full_name_en':
             super().import_parse_field(
                 'first_name_en', value, extra_params, extra_files
@@ -835,7 +842,7 @@ class EmployeeGroupAdmin(admin.ModelAdmin):
             return self.readonly_fields + ('organization',)
         return self.readonly_fields
 
-    actions = ['export_as_xlsx']
+    actions = ['export_as_xlsx', 'export_as_csv']
     export_fields = {
         'Id': 'id',
         'Name': 'name',
@@ -849,24 +856,26 @@ class EmployeeGroupAdmin(admin.ModelAdmin):
     }
 
     def export_as_xlsx(self, request, queryset):
-        data = list(queryset.values_list(*self.export_fields.values()))
-
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return get_export_response(
+            'e=Employee-Groups', self._iter_export_rows(queryset)
         )
-        response['Content-Disposition'] = 'attachment; filename=e=Employee-Groups.xlsx'
 
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.append(list(self.export_fields.keys()))
+    export_as_xlsx.short_description = 'Export selected Employee Group as XLSX'
 
-        for _employee_group in data:
-            worksheet.append(_employee_group)
+    def export_as_csv(self, request, queryset):
+        return get_export_response(
+            'e=Employee-Groups',
+            self._iter_export_rows(queryset),
+            ExportFormatEnum.CSV,
+        )
 
-        workbook.save(response)
-        return response
+    export_as_csv.short_description = 'Export selected Employee Group as CSV'
 
-    export_as_xlsx.short_description = 'Export selected Employee Group as XLSX'
+    def _iter_export_rows(self, queryset):
+        yield list(self.export_fields.keys())
+        yield from queryset.values_list(*self.export_fields.values()).iterator(
+            chunk_size=settings.EXPORT_CHUNK_SIZE
+        )
 
     def get_urls(self):
         urls = super().get_urls()
@@ -884,63 +893,19 @@ class EmployeeGroupAdmin(admin.ModelAdmin):
         if import_form.is_valid():
             try:
                 employee_group_file = import_form.clean().get('employee_group_file')
-                workbook = load_workbook(employee_group_file)
-                sheet = workbook.active
-                headers = None
-                counter = 0
-                for row in sheet.iter_rows(
-                    max_col=len(self.export_fields), values_only=True
-                ):
-                    if not headers:
-                        headers = row
-                        continue
-
-                    (
-                        _id,
-                        name,
-                        organization__name,
-                        delivery_city,
-                        delivery_street,
-                        delivery_street_number,
-                        delivery_apartment_number,
-                        delivery_location,
-                        auth_method,
-                    ) = row
-
-                    organization = Organization.objects.filter(
-                        name=organization__name
-                    ).first()
-
-                    employee_group = EmployeeGroup.objects.filter(id=_id).first()
-                    if employee_group:
-                        employee_group.name = name
-                        employee_group.delivery_city = delivery_city
-                        employee_group.delivery_street = delivery_street
-                        employee_group.delivery_street_number = delivery_street_number
-                        employee_group.delivery_apartment_number = (
-                            delivery_apartment_number
-                        )
-                        employee_group.delivery_location = delivery_location
-                        employee_group.auth_method = auth_method
-                        employee_group.save()
-
-                    else:
-                        EmployeeGroup.objects.create(
-                            name=name,
-                            organization=organization,
-                            delivery_city=delivery_city,
-                            delivery_street=delivery_street,
-                            delivery_street_number=delivery_street_number,
-                            delivery_apartment_number=delivery_apartment_number,
-                            delivery_location=delivery_location,
-                            auth_method=auth_method,
-                        )
-
-                    counter = counter + 1
+                # the rows are imported in the background, and the job's
+                # progress and errors are listed in the import jobs page
+                import_job = start_import_job(
+                    'campaign.employeegroup',
+                    employee_group_file,
+                    requested_by=request.user,
+                )
 
                 self.message_user(
                     request,
-                    f'successfully imported employee groups ({counter})',
+                    f'Employee groups are being imported as import job '
+                    f'#{import_job.id}, its progress and errors are listed in the '
+                    'import jobs page',
                     level=messages.INFO,
                 )
                 return HttpResponse(status=200)
@@ -1035,6 +1000,11 @@ class CampaignAdmin(admin.ModelAdmin, CampaignActionsMixin):
                 self.admin_site.admin_view(CampaignCreationWizard.as_view()),
                 name=f'{app_label}_{model_name}_edit',
             ),
+            path(
+                '<path:object_id>/status/reports/',
+                self.admin_site.admin_view(self.report_jobs_view),
+                name=f'{app_label}_{model_name}_report_jobs',
+            ),
             path(
                 '<path:object_id>/status/',
                 self.admin_site.admin_view(self.status_view),
@@ -1057,580 +1027,89 @@ class CampaignAdmin(admin.ModelAdmin, CampaignActionsMixin):
             ),
         ]
 
-    def get_campaign_products(self, campaign: Campaign):
-        unique_product_ids = list(
-            EmployeeGroupCampaignProduct.objects.filter(
-                employee_group_campaign_id__campaign=campaign
-            )
-            .values_list('product_id', flat=True)
-            .distinct()
-        )
-
-        money_product_list = Product.objects.filter(
-            id__in=unique_product_ids, product_kind='MONEY'
-        )
-
-        physical_product_list = Product.objects.filter(
-            id__in=unique_product_ids
-        ).exclude(product_kind='MONEY')
-
-        money_serializer = MoneyProductSerializerCampaignAdmin(
-            money_product_list,
-            many=True,
-            context={'campaign': campaign},
-        )
-
-        physical_serializer = PhysicalProductSerializerCampaignAdmin(
-            physical_product_list,
-            many=True,
-            context={'campaign': campaign},
+    def get_report_jobs(self, request, campaign: Campaign):
+        # the user's latest reports are displayed on the campaign status page,
+        # which polls them until they are ready to download
+        return CampaignReportJob.objects.filter(
+            campaign=campaign, requested_by=request.user
+        ).order_by('-created_at')[:5]
+
+    def start_report_job(self, request, campaign: Campaign, export_type: str):
+        report_type = CAMPAIGN_REPORT_EXPORT_TYPES[export_type]
+        export_format = get_export_format(request.GET.get('export_format'))
+        fingerprint = get_export_fingerprint(
+            'campaign report',
+            request.user.pk,
+            campaign.id,
+            report_type.name,
+            export_format.name,
         )
 
-        return money_serializer.data, physical_serializer.data
-
-    def get_campaign_employee_products(self, campaign: Campaign):
-        campaign_employees = CampaignEmployee.objects.filter(
-            campaign=campaign
-        ).annotate(
-            selection_date=Subquery(
-                Order.objects.filter(
-                    campaign_employee_id=OuterRef('pk'),
-                    status__in=[
-                        Order.OrderStatusEnum.PENDING.name,
-                        Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                    ],
-                )
-                .order_by('-order_date_time')
-                .values('order_date_time')[:1]
-            ),
-            has_order=Exists(
-                Order.objects.filter(
-                    campaign_employee_id=OuterRef('pk'),
-                    status__in=[
-                        Order.OrderStatusEnum.PENDING.name,
-                        Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                    ],
-                )
-            ),
-        )
-        he_data = []
-        for campaign_employee in campaign_employees:
-            employee_serializer = EmployeeReportSerializer(
-                campaign_employee.employee
-            ).data
-            if campaign_employee.has_order:
-                products = OrderProduct.objects.filter(
-                    order_id__campaign_employee_id=campaign_employee,
-                    order_id__status__in=[
-                        Order.OrderStatusEnum.PENDING.name,
-                        Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                    ],
-                    quantity__gt=0,
-                ).annotate(name_he=F('product_id__product_id__name_he'))
-
-                products_dict = {}
-
-                for product in products:
-                    name = product.name_he
-                    quantity = product.quantity
-                    products_dict.update({name: quantity + products_dict.get(name, 0)})
-
-                for name, quantity in products_dict.items():
-                    he_data.append(
-                        {
-                            'סוג בחירה': 'רגיל',
-                            'תאריך בחירה': campaign_employee.selection_date.strftime(
-                                '%Y-%m-%d %H:%M'
-                            )
-                            if campaign_employee.selection_date
-                            else None,
-                            'התחברות אחרונה': campaign_employee.last_login.strftime(
-                                '%Y-%m-%d %H:%M'
-                            )
-                            if campaign_employee.last_login
-                            else None,
-                            'שם העובד': f'{employee_serializer.get("first_name_he")} '
-                            + f'{employee_serializer.get("last_name_he")}',
-                            'מייל העובד': employee_serializer.get('email'),
-                            'טלפון עובד': employee_serializer.get('phone_number'),
-                            'קבוצת עובד': employee_serializer.get(
-                                'employee_group', {}
-                            ).get('name'),
-                            'שם המוצר': name if name else None,
-                            ' מספר מוצרים שנבחרו': quantity if quantity else None,
-                        }
-                    )
-            else:
-                # If employee has no orders, add them with empty product fields
-                he_data.append(
-                    {
-                        'סוג בחירה': 'רגיל',
-                        'תאריך בחירה': None,  # Since the employee hasn't order
-                        'התחברות אחרונה': campaign_employee.last_login.strftime(
-                            '%Y-%m-%d %H:%M'
-                        )
-                        if campaign_employee.last_login
-                        else None,
-                        'שם העובד': f'{employee_serializer.get("first_name_he")} {employee_serializer.get("last_name_he")}',  # noqa: E501
-                        'מייל העובד': employee_serializer.get('email'),
-                        'טלפון עובד': employee_serializer.get('phone_number'),
-                        'קבוצת עובד': employee_serializer.get('employee_group', {}).get(
-                            'name'
-                        ),
-                        'שם המוצר': None,
-                        ' מספר מוצרים שנבחרו': None,
-                    }
-                )
-        return he_data
+        # an identical report which is still being generated is reused instead
+        # of generating it again
+        report_job = get_reusable_campaign_report_job(fingerprint)
 
-    def get_group_summaries_products(self, campaign: Campaign):
-        order_products = self.get_order_products(campaign=campaign).filter(
-            quantity__gt=0,
-        )
-        data = (
-            EmployeeGroupCampaign.objects.filter(campaign=campaign)
-            .prefetch_related(
-                Prefetch(
-                    'employeegroupcampaignproduct_set',
-                    queryset=EmployeeGroupCampaignProduct.objects.filter(
-                        orderproduct__id__in=order_products.values_list(
-                            'id', flat=True
-                        ),
-                    )
-                    .annotate(
-                        product_name=F('product_id__name_he'),
-                        product_kind=F('product_id__product_kind'),
-                        discount_to=F('discount_mode'),
-                        group_budget=F(
-                            'employee_group_campaign_id__budget_per_employee'
-                        ),
-                        organization_discount=Coalesce(
-                            F('organization_discount_rate'),
-                            Value(0),
-                            output_field=FloatField(),
-                        ),
-                        voucher_value=Coalesce(
-                            Case(
-                                When(
-                                    discount_mode=EmployeeGroupCampaign.DefaultDiscountTypeEnum.EMPLOYEE.name,
-                                    then=Case(
-                                        When(
-                                            organization_discount=Value(0),
-                                            then=F('group_budget'),
-                                        ),
-                                        default=F('group_budget')
-                                        / (
-                                            Value(1)
-                                            - (F('organization_discount') / Value(100))
-                                        ),
-                                        output_field=FloatField(),
-                                    ),
-                                ),
-                                default=F('group_budget'),
-                                output_field=FloatField(),
-                            ),
-                            Value(0),
-                            output_field=FloatField(),
-                        ),
-                        cost_including_p=Case(
-                            When(
-                                discount_mode=EmployeeGroupCampaign.DefaultDiscountTypeEnum.ORGANIZATION.name,
-                                then=F('group_budget')
-                                * (
-                                    Value(1)
-                                    - (
-                                        Coalesce(
-                                            F('organization_discount_rate'), Value(0)
-                                        )
-                                        / Value(100)
-                                    )
-                                ),
-                            ),
-                            default=F('group_budget'),
-                            output_field=FloatField(),
-                        ),
-                        client_discount=F('organization_discount_rate'),
-                        quantity=Coalesce(
-                            Subquery(
-                                OrderProduct.objects.filter(
-                                    product_id=OuterRef('pk'),
-                                    order_id__status__in=[
-                                        Order.OrderStatusEnum.PENDING.name,
-                                        Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                                    ],
-                                )
-                                .values('product_id')
-                                .annotate(
-                                    has_physical=Subquery(
-                                        OrderProduct.objects.filter(
-                                            order_id__campaign_employee_id=OuterRef(
-                                                'order_id__campaign_employee_id'
-                                            ),
-                                            product_id__product_id__product_kind__in=[
-                                                'PHYSICAL',
-                                                'BUNDLE',
-                                                'VARIATION',
-                                            ],
-                                            order_id__status__in=[
-                                                Order.OrderStatusEnum.PENDING.name,
-                                                Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                                            ],
-                                        )
-                                        .values('order_id')
-                                        .annotate(count=Count('id'))
-                                        .values('count')[:1]
-                                    )
-                                )
-                                .filter(
-                                    Q(has_physical__isnull=True)
-                                    | Q(
-                                        has_physical__gt=0,
-                                        product_id__product_id__product_kind__in=[
-                                            'PHYSICAL',
-                                            'BUNDLE',
-                                            'VARIATION',
-                                        ],
-                                    )
-                                )
-                                .annotate(
-                                    total_unique_employees=Count(
-                                        'order_id__campaign_employee_id__employee',
-                                        distinct=True,
-                                    ),
-                                )
-                                .values('total_unique_employees')[:1],
-                            ),
-                            Value(0),
-                        ),
-                        total_cost=Case(
-                            When(
-                                product_id__product_kind='MONEY',
-                                then=F('quantity') * F('cost_including_p'),
-                            ),
-                            default=Coalesce(
-                                Subquery(
-                                    OrderProduct.objects.filter(
-                                        product_id=OuterRef('pk'),
-                                        order_id__status__in=[
-                                            Order.OrderStatusEnum.PENDING.name,
-                                            Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                                        ],
-                                    )
-                                    .values('order_id__campaign_employee_id__employee')
-                                    .distinct()
-                                    .annotate(
-                                        employee_budget=F(
-                                            'order_id__campaign_employee_id__total_budget'
-                                        )
-                                    )
-                                    .values('product_id')
-                                    .annotate(
-                                        employee_total_budget=Sum('employee_budget')
-                                    )
-                                    .values('employee_total_budget')[:1]
-                                ),
-                                Value(0),
-                            ),
-                            output_field=DecimalField(max_digits=10, decimal_places=2),
-                        ),
-                    )
-                    .filter(quantity__gt=0),
-                    to_attr='products',
-                )
+        if report_job:
+            message = (
+                f'An identical {report_job.get_report_type_display()} report was '
+                'already requested and is listed below'
             )
-            .annotate(
-                physical_quantity=Coalesce(
-                    Subquery(
-                        OrderProduct.objects.filter(
-                            product_id__employee_group_campaign_id=OuterRef('pk'),
-                            order_id__status__in=[
-                                Order.OrderStatusEnum.PENDING.name,
-                                Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                            ],
-                            product_id__product_id__product_kind__in=[
-                                'PHYSICAL',
-                                'BUNDLE',
-                                'VARIATION',
-                            ],
-                        )
-                        .annotate(
-                            product_category=Case(
-                                When(
-                                    product_id__product_id__product_kind='MONEY',
-                                    then=Value('MONEY'),
-                                ),
-                                default=Value('OTHER'),
-                                output_field=CharField(),
-                            )
-                        )
-                        .values('product_category')
-                        .annotate(
-                            total_unique_employees=Count(
-                                'order_id__campaign_employee_id__employee',
-                                distinct=True,
-                            )
-                        )
-                        .values('total_unique_employees')[:1],
-                    ),
-                    Value(0),
-                ),
-                money_quantity=Coalesce(
-                    Subquery(
-                        OrderProduct.objects.filter(
-                            product_id__employee_group_campaign_id=OuterRef('pk'),
-                            order_id__status__in=[
-                                Order.OrderStatusEnum.PENDING.name,
-                                Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                            ],
-                            product_id__product_id__product_kind__in=['MONEY'],
-                        )
-                        .annotate(
-                            has_physical=Subquery(
-                                OrderProduct.objects.filter(
-                                    order_id__campaign_employee_id=OuterRef(
-                                        'order_id__campaign_employee_id'
-                                    ),
-                                    product_id__product_id__product_kind__in=[
-                                        'PHYSICAL',
-                                        'BUNDLE',
-                                        'VARIATION',
-                                    ],
-                                    order_id__status__in=[
-                                        Order.OrderStatusEnum.PENDING.name,
-                                        Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                                    ],
-                                )
-                                .values('order_id')
-                                .annotate(count=Count('id'))
-                                .values('count')[:1]
-                            )
-                        )
-                        .filter(
-                            Q(has_physical__isnull=True)
-                            | Q(
-                                has_physical__gt=0,
-                                product_id__product_id__product_kind__in=[
-                                    'PHYSICAL',
-                                    'BUNDLE',
-                                    'VARIATION',
-                                ],
-                            )
-                        )
-                        .annotate(
-                            product_category=Case(
-                                When(
-                                    product_id__product_id__product_kind='MONEY',
-                                    then=Value('MONEY'),
-                                ),
-                                default=Value('OTHER'),
-                                output_field=CharField(),
-                            )
-                        )
-                        .values('product_category')
-                        .annotate(
-                            total_unique_employees=Count(
-                                'order_id__campaign_employee_id__employee',
-                                distinct=True,
-                            )
-                        )
-                        .values('total_unique_employees')[:1],
-                    ),
-                    Value(0),
-                ),
-                all_quantity=Coalesce(
-                    Subquery(
-                        OrderProduct.objects.filter(
-                            product_id__employee_group_campaign_id=OuterRef('pk'),
-                            order_id__status__in=[
-                                Order.OrderStatusEnum.PENDING.name,
-                                Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                            ],
-                        )
-                        .annotate(product_category=Value('ALL'))
-                        .values('product_category')
-                        .annotate(
-                            total_unique_employees=Count(
-                                'order_id__campaign_employee_id__employee',
-                                distinct=True,
-                            )
-                        )
-                        .values('total_unique_employees')[:1],
-                    ),
-                    Value(0),
-                ),
-                physical_total_cost=Coalesce(
-                    Subquery(
-                        # different approach with CampaignEmployee ,
-                        # because distinct is not working with sqlite
-                        CampaignEmployee.objects.filter(
-                            campaign=OuterRef('campaign'),
-                            employee__employee_group=OuterRef('employee_group'),
-                            # Only include employees who have physical products
-                            id__in=Subquery(
-                                OrderProduct.objects.filter(
-                                    product_id__employee_group_campaign_id__employee_group=OuterRef(
-                                        'employee__employee_group'
-                                    ),
-                                    order_id__status__in=[
-                                        Order.OrderStatusEnum.PENDING.name,
-                                        Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-                                    ],
-                                    product_id__product_id__product_kind__in=[
-                                        'PHYSICAL',
-                                        'BUNDLE',
-                                        'VARIATION',
-                                    ],
-                                )
-                                .values('order_id__campaign_employee_id')
-                                .distinct()
-                            ),
-                        )
-                        .values('employee__employee_group')
-                        # This distinct is not working with sqlite
-                        # (Thats why I changed OrderProduct to CampaignEmployee)
-                        .distinct()
-                        .annotate(total_budget=Sum('total_budget'))
-                        .values('total_budget')[:1]
-                    ),
-                    Value(0),
-                ),
+        else:
+            report_job = CampaignReportJob.objects.create(
+                campaign=campaign,
+                requested_by=request.user,
+                report_type=report_type.name,
+                export_format=export_format.name,
+                fingerprint=fingerprint,
             )
-        )
-
-        return data
 
-    def get_order_products(self, campaign):
-        return OrderProduct.objects.filter(
-            product_id__employee_group_campaign_id__campaign=campaign,
-            order_id__status__in=[
-                Order.OrderStatusEnum.PENDING.name,
-                Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-            ],
-        )
+            generate_campaign_report.apply_async((report_job.id,))
 
-    def get_graph_categories_data(self, campaign):
-        order_products = self.get_order_products(campaign=campaign)
-        return list(
-            EmployeeGroupCampaignProduct.objects.filter(
-                employee_group_campaign_id__campaign=campaign,
-                product_id__in=order_products.values('product_id__product_id'),
-                orderproduct__quantity__gt=0,
-            )
-            .exclude(product_id__categories__name=None)
-            .values('product_id__categories__name')
-            .annotate(Count('product_id__categories__name'))
-            .values_list(
-                'product_id__categories__name', 'product_id__categories__name__count'
+            message = (
+                f'Generating the {report_job.get_report_type_display()} report, '
+                'it will be available for download below when ready'
             )
-        )
 
-    def get_graph_employee_group_selections(self, campaign: Campaign):
-        order_products = self.get_order_products(campaign=campaign)
-        return list(
-            EmployeeGroupCampaignProduct.objects.filter(
-                employee_group_campaign_id__campaign=campaign,
-                product_id__in=order_products.values('product_id__product_id'),
-                orderproduct__quantity__gt=0,
-            )
-            .values('employee_group_campaign_id__employee_group__name')
-            .annotate(products=Count('product_id'))
-            .values_list('employee_group_campaign_id__employee_group__name', 'products')
-        )
+        self.message_user(request, message, messages.SUCCESS)
 
-    def get_graph_employee_choosing(self, campaign):
-        order_products = self.get_order_products(campaign=campaign)
-        choosing_employees = (
-            order_products.values('order_id__campaign_employee_id__employee__id')
-            .distinct()
-            .count()
-        )
-        total_employees = CampaignEmployee.objects.filter(campaign=campaign).count()
-        return [
-            ('normal', choosing_employees),
-            ('default', total_employees - choosing_employees),
-        ]
+        # back to the status page, without the export query parameters
+        return redirect(request.path)
 
-    def get_choosing_by_day_time(self, campaign):
-        order_products = self.get_order_products(campaign=campaign)
-        choosing_by_day = list(
-            order_products.annotate(
-                day=Cast(Cast('order_id__order_date_time', DateField()), CharField())
-            )
-            .values('day')
-            .annotate(selections=Count('product_id'))
-            .order_by('-day')
-            .values_list('day', 'selections')
-        )
+    def report_jobs_view(self, request, object_id):
+        campaign = Campaign.objects.get(pk=object_id)
+        download_url = reverse('download_export_file_view')
 
-        choosing_by_time = list(
-            order_products.values(f_time=ExtractHour('order_id__order_date_time'))
-            .annotate(selections=Count('product_id'))
-            .order_by('-f_time')
-            .annotate(
-                time=Concat(F('f_time') - 2, Value('h'), output_field=CharField())
-            )
-            .values_list('time', 'selections')
+        return JsonResponse(
+            {
+                'report_jobs': [
+                    {
+                        'id': report_job.id,
+                        'status': report_job.status,
+                        'status_display': report_job.get_status_display(),
+                        'download_url': (
+                            f'{download_url}{report_job.file_name}'
+                            if report_job.file_name
+                            else None
+                        ),
+                    }
+                    for report_job in self.get_report_jobs(request, campaign)
+                ]
+            }
         )
 
-        return choosing_by_day, choosing_by_time
+    def get_invitation_jobs(self, campaign: Campaign):
+        # the latest invitation sending processes are displayed with their
+        # progress on the campaign status page
+        return CampaignInvitationJob.objects.filter(campaign=campaign).order_by(
+            '-created_at'
+        )[:5]
 
     def status_view(self, request, object_id):
         campaign = Campaign.objects.get(pk=object_id)
         export_type = request.GET.get('export_type')
 
-        if export_type in ['employee_orders', 'employee_budgets']:
-            # Get data with appropriate export type
-            campaign_employees = get_campaign_employees(campaign, export_type)
-
-            # Set title based on export type
-            if export_type == 'employee_orders':
-                title = 'Campaign employee orders'
-            else:
-                title = 'Campaign employee budgets'
-
-            xlsx_http_response = get_xlsx_http_response(
-                title,
-                campaign_employees,
-            )
-            return xlsx_http_response
-        elif export_type == 'product':
-            money_products, physical_products = self.get_campaign_products(campaign)
-            xlsx_http_response = get_xlsx_http_products_response(
-                title='Campaign products',
-                physical_products=physical_products,
-                money_products=money_products,
-            )
-            return xlsx_http_response
-
-        elif export_type == 'campaign':
-            group_summaries_products = self.get_group_summaries_products(campaign)
-            main_data = self.get_campaign_employee_products(campaign)
-            graph_categories = self.get_graph_categories_data(campaign)
-            employee_group_selections = self.get_graph_employee_group_selections(
-                campaign
-            )
-            employees_choosing = self.get_graph_employee_choosing(campaign)
-            choosing_by_day_time = self.get_choosing_by_day_time(campaign)
-            xlsx_http_response = get_xlsx_http_campaign_response(
-                title='campaign selection',
-                main_data=main_data,
-                group_summaries_products=list(group_summaries_products),
-                organization=campaign.organization.name,
-                graph_categories=graph_categories,
-                employee_group_selections=employee_group_selections,
-                employees_choosing=employees_choosing,
-                choosing_by_day_time=choosing_by_day_time,
-            )
-            return xlsx_http_response
-
-        elif export_type == 'product':
-            money_products, physical_products = self.get_campaign_products(campaign)
-            xlsx_http_response = get_xlsx_http_products_response(
-                title='Campaign products',
-                physical_products=physical_products,
-                money_products=money_products,
-            )
-            return xlsx_http_response
+        if export_type in CAMPAIGN_REPORT_EXPORT_TYPES:
+            return self.start_report_job(request, campaign, export_type)
 
         send_invitation_type = request.GET.get('sendInvitationType')
         raw_ids = request.GET.get('campaignEmployees', '').split(',')
@@ -1668,6 +1147,9 @@ class CampaignAdmin(admin.ModelAdmin, CampaignActionsMixin):
                     Campaign.CampaignStatusEnum.PREVIEW.name,
                 ],
                 'campaign_code': campaign.code,
+                'invitation_jobs': self.get_invitation_jobs(campaign),
+                'report_jobs': self.get_report_jobs(request, campaign),
+                'group_totals': get_campaign_group_totals(campaign),
             }
             return TemplateResponse(request, 'campaign/status_form.html', context)
 
@@ -1807,6 +1289,9 @@ class CampaignAdmin(admin.ModelAdmin, CampaignActionsMixin):
                 Campaign.CampaignStatusEnum.PREVIEW.name,
             ],
             'campaign_code': campaign.code,
+            'invitation_jobs': self.get_invitation_jobs(campaign),
+            'report_jobs': self.get_report_jobs(request, campaign),
+            'group_totals': get_campaign_group_totals(campaign),
             'sms_sender_name': campaign.sms_sender_name,
             'sms_welcome_text': fill_message_template_sms(
                 employee=campaign_employees.employee, campaign=campaign
@@ -22,6 +22,7 @@ from .models import (
 )
 from .tasks import (
     export_orders_as_xlsx as export_orders_as_xlsx_task,
+    schedule_order_rollups_refresh,
     send_campaign_welcome_messages,
 )
 
@@ -247,6 +248,8 @@ class OrderActionsMixin:
 
     def complete(self, request, queryset):
         queryset.update(status=Order.OrderStatusEnum.COMPLETE.name)
+        # queryset updates do not send the signals maintaining the rollups
+        schedule_order_rollups_refresh(order_ids=queryset.values_list('pk', flat=True))
         orders_count = queryset.count()
 
         self.message_user(
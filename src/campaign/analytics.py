@@ -0,0 +1,225 @@
+"""
+Campaign order rollups, precomputed totals of the campaigns' active orders read
+by the campaign status page and charts instead of every order line
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Campaign,
+    CampaignEmployee,
+    CampaignOrderRollup,
+    Order,
+    OrderProduct,
+)
+
+
+# the order statuses counted by the rollups, matching the budget used by the
+# status page
+ROLLUP_ORDER_STATUSES = [
+    Order.OrderStatusEnum.PENDING.name,
+    Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+]
+
+
+def get_order_rollup_key(order: Order) -> tuple[int, date]:
+    """
+    Returns the campaign employee and day of an order, which together with the
+    employee's group identify the rollup rows the order is counted in
+    """
+
+    return order.campaign_employee_id_id, timezone.localdate(order.order_date_time)
+
+
+def get_order_rollup_buckets(
+    order_ids: Iterable[int], keys: Iterable[tuple[int, date]] = ()
+) -> set[tuple[int, int, date]]:
+    """
+    Returns the (campaign, employee group, day) rollup buckets of the given
+    orders and of orders identified by their rollup keys (such as deleted
+    orders or the previous state of changed orders)
+    """
+
+    keys = {
+        *keys,
+        *(
+            (campaign_employee_id, timezone.localdate(order_date_time))
+            for campaign_employee_id, order_date_time in Order.objects.filter(
+                pk__in=order_ids
+            ).values_list('campaign_employee_id', 'order_date_time')
+        ),
+    }
+
+    campaign_employee_groups = {
+        campaign_employee_id: (campaign_id, employee_group_id)
+        for campaign_employee_id, campaign_id, employee_group_id in (
+            CampaignEmployee.objects.filter(
+                pk__in={campaign_employee_id for campaign_employee_id, _ in keys}
+            ).values_list('pk', 'campaign_id', 'employee__employee_group_id')
+        )
+    }
+
+    return {
+        (*campaign_employee_groups[campaign_employee_id], day)
+        for campaign_employee_id, day in keys
+        if campaign_employee_id in campaign_employee_groups
+    }
+
+
+def refresh_order_rollups(buckets: Iterable[tuple[int, int, date]]) -> None:
+    """
+    Recomputes the rollup rows of each (campaign, employee group, day) bucket
+    from the bucket's orders only
+    """
+
+    for campaign_id, employee_group_id, day in sorted(buckets):
+        orders = Order.objects.filter(
+            campaign_employee_id__campaign_id=campaign_id,
+            campaign_employee_id__employee__employee_group_id=employee_group_id,
+            order_date_time__gte=timezone.make_aware(datetime.combine(day, time.min)),
+            order_date_time__lt=timezone.make_aware(
+                datetime.combine(day + timedelta(days=1), time.min)
+            ),
+        )
+
+        with transaction.atomic():
+            _lock_campaign_rollups(campaign_id)
+            CampaignOrderRollup.objects.filter(
+                campaign_id=campaign_id, employee_group_id=employee_group_id, day=day
+            ).delete()
+            CampaignOrderRollup.objects.bulk_create(_build_order_rollups(orders))
+
+
+def rebuild_campaign_order_rollups(campaign: Campaign) -> int:
+    """
+    Rebuilds all of the campaign's rollup rows from its orders and returns the
+    number of rows created
+    """
+
+    with transaction.atomic():
+        _lock_campaign_rollups(campaign.pk)
+        CampaignOrderRollup.objects.filter(campaign=campaign).delete()
+        rollups = CampaignOrderRollup.objects.bulk_create(
+            _build_order_rollups(
+                Order.objects.filter(campaign_employee_id__campaign=campaign)
+            ),
+            batch_size=1000,
+        )
+
+    return len(rollups)
+
+
+def _lock_campaign_rollups(campaign_id: int) -> None:
+    """
+    Locks the campaign's row until the current transaction ends, so concurrent
+    refreshes and rebuilds of the campaign's rollups wait for each other
+    instead of recreating the same rows at once
+    """
+
+    list(
+        Campaign.objects.select_for_update()
+        .filter(pk=campaign_id)
+        .values_list('pk', flat=True)
+    )
+
+
+def _build_order_rollups(orders: QuerySet) -> list[CampaignOrderRollup]:
+    orders = orders.filter(status__in=ROLLUP_ORDER_STATUSES)
+
+    order_totals = (
+        orders.order_by()
+        .values(
+            campaign_pk=F('campaign_employee_id__campaign_id'),
+            employee_group_pk=F('campaign_employee_id__employee__employee_group_id'),
+            order_day=TruncDate('order_date_time'),
+        )
+        .annotate(order_count=Count('pk'), budget_sum=Sum('cost_from_budget'))
+    )
+    # only products ordered with a positive quantity are counted as selections
+    product_totals = (
+        OrderProduct.objects.filter(order_id__in=orders, quantity__gt=0)
+        .order_by()
+        .values(
+            'product_id',
+            campaign_pk=F('order_id__campaign_employee_id__campaign_id'),
+            employee_group_pk=F(
+                'order_id__campaign_employee_id__employee__employee_group_id'
+            ),
+            order_day=TruncDate('order_id__order_date_time'),
+        )
+        .annotate(selection_count=Count('pk'), quantity_sum=Sum('quantity'))
+    )
+
+    return [
+        *(
+            CampaignOrderRollup(
+                campaign_id=totals['campaign_pk'],
+                employee_group_id=totals['employee_group_pk'],
+                day=totals['order_day'],
+                orders=totals['order_count'],
+                budget_used=totals['budget_sum'] or 0,
+            )
+            for totals in order_totals
+        ),
+        *(
+            CampaignOrderRollup(
+                campaign_id=totals['campaign_pk'],
+                employee_group_id=totals['employee_group_pk'],
+                product_id=totals['product_id'],
+                day=totals['order_day'],
+                selections=totals['selection_count'],
+                quantity=totals['quantity_sum'] or 0,
+            )
+            for totals in product_totals
+        ),
+    ]
+
+
+def get_campaign_ordering_employees(campaign: Campaign) -> dict[int, int]:
+    """
+    Returns the number of the campaign's employees with an active order in each
+    employee group. The rollups can not be summed up for this, since they count
+    orders per day rather than distinct employees
+    """
+
+    return dict(
+        Order.objects.filter(
+            campaign_employee_id__campaign=campaign, status__in=ROLLUP_ORDER_STATUSES
+        )
+        .order_by()
+        .values('campaign_employee_id__employee__employee_group_id')
+        .annotate(employees=Count('campaign_employee_id', distinct=True))
+        .values_list('campaign_employee_id__employee__employee_group_id', 'employees')
+    )
+
+
+def get_campaign_group_totals(campaign: Campaign) -> list[dict]:
+    """
+    Returns the ordering employees, used budget, selected products and ordered
+    quantity of each of the campaign's employee groups
+    """
+
+    group_totals = list(
+        CampaignOrderRollup.objects.filter(campaign=campaign)
+        .values('employee_group_id', employee_group_name=F('employee_group__name'))
+        .annotate(
+            total_budget_used=Sum('budget_used'),
+            total_selections=Sum('selections'),
+            total_quantity=Sum('quantity'),
+        )
+        .order_by('employee_group_name')
+    )
+
+    ordering_employees = get_campaign_ordering_employees(campaign)
+    for totals in group_totals:
+        totals['ordering_employees'] = ordering_employees.get(
+            totals.pop('employee_group_id'), 0
+        )
+
+    return group_totals
@@ -0,0 +1,315 @@
+"""
+Bulk imports of campaign data from admin uploaded spreadsheets, which resolve
+the rows' related objects up front and write them with set-based queries
+instead of one or more queries per row
+"""
+
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+
+from imports.jobs import Importer, register_importer
+from inventory.models import Product
+from lib.iter_utils import chunked
+
+from .models import (
+    Campaign,
+    CampaignEmployee,
+    Employee,
+    EmployeeGroup,
+    EmployeeGroupCampaign,
+    Organization,
+    OrganizationProduct,
+)
+
+
+def import_organization_pricelist(
+    organization: Organization, rows: Iterable[tuple[int, str, object]]
+) -> tuple[list[str], dict[str, list[int]]]:
+    """
+    Applies pricelist rows of (row number, sku, organization price) to the
+    organization's products. A price sets (creating if needed) the product's
+    organization price and an empty price removes it. Products are resolved
+    with a single query and the changes are applied with bulk queries in one
+    transaction. Returns the skus which were changed and the row errors, which
+    map each error message to the numbers of the rows it was raised for
+    """
+
+    rows = list(rows)
+
+    # get product current values so that we don't depend on any value set in
+    # the excel file
+    products_by_sku = {
+        product.sku: product
+        for product in Product.objects.filter(sku__in={sku for _, sku, _ in rows}).only(
+            'id', 'sku', 'google_price'
+        )
+    }
+
+    # like the previous `.first()` lookup, only the organization product with
+    # the lowest id is changed if a product has more than one
+    organization_products = {}
+    for organization_product in OrganizationProduct.objects.filter(
+        organization=organization, product__in=products_by_sku.values()
+    ).order_by('-id'):
+        organization_products[organization_product.product_id] = organization_product
+
+    # the price each product should have after the import (None to remove it).
+    # rows are applied in order, so a later row of the same sku wins
+    prices = {}
+    success = []
+    errors = {}
+
+    for row_num, sku, org_price in rows:
+        product = products_by_sku.get(sku)
+
+        if not product:
+            errors.setdefault(f'Could not find product with SKU "{sku}"', []).append(
+                row_num
+            )
+            continue
+
+        if org_price is not None:
+            if not isinstance(org_price, (float, int)):
+                errors.setdefault(
+                    f'Organization price is invalid for SKU ({sku})', []
+                ).append(row_num)
+                continue
+            else:
+                org_price = int(org_price)
+
+                # TODO: re-enable as a warning which requires
+                # confirmation to continue
+                # # validate organization price is not lower than total cost
+                # if org_price < total_cost:
+                #     errors.append(
+                #         'Organization price cannot be less than product '
+                #         f'total cost for SKU ({sku}) at row number '
+                #         f'{row_num}.'
+                #     )
+                #     continue
+
+        # validate organization price is not higher than google price
+        if (
+            product.google_price is not None
+            and org_price is not None
+            and org_price > product.google_price
+        ):
+            errors.setdefault(
+                'Organization price cannot be higher than product google '
+                f'price for SKU ({sku})',
+                [],
+            ).append(row_num)
+            continue
+
+        if product.id in prices:
+            has_price = prices[product.id] is not None
+        else:
+            has_price = product.id in organization_products
+
+        # there are two cases - one is organization price is set to any value
+        # in which organization product must exist or be created, and one is
+        # organization price is None in which case if an organization product
+        # exists we should remove it as the price was unset
+        if org_price is not None or has_price:
+            prices[product.id] = org_price
+            success.append(sku)
+
+    created = []
+    updated = []
+    deleted = []
+
+    for product_id, price in prices.items():
+        organization_product = organization_products.get(product_id)
+
+        if price is None:
+            if organization_product:
+                deleted.append(organization_product.id)
+        elif organization_product:
+            if organization_product.price != price:
+                organization_product.price = price
+                updated.append(organization_product)
+        else:
+            created.append(
+                OrganizationProduct(
+                    organization=organization, product_id=product_id, price=price
+                )
+            )
+
+    with transaction.atomic():
+        OrganizationProduct.objects.filter(id__in=deleted).delete()
+        OrganizationProduct.objects.bulk_update(
+            updated, ['price'], batch_size=settings.IMPORT_BATCH_SIZE
+        )
+        OrganizationProduct.objects.bulk_create(
+            created, batch_size=settings.IMPORT_BATCH_SIZE
+        )
+
+    return success, errors
+
+
+def connect_employees_to_active_campaigns(employees: Iterable[Employee]) -> None:
+    """
+    Creates the missing campaign employees of the employees' groups' active
+    campaigns, like the employee post_save signal does for a single employee.
+    The campaigns and budgets of all groups are loaded with one query and the
+    campaign employees are inserted in batches, skipping existing ones
+    """
+
+    employees = list(employees)
+
+    # the active campaigns of every group mapped to the employees' budget in
+    # them, taken from the group's first campaign settings like
+    # CampaignEmployee.save does
+    group_campaign_budgets = {}
+    for (
+        employee_group_id,
+        campaign_id,
+        budget_per_employee,
+    ) in (
+        EmployeeGroupCampaign.objects.filter(
+            employee_group_id__in={e.employee_group_id for e in employees},
+            campaign__status__in=[
+                Campaign.CampaignStatusEnum.ACTIVE.name,
+                Campaign.CampaignStatusEnum.PREVIEW.name,
+            ],
+        )
+        .order_by('-id')
+        .values_list('employee_group_id', 'campaign_id', 'budget_per_employee')
+    ):
+        group_campaign_budgets.setdefault(employee_group_id, {})[campaign_id] = (
+            budget_per_employee if budget_per_employee > 0 else 0
+        )
+
+    campaign_employees = (
+        CampaignEmployee(
+            campaign_id=campaign_id, employee_id=employee.pk, total_budget=budget
+        )
+        for employee in employees
+        for campaign_id, budget in group_campaign_budgets.get(
+            employee.employee_group_id, {}
+        ).items()
+    )
+
+    # campaign employees are unique per campaign and employee, so existing
+    # ones are left as they are
+    for batch in chunked(campaign_employees, settings.IMPORT_BATCH_SIZE):
+        CampaignEmployee.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+# the employee group fields set from an import row, in the row's column order
+# after the id, name and organization name columns
+EMPLOYEE_GROUP_IMPORT_FIELDS = (
+    'delivery_city',
+    'delivery_street',
+    'delivery_street_number',
+    'delivery_apartment_number',
+    'delivery_location',
+    'auth_method',
+)
+
+
+def import_employee_groups(rows: Iterable[tuple]) -> int:
+    """
+    Creates or updates employee groups from rows of (id, name, organization
+    name, delivery city, delivery street, delivery street number, delivery
+    apartment number, delivery location, auth method). A row updates the group
+    with its id if one exists (keeping the group's organization) and creates a
+    group otherwise. Organizations and existing groups are resolved with one
+    query each and the groups are written in bulk in one transaction. Returns
+    the number of imported rows
+    """
+
+    rows = list(rows)
+
+    # like the previous `.first()` lookup, the organization with the lowest id
+    # is used if more than one has the same name
+    organizations_by_name = {}
+    for organization in Organization.objects.filter(
+        name__in={row[2] for row in rows if row[2] is not None}
+    ).order_by('-id'):
+        organizations_by_name[organization.name] = organization
+
+    existing_groups = EmployeeGroup.objects.in_bulk(
+        {row[0] for row in rows if row[0] is not None}
+    )
+
+    created = []
+    updated = {}
+
+    for _id, name, organization__name, *values in rows:
+        employee_group = existing_groups.get(_id)
+
+        if employee_group:
+            # a group is updated once even if several rows have its id, with
+            # the values of the last of them
+            updated[employee_group.id] = employee_group
+        else:
+            employee_group = EmployeeGroup(
+                organization=organizations_by_name.get(organization__name)
+            )
+            created.append(employee_group)
+
+        employee_group.name = name
+        for field_name, value in zip(EMPLOYEE_GROUP_IMPORT_FIELDS, values):
+            setattr(employee_group, field_name, value)
+
+    with transaction.atomic():
+        EmployeeGroup.objects.bulk_update(
+            updated.values(),
+            ['name', *EMPLOYEE_GROUP_IMPORT_FIELDS],
+            batch_size=settings.IMPORT_BATCH_SIZE,
+        )
+        EmployeeGroup.objects.bulk_create(
+            created, batch_size=settings.IMPORT_BATCH_SIZE
+        )
+
+    return len(rows)
+
+
+class OrganizationPricelistImporter(Importer):
+    """
+    Imports an organization's pricelist in an import job. The job's params are
+    the organization's id and the indices of the sku and organization price
+    columns
+    """
+
+    def load_context(self, import_job, columns, files):
+        return (
+            Organization.objects.get(id=import_job.params['organization_id']),
+            import_job.params['sku_column'],
+            import_job.params['price_column'],
+        )
+
+    def import_rows(self, context, rows, files):
+        organization, sku_column, price_column = context
+
+        success, errors = import_organization_pricelist(
+            organization,
+            (
+                (row_number, row[sku_column], row[price_column])
+                for row_number, row in rows
+            ),
+        )
+
+        return len(success), errors
+
+
+class EmployeeGroupImporter(Importer):
+    """
+    Imports employee groups in an import job, from the columns of the
+    employee groups export
+    """
+
+    def import_rows(self, context, rows, files):
+        return (
+            import_employee_groups(
+                row[: 3 + len(EMPLOYEE_GROUP_IMPORT_FIELDS)] for _, row in rows
+            ),
+            {},
+        )
+
+
+register_importer('campaign.organization_pricelist', OrganizationPricelistImporter())
+register_importer('campaign.employeegroup', EmployeeGroupImporter())
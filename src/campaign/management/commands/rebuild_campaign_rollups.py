@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from campaign.analytics import rebuild_campaign_order_rollups
+from campaign.models import Campaign
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the order rollups of the given campaigns (or all campaigns)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        campaigns = Campaign.objects.all()
+        if options['campaign_ids']:
+            campaigns = campaigns.filter(pk__in=options['campaign_ids'])
+
+        for campaign in campaigns.order_by('pk'):
+            rollups_count = rebuild_campaign_order_rollups(campaign)
+            self.stdout.write(
+                f'Rebuilt {rollups_count} order rollups of campaign {campaign.pk}'
+            )
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('campaign', '0080_employeegroupcampaignproduct_company_cost_per_employee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignInvitationJob',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('invitation_types', models.JSONField(default=list)),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('PENDING', 'Pending'),
+                            ('RUNNING', 'Running'),
+                            ('COMPLETED', 'Completed'),
+                            ('COMPLETED_WITH_ERRORS', 'Completed With Errors'),
+                            ('FAILED', 'Failed'),
+                        ],
+                        default='PENDING',
+                        max_length=32,
+                    ),
+                ),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('total_chunks', models.PositiveIntegerField(default=0)),
+                ('processed_chunks', models.PositiveIntegerField(default=0)),
+                ('processed_count', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                (
+                    'campaign',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='campaign.campaign',
+                    ),
+                ),
+            ],
+        ),
+    ]
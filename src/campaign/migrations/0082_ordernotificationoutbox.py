@@ -0,0 +1,71 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('campaign', '0081_campaigninvitationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNotificationOutbox',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'kind',
+                    models.CharField(
+                        choices=[
+                            ('ORDER_CONFIRMATION_EMAIL', 'Order Confirmation Email')
+                        ],
+                        max_length=64,
+                    ),
+                ),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('PENDING', 'Pending'),
+                            ('SENT', 'Sent'),
+                            ('FAILED', 'Failed'),
+                        ],
+                        default='PENDING',
+                        max_length=32,
+                    ),
+                ),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                (
+                    'available_at',
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                (
+                    'order',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to='campaign.order'
+                    ),
+                ),
+            ],
+            options={
+                'indexes': [
+                    models.Index(
+                        fields=['status', 'available_at'],
+                        name='campaign_or_status_21e2c1_idx',
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('campaign', '0082_ordernotificationoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignReportJob',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'report_type',
+                    models.CharField(
+                        choices=[
+                            ('PRODUCTS', 'Campaign Products'),
+                            ('EMPLOYEE_ORDERS', 'Employee Orders'),
+                            ('EMPLOYEE_BUDGETS', 'Employee Budgets'),
+                            ('CAMPAIGN_SELECTION', 'Campaign Selection'),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                (
+                    'export_format',
+                    models.CharField(
+                        choices=[('XLSX', 'xlsx'), ('CSV', 'csv')],
+                        default='XLSX',
+                        max_length=8,
+                    ),
+                ),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('PENDING', 'Pending'),
+                            ('RUNNING', 'Running'),
+                            ('COMPLETED', 'Completed'),
+                            ('FAILED', 'Failed'),
+                        ],
+                        default='PENDING',
+                        max_length=32,
+                    ),
+                ),
+                ('file_name', models.CharField(blank=True, default='', max_length=255)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                (
+                    'campaign',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='campaign.campaign',
+                    ),
+                ),
+                (
+                    'requested_by',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('campaign', '0083_campaignreportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignreportjob',
+            name='fingerprint',
+            field=models.CharField(db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('campaign', '0084_campaignreportjob_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignOrderRollup',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('day', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('budget_used', models.IntegerField(default=0)),
+                ('selections', models.PositiveIntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                (
+                    'campaign',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='campaign.campaign',
+                    ),
+                ),
+                (
+                    'employee_group',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='campaign.employeegroup',
+                    ),
+                ),
+                (
+                    'product',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='campaign.employeegroupcampaignproduct',
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='campaignorderrollup',
+            constraint=models.UniqueConstraint(
+                fields=('campaign', 'employee_group', 'product', 'day'),
+                name='unique_campaign_order_rollup_product',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='campaignorderrollup',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('product', None)),
+                fields=('campaign', 'employee_group', 'day'),
+                name='unique_campaign_order_rollup_group',
+            ),
+        ),
+    ]
@@ -17,6 +17,7 @@ from django.utils import timezone
 import pyotp
 
 from lib.admin_utils import anchor_tag_popup
+from lib.export_utils import ExportFormatEnum
 from lib.phone_utils import convert_phone_number_to_long_form, validate_phone_number
 from lib.storage import RandomNameImageField
 from logistics.enums import LogisticsCenterEnum
@@ -100,7 +101,12 @@ class Employee(models.Model):
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
 
-    def save(self, *args, **kwargs):
+    def normalize_login_fields(self):
+        """
+        Sets the login type from the employee group if not already set, and
+        normalizes and validates the login field it requires. Bulk writes,
+        which skip `save`, should call this for every employee
+        """
         # Set login_type if not already set
         if not self.login_type and self.employee_group:
             self.login_type = self.employee_group.auth_method
@@ -119,6 +125,9 @@ class Employee(models.Model):
         elif not self.auth_id and self.login_type == 'AUTH_ID':
             raise Exception('auth_id must be provided')
 
+    def save(self, *args, **kwargs):
+        self.normalize_login_fields()
+
         super_save = super().save(*args, **kwargs)
 
         if not self.auth_id and not self.email and not self.phone_number:
@@ -807,6 +816,180 @@ class OrderProduct(models.Model):
         return product_dict
 
 
+class CampaignInvitationJob(models.Model):
+    """
+    Tracks a single invitation (welcome message) sending process for a
+    campaign. The recipients are split into fixed-size chunks which are sent
+    by separate tasks, and each chunk task adds its results to the counters
+    here so that progress can be displayed on the campaign status page.
+    """
+
+    class StatusEnum(Enum):
+        PENDING = 'Pending'
+        RUNNING = 'Running'
+        COMPLETED = 'Completed'
+        COMPLETED_WITH_ERRORS = 'Completed With Errors'
+        FAILED = 'Failed'
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
+    invitation_types = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=32,
+        choices=[(s.name, s.value) for s in StatusEnum],
+        default=StatusEnum.PENDING.name,
+    )
+    chunk_size = models.PositiveIntegerField()
+    total_count = models.PositiveIntegerField(default=0)
+    total_chunks = models.PositiveIntegerField(default=0)
+    processed_chunks = models.PositiveIntegerField(default=0)
+    processed_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress_percentage(self):
+        if not self.total_count:
+            return 100 if self.finished_at else 0
+
+        return round(self.processed_count / self.total_count * 100)
+
+    def __str__(self):
+        return f'Invitation job #{self.pk} | {self.campaign.name}'
+
+
+class CampaignReportJob(models.Model):
+    """
+    A campaign status report generated in the background instead of inside
+    the admin request. The status page polls the job's status and offers the
+    report file (saved to the exports storage) once it's ready.
+    """
+
+    class ReportTypeEnum(Enum):
+        PRODUCTS = 'Campaign Products'
+        EMPLOYEE_ORDERS = 'Employee Orders'
+        EMPLOYEE_BUDGETS = 'Employee Budgets'
+        CAMPAIGN_SELECTION = 'Campaign Selection'
+
+    class StatusEnum(Enum):
+        PENDING = 'Pending'
+        RUNNING = 'Running'
+        COMPLETED = 'Completed'
+        FAILED = 'Failed'
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(UserModel, on_delete=models.CASCADE)
+    report_type = models.CharField(
+        max_length=32, choices=[(t.name, t.value) for t in ReportTypeEnum]
+    )
+    export_format = models.CharField(
+        max_length=8,
+        choices=[(f.name, f.value) for f in ExportFormatEnum],
+        default=ExportFormatEnum.XLSX.name,
+    )
+    status = models.CharField(
+        max_length=32,
+        choices=[(s.name, s.value) for s in StatusEnum],
+        default=StatusEnum.PENDING.name,
+    )
+    # identical requests reuse the job while it is pending or running instead
+    # of generating the report again
+    fingerprint = models.CharField(max_length=64, db_index=True, default='')
+    # the exported file's name relative to the requesting user's directory,
+    # as expected by the export download view
+    file_name = models.CharField(max_length=255, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Report job #{self.pk} | {self.campaign.name}'
+
+
+class CampaignOrderRollup(models.Model):
+    """
+    Precomputed totals of a campaign's active (pending or sent to the logistics
+    center) orders per employee group, ordered product and order day, read by
+    the campaign status page and charts instead of scanning every order line.
+    Rows without a product hold the order level totals of their group and day.
+    Rows are recomputed per group and day whenever orders change (see
+    `campaign.analytics`) and can be rebuilt with the
+    `rebuild_campaign_rollups` management command.
+    """
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
+    employee_group = models.ForeignKey(EmployeeGroup, on_delete=models.CASCADE)
+    product = models.ForeignKey(
+        EmployeeGroupCampaignProduct, on_delete=models.CASCADE, null=True, blank=True
+    )
+    day = models.DateField()
+    # order level totals
+    orders = models.PositiveIntegerField(default=0)
+    budget_used = models.IntegerField(default=0)
+    # product level totals
+    selections = models.PositiveIntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['campaign', 'employee_group', 'product', 'day'],
+                name='unique_campaign_order_rollup_product',
+            ),
+            models.UniqueConstraint(
+                fields=['campaign', 'employee_group', 'day'],
+                condition=models.Q(product=None),
+                name='unique_campaign_order_rollup_group',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Order rollup | {self.campaign_id} | {self.day}'
+
+
+class OrderNotificationOutbox(models.Model):
+    """
+    A notification about an order which should be sent to the employee. Rows
+    are written in the same transaction as the order change they describe and
+    are sent later by the `dispatch_order_notifications` task, so that placing
+    an order does not depend on the notification provider.
+    """
+
+    class KindEnum(Enum):
+        ORDER_CONFIRMATION_EMAIL = 'Order Confirmation Email'
+
+    class StatusEnum(Enum):
+        PENDING = 'Pending'
+        SENT = 'Sent'
+        FAILED = 'Failed'
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    kind = models.CharField(
+        max_length=64,
+        choices=[(k.name, k.value) for k in KindEnum],
+    )
+    status = models.CharField(
+        max_length=32,
+        choices=[(s.name, s.value) for s in StatusEnum],
+        default=StatusEnum.PENDING.name,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # pending rows are only picked up by the dispatcher once this time has
+    # passed. it is moved forward while a dispatcher is sending the row and
+    # when a failed row is scheduled for a retry
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.pk} | Order {self.order_id}'
+
+
 class CampaignImpersonationToken(models.Model):
     token = models.TextField(db_index=True, unique=True)
     valid_until_epoch_seconds = models.BigIntegerField()
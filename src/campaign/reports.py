@@ -0,0 +1,633 @@
+"""
+Campaign status reports, generated in the background by campaign report jobs
+"""
+
+from datetime import timedelta
+from typing import IO
+
+from django.conf import settings
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    DecimalField,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Concat, ExtractHour
+from django.utils import timezone
+
+from inventory.models import Product
+from lib.export_utils import (
+    ExportFormatEnum,
+    save_workbook_to_temporary_file,
+    write_csv_to_temporary_file,
+    write_xlsx_to_temporary_file,
+)
+
+from .analytics import get_campaign_ordering_employees
+from .models import (
+    Campaign,
+    CampaignEmployee,
+    CampaignOrderRollup,
+    CampaignReportJob,
+    EmployeeGroupCampaign,
+    EmployeeGroupCampaignProduct,
+    Order,
+    OrderProduct,
+)
+from .serializers import (
+    EmployeeReportSerializer,
+    MoneyProductSerializerCampaignAdmin,
+    PhysicalProductSerializerCampaignAdmin,
+)
+from .utils import (
+    get_campaign_employees,
+    get_campaign_products_workbook,
+    get_campaign_selection_workbook,
+    get_report_rows,
+)
+
+
+REPORT_TITLES = {
+    CampaignReportJob.ReportTypeEnum.PRODUCTS: 'Campaign products',
+    CampaignReportJob.ReportTypeEnum.EMPLOYEE_ORDERS: 'Campaign employee orders',
+    CampaignReportJob.ReportTypeEnum.EMPLOYEE_BUDGETS: 'Campaign employee budgets',
+    CampaignReportJob.ReportTypeEnum.CAMPAIGN_SELECTION: 'campaign selection',
+}
+
+
+def get_reusable_campaign_report_job(fingerprint: str) -> CampaignReportJob | None:
+    """
+    Returns an identical report job which is still pending or running.
+    Completed reports are never reused, since their data may have changed since
+    """
+
+    return (
+        CampaignReportJob.objects.filter(
+            fingerprint=fingerprint,
+            status__in=[
+                CampaignReportJob.StatusEnum.PENDING.name,
+                CampaignReportJob.StatusEnum.RUNNING.name,
+            ],
+            # jobs running past the timeout are assumed to have crashed
+            created_at__gte=timezone.now()
+            - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT),
+        )
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def build_campaign_report(
+    campaign: Campaign,
+    report_type: CampaignReportJob.ReportTypeEnum,
+    export_format: ExportFormatEnum,
+) -> IO[bytes]:
+    """
+    Builds the campaign's report and returns it as a temporary file. Only the
+    employee reports can be built as csv, the products and selection reports
+    have multiple sheets and are always built as xlsx
+    """
+
+    if report_type in (
+        CampaignReportJob.ReportTypeEnum.EMPLOYEE_ORDERS,
+        CampaignReportJob.ReportTypeEnum.EMPLOYEE_BUDGETS,
+    ):
+        rows = get_report_rows(
+            get_campaign_employees(campaign, report_type.name.lower())
+        )
+
+        if export_format == ExportFormatEnum.CSV:
+            return write_csv_to_temporary_file(rows)
+
+        return write_xlsx_to_temporary_file(rows, REPORT_TITLES[report_type])
+
+    if report_type == CampaignReportJob.ReportTypeEnum.PRODUCTS:
+        money_products, physical_products = get_campaign_products(campaign)
+        workbook = get_campaign_products_workbook(
+            physical_products=physical_products,
+            money_products=money_products,
+        )
+    else:
+        workbook = get_campaign_selection_workbook(
+            main_data=get_campaign_employee_products(campaign),
+            group_summaries_products=list(get_group_summaries_products(campaign)),
+            organization=campaign.organization.name,
+            graph_categories=get_graph_categories_data(campaign),
+            employee_group_selections=get_graph_employee_group_selections(campaign),
+            employees_choosing=get_graph_employee_choosing(campaign),
+            choosing_by_day_time=get_choosing_by_day_time(campaign),
+        )
+
+    return save_workbook_to_temporary_file(workbook)
+
+
+def get_campaign_products(campaign: Campaign):
+    unique_product_ids = list(
+        EmployeeGroupCampaignProduct.objects.filter(
+            employee_group_campaign_id__campaign=campaign
+        )
+        .values_list('product_id', flat=True)
+        .distinct()
+    )
+
+    money_product_list = Product.objects.filter(
+        id__in=unique_product_ids, product_kind='MONEY'
+    )
+
+    physical_product_list = Product.objects.filter(id__in=unique_product_ids).exclude(
+        product_kind='MONEY'
+    )
+
+    money_serializer = MoneyProductSerializerCampaignAdmin(
+        money_product_list,
+        many=True,
+        context={'campaign': campaign},
+    )
+
+    physical_serializer = PhysicalProductSerializerCampaignAdmin(
+        physical_product_list,
+        many=True,
+        context={'campaign': campaign},
+    )
+
+    return money_serializer.data, physical_serializer.data
+
+
+def get_campaign_employee_products(campaign: Campaign):
+    campaign_employees = CampaignEmployee.objects.filter(campaign=campaign).annotate(
+        selection_date=Subquery(
+            Order.objects.filter(
+                campaign_employee_id=OuterRef('pk'),
+                status__in=[
+                    Order.OrderStatusEnum.PENDING.name,
+                    Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                ],
+            )
+            .order_by('-order_date_time')
+            .values('order_date_time')[:1]
+        ),
+        has_order=Exists(
+            Order.objects.filter(
+                campaign_employee_id=OuterRef('pk'),
+                status__in=[
+                    Order.OrderStatusEnum.PENDING.name,
+                    Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                ],
+            )
+        ),
+    )
+    he_data = []
+    for campaign_employee in campaign_employees:
+        employee_serializer = EmployeeReportSerializer(campaign_employee.employee).data
+        if campaign_employee.has_order:
+            products = OrderProduct.objects.filter(
+                order_id__campaign_employee_id=campaign_employee,
+                order_id__status__in=[
+                    Order.OrderStatusEnum.PENDING.name,
+                    Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                ],
+                quantity__gt=0,
+            ).annotate(name_he=F('product_id__product_id__name_he'))
+
+            products_dict = {}
+
+            for product in products:
+                name = product.name_he
+                quantity = product.quantity
+                products_dict.update({name: quantity + products_dict.get(name, 0)})
+
+            for name, quantity in products_dict.items():
+                he_data.append(
+                    {
+                        'סוג בחירה': 'רגיל',
+                        'תאריך בחירה': campaign_employee.selection_date.strftime(
+                            '%Y-%m-%d %H:%M'
+                        )
+                        if campaign_employee.selection_date
+                        else None,
+                        'התחברות אחרונה': campaign_employee.last_login.strftime(
+                            '%Y-%m-%d %H:%M'
+                        )
+                        if campaign_employee.last_login
+                        else None,
+                        'שם העובד': f'{employee_serializer.get("first_name_he")} '
+                        + f'{employee_serializer.get("last_name_he")}',
+                        'מייל העובד': employee_serializer.get('email'),
+                        'טלפון עובד': employee_serializer.get('phone_number'),
+                        'קבוצת עובד': employee_serializer.get('employee_group', {}).get(
+                            'name'
+                        ),
+                        'שם המוצר': name if name else None,
+                        ' מספר מוצרים שנבחרו': quantity if quantity else None,
+                    }
+                )
+        else:
+            # If employee has no orders, add them with empty product fields
+            he_data.append(
+                {
+                    'סוג בחירה': 'רגיל',
+                    'תאריך בחירה': None,  # Since the employee hasn't order
+                    'התחברות אחרונה': campaign_employee.last_login.strftime(
+                        '%Y-%m-%d %H:%M'
+                    )
+                    if campaign_employee.last_login
+                    else None,
+                    'שם העובד': f'{employee_serializer.get("first_name_he")} {employee_serializer.get("last_name_he")}',  # noqa: E501
+                    'מייל העובד': employee_serializer.get('email'),
+                    'טלפון עובד': employee_serializer.get('phone_number'),
+                    'קבוצת עובד': employee_serializer.get('employee_group', {}).get(
+                        'name'
+                    ),
+                    'שם המוצר': None,
+                    ' מספר מוצרים שנבחרו': None,
+                }
+            )
+    return he_data
+
+
+def get_group_summaries_products(campaign: Campaign):
+    order_products = get_order_products(campaign=campaign).filter(
+        quantity__gt=0,
+    )
+    data = (
+        EmployeeGroupCampaign.objects.filter(campaign=campaign)
+        .prefetch_related(
+            Prefetch(
+                'employeegroupcampaignproduct_set',
+                queryset=EmployeeGroupCampaignProduct.objects.filter(
+                    orderproduct__id__in=order_products.values_list('id', flat=True),
+                )
+                .annotate(
+                    product_name=F('product_id__name_he'),
+                    product_kind=F('product_id__product_kind'),
+                    discount_to=F('discount_mode'),
+                    group_budget=F('employee_group_campaign_id__budget_per_employee'),
+                    organization_discount=Coalesce(
+                        F('organization_discount_rate'),
+                        Value(0),
+                        output_field=FloatField(),
+                    ),
+                    voucher_value=Coalesce(
+                        Case(
+                            When(
+                                discount_mode=EmployeeGroupCampaign.DefaultDiscountTypeEnum.EMPLOYEE.name,
+                                then=Case(
+                                    When(
+                                        organization_discount=Value(0),
+                                        then=F('group_budget'),
+                                    ),
+                                    default=F('group_budget')
+                                    / (
+                                        Value(1)
+                                        - (F('organization_discount') / Value(100))
+                                    ),
+                                    output_field=FloatField(),
+                                ),
+                            ),
+                            default=F('group_budget'),
+                            output_field=FloatField(),
+                        ),
+                        Value(0),
+                        output_field=FloatField(),
+                    ),
+                    cost_including_p=Case(
+                        When(
+                            discount_mode=EmployeeGroupCampaign.DefaultDiscountTypeEnum.ORGANIZATION.name,
+                            then=F('group_budget')
+                            * (
+                                Value(1)
+                                - (
+                                    Coalesce(F('organization_discount_rate'), Value(0))
+                                    / Value(100)
+                                )
+                            ),
+                        ),
+                        default=F('group_budget'),
+                        output_field=FloatField(),
+                    ),
+                    client_discount=F('organization_discount_rate'),
+                    quantity=Coalesce(
+                        Subquery(
+                            OrderProduct.objects.filter(
+                                product_id=OuterRef('pk'),
+                                order_id__status__in=[
+                                    Order.OrderStatusEnum.PENDING.name,
+                                    Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                                ],
+                            )
+                            .values('product_id')
+                            .annotate(
+                                has_physical=Subquery(
+                                    OrderProduct.objects.filter(
+                                        order_id__campaign_employee_id=OuterRef(
+                                            'order_id__campaign_employee_id'
+                                        ),
+                                        product_id__product_id__product_kind__in=[
+                                            'PHYSICAL',
+                                            'BUNDLE',
+                                            'VARIATION',
+                                        ],
+                                        order_id__status__in=[
+                                            Order.OrderStatusEnum.PENDING.name,
+                                            Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                                        ],
+                                    )
+                                    .values('order_id')
+                                    .annotate(count=Count('id'))
+                                    .values('count')[:1]
+                                )
+                            )
+                            .filter(
+                                Q(has_physical__isnull=True)
+                                | Q(
+                                    has_physical__gt=0,
+                                    product_id__product_id__product_kind__in=[
+                                        'PHYSICAL',
+                                        'BUNDLE',
+                                        'VARIATION',
+                                    ],
+                                )
+                            )
+                            .annotate(
+                                total_unique_employees=Count(
+                                    'order_id__campaign_employee_id__employee',
+                                    distinct=True,
+                                ),
+                            )
+                            .values('total_unique_employees')[:1],
+                        ),
+                        Value(0),
+                    ),
+                    total_cost=Case(
+                        When(
+                            product_id__product_kind='MONEY',
+                            then=F('quantity') * F('cost_including_p'),
+                        ),
+                        default=Coalesce(
+                            Subquery(
+                                OrderProduct.objects.filter(
+                                    product_id=OuterRef('pk'),
+                                    order_id__status__in=[
+                                        Order.OrderStatusEnum.PENDING.name,
+                                        Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                                    ],
+                                )
+                                .values('order_id__campaign_employee_id__employee')
+                                .distinct()
+                                .annotate(
+                                    employee_budget=F(
+                                        'order_id__campaign_employee_id__total_budget'
+                                    )
+                                )
+                                .values('product_id')
+                                .annotate(employee_total_budget=Sum('employee_budget'))
+                                .values('employee_total_budget')[:1]
+                            ),
+                            Value(0),
+                        ),
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                )
+                .filter(quantity__gt=0),
+                to_attr='products',
+            )
+        )
+        .annotate(
+            physical_quantity=Coalesce(
+                Subquery(
+                    OrderProduct.objects.filter(
+                        product_id__employee_group_campaign_id=OuterRef('pk'),
+                        order_id__status__in=[
+                            Order.OrderStatusEnum.PENDING.name,
+                            Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                        ],
+                        product_id__product_id__product_kind__in=[
+                            'PHYSICAL',
+                            'BUNDLE',
+                            'VARIATION',
+                        ],
+                    )
+                    .annotate(
+                        product_category=Case(
+                            When(
+                                product_id__product_id__product_kind='MONEY',
+                                then=Value('MONEY'),
+                            ),
+                            default=Value('OTHER'),
+                            output_field=CharField(),
+                        )
+                    )
+                    .values('product_category')
+                    .annotate(
+                        total_unique_employees=Count(
+                            'order_id__campaign_employee_id__employee',
+                            distinct=True,
+                        )
+                    )
+                    .values('total_unique_employees')[:1],
+                ),
+                Value(0),
+            ),
+            money_quantity=Coalesce(
+                Subquery(
+                    OrderProduct.objects.filter(
+                        product_id__employee_group_campaign_id=OuterRef('pk'),
+                        order_id__status__in=[
+                            Order.OrderStatusEnum.PENDING.name,
+                            Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                        ],
+                        product_id__product_id__product_kind__in=['MONEY'],
+                    )
+                    .annotate(
+                        has_physical=Subquery(
+                            OrderProduct.objects.filter(
+                                order_id__campaign_employee_id=OuterRef(
+                                    'order_id__campaign_employee_id'
+                                ),
+                                product_id__product_id__product_kind__in=[
+                                    'PHYSICAL',
+                                    'BUNDLE',
+                                    'VARIATION',
+                                ],
+                                order_id__status__in=[
+                                    Order.OrderStatusEnum.PENDING.name,
+                                    Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                                ],
+                            )
+                            .values('order_id')
+                            .annotate(count=Count('id'))
+                            .values('count')[:1]
+                        )
+                    )
+                    .filter(
+                        Q(has_physical__isnull=True)
+                        | Q(
+                            has_physical__gt=0,
+                            product_id__product_id__product_kind__in=[
+                                'PHYSICAL',
+                                'BUNDLE',
+                                'VARIATION',
+                            ],
+                        )
+                    )
+                    .annotate(
+                        product_category=Case(
+                            When(
+                                product_id__product_id__product_kind='MONEY',
+                                then=Value('MONEY'),
+                            ),
+                            default=Value('OTHER'),
+                            output_field=CharField(),
+                        )
+                    )
+                    .values('product_category')
+                    .annotate(
+                        total_unique_employees=Count(
+                            'order_id__campaign_employee_id__employee',
+                            distinct=True,
+                        )
+                    )
+                    .values('total_unique_employees')[:1],
+                ),
+                Value(0),
+            ),
+            all_quantity=Coalesce(
+                Subquery(
+                    OrderProduct.objects.filter(
+                        product_id__employee_group_campaign_id=OuterRef('pk'),
+                        order_id__status__in=[
+                            Order.OrderStatusEnum.PENDING.name,
+                            Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                        ],
+                    )
+                    .annotate(product_category=Value('ALL'))
+                    .values('product_category')
+                    .annotate(
+                        total_unique_employees=Count(
+                            'order_id__campaign_employee_id__employee',
+                            distinct=True,
+                        )
+                    )
+                    .values('total_unique_employees')[:1],
+                ),
+                Value(0),
+            ),
+            physical_total_cost=Coalesce(
+                Subquery(
+                    # different approach with CampaignEmployee ,
+                    # because distinct is not working with sqlite
+                    CampaignEmployee.objects.filter(
+                        campaign=OuterRef('campaign'),
+                        employee__employee_group=OuterRef('employee_group'),
+                        # Only include employees who have physical products
+                        id__in=Subquery(
+                            OrderProduct.objects.filter(
+                                product_id__employee_group_campaign_id__employee_group=OuterRef(
+                                    'employee__employee_group'
+                                ),
+                                order_id__status__in=[
+                                    Order.OrderStatusEnum.PENDING.name,
+                                    Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                                ],
+                                product_id__product_id__product_kind__in=[
+                                    'PHYSICAL',
+                                    'BUNDLE',
+                                    'VARIATION',
+                                ],
+                            )
+                            .values('order_id__campaign_employee_id')
+                            .distinct()
+                        ),
+                    )
+                    .values('employee__employee_group')
+                    # This distinct is not working with sqlite
+                    # (Thats why I changed OrderProduct to CampaignEmployee)
+                    .distinct()
+                    .annotate(total_budget=Sum('total_budget'))
+                    .values('total_budget')[:1]
+                ),
+                Value(0),
+            ),
+        )
+    )
+
+    return data
+
+
+def get_order_products(campaign):
+    return OrderProduct.objects.filter(
+        product_id__employee_group_campaign_id__campaign=campaign,
+        order_id__status__in=[
+            Order.OrderStatusEnum.PENDING.name,
+            Order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+        ],
+    )
+
+
+# the graphs read the campaign's order rollups (see `campaign.analytics`)
+# instead of its order products. selections are the active orders' products
+# ordered with a positive quantity
+
+
+def get_graph_categories_data(campaign):
+    return list(
+        CampaignOrderRollup.objects.filter(campaign=campaign, product__isnull=False)
+        .exclude(product__product_id__categories__name=None)
+        .values('product__product_id__categories__name')
+        .annotate(category_selections=Sum('selections'))
+        .values_list('product__product_id__categories__name', 'category_selections')
+    )
+
+
+def get_graph_employee_group_selections(campaign: Campaign):
+    return list(
+        CampaignOrderRollup.objects.filter(campaign=campaign, product__isnull=False)
+        .values('employee_group__name')
+        .annotate(group_selections=Sum('selections'))
+        .values_list('employee_group__name', 'group_selections')
+    )
+
+
+def get_graph_employee_choosing(campaign):
+    choosing_employees = sum(get_campaign_ordering_employees(campaign).values())
+    total_employees = CampaignEmployee.objects.filter(campaign=campaign).count()
+    return [
+        ('normal', choosing_employees),
+        ('default', total_employees - choosing_employees),
+    ]
+
+
+def get_choosing_by_day_time(campaign):
+    choosing_by_day = [
+        (day.isoformat(), day_selections)
+        for day, day_selections in CampaignOrderRollup.objects.filter(
+            campaign=campaign, product__isnull=False
+        )
+        .values('day')
+        .annotate(day_selections=Sum('selections'))
+        .order_by('-day')
+        .values_list('day', 'day_selections')
+    ]
+
+    # the rollups are daily so the selections by hour are still counted from
+    # the order products
+    order_products = get_order_products(campaign=campaign)
+    choosing_by_time = list(
+        order_products.values(f_time=ExtractHour('order_id__order_date_time'))
+        .annotate(selections=Count('product_id'))
+        .order_by('-f_time')
+        .annotate(time=Concat(F('f_time') - 2, Value('h'), output_field=CharField()))
+        .values_list('time', 'selections')
+    )
+
+    return choosing_by_day, choosing_by_time
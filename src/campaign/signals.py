@@ -1,16 +1,19 @@
 import secrets
 
 from django.db import transaction  # Import transaction
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from .analytics import get_order_rollup_key
 from .models import (
     Campaign,
     CampaignEmployee,
     Employee,
     Order,
+    OrderProduct,
     QuickOffer,
 )
+from .tasks import schedule_order_rollups_refresh
 
 
 @receiver(pre_save, sender=Campaign)
@@ -48,6 +51,8 @@ class OrderState:
     def __init__(self):
         self.previous_order_products = None
         self.previous_order_status = None
+        self.previous_order_rollup_values = None
+        self.previous_order_rollup_key = None
 
 
 order_state = OrderState()  # Create an instance of OrderState
@@ -61,9 +66,53 @@ def store_previous_order_instance(sender, instance, **kwargs):
         if order:
             order_state.previous_order_products = list(order.orderproduct_set.all())
             order_state.previous_order_status = order.status
+            order_state.previous_order_rollup_values = _get_order_rollup_values(order)
+            order_state.previous_order_rollup_key = get_order_rollup_key(order)
     else:
         order_state.previous_order_products = None
         order_state.previous_order_status = None
+        order_state.previous_order_rollup_values = None
+        order_state.previous_order_rollup_key = None
+
+
+def _get_order_rollup_values(order):
+    return (
+        order.status,
+        order.cost_from_budget,
+        order.campaign_employee_id_id,
+        order.order_date_time,
+    )
+
+
+@receiver(post_save, sender=Order)
+def refresh_order_rollups_on_save(sender, instance, created, **kwargs):
+    # only changes of the fields counted by the rollups refresh them
+    if (
+        not created
+        and order_state.previous_order_rollup_values
+        == _get_order_rollup_values(instance)
+    ):
+        return
+
+    # the order's previous group and day are refreshed as well, in case it
+    # moved out of them
+    schedule_order_rollups_refresh(
+        order_ids=[instance.pk],
+        keys=[order_state.previous_order_rollup_key]
+        if order_state.previous_order_rollup_key
+        else [],
+    )
+
+
+@receiver(post_delete, sender=Order)
+def refresh_order_rollups_on_delete(sender, instance, **kwargs):
+    schedule_order_rollups_refresh(keys=[get_order_rollup_key(instance)])
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def refresh_order_product_rollups(sender, instance, **kwargs):
+    schedule_order_rollups_refresh(order_ids=[instance.order_id_id])
 
 
 @receiver(post_save, sender=Order)
@@ -1,31 +1,51 @@
-from datetime import datetime, timezone
-from io import BytesIO
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
 import logging
 import os
-from typing import Literal
+from typing import Iterable, Iterator, Literal
 import uuid
 
-from celery import shared_task
-from django.core.files.base import ContentFile
+from celery import chord, shared_task
+from django.conf import settings
+from django.core.files.base import File
 from django.core.files.storage import storages
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch, QuerySet
 from django.db.models.sql.query import Query
-from openpyxl import Workbook
+from openpyxl import load_workbook
+from rest_framework.fields import DateTimeField
 
+from export.models import ExportJob
+from export.utils import ExportTask, finish_export_job, start_export_job
+from inventory.models import Product, ProductBundleItem
 from inventory.utils import fill_message_template_email, fill_message_template_sms
+from lib.export_utils import (
+    ExportFormatEnum,
+    get_export_fingerprint,
+    write_xlsx_to_temporary_file,
+)
+from lib.iter_utils import chunked
 from services.email import (
     send_campaign_welcome_email,
     send_export_download_email,
+    send_order_confirmation_email,
 )
 from services.sms import send_campaign_welcome_sms
 
+from .analytics import get_order_rollup_buckets, refresh_order_rollups
 from .models import (
     Campaign,
+    CampaignInvitationJob,
+    CampaignReportJob,
     Employee,
+    EmployeeAuthEnum,
     EmployeeGroupCampaign,
     Order,
+    OrderNotificationOutbox,
+    OrderProduct,
     OrganizationProduct,
 )
-from .serializers import OrderExportSerializer
+from .reports import REPORT_TITLES, build_campaign_report
 
 
 logger = logging.getLogger(__name__)
@@ -41,36 +61,109 @@ def send_campaign_welcome_messages(campaign_id: int, employee_ids=None) -> bool:
         logger.warn(f'campaign {campaign_id} not found for welcome messages')
         return False
 
-    for employee_group_campaign in campaign.employeegroupcampaign_set.all():
-        logger.info(
-            'sending welcome messages to campaign employee group '
-            f'{employee_group_campaign.id}...'
+    chunk_size = settings.CAMPAIGN_INVITATION_CHUNK_SIZE
+    job = CampaignInvitationJob.objects.create(
+        campaign=campaign,
+        invitation_types=['welcome'],
+        chunk_size=chunk_size,
+    )
+
+    chunk_signatures = []
+    total_count = 0
+
+    for employee_group_campaign in campaign.employeegroupcampaign_set.select_related(
+        'employee_group'
+    ).all():
+        # only email and sms groups receive welcome messages
+        if employee_group_campaign.employee_group.auth_method not in (
+            EmployeeAuthEnum.EMAIL.name,
+            EmployeeAuthEnum.SMS.name,
+        ):
+            continue
+
+        recipients = Employee.objects.filter(
+            employee_group_id=employee_group_campaign.employee_group_id, active=True
         )
-        sent_count = 0
 
-        for employee in employee_group_campaign.employee_group.employee_set.all():
-            # If employee_ids is provided and the current employee is not in the list,
-            # skip sending the invitation
-            if employee_ids and employee.id not in employee_ids:
-                continue
+        # if employee_ids is provided only those employees should receive
+        # their invitation
+        if employee_ids:
+            recipients = recipients.filter(id__in=employee_ids)
 
-            if employee_group_campaign.employee_group.auth_method == 'EMAIL':
-                send_campaign_welcome_message_email.apply_async(
-                    (employee.id, employee_group_campaign.id, campaign_id)
-                )
-                sent_count += 1
-            elif employee_group_campaign.employee_group.auth_method == 'SMS':
-                send_campaign_welcome_message_sms.apply_async(
-                    (employee.id, employee_group_campaign.id, campaign_id)
+        for employee_ids_chunk in chunked(
+            recipients.order_by('id')
+            .values_list('id', flat=True)
+            .iterator(chunk_size=chunk_size),
+            chunk_size,
+        ):
+            chunk_signatures.append(
+                send_campaign_welcome_messages_chunk.si(
+                    job.id, campaign_id, employee_group_campaign.id, employee_ids_chunk
                 )
-                sent_count += 1
+            )
+            total_count += len(employee_ids_chunk)
 
-        logger.info(
-            f'sent welcome messages to {sent_count} employees in campaign '
-            f'employee group {employee_group_campaign.id}'
+    _dispatch_campaign_invitation_job(job, chunk_signatures, total_count)
+
+    logger.info(
+        f'queued welcome messages for campaign {campaign_id} to {total_count} '
+        f'employees in {len(chunk_signatures)} chunks (job {job.id})'
+    )
+
+    return True
+
+
+@shared_task
+def send_campaign_welcome_messages_chunk(
+    job_id: int,
+    campaign_id: int,
+    employee_group_campaign_id: int,
+    employee_ids: list[int],
+) -> tuple[int, int]:
+    campaign = (
+        Campaign.objects.filter(id=campaign_id).select_related('organization').first()
+    )
+    employee_group_campaign = (
+        EmployeeGroupCampaign.objects.filter(id=employee_group_campaign_id)
+        .select_related('employee_group')
+        .first()
+    )
+    employees = list(Employee.objects.filter(id__in=employee_ids, active=True))
+
+    sent_count = 0
+    failed_count = len(employee_ids) - len(employees)
+
+    if not campaign or not employee_group_campaign:
+        logger.error(
+            f'send_campaign_welcome_messages_chunk could not find campaign '
+            f'{campaign_id} or campaign employee group {employee_group_campaign_id}'
         )
+        employees = []
+        failed_count = len(employee_ids)
+
+    for employee in employees:
+        try:
+            if employee_group_campaign.employee_group.auth_method == 'EMAIL':
+                sent = _send_campaign_welcome_message_email(employee, campaign)
+            else:
+                sent = _send_campaign_welcome_message_sms(employee, campaign)
+        except Exception as ex:
+            logger.error(
+                f'failed sending welcome message to employee {employee.id} in '
+                f'campaign {campaign_id}: {ex}'
+            )
+            sent = False
+
+        if sent:
+            sent_count += 1
+        else:
+            failed_count += 1
+
+    _record_campaign_invitation_chunk(
+        job_id, len(employee_ids), sent_count, failed_count
+    )
 
-    logger.info(f'done sending welcome messages for campaign {campaign_id}')
+    return sent_count, failed_count
 
 
 @shared_task
@@ -90,9 +183,33 @@ def send_campaign_welcome_message_email(
         )
         raise Exception('employee or campaign not found')
 
+    _send_campaign_welcome_message_email(employee, campaign)
+
+
+@shared_task
+def send_campaign_welcome_message_sms(
+    employee_id: int, employee_group_campaign_id: int, campaign_id: int
+):
+    employee = Employee.objects.filter(id=employee_id, active=True).first()
+    employee_group_campaign = EmployeeGroupCampaign.objects.filter(
+        id=employee_group_campaign_id
+    ).first()
+    campaign = Campaign.objects.filter(id=campaign_id).first()
+
+    if not employee or not employee_group_campaign or not campaign:
+        logger.error(
+            f'send_campaign_welcome_message_sms could not find active '
+            f'employee {employee_id} and campaign {campaign_id}'
+        )
+        raise Exception('employee or campaign not found')
+
+    _send_campaign_welcome_message_sms(employee, campaign)
+
+
+def _send_campaign_welcome_message_email(employee: Employee, campaign: Campaign):
     if not employee.email:
         logger.error(
-            f'send_campaign_welcome_message_email employee {employee_id} has '
+            f'send_campaign_welcome_message_email employee {employee.id} has '
             'no email address'
         )
         raise Exception('employee has no email address')
@@ -110,43 +227,116 @@ def send_campaign_welcome_message_email(
 
     link_url = employee.get_campaign_site_link(campaign.code)
 
-    send_campaign_welcome_email(employee.email, subject, body, link_url)
+    return send_campaign_welcome_email(employee.email, subject, body, link_url)
 
 
-@shared_task
-def send_campaign_welcome_message_sms(
-    employee_id: int, employee_group_campaign_id: int, campaign_id: int
-):
-    employee = Employee.objects.filter(id=employee_id, active=True).first()
-    employee_group_campaign = EmployeeGroupCampaign.objects.filter(
-        id=employee_group_campaign_id
-    ).first()
-    campaign = Campaign.objects.filter(id=campaign_id).first()
-
-    if not employee or not employee_group_campaign or not campaign:
-        logger.error(
-            f'send_campaign_welcome_message_sms could not find active '
-            f'employee {employee_id} and campaign {campaign_id}'
-        )
-        raise Exception('employee or campaign not found')
-
+def _send_campaign_welcome_message_sms(employee: Employee, campaign: Campaign):
     if not employee.phone_number:
         logger.error(
-            f'send_campaign_welcome_message_sms employee {employee_id} has no '
+            f'send_campaign_welcome_message_sms employee {employee.id} has no '
             'phoner number'
         )
         raise Exception('employee has no phone number')
 
     message_text = fill_message_template_sms(employee=employee, campaign=campaign)
 
-    send_campaign_welcome_sms(
+    return send_campaign_welcome_sms(
         campaign.sms_sender_name, employee.phone_number, message_text
     )
 
 
+def _dispatch_campaign_invitation_job(
+    job: CampaignInvitationJob, chunk_signatures: list, total_count: int
+):
+    job.total_count = total_count
+    job.total_chunks = len(chunk_signatures)
+
+    if not chunk_signatures:
+        # nothing to send, so the job is done right away
+        job.status = CampaignInvitationJob.StatusEnum.COMPLETED.name
+        job.finished_at = datetime.now(timezone.utc)
+        job.save(update_fields=['total_count', 'total_chunks', 'status', 'finished_at'])
+        return
+
+    job.status = CampaignInvitationJob.StatusEnum.RUNNING.name
+    job.save(update_fields=['total_count', 'total_chunks', 'status'])
+
+    # the chunks run in parallel and the job is finalized once all of them
+    # are done, or marked as failed if any of them raises
+    try:
+        chord(chunk_signatures)(
+            finish_campaign_invitation_job.si(job.id).on_error(
+                fail_campaign_invitation_job.si(job.id)
+            )
+        )
+    except Exception:
+        # chunks which run eagerly raise their error here instead of calling
+        # the error callback
+        fail_campaign_invitation_job(job.id)
+        raise
+
+
+def _record_campaign_invitation_chunk(
+    job_id: int, processed_count: int, sent_count: int, failed_count: int
+):
+    # counters are incremented in the database since chunks of the same job
+    # are processed concurrently
+    CampaignInvitationJob.objects.filter(id=job_id).update(
+        processed_chunks=F('processed_chunks') + 1,
+        processed_count=F('processed_count') + processed_count,
+        sent_count=F('sent_count') + sent_count,
+        failed_count=F('failed_count') + failed_count,
+    )
+
+
+@shared_task
+def finish_campaign_invitation_job(job_id: int) -> bool:
+    job = CampaignInvitationJob.objects.filter(id=job_id).first()
+
+    if not job:
+        logger.warn(f'campaign invitation job {job_id} not found')
+        return False
+
+    if job.failed_count:
+        job.status = CampaignInvitationJob.StatusEnum.COMPLETED_WITH_ERRORS.name
+    else:
+        job.status = CampaignInvitationJob.StatusEnum.COMPLETED.name
+    job.finished_at = datetime.now(timezone.utc)
+    job.save(update_fields=['status', 'finished_at'])
+
+    logger.info(
+        f'campaign invitation job {job_id} done - sent {job.sent_count} and '
+        f'failed {job.failed_count} out of {job.total_count} messages'
+    )
+
+    return True
+
+
+@shared_task
+def fail_campaign_invitation_job(job_id: int) -> bool:
+    job = CampaignInvitationJob.objects.filter(id=job_id).first()
+
+    if not job:
+        logger.warn(f'campaign invitation job {job_id} not found')
+        return False
+
+    job.status = CampaignInvitationJob.StatusEnum.FAILED.name
+    job.finished_at = datetime.now(timezone.utc)
+    job.save(update_fields=['status', 'finished_at'])
+
+    logger.error(
+        f'campaign invitation job {job_id} failed - sent {job.sent_count} and '
+        f'failed {job.failed_count} out of {job.total_count} messages, in '
+        f'{job.processed_chunks} of {job.total_chunks} chunks'
+    )
+
+    return True
+
+
 # must use pickle task serializer for the query argument
-@shared_task(serializer='pickle')
+@shared_task(serializer='pickle', bind=True, base=ExportTask)
 def export_orders_as_xlsx(
+    self,
     orders_query: Query,
     exporter_user_id: int,
     exporter_email: str,
@@ -154,7 +344,9 @@ def export_orders_as_xlsx(
 ) -> bool:
     """
     Export all queried orders as an xlsx file. This method retuns a
-    HttpResponse which can be returned as-is by actions
+    HttpResponse which can be returned as-is by actions. The orders are
+    exported by their primary key (the query's ordering is ignored), so that
+    the rows are in the same order whether or not the export is sharded
     """
 
     export_init_datetime = datetime.now(timezone.utc)
@@ -164,6 +356,19 @@ def export_orders_as_xlsx(
     orders_queryset = Order.objects.all()
     orders_queryset.query = orders_query
 
+    # an identical export which is still running is reused instead of
+    # generating it again, and sends its file to the exporter once done
+    export_job, reused = start_export_job(
+        exporter_user_id,
+        get_export_fingerprint(
+            'orders', exporter_user_id, *orders_query.sql_with_params()
+        ),
+        self.request.id,
+    )
+
+    if reused:
+        return True
+
     field_names = [
         'order id',
         'reference',
@@ -200,129 +405,425 @@ def export_orders_as_xlsx(
         'Last Status Change',
     ]
 
-    workbook = Workbook()
-    worksheet = workbook.active
+    sorted_variation_keys = _get_orders_variation_keys(orders_queryset)
 
-    all_variation_keys = set()
+    for key in sorted_variation_keys:
+        field_names.insert(field_names.index('sku'), key)
 
-    for order in (
-        orders_queryset.select_related('campaign_employee_id')
-        .prefetch_related(
-            'campaign_employee_id__campaign',
-            'campaign_employee_id__campaign__organization',
-            'campaign_employee_id__employee',
-            'campaign_employee_id__employee__employee_group',
+    storage = storages['exports']
+
+    formatted_init_datetime = export_init_datetime.strftime('%Y_%m_%d_%H%M')
+    export_file_name = storage.generate_filename(
+        os.path.join(
+            str(uuid.uuid4()),
+            f'orders_export_{formatted_init_datetime}.xlsx',
+        ),
+    )
+    private_export_file_name = storage.generate_filename(
+        os.path.join(
+            str(exporter_user_id),
+            export_file_name,
+        ),
+    )
+    export_download_url = f'{base_export_download_url}{export_file_name}'
+
+    shard_bounds = _get_order_export_shard_bounds(
+        orders_queryset, settings.EXPORT_SHARD_SIZE
+    )
+
+    if len(shard_bounds) > 1:
+        # large exports are split into primary key ranges which are exported
+        # to partial files in parallel, and merged once all of them are done.
+        # the partial files are kept in their own directory so that they can be
+        # removed together if a shard fails
+        part_file_dir = f'{os.path.splitext(private_export_file_name)[0]}_parts'
+        shard_signatures = [
+            export_orders_shard_as_xlsx.s(
+                orders_query,
+                sorted_variation_keys,
+                start_pk,
+                end_pk,
+                part_file_name=os.path.join(part_file_dir, f'{shard_index}.xlsx'),
+                export_job_id=export_job.id,
+            )
+            for shard_index, (start_pk, end_pk) in enumerate(shard_bounds)
+        ]
+
+        logger.info(
+            f'exporting orders to {private_export_file_name} in '
+            f'{len(shard_signatures)} shards'
+        )
+
+        chord(shard_signatures)(
+            merge_order_export_shards.s(
+                field_names,
+                export_file_name,
+                private_export_file_name,
+                exporter_email,
+                export_download_url,
+                export_job_id=export_job.id,
+            )
         )
-        .all()
+
+        return True
+
+    rows = _iter_order_export_rows(
+        orders_queryset.order_by('pk'),
+        sorted_variation_keys,
+        _get_organization_prices(orders_queryset),
+        settings.EXPORT_CHUNK_SIZE,
+    )
+
+    # rows are written to a temporary file as they are fetched, which is then
+    # saved to the configured storage
+    with write_xlsx_to_temporary_file(chain([field_names], rows)) as export_file:
+        storage.save(private_export_file_name, File(export_file))
+
+    finish_export_job(export_job.id, export_file_name)
+
+    # send an email to the exporter with a link to download the file
+    send_export_download_email('order', exporter_email, export_download_url)
+
+    return True
+
+
+class OrderExportShardTask(ExportTask):
+    """
+    Base class for the shard tasks of a sharded orders export, which also
+    removes the export's partial files when a shard fails, since they are
+    never merged
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        super().on_failure(exc, task_id, args, kwargs, einfo)
+
+        _delete_order_export_parts(storages['exports'], kwargs['part_file_name'])
+
+
+# must use pickle task serializer for the query argument
+@shared_task(serializer='pickle', base=OrderExportShardTask)
+def export_orders_shard_as_xlsx(
+    orders_query: Query,
+    sorted_variation_keys: list[str],
+    start_pk: int,
+    end_pk: int | None,
+    part_file_name: str,
+    export_job_id: int | None = None,
+) -> str:
+    """
+    Export the queried orders within the [start_pk, end_pk) primary key range
+    as a partial xlsx file without a header, and return its saved file name
+    """
+
+    orders_queryset = Order.objects.all()
+    orders_queryset.query = orders_query
+
+    orders_queryset = orders_queryset.filter(pk__gte=start_pk)
+    if end_pk is not None:
+        orders_queryset = orders_queryset.filter(pk__lt=end_pk)
+
+    rows = _iter_order_export_rows(
+        orders_queryset.order_by('pk'),
+        sorted_variation_keys,
+        _get_organization_prices(orders_queryset),
+        settings.EXPORT_CHUNK_SIZE,
+    )
+
+    storage = storages['exports']
+
+    with write_xlsx_to_temporary_file(rows) as part_file:
+        part_file_name = storage.save(part_file_name, File(part_file))
+
+    # a shard which finishes after another shard failed (and marked the export
+    # job as failed) removes its own partial file
+    if (
+        export_job_id
+        and ExportJob.objects.filter(
+            id=export_job_id, status=ExportJob.StatusEnum.FAILED.name
+        ).exists()
     ):
-        for order_product in order.ordered_products():
-            variations = order_product.get('variations')
-            if variations:
-                all_variation_keys.update(variations.keys())
+        storage.delete(part_file_name)
 
-    sorted_variation_keys = sorted(all_variation_keys)
+    return part_file_name
 
-    for key in sorted_variation_keys:
-        field_names.insert(field_names.index('sku'), key)
 
-    worksheet.append(field_names)
+@shared_task(base=ExportTask)
+def merge_order_export_shards(
+    part_file_names: list[str],
+    field_names: list[str],
+    export_file_name: str,
+    private_export_file_name: str,
+    exporter_email: str,
+    export_download_url: str,
+    export_job_id: int | None = None,
+) -> bool:
+    """
+    Merge the partial files of a sharded orders export, in shard order, into
+    the final export file and send it to the exporter
+    """
 
-    for order in (
-        orders_queryset.select_related('campaign_employee_id')
-        .prefetch_related(
-            'campaign_employee_id__campaign',
-            'campaign_employee_id__campaign__organization',
-            'campaign_employee_id__employee',
-            'campaign_employee_id__employee__employee_group',
+    storage = storages['exports']
+
+    rows = _iter_order_export_part_rows(storage, part_file_names)
+
+    with write_xlsx_to_temporary_file(chain([field_names], rows)) as export_file:
+        storage.save(private_export_file_name, File(export_file))
+
+    for part_file_name in part_file_names:
+        storage.delete(part_file_name)
+
+    if export_job_id:
+        finish_export_job(export_job_id, export_file_name)
+
+    send_export_download_email('order', exporter_email, export_download_url)
+
+    return True
+
+
+def _get_order_export_shard_bounds(
+    orders_queryset: QuerySet, shard_size: int
+) -> list[tuple[int, int | None]]:
+    """
+    Split the queried orders into primary key ranges of up to `shard_size`
+    orders. Each range is returned as its first primary key and the first
+    primary key of the next range (None for the last range)
+    """
+
+    shard_start_pks = [
+        pk
+        for index, pk in enumerate(
+            orders_queryset.order_by('pk')
+            .values_list('pk', flat=True)
+            .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
         )
-        .all()
-    ):
-        order_serializer = OrderExportSerializer(order).data
-        for order_product in order.ordered_products():
-            record = []
-            record.append(order.order_id)
-            record.append(order_serializer.get('reference'))
-            record.append(order_serializer.get('campaign', {}).get('name', ''))
-            record.append(order_serializer.get('campaign', {}).get('is_active', ''))
-            record.append(order_serializer.get('employee', {}).get('full_name'))
-            record.append(order_serializer.get('employee', {}).get('email', '') or '')
-            record.append(order_serializer.get('employee_group', {}).get('name'))
-            record.append(order_serializer.get('phone_number'))
-            record.append(order_serializer.get('additional_phone_number'))
-            record.append(order.organization())
-            record.append(order_product.get('name'))
-
-            variations = order_product.get('variations', {})
-            if variations:
-                for key in sorted_variation_keys:
-                    record.append(variations.get(key, None))
-            else:
-                record.extend([None] * len(sorted_variation_keys))
-
-            record.append(order_product.get('sku'))
-            record.append(order_product.get('supplier').get('name'))
-            record.append(order_product.get('brand').get('name'))
-            record.append(order_product.get('quantity'))
-            record.append(order_product.get('cost_price'))
-            record.append(order_product.get('logistics_rate_cost_percent'))
-            record.append(order_product.get('total_cost'))
-            record.append(order_serializer.get('order_date_time'))
-            record.append(order_serializer.get('delivery_street'))
-            record.append(order_serializer.get('delivery_street_number'))
-            record.append(order_serializer.get('delivery_apartment_number'))
-            record.append(order_serializer.get('delivery_city'))
-            record.append(order_serializer.get('country'))
-            record.append(order_serializer.get('state_code'))
-            record.append(order_serializer.get('zip_code'))
-            record.append(order_serializer.get('delivery_additional_details'))
-            record.append(order_product.get('product_type'))
-            record.append(order_product.get('product_kind'))
-            record.append(
-                getattr(
-                    OrganizationProduct.objects.filter(
-                        product=order_product.get('id'),
-                        organization=order_serializer.get('organization'),
-                    ).first(),
-                    'price',
-                    order_product.get('sale_price'),
-                )
-            )
-            record.append(order_serializer.get('status'))
-            record.append(order_serializer.get('logistics_center_status'))
-            record.append(order_serializer.get('dc_status_last_changed'))
+        if index % shard_size == 0
+    ]
+
+    return list(zip(shard_start_pks, [*shard_start_pks[1:], None]))
+
+
+def _delete_order_export_parts(storage, part_file_name: str):
+    part_file_dir = os.path.dirname(part_file_name)
+
+    try:
+        _, file_names = storage.listdir(part_file_dir)
+    except FileNotFoundError:
+        # no shard saved its partial file yet
+        return
+
+    for file_name in file_names:
+        storage.delete(os.path.join(part_file_dir, file_name))
+
+
+def _iter_order_export_part_rows(storage, part_file_names: list[str]) -> Iterator:
+    for part_file_name in part_file_names:
+        with storage.open(part_file_name) as part_file:
+            workbook = load_workbook(part_file, read_only=True)
+            yield from workbook.active.iter_rows(values_only=True)
+            workbook.close()
+
+
+@shared_task
+def generate_campaign_report(job_id: int) -> bool:
+    report_job = (
+        CampaignReportJob.objects.filter(id=job_id)
+        .select_related('campaign__organization')
+        .first()
+    )
+
+    if not report_job:
+        logger.warn(f'campaign report job {job_id} not found')
+        return False
 
-            worksheet.append(record)
+    report_job.status = CampaignReportJob.StatusEnum.RUNNING.name
+    report_job.save(update_fields=['status'])
+
+    report_type = CampaignReportJob.ReportTypeEnum[report_job.report_type]
+    export_format = ExportFormatEnum[report_job.export_format]
 
     storage = storages['exports']
 
-    formatted_init_datetime = export_init_datetime.strftime('%Y_%m_%d_%H%M')
     export_file_name = storage.generate_filename(
         os.path.join(
             str(uuid.uuid4()),
-            f'orders_export_{formatted_init_datetime}.xlsx',
+            f'{REPORT_TITLES[report_type]}.{export_format.value}',
         ),
     )
     private_export_file_name = storage.generate_filename(
         os.path.join(
-            str(exporter_user_id),
+            str(report_job.requested_by_id),
             export_file_name,
         ),
     )
 
-    # save workbook to memory and then to the configured storage
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-    storage.save(private_export_file_name, ContentFile(buffer.read()))
+    try:
+        with build_campaign_report(
+            report_job.campaign, report_type, export_format
+        ) as report_file:
+            storage.save(private_export_file_name, File(report_file))
+    except Exception as ex:
+        logger.error(f'failed generating campaign report job {job_id}: {ex}')
 
-    # send an email to the exporter with a link to download the file
-    send_export_download_email(
-        'order', exporter_email, f'{base_export_download_url}{export_file_name}'
-    )
+        report_job.status = CampaignReportJob.StatusEnum.FAILED.name
+        report_job.error = str(ex)
+        report_job.finished_at = datetime.now(timezone.utc)
+        report_job.save(update_fields=['status', 'error', 'finished_at'])
+
+        return False
+
+    report_job.status = CampaignReportJob.StatusEnum.COMPLETED.name
+    report_job.file_name = export_file_name
+    report_job.finished_at = datetime.now(timezone.utc)
+    report_job.save(update_fields=['status', 'file_name', 'finished_at'])
 
     return True
 
 
+def _get_orders_variation_keys(orders_queryset: QuerySet) -> list[str]:
+    """
+    Returns the sorted variation keys used by the queried orders' products,
+    collected from the distinct variation values in a single query
+    """
+
+    variation_keys = set()
+
+    for variations in (
+        OrderProduct.objects.filter(
+            order_id__in=orders_queryset.order_by().values('reference'),
+            variations__isnull=False,
+        )
+        .order_by()
+        .values_list('variations', flat=True)
+        .distinct()
+    ):
+        if variations:
+            variation_keys.update(variations.keys())
+
+    return sorted(variation_keys)
+
+
+def _get_organization_prices(orders_queryset: QuerySet) -> dict[tuple, int]:
+    """
+    Returns the organization product prices of the queried orders'
+    organizations, keyed by (organization id, product id)
+    """
+
+    organization_prices = {}
+
+    # iterating in reverse so the first organization product wins for
+    # duplicate (organization, product) pairs
+    for organization_id, product_id, price in (
+        OrganizationProduct.objects.filter(
+            organization_id__in=orders_queryset.order_by().values(
+                'campaign_employee_id__campaign__organization_id'
+            )
+        )
+        .order_by('-id')
+        .values_list('organization_id', 'product_id', 'price')
+    ):
+        organization_prices[(organization_id, product_id)] = price
+
+    return organization_prices
+
+
+def _iter_order_export_rows(
+    orders_queryset: QuerySet,
+    sorted_variation_keys: list[str],
+    organization_prices: dict[tuple, int],
+    chunk_size: int,
+) -> Iterator[list]:
+    date_time_field = DateTimeField()
+
+    orders = (
+        orders_queryset.select_related(
+            'campaign_employee_id__campaign__organization',
+            'campaign_employee_id__employee__employee_group',
+        )
+        .prefetch_related(
+            Prefetch(
+                'orderproduct_set',
+                queryset=OrderProduct.objects.select_related(
+                    'product_id__product_id__supplier',
+                    'product_id__product_id__brand',
+                ),
+            ),
+            Prefetch(
+                'orderproduct_set__product_id__product_id__bundled_items',
+                queryset=ProductBundleItem.objects.select_related(
+                    'product__supplier', 'product__brand'
+                ),
+            ),
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+    for order in orders:
+        campaign = order.campaign_employee_id.campaign
+        employee = order.campaign_employee_id.employee
+        dc_status_last_changed = (
+            order.dc_status_last_changed.strftime('%d/%m/%Y %H:%M')
+            if order.dc_status_last_changed
+            else None
+        )
+
+        for order_product in order.orderproduct_set.all():
+            ordered_product = order_product.product_id.product_id
+
+            if ordered_product.product_kind == Product.ProductKindEnum.BUNDLE.name:
+                products = [
+                    (bundled_item.product, bundled_item.quantity)
+                    for bundled_item in ordered_product.bundled_items.all()
+                ]
+            else:
+                products = [(ordered_product, 1)]
+
+            variations = order_product.variations
+            if variations:
+                variation_values = [variations.get(k) for k in sorted_variation_keys]
+            else:
+                variation_values = [None] * len(sorted_variation_keys)
+
+            for product, base_quantity in products:
+                yield [
+                    order.order_id,
+                    order.reference,
+                    campaign.name,
+                    campaign.is_active,
+                    employee.full_name,
+                    employee.email or '',
+                    employee.employee_group.name,
+                    order.phone_number,
+                    order.additional_phone_number,
+                    campaign.organization.name,
+                    product.name,
+                    *variation_values,
+                    product.sku,
+                    product.supplier.name,
+                    product.brand.name,
+                    order_product.quantity * base_quantity,
+                    product.cost_price,
+                    product.logistics_rate_cost_percent,
+                    product.total_cost,
+                    date_time_field.to_representation(order.order_date_time),
+                    order.delivery_street,
+                    order.delivery_street_number,
+                    order.delivery_apartment_number,
+                    order.delivery_city,
+                    order.country,
+                    order.state_code,
+                    order.zip_code,
+                    order.delivery_additional_details,
+                    product.product_type,
+                    product.product_kind,
+                    organization_prices.get(
+                        (campaign.organization_id, product.id), product.sale_price
+                    ),
+                    order.status,
+                    order.logistics_center_status,
+                    dc_status_last_changed,
+                ]
+
+
 @shared_task
 def send_campaign_employee_invitation(
     campaign_id: int,
@@ -339,38 +840,272 @@ def send_campaign_employee_invitation(
         logger.warn(f'campaign id: {campaign_id} not found for employee invitations')
         return
 
-    employees = Employee.objects.filter(id__in=employee_ids)
+    chunk_size = settings.CAMPAIGN_INVITATION_CHUNK_SIZE
+    job = CampaignInvitationJob.objects.create(
+        campaign=campaign,
+        invitation_types=list(invitation_type),
+        chunk_size=chunk_size,
+    )
+
+    chunk_signatures = []
+    total_count = 0
+
+    for employee_ids_chunk in chunked(
+        Employee.objects.filter(id__in=employee_ids)
+        .order_by('id')
+        .values_list('id', flat=True)
+        .iterator(chunk_size=chunk_size),
+        chunk_size,
+    ):
+        chunk_signatures.append(
+            send_campaign_employee_invitation_chunk.si(
+                job.id, campaign_id, employee_ids_chunk, list(invitation_type)
+            )
+        )
+        total_count += len(employee_ids_chunk)
+
+    _dispatch_campaign_invitation_job(job, chunk_signatures, total_count)
+
+    logger.info(
+        f'queued campaign id: {campaign_id} invitation to {total_count} employees '
+        f'in {len(chunk_signatures)} chunks (job {job.id})'
+    )
+
+
+@shared_task
+def send_campaign_employee_invitation_chunk(
+    job_id: int,
+    campaign_id: int,
+    employee_ids: list[int],
+    invitation_type: list[Literal['email', 'sms']],
+) -> tuple[int, int]:
+    campaign = (
+        Campaign.objects.filter(id=campaign_id).select_related('organization').first()
+    )
+    employees = list(Employee.objects.filter(id__in=employee_ids)) if campaign else []
+
     sent_count = 0
+    failed_count = 0
+
     for employee in employees:
         logger.info(f'sending invitation message to employee id: {employee.id}')
 
-        if employee.email and 'email' in invitation_type:
-            welcome_message = fill_message_template_email(
-                employee=employee, campaign=campaign
+        try:
+            if employee.email and 'email' in invitation_type:
+                welcome_message = fill_message_template_email(
+                    employee=employee, campaign=campaign
+                )
+                if send_campaign_welcome_email(
+                    employee.email,
+                    "You're Invited!",
+                    welcome_message,
+                    employee.get_campaign_site_link(campaign.code),
+                ):
+                    sent_count += 1
+                else:
+                    failed_count += 1
+
+            if employee.phone_number and 'sms' in invitation_type:
+                welcome_message = fill_message_template_sms(
+                    employee=employee, campaign=campaign
+                )
+                if send_campaign_welcome_sms(
+                    campaign.sms_sender_name,
+                    employee.phone_number,
+                    welcome_message,
+                ):
+                    sent_count += 1
+                else:
+                    failed_count += 1
+        except Exception as ex:
+            logger.error(
+                f'failed sending campaign id: {campaign_id} invitation to '
+                f'employee id: {employee.id}: {ex}'
+            )
+            failed_count += 1
+
+    _record_campaign_invitation_chunk(
+        job_id, len(employee_ids), sent_count, failed_count
+    )
+
+    return sent_count, failed_count
+
+
+# the number of times sending an order notification is attempted before it is
+# marked as failed, and the number of seconds a dispatcher may hold a row while
+# sending it before it is picked up again by another dispatcher
+ORDER_NOTIFICATION_MAX_ATTEMPTS = 5
+ORDER_NOTIFICATION_LEASE_SECONDS = 300
+
+
+def enqueue_order_confirmation_email(order: Order) -> OrderNotificationOutbox:
+    """
+    Writes an order confirmation email to the order notification outbox. This
+    should be called inside the transaction which places the order, so that the
+    notification is only sent if the order is committed.
+    """
+
+    notification = OrderNotificationOutbox.objects.create(
+        order=order,
+        kind=OrderNotificationOutbox.KindEnum.ORDER_CONFIRMATION_EMAIL.name,
+    )
+    transaction.on_commit(lambda: dispatch_order_notifications.apply_async())
+
+    return notification
+
+
+@shared_task
+def dispatch_order_notifications(batch_size: int | None = None) -> int:
+    batch_size = batch_size or settings.ORDER_NOTIFICATION_BATCH_SIZE
+    sent_count = 0
+
+    while True:
+        notifications = _claim_order_notifications(batch_size)
+
+        for notification in notifications:
+            if _send_order_notification(notification):
+                sent_count += 1
+
+        if len(notifications) < batch_size:
+            break
+
+    if sent_count:
+        logger.info(f'dispatched {sent_count} order notifications')
+
+    return sent_count
+
+
+def _claim_order_notifications(batch_size: int) -> list[OrderNotificationOutbox]:
+    now = datetime.now(timezone.utc)
+
+    with transaction.atomic():
+        # only the outbox rows are locked, and not the joined orders and
+        # employees, so checkouts and status updates aren't blocked by a batch
+        notifications = list(
+            OrderNotificationOutbox.objects.select_for_update(
+                skip_locked=True, of=('self',)
             )
-            send_campaign_welcome_email(
-                employee.email,
-                "You're Invited!",
-                welcome_message,
-                employee.get_campaign_site_link(campaign.code),
+            .filter(
+                status=OrderNotificationOutbox.StatusEnum.PENDING.name,
+                available_at__lte=now,
             )
-            sent_count += 1
+            .select_related('order__campaign_employee_id__employee')
+            .order_by('available_at', 'id')[:batch_size]
+        )
+
+        # lease the claimed rows so concurrent dispatchers skip them once the
+        # lock is released
+        OrderNotificationOutbox.objects.filter(
+            id__in=[n.id for n in notifications]
+        ).update(available_at=now + timedelta(seconds=ORDER_NOTIFICATION_LEASE_SECONDS))
+
+    return notifications
+
 
-        if employee.phone_number and 'sms' in invitation_type:
-            welcome_message = fill_message_template_sms(
-                employee=employee, campaign=campaign
+def _send_order_notification(notification: OrderNotificationOutbox) -> bool:
+    error = ''
+
+    try:
+        if (
+            notification.kind
+            == OrderNotificationOutbox.KindEnum.ORDER_CONFIRMATION_EMAIL.name
+        ):
+            sent = send_order_confirmation_email(notification.order)
+        else:
+            sent = False
+            error = f'unknown notification kind {notification.kind}'
+    except Exception as ex:
+        sent = False
+        error = str(ex)
+
+    now = datetime.now(timezone.utc)
+    notification.attempts += 1
+
+    if sent:
+        notification.status = OrderNotificationOutbox.StatusEnum.SENT.name
+        notification.sent_at = now
+        notification.last_error = ''
+    else:
+        notification.last_error = error or 'sending failed'
+
+        if notification.attempts >= ORDER_NOTIFICATION_MAX_ATTEMPTS:
+            notification.status = OrderNotificationOutbox.StatusEnum.FAILED.name
+            logger.error(
+                f'giving up on order notification {notification.id} for order '
+                f'{notification.order_id}: {notification.last_error}'
             )
-            send_campaign_welcome_sms(
-                campaign.sms_sender_name,
-                employee.phone_number,
-                welcome_message,
+        else:
+            # exponential backoff: 1, 2, 4, 8... minutes
+            notification.available_at = now + timedelta(
+                minutes=2 ** (notification.attempts - 1)
+            )
+            logger.warn(
+                f'failed sending order notification {notification.id} for order '
+                f'{notification.order_id}, will retry: {notification.last_error}'
             )
-            sent_count += 1
 
-        logger.info(
-            f'campaign invitation sent to {sent_count} out of {len(employee_ids)} employees'  # noqa: E501
-        )
+    notification.save(
+        update_fields=['status', 'attempts', 'last_error', 'available_at', 'sent_at']
+    )
 
-    logger.info(
-        f'done sending campaign id: {campaign_id} invitation to {len(employee_ids)} employees'  # noqa: E501
+    return sent
+
+
+def schedule_order_rollups_refresh(
+    order_ids: Iterable[int] = (), keys: Iterable[tuple[int, date]] = ()
+):
+    """
+    Refreshes the campaign order rollups of the given orders, and of the rollup
+    keys (see `get_order_rollup_key`) of deleted orders or of the previous
+    state of changed orders, once the current transaction is committed. The
+    orders and keys scheduled within a transaction (for example an order and
+    each of its products) are refreshed together by a single task
+    """
+
+    # the pending refresh is kept on the connection, which is not shared
+    # between threads
+    connection = transaction.get_connection()
+    if not hasattr(connection, 'pending_order_rollups_refresh'):
+        connection.pending_order_rollups_refresh = (set(), set())
+
+    pending_order_ids, pending_keys = connection.pending_order_rollups_refresh
+    pending_order_ids.update(order_ids)
+    pending_keys.update(
+        (campaign_employee_id, day.isoformat()) for campaign_employee_id, day in keys
     )
+
+    transaction.on_commit(lambda: _start_order_rollups_refresh(connection))
+
+
+def _start_order_rollups_refresh(connection):
+    # the first callback of the transaction starts the refresh of everything
+    # which was scheduled, the others find nothing left to refresh. keys of a
+    # rolled back transaction are refreshed with the next one, which only
+    # recomputes their buckets again
+    if not hasattr(connection, 'pending_order_rollups_refresh'):
+        return
+
+    order_ids, keys = connection.pending_order_rollups_refresh
+    del connection.pending_order_rollups_refresh
+
+    refresh_campaign_order_rollups.apply_async((sorted(order_ids), sorted(keys)))
+
+
+@shared_task(
+    autoretry_for=(IntegrityError,),
+    retry_kwargs={'max_retries': 2, 'countdown': 30},
+)
+def refresh_campaign_order_rollups(
+    order_ids: list[int], keys: list[tuple[int, str]]
+) -> bool:
+    refresh_order_rollups(
+        get_order_rollup_buckets(
+            order_ids,
+            [
+                (campaign_employee_id, date.fromisoformat(day))
+                for campaign_employee_id, day in keys
+            ],
+        )
+    )
+
+    return True
@@ -1,21 +1,35 @@
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from io import BytesIO, StringIO
 import json
 from unittest import mock
 
 from django.conf import settings
+from django.contrib.admin.sites import AdminSite
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.db.models import (
     Q,
     Sum,
 )
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone as django_timezone
+from django.utils.datastructures import MultiValueDict
+from openpyxl import Workbook, load_workbook
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from campaign import tasks as campaign_tasks
+from campaign.admin import EmployeeAdmin
+from campaign.imports import import_employee_groups, import_organization_pricelist
 from campaign.models import (
     Campaign,
     CampaignEmployee,
+    CampaignInvitationJob,
+    CampaignOrderRollup,
+    CampaignReportJob,
     Cart,
     CartProduct,
     DeliveryLocationEnum,
@@ -25,6 +39,7 @@ from campaign.models import (
     EmployeeGroupCampaign,
     EmployeeGroupCampaignProduct,
     Order,
+    OrderNotificationOutbox,
     OrderProduct,
     Organization,
     OrganizationProduct,
@@ -40,22 +55,32 @@ from campaign.serializers import (
     QuickOfferSelectProductsDetailSerializer,
     QuickOfferSerializer,
 )
+from campaign.tasks import (
+    dispatch_order_notifications,
+    export_orders_as_xlsx,
+    export_orders_shard_as_xlsx,
+    send_campaign_employee_invitation,
+    send_campaign_welcome_messages,
+)
 from campaign.utils import (
     get_campaign_brands,
     get_campaign_max_product_price,
     get_campaign_product_kinds,
     get_campaign_tags,
 )
+from export.models import ExportJob
 from inventory.models import (
     Brand,
     Category,
     Product,
+    ProductBundleItem,
     ProductImage,
     Share,
     ShareTypeEnum,
     Supplier,
     Tag,
 )
+from lib.admin import RecordImportError
 from services.auth import jwt_encode
 
 
@@ -2603,7 +2628,7 @@ class EmployeeOrderViewTestCase(TestCase):
             },
         )
 
-    @mock.patch('campaign.views.send_order_confirmation_email')
+    @mock.patch('campaign.tasks.send_order_confirmation_email')
     def test_employee_order_already_exists_with_campaign_type_wallet(
         self, mock_send_email
     ):
@@ -2650,12 +2675,28 @@ class EmployeeOrderViewTestCase(TestCase):
         employee_order = Order.objects.get(pk=2)
 
         self.assertEqual(employee_order.status, 'PENDING')
-        mock_send_email.assert_called_once_with(mock.ANY)
 
+        # the confirmation email is queued in the outbox and not sent inline
+        mock_send_email.assert_not_called()
+        self.assertListEqual(
+            list(
+                OrderNotificationOutbox.objects.filter(order=employee_order).values(
+                    'kind', 'status'
+                )
+            ),
+            [
+                {
+                    'kind': 'ORDER_CONFIRMATION_EMAIL',
+                    'status': 'PENDING',
+                }
+            ],
+        )
+
+        dispatch_order_notifications()
         mock_send_email.assert_called_once_with(employee_order)
         self.assertEqual(len(CartProduct.objects.filter(cart_id=self.cart2)), 0)
 
-    @mock.patch('requests.post')
+    @mock.patch('services.http_client.http_client.post')
     def test_valid_request(self, mock_post):
         self.campaignEmployee.total_budget = 0
         self.campaignEmployee.save()
@@ -2811,7 +2852,7 @@ class EmployeeOrderViewTestCase(TestCase):
             },
         )
 
-    @mock.patch('requests.post')
+    @mock.patch('services.http_client.http_client.post')
     def test_valid_checkout_global_request(self, mock_post):
         self.campaignEmployee.total_budget = 0
         self.campaignEmployee.save()
@@ -2873,7 +2914,7 @@ class EmployeeOrderViewTestCase(TestCase):
             [{'product_id': 1, 'quantity': 2}, {'product_id': 2, 'quantity': 3}],
         )
 
-    @mock.patch('requests.post')
+    @mock.patch('services.http_client.http_client.post')
     def test_request_cost_with_multiple_employee_group_budgets(self, mock_post):
         campaignEmployee2 = CampaignEmployee.objects.get(pk=2)
         campaignEmployee2.total_budget = 0
@@ -2957,8 +2998,8 @@ class EmployeeOrderViewTestCase(TestCase):
             },
         )
 
-    @mock.patch('requests.post')
-    @mock.patch('campaign.views.send_order_confirmation_email')
+    @mock.patch('services.http_client.http_client.post')
+    @mock.patch('campaign.tasks.send_order_confirmation_email')
     def test_voucher_value_lock_after_update(self, mock_send_email, mock_post):
         # Mock payment response as a fallback
         mock_post.return_value = self._mock_response(
@@ -3133,6 +3174,7 @@ class EmployeeOrderViewTestCase(TestCase):
         )
 
         # Verify email was sent for both orders
+        dispatch_order_notifications()
         self.assertEqual(mock_send_email.call_count, 2)
         mock_send_email.assert_any_call(order1)
         mock_send_email.assert_any_call(order2)
@@ -5861,6 +5903,303 @@ class OrganizationProductTestCase(TestCase):
         self.assertEqual(new_org_product.price, 150)
 
 
+class ImportOrganizationPricelistTestCase(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.organization = Organization.objects.first()
+        Product.objects.filter(sku='sku 3').update(google_price=50)
+
+        self.updated_organization_product = OrganizationProduct.objects.create(
+            organization=self.organization,
+            product=Product.objects.get(sku='sku 1'),
+            price=10,
+        )
+        self.deleted_organization_product = OrganizationProduct.objects.create(
+            organization=self.organization,
+            product=Product.objects.get(sku='sku 2'),
+            price=20,
+        )
+
+    def test_import_pricelist(self):
+        # the products and organization products are loaded with a query
+        # each, and the changes are a delete, an update and an insert in a
+        # savepoint
+        with self.assertNumQueries(7):
+            success, errors = import_organization_pricelist(
+                self.organization,
+                [
+                    (2, 'sku 1', 15),
+                    (3, 'sku 2', None),
+                    (4, 'sku 3', 100),
+                    (5, 'sku 4', 40.0),
+                    (6, 'missing sku', 10),
+                    (7, 'sku 3', 'invalid'),
+                    (8, 'missing sku', 20),
+                ],
+            )
+
+        self.assertListEqual(success, ['sku 1', 'sku 2', 'sku 4'])
+        # the errors of identical rows are reported together with their rows
+        self.assertDictEqual(
+            errors,
+            {
+                'Organization price cannot be higher than product google price for '
+                'SKU (sku 3)': [4],
+                'Could not find product with SKU "missing sku"': [6, 8],
+                'Organization price is invalid for SKU (sku 3)': [7],
+            },
+        )
+
+        self.updated_organization_product.refresh_from_db()
+        self.assertEqual(self.updated_organization_product.price, 15)
+        self.assertFalse(
+            OrganizationProduct.objects.filter(
+                pk=self.deleted_organization_product.pk
+            ).exists()
+        )
+        self.assertListEqual(
+            list(
+                OrganizationProduct.objects.filter(
+                    organization=self.organization
+                ).values_list('product__sku', 'price')
+            ),
+            [('sku 1', 15), ('sku 4', 40)],
+        )
+
+    def test_import_pricelist_applies_rows_in_order(self):
+        success, errors = import_organization_pricelist(
+            self.organization,
+            [
+                (2, 'sku 4', 30),
+                (3, 'sku 4', None),
+                (4, 'sku 1', None),
+                (5, 'sku 1', 12),
+                (6, 'sku 3', None),
+            ],
+        )
+
+        self.assertListEqual(success, ['sku 4', 'sku 4', 'sku 1', 'sku 1'])
+        self.assertDictEqual(errors, {})
+        self.assertListEqual(
+            list(
+                OrganizationProduct.objects.filter(
+                    organization=self.organization
+                ).values_list('product__sku', 'price')
+            ),
+            [('sku 1', 12), ('sku 2', 20)],
+        )
+
+
+class ImportEmployeeGroupsTestCase(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.organization = Organization.objects.first()
+        self.other_organization = Organization.objects.create(
+            name_en='other organization',
+            name_he='other organization',
+            manager_full_name='manager',
+            manager_phone_number='0500000000',
+            manager_email='manager@other.com',
+        )
+        self.employee_group = EmployeeGroup.objects.create(
+            name='existing group',
+            organization=self.organization,
+            delivery_location=DeliveryLocationEnum.ToOffice.name,
+            auth_method=EmployeeAuthEnum.EMAIL.name,
+        )
+
+    def test_import_employee_groups(self):
+        groups_count = EmployeeGroup.objects.count()
+
+        # the organizations and groups are loaded with a query each, and the
+        # groups are written with an update and an insert in a savepoint
+        with self.assertNumQueries(6):
+            counter = import_employee_groups(
+                [
+                    (
+                        self.employee_group.id,
+                        'updated group',
+                        self.other_organization.name,
+                        'city',
+                        'street',
+                        '1',
+                        '2',
+                        DeliveryLocationEnum.ToHome.name,
+                        EmployeeAuthEnum.SMS.name,
+                    ),
+                    (
+                        None,
+                        'new group',
+                        self.other_organization.name,
+                        None,
+                        None,
+                        None,
+                        None,
+                        DeliveryLocationEnum.ToOffice.name,
+                        EmployeeAuthEnum.EMAIL.name,
+                    ),
+                    (
+                        None,
+                        'new group without organization',
+                        'missing organization',
+                        None,
+                        None,
+                        None,
+                        None,
+                        DeliveryLocationEnum.ToOffice.name,
+                        EmployeeAuthEnum.EMAIL.name,
+                    ),
+                ]
+            )
+
+        self.assertEqual(counter, 3)
+        self.assertEqual(EmployeeGroup.objects.count(), groups_count + 2)
+
+        # the organization of an existing group is not changed
+        self.employee_group.refresh_from_db()
+        self.assertEqual(self.employee_group.name, 'updated group')
+        self.assertEqual(self.employee_group.organization, self.organization)
+        self.assertEqual(self.employee_group.delivery_city, 'city')
+        self.assertEqual(self.employee_group.delivery_street, 'street')
+        self.assertEqual(self.employee_group.delivery_street_number, '1')
+        self.assertEqual(self.employee_group.delivery_apartment_number, '2')
+        self.assertEqual(
+            self.employee_group.delivery_location, DeliveryLocationEnum.ToHome.name
+        )
+        self.assertEqual(self.employee_group.auth_method, EmployeeAuthEnum.SMS.name)
+
+        self.assertEqual(
+            EmployeeGroup.objects.get(name='new group').organization,
+            self.other_organization,
+        )
+        self.assertIsNone(
+            EmployeeGroup.objects.get(
+                name='new group without organization'
+            ).organization
+        )
+
+
+class EmployeeAdminImportTestCase(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.employee_admin = EmployeeAdmin(Employee, AdminSite())
+
+    def _employee_row(self, employee_group_name, employee_id=None, **kwargs):
+        return [
+            employee_id,
+            employee_group_name,
+            kwargs.get('full_name', 'first last'),
+            kwargs.get('full_name', 'first last'),
+            kwargs.get('login_type', EmployeeAuthEnum.AUTH_ID.name),
+            kwargs.get('auth_id'),
+            kwargs.get('email'),
+            kwargs.get('phone_number'),
+            None,
+            'HE',
+            None,
+            None,
+            None,
+            None,
+            True,
+        ]
+
+    def _import(self, rows):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.append(list(self.employee_admin.export_fields))
+        for row in rows:
+            worksheet.append(row)
+
+        xlsx_file = BytesIO()
+        workbook.save(xlsx_file)
+
+        return self.employee_admin.import_parse_and_save_xlsx_data(
+            {'organization_id': 1},
+            MultiValueDict(
+                {
+                    'xlsx_file': [
+                        SimpleUploadedFile('employees.xlsx', xlsx_file.getvalue())
+                    ]
+                }
+            ),
+        )
+
+    def test_import_employees(self):
+        created, updated = self._import(
+            [
+                self._employee_row(
+                    'employee group name 2',
+                    employee_id=1,
+                    full_name='updated name',
+                    auth_id='updated auth id',
+                ),
+                self._employee_row(
+                    'employee group name 3',
+                    full_name='new employee',
+                    login_type=EmployeeAuthEnum.EMAIL.name,
+                    email='New@Example.com',
+                ),
+                self._employee_row(
+                    'employee group name 3',
+                    full_name='sms employee',
+                    login_type=EmployeeAuthEnum.SMS.name,
+                    phone_number='0501234567',
+                ),
+            ]
+        )
+
+        self.assertEqual((created, updated), (2, 1))
+
+        updated_employee = Employee.objects.get(pk=1)
+        self.assertEqual(updated_employee.employee_group_id, 2)
+        self.assertEqual(updated_employee.first_name_en, 'updated')
+        self.assertEqual(updated_employee.last_name_en, 'name')
+        self.assertEqual(updated_employee.auth_id, 'updated auth id')
+
+        email_employee = Employee.objects.get(first_name_en='new')
+        self.assertEqual(email_employee.email, 'new@example.com')
+        sms_employee = Employee.objects.get(first_name_en='sms')
+        self.assertEqual(sms_employee.phone_number, '+972501234567')
+
+        # the new employees are connected to their group's active campaign with
+        # the group's budget, and existing campaign employees are kept
+        self.assertListEqual(
+            list(
+                CampaignEmployee.objects.filter(
+                    employee__in=[email_employee, sms_employee]
+                )
+                .order_by('employee_id')
+                .values_list('campaign_id', 'total_budget')
+            ),
+            [(2, 3000), (2, 3000)],
+        )
+        self.assertEqual(CampaignEmployee.objects.filter(employee_id=1).count(), 2)
+
+    def test_import_employees_reports_row_errors(self):
+        with self.assertRaises(RecordImportError) as cm:
+            self._import(
+                [
+                    self._employee_row('employee group name 1', auth_id='auth id'),
+                    self._employee_row('missing group', auth_id='auth id'),
+                    self._employee_row(
+                        'employee group name 1',
+                        login_type=EmployeeAuthEnum.EMAIL.name,
+                    ),
+                ]
+            )
+
+        self.assertDictEqual(
+            cm.exception.errors,
+            {
+                'EmployeeGroup matching query does not exist.': [3],
+                'email - Email must be provided': [4],
+            },
+        )
+
+
 class CampaignEmployeeSaveTestCase(TestCase):
     def setUp(self):
         self.organization = Organization.objects.create(
@@ -5966,3 +6305,794 @@ class TestCampaignAdminActions(TestCase):
         # ckeck the status
         self.assertEqual(campaign1.status, 'PENDING_APPROVAL')
         self.assertEqual(campaign2.status, 'PENDING_APPROVAL')
+
+    def test_export_organizations_as_csv(self):
+        self.client.login(username='admin', password='password')
+
+        response = self.client.post(
+            '/admin/campaign/organization/',
+            {'action': 'export_as_csv', '_selected_action': [1]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('.csv"', response['Content-Disposition'])
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeffid,name,'))
+        self.assertEqual(len(content.splitlines()), 2)
+        self.assertIn('organization name 1', content.splitlines()[1])
+
+    def test_export_organizations_as_xlsx(self):
+        self.client.login(username='admin', password='password')
+
+        response = self.client.post(
+            '/admin/campaign/organization/',
+            {'action': 'export_as_xlsx', '_selected_action': [1]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('.xlsx"', response['Content-Disposition'])
+
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:2], ('id', 'name'))
+        self.assertEqual(rows[1][:2], (1, 'organization name 1'))
+
+
+@override_settings(CAMPAIGN_INVITATION_CHUNK_SIZE=2)
+class SendCampaignInvitationsTaskTestCase(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(
+            name='test_org',
+            manager_full_name='test',
+            manager_phone_number='086786',
+            manager_email='info@gmail.com',
+        )
+        self.email_employee_group = EmployeeGroup.objects.create(
+            name='email group',
+            organization=self.organization,
+            auth_method='EMAIL',
+        )
+        self.sms_employee_group = EmployeeGroup.objects.create(
+            name='sms group',
+            organization=self.organization,
+            auth_method='SMS',
+        )
+        self.campaign = Campaign.objects.create(
+            organization=self.organization,
+            name='campaign name',
+            start_date_time=django_timezone.now(),
+            end_date_time=django_timezone.now() + django_timezone.timedelta(hours=1),
+            status='ACTIVE',
+            login_page_title='en',
+            login_page_subtitle='en',
+            main_page_first_banner_title='en',
+            main_page_first_banner_subtitle='en',
+            main_page_first_banner_image='image',
+            main_page_first_banner_mobile_image='mobile_image',
+            main_page_second_banner_title='en',
+            main_page_second_banner_subtitle='en',
+            main_page_second_banner_background_color='#123456',
+            main_page_second_banner_text_color='WHITE',
+            sms_sender_name='sender',
+            sms_welcome_text='en',
+            email_welcome_text='en',
+            campaign_type=Campaign.CampaignTypeEnum.NORMAL.name,
+        )
+        EmployeeGroupCampaign.objects.create(
+            campaign=self.campaign,
+            employee_group=self.email_employee_group,
+            budget_per_employee=100,
+        )
+        EmployeeGroupCampaign.objects.create(
+            campaign=self.campaign,
+            employee_group=self.sms_employee_group,
+            budget_per_employee=100,
+        )
+        self.email_employees = [
+            Employee.objects.create(
+                first_name=f'email_employee_{i}',
+                last_name='last_name',
+                email=f'employee{i}@test.com',
+                employee_group=self.email_employee_group,
+            )
+            for i in range(5)
+        ]
+        self.sms_employee = Employee.objects.create(
+            first_name='sms_employee',
+            last_name='last_name',
+            phone_number='0500000000',
+            employee_group=self.sms_employee_group,
+        )
+        Employee.objects.create(
+            first_name='inactive_employee',
+            last_name='last_name',
+            email='inactive@test.com',
+            active=False,
+            employee_group=self.email_employee_group,
+        )
+
+    @mock.patch('campaign.tasks.send_campaign_welcome_sms', return_value=True)
+    @mock.patch('campaign.tasks.send_campaign_welcome_email')
+    def test_welcome_messages_are_sent_in_chunks(self, mock_email, mock_sms):
+        # the second email fails and should be counted as such
+        mock_email.side_effect = [True, False, True, True, True]
+
+        self.assertTrue(send_campaign_welcome_messages(self.campaign.id))
+
+        self.assertEqual(mock_email.call_count, 5)
+        self.assertEqual(mock_sms.call_count, 1)
+
+        job = CampaignInvitationJob.objects.get(campaign=self.campaign)
+        self.assertEqual(job.total_count, 6)
+        # 3 chunks for the email group and 1 for the sms group
+        self.assertEqual(job.total_chunks, 4)
+        self.assertEqual(job.processed_chunks, 4)
+        self.assertEqual(job.processed_count, 6)
+        self.assertEqual(job.sent_count, 5)
+        self.assertEqual(job.failed_count, 1)
+        self.assertEqual(
+            job.status, CampaignInvitationJob.StatusEnum.COMPLETED_WITH_ERRORS.name
+        )
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.progress_percentage, 100)
+
+    @mock.patch('campaign.tasks.send_campaign_welcome_sms', return_value=True)
+    @mock.patch('campaign.tasks.send_campaign_welcome_email', return_value=True)
+    def test_failed_welcome_messages_chunk(self, mock_email, mock_sms):
+        record_chunk = campaign_tasks._record_campaign_invitation_chunk
+
+        def record_chunk_or_fail(job_id, *counts):
+            # the second chunk fails after sending its messages
+            if CampaignInvitationJob.objects.get(id=job_id).processed_chunks:
+                raise Exception('chunk failed')
+            record_chunk(job_id, *counts)
+
+        with mock.patch(
+            'campaign.tasks._record_campaign_invitation_chunk',
+            side_effect=record_chunk_or_fail,
+        ):
+            with self.assertRaisesMessage(Exception, 'chunk failed'):
+                send_campaign_welcome_messages(self.campaign.id)
+
+        # the job is not left running, and keeps the counts of the chunks which
+        # were processed
+        job = CampaignInvitationJob.objects.get(campaign=self.campaign)
+        self.assertEqual(job.status, CampaignInvitationJob.StatusEnum.FAILED.name)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.total_chunks, 4)
+        self.assertEqual(job.processed_chunks, 1)
+        self.assertEqual(job.sent_count, 2)
+
+    @mock.patch('campaign.tasks.send_campaign_welcome_sms', return_value=True)
+    @mock.patch('campaign.tasks.send_campaign_welcome_email', return_value=True)
+    def test_welcome_messages_resend_to_subset(self, mock_email, mock_sms):
+        employee_ids = [self.email_employees[0].id, self.email_employees[3].id]
+
+        send_campaign_welcome_messages(self.campaign.id, employee_ids)
+
+        self.assertEqual(mock_email.call_count, 2)
+        self.assertEqual(
+            {c.args[0] for c in mock_email.call_args_list},
+            {'employee0@test.com', 'employee3@test.com'},
+        )
+        mock_sms.assert_not_called()
+
+        job = CampaignInvitationJob.objects.get(campaign=self.campaign)
+        self.assertEqual(job.total_count, 2)
+        self.assertEqual(job.total_chunks, 1)
+        self.assertEqual(job.sent_count, 2)
+        self.assertEqual(job.status, CampaignInvitationJob.StatusEnum.COMPLETED.name)
+
+    @mock.patch('campaign.tasks.send_campaign_welcome_email', return_value=True)
+    def test_welcome_messages_without_recipients(self, mock_email):
+        send_campaign_welcome_messages(self.campaign.id, [-1])
+
+        mock_email.assert_not_called()
+
+        job = CampaignInvitationJob.objects.get(campaign=self.campaign)
+        self.assertEqual(job.total_count, 0)
+        self.assertEqual(job.total_chunks, 0)
+        self.assertEqual(job.status, CampaignInvitationJob.StatusEnum.COMPLETED.name)
+
+    @mock.patch('campaign.tasks.send_campaign_welcome_sms', return_value=True)
+    @mock.patch('campaign.tasks.send_campaign_welcome_email', return_value=True)
+    def test_employee_invitation_is_sent_in_chunks(self, mock_email, mock_sms):
+        employee_ids = [e.id for e in self.email_employees] + [self.sms_employee.id]
+
+        send_campaign_employee_invitation(
+            self.campaign.id, employee_ids, ['email', 'sms']
+        )
+
+        self.assertEqual(mock_email.call_count, 5)
+        self.assertEqual(mock_sms.call_count, 1)
+
+        job = CampaignInvitationJob.objects.get(campaign=self.campaign)
+        self.assertEqual(job.invitation_types, ['email', 'sms'])
+        self.assertEqual(job.total_count, 6)
+        self.assertEqual(job.total_chunks, 3)
+        self.assertEqual(job.sent_count, 6)
+        self.assertEqual(job.failed_count, 0)
+        self.assertEqual(job.status, CampaignInvitationJob.StatusEnum.COMPLETED.name)
+
+
+class DispatchOrderNotificationsTaskTestCase(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(
+            name='test_org',
+            manager_full_name='test',
+            manager_phone_number='086786',
+            manager_email='info@gmail.com',
+        )
+        self.employee_group = EmployeeGroup.objects.create(
+            name='email group',
+            organization=self.organization,
+            auth_method='EMAIL',
+        )
+        self.campaign = Campaign.objects.create(
+            organization=self.organization,
+            name='campaign name',
+            start_date_time=django_timezone.now(),
+            end_date_time=django_timezone.now() + django_timezone.timedelta(hours=1),
+            status='ACTIVE',
+            login_page_title='en',
+            login_page_subtitle='en',
+            main_page_first_banner_title='en',
+            main_page_first_banner_subtitle='en',
+            main_page_first_banner_image='image',
+            main_page_first_banner_mobile_image='mobile_image',
+            main_page_second_banner_title='en',
+            main_page_second_banner_subtitle='en',
+            main_page_second_banner_background_color='#123456',
+            main_page_second_banner_text_color='WHITE',
+            sms_sender_name='sender',
+            sms_welcome_text='en',
+            email_welcome_text='en',
+            campaign_type=Campaign.CampaignTypeEnum.NORMAL.name,
+        )
+        EmployeeGroupCampaign.objects.create(
+            campaign=self.campaign,
+            employee_group=self.employee_group,
+            budget_per_employee=100,
+        )
+        self.orders = []
+        for i in range(3):
+            employee = Employee.objects.create(
+                first_name=f'employee_{i}',
+                last_name='last_name',
+                email=f'employee{i}@test.com',
+                employee_group=self.employee_group,
+            )
+            self.orders.append(
+                Order.objects.create(
+                    campaign_employee_id=CampaignEmployee.objects.get(
+                        campaign=self.campaign, employee=employee
+                    ),
+                    order_date_time=datetime.now(timezone.utc),
+                    cost_from_budget=0,
+                    cost_added=0,
+                    status=Order.OrderStatusEnum.PENDING.name,
+                )
+            )
+            OrderNotificationOutbox.objects.create(
+                order=self.orders[-1],
+                kind=OrderNotificationOutbox.KindEnum.ORDER_CONFIRMATION_EMAIL.name,
+            )
+
+    @mock.patch('campaign.tasks.send_order_confirmation_email')
+    def test_dispatch_sends_all_pending_in_batches(self, mock_send_email):
+        mock_send_email.return_value = True
+
+        self.assertEqual(dispatch_order_notifications(batch_size=2), 3)
+        self.assertListEqual(
+            [c.args[0] for c in mock_send_email.call_args_list], self.orders
+        )
+        for notification in OrderNotificationOutbox.objects.all():
+            self.assertEqual(notification.status, 'SENT')
+            self.assertEqual(notification.attempts, 1)
+            self.assertIsNotNone(notification.sent_at)
+
+        # sent notifications are not sent again
+        self.assertEqual(dispatch_order_notifications(batch_size=2), 0)
+        self.assertEqual(mock_send_email.call_count, 3)
+
+    @mock.patch('campaign.tasks.send_order_confirmation_email')
+    def test_dispatch_failure_is_retried_later(self, mock_send_email):
+        mock_send_email.side_effect = [True, Exception('ses is down'), False]
+
+        self.assertEqual(dispatch_order_notifications(), 1)
+
+        notifications = list(OrderNotificationOutbox.objects.order_by('id'))
+        self.assertEqual(notifications[0].status, 'SENT')
+        self.assertEqual(notifications[1].status, 'PENDING')
+        self.assertEqual(notifications[1].attempts, 1)
+        self.assertEqual(notifications[1].last_error, 'ses is down')
+        self.assertGreater(notifications[1].available_at, django_timezone.now())
+        self.assertEqual(notifications[2].status, 'PENDING')
+        self.assertEqual(notifications[2].last_error, 'sending failed')
+
+        # nothing is available until the retry time has passed
+        self.assertEqual(dispatch_order_notifications(), 0)
+
+        mock_send_email.side_effect = None
+        mock_send_email.return_value = True
+        OrderNotificationOutbox.objects.update(available_at=django_timezone.now())
+
+        self.assertEqual(dispatch_order_notifications(), 2)
+        self.assertEqual(
+            OrderNotificationOutbox.objects.filter(status='SENT').count(), 3
+        )
+
+    @mock.patch('campaign.tasks.send_order_confirmation_email')
+    def test_dispatch_gives_up_after_max_attempts(self, mock_send_email):
+        mock_send_email.return_value = False
+        OrderNotificationOutbox.objects.update(attempts=4)
+
+        self.assertEqual(dispatch_order_notifications(), 0)
+        self.assertEqual(
+            OrderNotificationOutbox.objects.filter(status='FAILED').count(), 3
+        )
+
+
+class ExportOrdersAsXlsxTaskTestCase(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.storage = InMemoryStorage()
+
+        order_date_time = datetime(2024, 7, 1, 10, 30, tzinfo=timezone.utc)
+        self.order_1 = Order.objects.create(
+            campaign_employee_id=CampaignEmployee.objects.get(pk=1),
+            order_date_time=order_date_time,
+            cost_from_budget=0,
+            cost_added=0,
+            status=Order.OrderStatusEnum.PENDING.name,
+            phone_number='0500000000',
+            delivery_city='city',
+        )
+        OrderProduct.objects.create(
+            order_id=self.order_1,
+            product_id=EmployeeGroupCampaignProduct.objects.get(pk=1),
+            quantity=2,
+            variations={'size': 'L', 'color': 'red'},
+        )
+        OrderProduct.objects.create(
+            order_id=self.order_1,
+            product_id=EmployeeGroupCampaignProduct.objects.get(pk=5),
+            quantity=1,
+        )
+
+        # product 3 is a bundle of 2 x product 1 and 1 x product 2
+        Product.objects.filter(pk=3).update(
+            product_kind=Product.ProductKindEnum.BUNDLE.name
+        )
+        ProductBundleItem.objects.create(bundle_id=3, product_id=1, quantity=2)
+        ProductBundleItem.objects.create(bundle_id=3, product_id=2, quantity=1)
+        self.order_2 = Order.objects.create(
+            campaign_employee_id=CampaignEmployee.objects.get(pk=2),
+            order_date_time=order_date_time,
+            cost_from_budget=0,
+            cost_added=0,
+            status=Order.OrderStatusEnum.PENDING.name,
+        )
+        OrderProduct.objects.create(
+            order_id=self.order_2,
+            product_id=EmployeeGroupCampaignProduct.objects.create(
+                employee_group_campaign_id=EmployeeGroupCampaign.objects.get(pk=2),
+                product_id=Product.objects.get(pk=3),
+            ),
+            quantity=3,
+            variations={'size': 'M'},
+        )
+
+        OrganizationProduct.objects.create(organization_id=1, product_id=1, price=150)
+
+    def _export(self, orders_queryset):
+        with mock.patch('campaign.tasks.storages', {'exports': self.storage}):
+            export_orders_as_xlsx(
+                orders_queryset.query, 1, 'admin@test.com', 'http://test/export/'
+            )
+
+        export_file_names = self.storage.listdir('1')[0]
+        self.assertEqual(len(export_file_names), 1)
+        export_files = self.storage.listdir(f'1/{export_file_names[0]}')[1]
+        self.assertEqual(len(export_files), 1)
+
+        with self.storage.open(f'1/{export_file_names[0]}/{export_files[0]}') as f:
+            worksheet = load_workbook(f).active
+            return [list(row) for row in worksheet.iter_rows(values_only=True)]
+
+    def test_export_orders(self):
+        rows = self._export(Order.objects.all().order_by('reference'))
+
+        header = rows[0]
+        self.assertListEqual(
+            header[10:15], ['product name', 'color', 'size', 'sku', 'supplier name']
+        )
+        self.assertEqual(len(rows), 5)
+
+        def column(row, name):
+            return row[header.index(name)]
+
+        self.assertListEqual(
+            [
+                (
+                    column(row, 'reference'),
+                    column(row, 'sku'),
+                    column(row, 'color'),
+                    column(row, 'size'),
+                    column(row, 'quantity'),
+                    column(row, 'organization price'),
+                )
+                for row in rows[1:]
+            ],
+            [
+                (self.order_1.pk, 'sku 1', 'red', 'L', 2, 150),
+                (self.order_1.pk, 'sku 4', None, None, 1, 20),
+                (self.order_2.pk, 'sku 1', None, 'M', 6, 150),
+                (self.order_2.pk, 'sku 2', None, 'M', 3, 1),
+            ],
+        )
+
+        first_row = rows[1]
+        self.assertEqual(column(first_row, 'order id'), f'organizati_{self.order_1.pk}')
+        self.assertEqual(column(first_row, 'campaign name'), 'campaign name en 1')
+        self.assertEqual(column(first_row, 'campaign active'), True)
+        self.assertEqual(
+            column(first_row, 'employee name'),
+            'employee first name en 1 employee last name en 1',
+        )
+        self.assertEqual(column(first_row, 'employee email'), None)
+        self.assertEqual(column(first_row, 'phone number'), '0500000000')
+        self.assertEqual(column(first_row, 'organization name'), 'organization name 1')
+        self.assertEqual(column(first_row, 'product name'), 'product name en 1')
+        self.assertEqual(column(first_row, 'delivery city'), 'city')
+        self.assertEqual(
+            column(first_row, 'order date time'), '2024-07-01T13:30:00+03:00'
+        )
+        self.assertEqual(column(first_row, 'status'), 'PENDING')
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_export_filtered_orders(self):
+        rows = self._export(Order.objects.filter(pk=self.order_2.pk))
+
+        # only variation keys of the exported orders are included
+        self.assertNotIn('color', rows[0])
+        self.assertIn('size', rows[0])
+        self.assertEqual(len(rows), 3)
+
+    @override_settings(EXPORT_SHARD_SIZE=1)
+    def test_export_orders_in_shards(self):
+        rows = self._export(Order.objects.all().order_by('-reference'))
+
+        # each order is exported by its own shard, the partial files are merged
+        # in order and removed, and the result matches a single pass export
+        self.storage = InMemoryStorage()
+        ExportJob.objects.all().delete()
+        with override_settings(EXPORT_SHARD_SIZE=100):
+            unsharded_rows = self._export(Order.objects.all().order_by('-reference'))
+
+        self.assertEqual(len(rows), 5)
+        self.assertListEqual(rows, unsharded_rows)
+        self.assertEqual(len(mail.outbox), 2)
+
+        # both exports are ordered by primary key regardless of the query's
+        # ordering
+        reference_index = rows[0].index('reference')
+        self.assertListEqual(
+            [row[reference_index] for row in rows[1:]],
+            [self.order_1.pk, self.order_1.pk, self.order_2.pk, self.order_2.pk],
+        )
+
+    def test_failed_export_shard_removes_partial_files(self):
+        export_job = ExportJob.objects.create(
+            fingerprint='fingerprint', exporter_user_id=1
+        )
+        self.storage.save('1/export_parts/0.xlsx', BytesIO(b'part'))
+
+        with mock.patch('campaign.tasks.storages', {'exports': self.storage}):
+            with mock.patch(
+                'campaign.tasks.write_xlsx_to_temporary_file',
+                side_effect=Exception('failed'),
+            ):
+                result = export_orders_shard_as_xlsx.apply(
+                    (Order.objects.all().query, [], self.order_2.pk, None),
+                    {
+                        'part_file_name': '1/export_parts/1.xlsx',
+                        'export_job_id': export_job.id,
+                    },
+                    throw=False,
+                )
+
+        # the export job failed and the partial files of the other shards,
+        # which will never be merged, were removed
+        self.assertTrue(result.failed())
+        export_job.refresh_from_db()
+        self.assertEqual(export_job.status, 'FAILED')
+        self.assertListEqual(self.storage.listdir('1/export_parts')[1], [])
+
+    def test_reuse_running_identical_export(self):
+        self._export(Order.objects.all().order_by('reference'))
+        export_job = ExportJob.objects.get()
+        self.assertEqual(export_job.status, 'COMPLETED')
+
+        # a completed export is not reused, since its data may have changed
+        self.storage = InMemoryStorage()
+        self._export(Order.objects.all().order_by('reference'))
+        self.assertEqual(ExportJob.objects.filter(status='COMPLETED').count(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+        # an identical export which is still running is not generated again,
+        # the running export sends its file to the exporter once done
+        export_job.status = ExportJob.StatusEnum.RUNNING.name
+        export_job.save(update_fields=['status'])
+        self.storage = InMemoryStorage()
+        with mock.patch('campaign.tasks.storages', {'exports': self.storage}):
+            export_orders_as_xlsx(
+                Order.objects.all().order_by('reference').query,
+                1,
+                'admin@test.com',
+                'http://test/export/',
+            )
+
+        self.assertEqual(ExportJob.objects.count(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertListEqual(self.storage.listdir('')[0], [])
+
+    def test_failed_export_job(self):
+        with mock.patch('campaign.tasks.storages', {'exports': self.storage}):
+            with mock.patch(
+                'campaign.tasks.write_xlsx_to_temporary_file',
+                side_effect=Exception('failed'),
+            ):
+                # not propagating the error so the task's failure handler runs
+                result = export_orders_as_xlsx.apply(
+                    (
+                        Order.objects.all().query,
+                        1,
+                        'admin@test.com',
+                        'http://test/export/',
+                    ),
+                    throw=False,
+                )
+
+        self.assertTrue(result.failed())
+
+        # the failed export does not block an identical export
+        self.assertEqual(ExportJob.objects.get().status, 'FAILED')
+        self._export(Order.objects.all())
+        self.assertEqual(ExportJob.objects.filter(status='COMPLETED').count(), 1)
+
+
+class CampaignReportJobTestCase(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(
+            username='admin', email='admin@test.com', password='password'
+        )
+        self.client.login(username='admin', password='password')
+        self.storage = InMemoryStorage()
+
+    def _request_report(self, query_string):
+        with mock.patch('campaign.tasks.storages', {'exports': self.storage}):
+            response = self.client.get(
+                f'/admin/campaign/campaign/1/status/?{query_string}'
+            )
+
+        # the report is generated in the background and the status page lists
+        # it instead of returning the file
+        self.assertRedirects(
+            response,
+            '/admin/campaign/campaign/1/status/',
+            fetch_redirect_response=False,
+        )
+
+        return CampaignReportJob.objects.get()
+
+    def test_products_report(self):
+        report_job = self._request_report('export_type=product')
+
+        self.assertEqual(report_job.report_type, 'PRODUCTS')
+        self.assertEqual(report_job.requested_by, self.user)
+        self.assertEqual(report_job.status, 'COMPLETED')
+        self.assertTrue(report_job.file_name.endswith('.xlsx'))
+        self.assertIsNotNone(report_job.finished_at)
+
+        with self.storage.open(f'{self.user.pk}/{report_job.file_name}') as f:
+            self.assertListEqual(
+                load_workbook(f).sheetnames, ['Physical Products', 'Money Products']
+            )
+
+    def test_employee_orders_csv_report(self):
+        report_job = self._request_report(
+            'export_type=employee_orders&export_format=csv'
+        )
+
+        self.assertEqual(report_job.report_type, 'EMPLOYEE_ORDERS')
+        self.assertEqual(report_job.export_format, 'CSV')
+        self.assertEqual(report_job.status, 'COMPLETED')
+        self.assertTrue(report_job.file_name.endswith('.csv'))
+
+        with self.storage.open(f'{self.user.pk}/{report_job.file_name}') as f:
+            lines = f.read().decode('utf-8').splitlines()
+
+        self.assertTrue(lines[0].startswith('\ufeffemployee_name,employee_group,'))
+        self.assertEqual(len(lines), 3)
+
+    def test_unknown_export_format_report(self):
+        # an unknown export format falls back to xlsx instead of failing
+        report_job = self._request_report('export_type=product&export_format=pdf')
+
+        self.assertEqual(report_job.export_format, 'XLSX')
+        self.assertEqual(report_job.status, 'COMPLETED')
+        self.assertTrue(report_job.file_name.endswith('.xlsx'))
+
+    def test_failed_report(self):
+        with mock.patch(
+            'campaign.tasks.build_campaign_report', side_effect=Exception('failed')
+        ):
+            report_job = self._request_report('export_type=campaign')
+
+        self.assertEqual(report_job.report_type, 'CAMPAIGN_SELECTION')
+        self.assertEqual(report_job.status, 'FAILED')
+        self.assertEqual(report_job.error, 'failed')
+        self.assertEqual(report_job.file_name, '')
+
+    def test_report_jobs_view(self):
+        report_job = self._request_report('export_type=employee_budgets')
+
+        response = self.client.get('/admin/campaign/campaign/1/status/reports/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json()['report_jobs'],
+            [
+                {
+                    'id': report_job.id,
+                    'status': 'COMPLETED',
+                    'status_display': 'Completed',
+                    'download_url': f'/export/download/{report_job.file_name}',
+                }
+            ],
+        )
+
+    def test_reuse_identical_report(self):
+        report_job = self._request_report('export_type=product')
+        # an identical report which is still pending is listed again instead of
+        # being generated a second time
+        CampaignReportJob.objects.filter(pk=report_job.pk).update(
+            status=CampaignReportJob.StatusEnum.PENDING.name
+        )
+        self.assertEqual(self._request_report('export_type=product'), report_job)
+
+        with mock.patch('campaign.tasks.storages', {'exports': self.storage}):
+            # a different format is a different report
+            self.client.get(
+                '/admin/campaign/campaign/1/status/'
+                '?export_type=product&export_format=csv'
+            )
+            self.assertEqual(CampaignReportJob.objects.count(), 2)
+
+            # a completed report is generated again, since its data may have
+            # changed
+            CampaignReportJob.objects.filter(pk=report_job.pk).update(
+                status=CampaignReportJob.StatusEnum.COMPLETED.name
+            )
+            self.client.get('/admin/campaign/campaign/1/status/?export_type=product')
+            self.assertEqual(CampaignReportJob.objects.count(), 3)
+
+
+class CampaignOrderRollupTestCase(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def _create_order(self, campaign_employee_id, products, cost_from_budget):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                campaign_employee_id=CampaignEmployee.objects.get(
+                    pk=campaign_employee_id
+                ),
+                order_date_time=datetime(2024, 7, 1, 10, 30, tzinfo=timezone.utc),
+                cost_from_budget=cost_from_budget,
+                cost_added=0,
+                status=Order.OrderStatusEnum.PENDING.name,
+            )
+            for product_id, quantity in products:
+                OrderProduct.objects.create(
+                    order_id=order, product_id_id=product_id, quantity=quantity
+                )
+
+        return order
+
+    def _get_rollups(self):
+        return sorted(
+            CampaignOrderRollup.objects.filter(campaign_id=1).values_list(
+                'employee_group_id',
+                'product_id',
+                'day',
+                'orders',
+                'budget_used',
+                'selections',
+                'quantity',
+            ),
+            key=lambda rollup: (rollup[0], rollup[1] or 0),
+        )
+
+    def test_refresh_rollups_on_order_changes(self):
+        order = self._create_order(1, [(1, 2), (5, 1)], 50)
+        self._create_order(2, [(2, 3)], 20)
+
+        day = date(2024, 7, 1)
+        self.assertListEqual(
+            self._get_rollups(),
+            [
+                (1, None, day, 1, 50, 0, 0),
+                (1, 1, day, 0, 0, 1, 2),
+                (1, 5, day, 0, 0, 1, 1),
+                (2, None, day, 1, 20, 0, 0),
+                (2, 2, day, 0, 0, 1, 3),
+            ],
+        )
+
+        # cancelled orders are not counted, and only the order's group and day
+        # are recomputed
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = Order.OrderStatusEnum.CANCELLED.name
+            order.save()
+
+        self.assertListEqual(
+            self._get_rollups(),
+            [(2, None, day, 1, 20, 0, 0), (2, 2, day, 0, 0, 1, 3)],
+        )
+
+    def test_refresh_rollups_once_per_transaction(self):
+        with mock.patch(
+            'campaign.tasks.refresh_campaign_order_rollups.apply_async'
+        ) as apply_async:
+            order = self._create_order(1, [(1, 2), (5, 1)], 50)
+
+        # the order and each of its products are refreshed by a single task
+        apply_async.assert_called_once()
+        self.assertIn(order.pk, apply_async.call_args.args[0][0])
+
+    def test_rebuild_rollups_command(self):
+        self._create_order(1, [(1, 2), (5, 1)], 50)
+        self._create_order(2, [(2, 3)], 20)
+        rollups = self._get_rollups()
+
+        CampaignOrderRollup.objects.all().delete()
+        call_command('rebuild_campaign_rollups', '1', stdout=StringIO())
+
+        self.assertListEqual(self._get_rollups(), rollups)
+
+    def test_status_view_group_totals(self):
+        get_user_model().objects.create_superuser(
+            username='admin', email='admin@test.com', password='password'
+        )
+        self.client.login(username='admin', password='password')
+        self._create_order(1, [(1, 2), (5, 1)], 50)
+        # the employee's second active order, on another day, does not make
+        # them another ordering employee, and products ordered without a
+        # quantity are not selections
+        order = self._create_order(1, [(1, 0)], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.order_date_time = datetime(2024, 7, 2, 10, 30, tzinfo=timezone.utc)
+            order.save()
+
+        response = self.client.get('/admin/campaign/campaign/1/status/')
+
+        self.assertListEqual(
+            response.context['group_totals'],
+            [
+                {
+                    'employee_group_name': 'employee group name 1',
+                    'ordering_employees': 1,
+                    'total_budget_used': 50,
+                    'total_selections': 2,
+                    'total_quantity': 3,
+                }
+            ],
+        )
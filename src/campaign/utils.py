@@ -1,6 +1,6 @@
-from io import BytesIO
+from itertools import chain
 import math
-from typing import Optional
+from typing import Iterator, Optional
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -20,7 +20,6 @@ from django.db.models import (
     When,
 )
 from django.db.models.functions import Coalesce, Concat
-from django.http import HttpResponse
 import jwt
 from openpyxl import Workbook
 from openpyxl.chart import BarChart3D, PieChart, Reference
@@ -554,28 +553,19 @@ def get_campaign_employees(campaign: Campaign, export_type=None):
     return list(employee_list.values())
 
 
-def get_xlsx_http_response(title: str, data: list[dict]):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = title
-    headers = list(data[0].keys())
-    ws.append(headers)
-    for d in data:
-        ws.append([str(d.get(h)) for h in headers])
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
-    response['Content-Disposition'] = f'attachment; filename="{title}.xlsx"'
-    return response
+def get_report_rows(data: list[dict]) -> Iterator[list]:
+    """
+    Returns the header row (the keys of the first record) followed by a row
+    of string values per record
+    """
 
+    headers = list(data[0].keys()) if data else []
+    return chain([headers], ([str(d.get(h)) for h in headers] for d in data))
 
-def get_xlsx_http_products_response(
-    title: str, physical_products: list[dict], money_products: list[dict]
-):
+
+def get_campaign_products_workbook(
+    physical_products: list[dict], money_products: list[dict]
+) -> Workbook:
     wb = Workbook()
     ws_physical = wb.active
     ws_physical.title = 'Physical Products'
@@ -590,19 +580,10 @@ def get_xlsx_http_products_response(
         ws_money.append(headers_money)
         for d in money_products:
             ws_money.append([str(d.get(h)) for h in headers_money])
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
-    response['Content-Disposition'] = f'attachment; filename="{title}.xlsx"'
-    return response
+    return wb
 
 
-def get_xlsx_http_campaign_response(
-    title: str,
+def get_campaign_selection_workbook(
     main_data: list[dict],
     group_summaries_products: list[EmployeeGroupCampaign],
     organization: str,
@@ -610,7 +591,7 @@ def get_xlsx_http_campaign_response(
     employee_group_selections: list[tuple],
     employees_choosing: list[tuple],
     choosing_by_day_time: list[tuple],
-):
+) -> Workbook:
     wss = []
     wb = Workbook()
     ws_main_dimensions = {
@@ -980,15 +961,7 @@ def get_xlsx_http_campaign_response(
                 alignment = Alignment(horizontal='right')
                 cell.alignment = alignment
 
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
-    response['Content-Disposition'] = f'attachment; filename="{title}.xlsx"'
-    return response
+    return wb
 
 
 def price_deduct_tax(price: int) -> float:
@@ -4,6 +4,7 @@ from time import time
 
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import (
     Case,
     CharField,
@@ -76,7 +77,10 @@ from campaign.serializers import (
     QuickOfferUpdateSendMyOrderSerializer,
     ShareRequestSerializer,
 )
-from campaign.tasks import send_campaign_employee_invitation
+from campaign.tasks import (
+    enqueue_order_confirmation_email,
+    send_campaign_employee_invitation,
+)
 from campaign.utils import (
     AdminPreviewAuthentication,
     EmployeeAuthentication,
@@ -112,7 +116,7 @@ from inventory.serializers import (
 )
 from payment.utils import initiate_payment
 from services.auth import jwt_encode
-from services.email import send_order_confirmation_email, send_otp_token_email
+from services.email import send_otp_token_email
 from services.sms import send_otp_token_sms
 
 
@@ -1586,23 +1590,26 @@ class EmployeeOrderView(APIView):
                 status=status.HTTP_402_PAYMENT_REQUIRED,
             )
         else:
-            employee_order.status = employee_order.OrderStatusEnum.PENDING.name
-            employee_order.save(update_fields=['status'])
-
-            # Decrease the actual product quantity
-            if employee_order.status in [
-                employee_order.OrderStatusEnum.PENDING.name,
-                employee_order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
-            ]:
-                for cart_product in cart_products:
-                    product = cart_product.product_id.product_id
-                    product.product_quantity -= cart_product.quantity
-                    product.save(update_fields=['product_quantity'])
-
-            if campaign.campaign_type == 'WALLET':
-                cart_products.delete()
-
-            send_order_confirmation_email(employee_order)
+            # the confirmation email is written to the outbox in the same
+            # transaction as the order and sent in the background
+            with transaction.atomic():
+                employee_order.status = employee_order.OrderStatusEnum.PENDING.name
+                employee_order.save(update_fields=['status'])
+
+                # Decrease the actual product quantity
+                if employee_order.status in [
+                    employee_order.OrderStatusEnum.PENDING.name,
+                    employee_order.OrderStatusEnum.SENT_TO_LOGISTIC_CENTER.name,
+                ]:
+                    for cart_product in cart_products:
+                        product = cart_product.product_id.product_id
+                        product.product_quantity -= cart_product.quantity
+                        product.save(update_fields=['product_quantity'])
+
+                if campaign.campaign_type == 'WALLET':
+                    cart_products.delete()
+
+                enqueue_order_confirmation_email(employee_order)
 
         return Response(
             {
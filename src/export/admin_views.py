@@ -22,7 +22,9 @@ class DownloadExportFile(APIView):
         else:
             private_export_file_name = None
 
-        if not private_export_file_name or not storage.exists(private_export_file_name):
+        # the file's existence isn't checked to avoid another storage round
+        # trip - the presigned url returns not found by itself if it's missing
+        if not private_export_file_name:
             return Response(
                 {
                     'success': False,
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('exporter_user_id', models.PositiveIntegerField()),
+                ('task_id', models.CharField(blank=True, default='', max_length=255)),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('RUNNING', 'Running'),
+                            ('COMPLETED', 'Completed'),
+                            ('FAILED', 'Failed'),
+                        ],
+                        default='RUNNING',
+                        max_length=32,
+                    ),
+                ),
+                (
+                    'export_file_name',
+                    models.CharField(blank=True, default='', max_length=255),
+                ),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('status', 'RUNNING')),
+                fields=('fingerprint',),
+                name='unique_running_export_job_fingerprint',
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from enum import Enum
+
+from django.db import models
+from django.db.models import Q
+
+
+class ExportJob(models.Model):
+    """
+    A background export, identified by a fingerprint of the exporter and the
+    export's parameters. An identical export which is still running is reused
+    instead of being generated again.
+    """
+
+    class StatusEnum(Enum):
+        RUNNING = 'Running'
+        COMPLETED = 'Completed'
+        FAILED = 'Failed'
+
+    fingerprint = models.CharField(max_length=64)
+    # the exporter's id as passed to the export tasks, which also store the
+    # exported files under it
+    exporter_user_id = models.PositiveIntegerField()
+    # the celery task generating the export, used to mark the job as failed
+    task_id = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(
+        max_length=32,
+        choices=[(s.name, s.value) for s in StatusEnum],
+        default=StatusEnum.RUNNING.name,
+    )
+    # the exported file's name relative to the exporter's directory, as
+    # expected by the export download view
+    export_file_name = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # an identical export can only be generated once at a time
+            models.UniqueConstraint(
+                fields=['fingerprint'],
+                condition=Q(status='RUNNING'),
+                name='unique_running_export_job_fingerprint',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Export job #{self.pk}'
@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import InMemoryStorage
+from django.test import TestCase
+
+
+class DownloadExportFileViewTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(
+            username='admin', email='admin@test.com', password='password'
+        )
+        self.storage = InMemoryStorage(base_url='https://exports.test/')
+
+    def test_download_export_file(self):
+        self.client.login(username='admin', password='password')
+
+        with mock.patch('export.admin_views.storages', {'exports': self.storage}):
+            with mock.patch.object(self.storage, 'exists') as exists_mock:
+                response = self.client.get(
+                    '/export/download/a1b2/orders_export_2024_07_01_1330.xlsx'
+                )
+
+        exists_mock.assert_not_called()
+        self.assertRedirects(
+            response,
+            f'https://exports.test/{self.user.pk}/a1b2/'
+            'orders_export_2024_07_01_1330.xlsx',
+            fetch_redirect_response=False,
+        )
+
+    def test_download_export_file_without_name(self):
+        self.client.login(username='admin', password='password')
+
+        with mock.patch('export.admin_views.storages', {'exports': self.storage}):
+            response = self.client.get('/export/download/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['code'], 'not_found')
@@ -0,0 +1,78 @@
+from datetime import timedelta
+import logging
+
+from celery import Task
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ExportJob
+
+
+logger = logging.getLogger(__name__)
+
+
+def start_export_job(
+    exporter_user_id: int, fingerprint: str, task_id: str
+) -> tuple[ExportJob, bool]:
+    """
+    Returns a running identical export job and True, or a new running export
+    job for the exporter and False. The running identical job sends its file
+    to the exporter by itself once done, while completed exports are never
+    reused since their data may have changed since
+    """
+
+    now = timezone.now()
+
+    # running jobs which exceeded the timeout are assumed to have crashed
+    ExportJob.objects.filter(
+        fingerprint=fingerprint,
+        status=ExportJob.StatusEnum.RUNNING.name,
+        created_at__lt=now - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT),
+    ).update(status=ExportJob.StatusEnum.FAILED.name, finished_at=now)
+
+    try:
+        with transaction.atomic():
+            export_job = ExportJob.objects.create(
+                fingerprint=fingerprint,
+                exporter_user_id=exporter_user_id,
+                task_id=task_id or '',
+            )
+    except IntegrityError:
+        # only one identical export can be running at a time
+        export_job = ExportJob.objects.get(
+            fingerprint=fingerprint, status=ExportJob.StatusEnum.RUNNING.name
+        )
+        logger.info(f'identical export job {export_job.id} is already running')
+        return export_job, True
+
+    return export_job, False
+
+
+def finish_export_job(export_job_id: int, export_file_name: str):
+    ExportJob.objects.filter(id=export_job_id).update(
+        status=ExportJob.StatusEnum.COMPLETED.name,
+        export_file_name=export_file_name,
+        finished_at=timezone.now(),
+    )
+
+
+class ExportTask(Task):
+    """
+    Base class for export tasks, marking their running export job as failed
+    when they fail so an identical export can be requested again right away.
+    The job is found by the `export_job_id` keyword argument, or otherwise by
+    the task's id
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if kwargs.get('export_job_id'):
+            export_jobs = ExportJob.objects.filter(id=kwargs['export_job_id'])
+        else:
+            export_jobs = ExportJob.objects.filter(task_id=task_id)
+
+        export_jobs.filter(status=ExportJob.StatusEnum.RUNNING.name).update(
+            status=ExportJob.StatusEnum.FAILED.name, finished_at=timezone.now()
+        )
+
+        super().on_failure(exc, task_id, args, kwargs, einfo)
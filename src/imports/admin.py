@@ -0,0 +1,70 @@
+from django.contrib import admin, messages
+from django.utils.html import format_html_join
+
+from .jobs import resume_import_jobs
+from .models import ImportJob
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'importer',
+        'requested_by',
+        'status',
+        'progress',
+        'imported_rows',
+        'created_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'importer')
+    fields = (
+        'importer',
+        'params',
+        'requested_by',
+        'status',
+        'progress',
+        'total_rows',
+        'processed_rows',
+        'imported_rows',
+        'row_errors',
+        'error',
+        'created_at',
+        'updated_at',
+        'finished_at',
+    )
+    readonly_fields = fields
+    actions = ['resume_selected_import_jobs']
+
+    def progress(self, obj):
+        return f'{obj.progress_percentage}%'
+
+    def row_errors(self, obj):
+        return format_html_join(
+            '\n',
+            '<p>{}</p>',
+            (
+                (
+                    f'Row{"s" if len(row_numbers) > 1 else ""} '
+                    f'{", ".join(str(r) for r in row_numbers)} failed with error: '
+                    f'{error}'
+                    if row_numbers
+                    else error,
+                )
+                for error, row_numbers in obj.errors.items()
+            ),
+        )
+
+    def resume_selected_import_jobs(self, request, queryset):
+        resumed_import_job_ids = resume_import_jobs(queryset)
+        self.message_user(
+            request,
+            f'Resuming {len(resumed_import_job_ids)} import job(s) from their '
+            'last imported rows',
+            level=messages.SUCCESS,
+        )
+
+    resume_selected_import_jobs.short_description = 'Resume selected import jobs'
+
+    def has_add_permission(self, request):
+        return False
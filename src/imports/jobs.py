@@ -0,0 +1,328 @@
+from datetime import timedelta
+from itertools import islice
+import logging
+import os
+from typing import Any, Iterator
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+from openpyxl import load_workbook
+
+from lib.iter_utils import chunked
+
+from .models import ImportJob
+
+
+logger = logging.getLogger(__name__)
+
+
+class Importer:
+    """
+    Base class of the importers run by import jobs. An importer reads the
+    columns and rows of the uploaded sheet, loads what its rows refer to once
+    per run and imports the rows a chunk at a time. Jobs without a sheet
+    import rows the importer yields from the job's other uploaded files
+    """
+
+    def read_columns(self, worksheet) -> list:
+        return list(next(worksheet.iter_rows(max_row=1, values_only=True), ()))
+
+    def iter_rows(
+        self, worksheet, columns: list, files: MultiValueDict
+    ) -> Iterator[tuple[int, tuple]]:
+        """
+        Yields the (row number, row) pairs of the sheet's rows to import, which
+        are all non-empty rows after the columns row by default. The rows must
+        be yielded in the same order every time, since a resumed job skips the
+        rows which were already imported by their position
+        """
+        for row_number, row in enumerate(
+            worksheet.iter_rows(min_row=2, max_col=len(columns), values_only=True),
+            2,
+        ):
+            if any(value is not None for value in row):
+                yield row_number, row
+
+    def load_context(
+        self, import_job: ImportJob, columns: list, files: MultiValueDict
+    ) -> Any:
+        """
+        Loads what the imported rows refer to (for example lookups of related
+        objects by name) once per run, which is passed to `import_rows`
+        """
+        return None
+
+    def import_rows(
+        self, context: Any, rows: list[tuple[int, tuple]], files: MultiValueDict
+    ) -> tuple[int, dict[str, list[int]]]:
+        """
+        Imports a chunk of (row number, row) pairs in the chunk's transaction.
+        Returns the number of imported rows and the row errors, mapped to the
+        numbers of the rows which failed with them
+        """
+        raise NotImplementedError
+
+
+class ImportJobConflictError(Exception):
+    """
+    Raised when a chunk is committed by another run of the same job (for
+    example when a slow run was assumed to have crashed and was resumed)
+    """
+
+
+_importers: dict[str, Importer] = {}
+
+
+def register_importer(name: str, importer: Importer):
+    """
+    Registers an importer under the name import jobs refer to it by. Importers
+    are registered when their module is imported, which has to happen in the
+    workers as well (the admin importers are registered by admin autodiscovery)
+    """
+    _importers[name] = importer
+
+
+def get_importer(name: str) -> Importer:
+    if name not in _importers:
+        raise ValueError(f'Importer "{name}" is not registered')
+
+    return _importers[name]
+
+
+def start_import_job(
+    importer: str,
+    xlsx_file: File | None,
+    requested_by=None,
+    params: dict[str, Any] | None = None,
+    files: MultiValueDict | None = None,
+    chunk_size: int | None = None,
+) -> ImportJob:
+    """
+    Stores the uploaded xlsx file and any other uploaded files (for example
+    product images) and queues their import by the named importer once the
+    job is committed. The rows are committed in chunks of `chunk_size` rows,
+    `IMPORT_JOB_CHUNK_SIZE` by default
+    """
+    from .tasks import process_import_job
+
+    storage = storages['imports']
+
+    with transaction.atomic():
+        import_job = ImportJob.objects.create(
+            importer=importer,
+            params=params or {},
+            requested_by=requested_by,
+            chunk_size=chunk_size or settings.IMPORT_JOB_CHUNK_SIZE,
+        )
+
+        # the files are stored under the job's id. the uploaded names are kept
+        # since the storage may change them and importers may look files up
+        # by name
+        if xlsx_file:
+            import_job.file_name = storage.save(
+                os.path.join(str(import_job.id), os.path.basename(xlsx_file.name)),
+                xlsx_file,
+            )
+        import_job.extra_files = {
+            field_name: [
+                (
+                    storage.save(
+                        os.path.join(
+                            str(import_job.id), field_name, os.path.basename(f.name)
+                        ),
+                        f,
+                    ),
+                    os.path.basename(f.name),
+                )
+                for f in files.getlist(field_name)
+            ]
+            for field_name in (files or {})
+        }
+        import_job.save(update_fields=['file_name', 'extra_files'])
+
+        transaction.on_commit(lambda: process_import_job.apply_async((import_job.id,)))
+
+    return import_job
+
+
+def resume_import_jobs(import_jobs: QuerySet) -> list[int]:
+    """
+    Queues failed or interrupted import jobs to continue from their last
+    committed chunk. Returns the ids of the resumed jobs
+    """
+    from .tasks import process_import_job
+
+    import_job_ids = list(
+        import_jobs.filter(
+            status__in=[
+                ImportJob.StatusEnum.PENDING.name,
+                ImportJob.StatusEnum.RUNNING.name,
+                ImportJob.StatusEnum.FAILED.name,
+            ]
+        ).values_list('id', flat=True)
+    )
+
+    ImportJob.objects.filter(id__in=import_job_ids).update(
+        status=ImportJob.StatusEnum.PENDING.name,
+        error='',
+        updated_at=timezone.now(),
+        finished_at=None,
+    )
+
+    for import_job_id in import_job_ids:
+        transaction.on_commit(
+            lambda import_job_id=import_job_id: process_import_job.apply_async(
+                (import_job_id,)
+            )
+        )
+
+    return import_job_ids
+
+
+def get_stale_import_jobs() -> QuerySet:
+    """
+    Returns the pending or running import jobs which had no chunk committed
+    for longer than the job timeout, and whose worker is assumed to have
+    crashed (or whose task was lost)
+    """
+    return ImportJob.objects.filter(
+        status__in=[
+            ImportJob.StatusEnum.PENDING.name,
+            ImportJob.StatusEnum.RUNNING.name,
+        ],
+        updated_at__lt=timezone.now() - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT),
+    )
+
+
+def run_import_job(import_job_id: int) -> bool:
+    """
+    Imports the rows of an import job in chunks, skipping the rows of chunks
+    which were already committed by a previous run. Each chunk is committed
+    in its own transaction along with the job's progress and row errors
+    """
+    import_job = ImportJob.objects.filter(
+        id=import_job_id,
+        status__in=[
+            ImportJob.StatusEnum.PENDING.name,
+            ImportJob.StatusEnum.RUNNING.name,
+        ],
+    ).first()
+
+    if not import_job:
+        logger.warning(f'import job {import_job_id} not found or already finished')
+        return False
+
+    import_job.status = ImportJob.StatusEnum.RUNNING.name
+    import_job.save(update_fields=['status', 'updated_at'])
+
+    storage = storages['imports']
+    files = MultiValueDict()
+
+    try:
+        importer = get_importer(import_job.importer)
+
+        for field_name, stored_files in import_job.extra_files.items():
+            files.setlist(
+                field_name,
+                [
+                    File(storage.open(stored_file_name), name=file_name)
+                    for stored_file_name, file_name in stored_files
+                ],
+            )
+
+        if import_job.file_name:
+            with storage.open(import_job.file_name) as xlsx_file:
+                # read-only mode streams the rows instead of loading the whole
+                # sheet in memory
+                workbook = load_workbook(xlsx_file, data_only=True, read_only=True)
+                try:
+                    _import_rows(import_job, importer, workbook.active, files)
+                finally:
+                    workbook.close()
+        else:
+            _import_rows(import_job, importer, None, files)
+    except ImportJobConflictError:
+        logger.warning(f'import job {import_job_id} is run by another worker')
+        return False
+    except Exception as ex:
+        logger.error(f'failed running import job {import_job_id}: {ex}')
+
+        import_job.status = ImportJob.StatusEnum.FAILED.name
+        import_job.error = str(ex)
+        import_job.finished_at = timezone.now()
+        import_job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+
+        return False
+    finally:
+        for _, field_files in files.lists():
+            for f in field_files:
+                f.close()
+
+    if import_job.errors:
+        import_job.status = ImportJob.StatusEnum.COMPLETED_WITH_ERRORS.name
+    else:
+        import_job.status = ImportJob.StatusEnum.COMPLETED.name
+    import_job.finished_at = timezone.now()
+    import_job.save(update_fields=['status', 'finished_at', 'updated_at'])
+
+    return True
+
+
+def _import_rows(
+    import_job: ImportJob, importer: Importer, worksheet, files: MultiValueDict
+):
+    columns = importer.read_columns(worksheet) if worksheet is not None else []
+    context = importer.load_context(import_job, columns, files)
+
+    if import_job.total_rows is None:
+        import_job.total_rows = sum(
+            1 for _ in importer.iter_rows(worksheet, columns, files)
+        )
+        import_job.save(update_fields=['total_rows', 'updated_at'])
+
+    rows = islice(
+        importer.iter_rows(worksheet, columns, files),
+        import_job.processed_rows,
+        None,
+    )
+    for chunk in chunked(rows, import_job.chunk_size):
+        _import_chunk(import_job, importer, context, chunk, files)
+
+
+def _import_chunk(
+    import_job: ImportJob,
+    importer: Importer,
+    context: Any,
+    rows: list[tuple[int, tuple]],
+    files: MultiValueDict,
+):
+    errors = {
+        error: list(row_numbers) for error, row_numbers in import_job.errors.items()
+    }
+
+    with transaction.atomic():
+        imported_rows, chunk_errors = importer.import_rows(context, rows, files)
+
+        for error, row_numbers in chunk_errors.items():
+            errors.setdefault(error, []).extend(row_numbers)
+
+        # the progress is committed with the chunk's rows, and only if no other
+        # run of the job committed the chunk first
+        if not ImportJob.objects.filter(
+            id=import_job.id, processed_rows=import_job.processed_rows
+        ).update(
+            processed_rows=F('processed_rows') + len(rows),
+            imported_rows=F('imported_rows') + imported_rows,
+            errors=errors,
+            updated_at=timezone.now(),
+        ):
+            raise ImportJobConflictError()
+
+    import_job.processed_rows += len(rows)
+    import_job.imported_rows += imported_rows
+    import_job.errors = errors
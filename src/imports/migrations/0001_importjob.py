@@ -0,0 +1,74 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('importer', models.CharField(max_length=64)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('file_name', models.CharField(max_length=255)),
+                ('extra_files', models.JSONField(blank=True, default=dict)),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('PENDING', 'Pending'),
+                            ('RUNNING', 'Running'),
+                            ('COMPLETED', 'Completed'),
+                            ('COMPLETED_WITH_ERRORS', 'Completed With Errors'),
+                            ('FAILED', 'Failed'),
+                        ],
+                        default='PENDING',
+                        max_length=32,
+                    ),
+                ),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('imported_rows', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                (
+                    'requested_by',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'indexes': [
+                    models.Index(
+                        fields=['status', 'updated_at'],
+                        name='imports_imp_status_a2ef99_idx',
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+from enum import Enum
+
+from django.conf import settings
+from django.db import models
+
+
+class ImportJob(models.Model):
+    """
+    A background xlsx import. The uploaded files are stored and their rows are
+    imported by a task in fixed-size chunks, each committed along with the
+    job's progress and row errors, so that an interrupted job resumes from its
+    last committed chunk instead of starting over.
+    """
+
+    class StatusEnum(Enum):
+        PENDING = 'Pending'
+        RUNNING = 'Running'
+        COMPLETED = 'Completed'
+        COMPLETED_WITH_ERRORS = 'Completed With Errors'
+        FAILED = 'Failed'
+
+    # the name of the registered importer which imports the rows
+    importer = models.CharField(max_length=64)
+    # importer specific parameters, for example the organization employees are
+    # imported to
+    params = models.JSONField(default=dict, blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    # the stored xlsx file, relative to the imports storage, and the other
+    # uploaded files (such as product images) as (stored file name, uploaded
+    # file name) pairs mapped by their form field name
+    file_name = models.CharField(max_length=255)
+    extra_files = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=32,
+        choices=[(s.name, s.value) for s in StatusEnum],
+        default=StatusEnum.PENDING.name,
+    )
+    chunk_size = models.PositiveIntegerField()
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    # the number of rows whose chunks were committed, which is where an
+    # interrupted job resumes from
+    processed_rows = models.PositiveIntegerField(default=0)
+    imported_rows = models.PositiveIntegerField(default=0)
+    # row errors mapped to the numbers of the rows which failed with them
+    errors = models.JSONField(default=dict, blank=True)
+    # the error which failed the job, if any
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # updated whenever a chunk is committed, so jobs whose worker crashed can
+    # be detected and resumed
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'updated_at'])]
+
+    @property
+    def progress_percentage(self):
+        if not self.total_rows:
+            return 100 if self.finished_at else 0
+
+        return round(self.processed_rows / self.total_rows * 100)
+
+    def __str__(self):
+        return f'Import job #{self.pk} | {self.importer}'
@@ -0,0 +1,37 @@
+import logging
+
+from celery import shared_task
+from django.utils import timezone
+
+from .jobs import get_stale_import_jobs, run_import_job
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_import_job(import_job_id: int) -> bool:
+    return run_import_job(import_job_id)
+
+
+@shared_task
+def resume_stale_import_jobs() -> int:
+    """
+    Queues the import jobs whose worker crashed (or whose task was lost) to
+    continue from their last committed chunk
+    """
+    resumed_count = 0
+
+    for import_job_id in get_stale_import_jobs().values_list('id', flat=True):
+        # the job is claimed first so it's only resumed once even if this task
+        # runs concurrently
+        if (
+            get_stale_import_jobs()
+            .filter(id=import_job_id)
+            .update(updated_at=timezone.now())
+        ):
+            logger.info(f'resuming stale import job {import_job_id}')
+            process_import_job.apply_async((import_job_id,))
+            resumed_count += 1
+
+    return resumed_count
@@ -0,0 +1,215 @@
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+from openpyxl import Workbook
+
+from campaign.models import EmployeeGroup
+from imports.jobs import (
+    Importer,
+    register_importer,
+    resume_import_jobs,
+    run_import_job,
+    start_import_job,
+)
+from imports.models import ImportJob
+from imports.tasks import resume_stale_import_jobs
+
+
+class EmployeeGroupNamesImporter(Importer):
+    """
+    Creates an employee group per row, failing rows without a name and
+    failing the whole job on a row named 'crash'
+    """
+
+    def import_rows(self, context, rows, files):
+        errors = {}
+        imported_rows = 0
+
+        for row_number, (name, image_name) in rows:
+            if name == 'crash':
+                raise RuntimeError('worker crashed')
+
+            if not name:
+                errors.setdefault('Name is required', []).append(row_number)
+                continue
+
+            if image_name:
+                image = next(f for f in files.getlist('images') if f.name == image_name)
+                name = f'{name} {image.read().decode()}'
+
+            EmployeeGroup.objects.create(name=name)
+            imported_rows += 1
+
+        return imported_rows, errors
+
+
+register_importer('test.employee_group_names', EmployeeGroupNamesImporter())
+
+
+@override_settings(IMPORT_JOB_CHUNK_SIZE=2)
+class ImportJobTestCase(TestCase):
+    def setUp(self):
+        self.storage = InMemoryStorage()
+        self.user = get_user_model().objects.create_superuser(
+            username='admin', email='admin@test.com', password='password'
+        )
+
+        storages_patcher = mock.patch(
+            'imports.jobs.storages', {'imports': self.storage}
+        )
+        storages_patcher.start()
+        self.addCleanup(storages_patcher.stop)
+
+    def _xlsx_file(self, rows):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.append(['name', 'image'])
+        for row in rows:
+            worksheet.append(row)
+
+        xlsx_file = BytesIO()
+        workbook.save(xlsx_file)
+
+        return SimpleUploadedFile('groups.xlsx', xlsx_file.getvalue())
+
+    def _start_import_job(self, rows, files=None):
+        with self.captureOnCommitCallbacks(execute=False):
+            return start_import_job(
+                'test.employee_group_names',
+                self._xlsx_file(rows),
+                requested_by=self.user,
+                files=files,
+            )
+
+    def test_start_import_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            import_job = start_import_job(
+                'test.employee_group_names',
+                self._xlsx_file([['group 1', 'logo.txt'], ['group 2', None]]),
+                requested_by=self.user,
+                files=MultiValueDict(
+                    {'images': [SimpleUploadedFile('logo.txt', b'logo')]}
+                ),
+            )
+
+        import_job.refresh_from_db()
+        self.assertEqual(import_job.status, ImportJob.StatusEnum.COMPLETED.name)
+        self.assertEqual(import_job.requested_by, self.user)
+        self.assertEqual(import_job.file_name, f'{import_job.id}/groups.xlsx')
+        self.assertDictEqual(
+            import_job.extra_files,
+            {'images': [[f'{import_job.id}/images/logo.txt', 'logo.txt']]},
+        )
+        self.assertEqual(import_job.total_rows, 2)
+        self.assertEqual(import_job.processed_rows, 2)
+        self.assertEqual(import_job.imported_rows, 2)
+        self.assertTrue(EmployeeGroup.objects.filter(name='group 1 logo').exists())
+        self.assertTrue(EmployeeGroup.objects.filter(name='group 2').exists())
+
+    def test_run_import_job_records_row_errors(self):
+        import_job = self._start_import_job(
+            [['group 1', None], [None, 'no name'], ['group 3', None]]
+        )
+
+        self.assertTrue(run_import_job(import_job.id))
+
+        import_job.refresh_from_db()
+        self.assertEqual(
+            import_job.status, ImportJob.StatusEnum.COMPLETED_WITH_ERRORS.name
+        )
+        self.assertEqual(import_job.total_rows, 3)
+        self.assertEqual(import_job.processed_rows, 3)
+        self.assertEqual(import_job.imported_rows, 2)
+        self.assertDictEqual(import_job.errors, {'Name is required': [3]})
+        self.assertEqual(import_job.progress_percentage, 100)
+
+    def test_failed_import_job_resumes_from_last_committed_chunk(self):
+        import_job = self._start_import_job(
+            [
+                ['group 1', None],
+                ['group 2', None],
+                ['group 3', None],
+                ['crash', None],
+                ['group 5', None],
+            ]
+        )
+
+        self.assertFalse(run_import_job(import_job.id))
+
+        # the first chunk was committed while the failed chunk was rolled back
+        import_job.refresh_from_db()
+        self.assertEqual(import_job.status, ImportJob.StatusEnum.FAILED.name)
+        self.assertEqual(import_job.error, 'worker crashed')
+        self.assertEqual(import_job.processed_rows, 2)
+        self.assertListEqual(
+            list(EmployeeGroup.objects.order_by('id').values_list('name', flat=True)),
+            ['group 1', 'group 2'],
+        )
+
+        # once the row is fixed (here by changing the importer's input) the job
+        # continues from the third row
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertListEqual(
+                resume_import_jobs(ImportJob.objects.all()), [import_job.id]
+            )
+        self.assertEqual(len(callbacks), 1)
+
+        with mock.patch.object(
+            EmployeeGroupNamesImporter,
+            'iter_rows',
+            return_value=iter(
+                [
+                    (2, ('group 1', None)),
+                    (3, ('group 2', None)),
+                    (4, ('group 3', None)),
+                    (5, ('group 4', None)),
+                    (6, ('group 5', None)),
+                ]
+            ),
+        ):
+            self.assertTrue(run_import_job(import_job.id))
+
+        import_job.refresh_from_db()
+        self.assertEqual(import_job.status, ImportJob.StatusEnum.COMPLETED.name)
+        self.assertEqual(import_job.processed_rows, 5)
+        self.assertEqual(import_job.imported_rows, 5)
+        self.assertListEqual(
+            list(EmployeeGroup.objects.order_by('id').values_list('name', flat=True)),
+            ['group 1', 'group 2', 'group 3', 'group 4', 'group 5'],
+        )
+
+    def test_finished_import_job_is_not_run_again(self):
+        import_job = self._start_import_job([['group 1', None]])
+
+        self.assertTrue(run_import_job(import_job.id))
+        self.assertFalse(run_import_job(import_job.id))
+
+        self.assertEqual(EmployeeGroup.objects.filter(name='group 1').count(), 1)
+
+    @override_settings(IMPORT_JOB_TIMEOUT=60)
+    def test_resume_stale_import_jobs(self):
+        stale_import_job = self._start_import_job([['group 1', None]])
+        running_import_job = self._start_import_job([['group 2', None]])
+        ImportJob.objects.filter(id=stale_import_job.id).update(
+            status=ImportJob.StatusEnum.RUNNING.name,
+            updated_at=timezone.now() - timedelta(minutes=5),
+        )
+        ImportJob.objects.filter(id=running_import_job.id).update(
+            status=ImportJob.StatusEnum.RUNNING.name
+        )
+
+        self.assertEqual(resume_stale_import_jobs(), 1)
+
+        stale_import_job.refresh_from_db()
+        running_import_job.refresh_from_db()
+        self.assertEqual(stale_import_job.status, ImportJob.StatusEnum.COMPLETED.name)
+        self.assertEqual(running_import_job.status, ImportJob.StatusEnum.RUNNING.name)
+        self.assertTrue(EmployeeGroup.objects.filter(name='group 1').exists())
+        self.assertFalse(EmployeeGroup.objects.filter(name='group 2').exists())
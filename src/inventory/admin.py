@@ -1,4 +1,3 @@
-import os
 from typing import Any
 import uuid
 
@@ -7,9 +6,9 @@ from django import forms
 from django.conf import settings
 from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from django.db import models
 from django.db.models import Q
+from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils.datastructures import MultiValueDict
 from django.utils.html import format_html
@@ -38,12 +37,13 @@ from inventory.models import (
     TextVariation,
     Variation,
 )
-from lib.admin import ImportableExportableAdmin, RecordImportError
+from lib.admin import ImportableExportableAdmin
 from lib.filters import MultiSelectFilter
 from services.email import send_stock_alert_email
 
 from .admin_actions import ProductActionsMixin
 from .admin_forms import ModelWithImagesXlsxImportForm
+from .images import save_product_images, start_product_images_import_job
 
 
 class ProductImageInlineFormset(forms.models.BaseInlineFormSet):
@@ -234,6 +234,39 @@ def custom_titled_filter(title):
     return Wrapper
 
 
+def _index_by_lowercase_name(queryset: models.QuerySet) -> dict[str, list]:
+    """
+    Maps the lowercase names of the queryset's objects to the objects, to
+    replace `name__iexact` lookups while importing
+    """
+    objects_by_name = {}
+
+    for obj in queryset.order_by('id'):
+        if obj.name:
+            objects_by_name.setdefault(obj.name.lower(), []).append(obj)
+
+    return objects_by_name
+
+
+def _get_by_lowercase_name(
+    objects_by_name: dict[str, list], model: type[models.Model], name: str
+):
+    matches = objects_by_name.get(str(name).lower(), []) if name else []
+
+    # raise the same errors a `.get(name__iexact=name)` query would
+    if not matches:
+        raise model.DoesNotExist(
+            f'{model._meta.object_name} matching query does not exist.'
+        )
+    elif len(matches) > 1:
+        raise model.MultipleObjectsReturned(
+            f'get() returned more than one {model._meta.object_name} -- it '
+            f'returned {len(matches)}!'
+        )
+
+    return matches[0]
+
+
 class PriceFilter(admin.SimpleListFilter):
     title = 'Product Price Filter'
     parameter_name = 'cost_price'
@@ -512,18 +545,56 @@ class ProductAdmin(ProductActionsMixin, ImportableExportableAdmin, NestedModelAd
     def import_parse_and_save_xlsx_data(
         self, extra_params: dict[str, Any], request_files: MultiValueDict
     ):
-        if len(request_files) == 0:
+        # image-only imports are run by import jobs (see `import_xlsx`)
+        if 'xlsx_file' not in request_files:
             raise Exception(
                 _(
                     'Either an XLSX file or a directory containing images '
                     'must be selected.'
                 )
             )
-        elif 'xlsx_file' in request_files:
-            return super().import_parse_and_save_xlsx_data(extra_params, request_files)
-        else:
-            # if only other files were sent this is an image-only import
-            return self._import_and_save_image_date(request_files)
+
+        return super().import_parse_and_save_xlsx_data(extra_params, request_files)
+
+    def import_xlsx(self, request, **kwargs):
+        if (
+            request.method == 'POST'
+            and 'xlsx_file' not in request.FILES
+            and 'image_dir' in request.FILES
+        ):
+            # if only images were sent this is an image-only import, whose
+            # images are stored and recorded in the background while the
+            # products stay usable
+            import_job = start_product_images_import_job(
+                request.FILES, requested_by=request.user
+            )
+
+            self.message_user(
+                request,
+                (
+                    f'Your images are being imported as import job '
+                    f'#{import_job.id}, its progress and errors are listed in the '
+                    'import jobs page'
+                ),
+            )
+
+            return redirect('admin:inventory_product_changelist')
+
+        return super().import_xlsx(request, **kwargs)
+
+    def import_load_lookups(self, columns: list[str]) -> dict[str, Any]:
+        lookups = {}
+
+        if 'brand' in columns:
+            lookups['brand'] = _index_by_lowercase_name(Brand.objects.all())
+        if 'supplier' in columns:
+            lookups['supplier'] = _index_by_lowercase_name(Supplier.objects.all())
+        if 'categories' in columns:
+            lookups['categories'] = _index_by_lowercase_name(Category.objects.all())
+        if 'tags' in columns:
+            lookups['tags'] = _index_by_lowercase_name(Tag.objects.all())
+
+        return lookups
 
     def import_parse_field(
         self,
@@ -533,9 +604,13 @@ class ProductAdmin(ProductActionsMixin, ImportableExportableAdmin, NestedModelAd
         extra_files: MultiValueDict,
     ):
         if name == 'brand':
-            return Brand.objects.get(name__iexact=value)
+            return _get_by_lowercase_name(
+                extra_params['import_lookups']['brand'], Brand, value
+            )
         elif name == 'supplier':
-            return Supplier.objects.get(name__iexact=value)
+            return _get_by_lowercase_name(
+                extra_params['import_lookups']['supplier'], Supplier, value
+            )
         elif name == 'product_quantity' and (not value or int(value) < 0):
             raise ValidationError(
                 {'product_quantity': [_('Product quantity must be a positive number')]}
@@ -547,6 +622,7 @@ class ProductAdmin(ProductActionsMixin, ImportableExportableAdmin, NestedModelAd
         self,
         name: str,
         value: str,
+        extra_params: dict[str, Any],
         extra_files: MultiValueDict,
         main_record: models.Model,
     ):
@@ -562,7 +638,9 @@ class ProductAdmin(ProductActionsMixin, ImportableExportableAdmin, NestedModelAd
                         ]
                     for val in v:
                         parsed_values.extend(
-                            list(Category.objects.filter(name__iexact=val))
+                            extra_params['import_lookups']['categories'].get(
+                                val.lower(), []
+                            )
                         )
 
             # if len(parsed_values) == 0:
@@ -582,7 +660,9 @@ class ProductAdmin(ProductActionsMixin, ImportableExportableAdmin, NestedModelAd
                             v,
                         ]
                     for val in v:
-                        parsed_values.extend(list(Tag.objects.filter(name__iexact=val)))
+                        parsed_values.extend(
+                            extra_params['import_lookups']['tags'].get(val.lower(), [])
+                        )
 
             # if len(parsed_values) == 0:
             #     raise ValidationError({'tags': ['Must provide at least one tag']})
@@ -598,16 +678,7 @@ class ProductAdmin(ProductActionsMixin, ImportableExportableAdmin, NestedModelAd
                     ]
 
                     if image_files:
-                        is_main = len(parsed_values) == 0
-
-                        new_image = ProductImage.objects.create(
-                            product=main_record, main=is_main
-                        )
-                        new_image.image.save(
-                            image_files[0].name, ContentFile(image_files[0].read())
-                        )
-
-                        parsed_values.append(new_image)
+                        parsed_values.append(image_files[0])
                     else:
                         raise ValueError(
                             f'Image file {v} not found in uploaded directory'
@@ -617,61 +688,14 @@ class ProductAdmin(ProductActionsMixin, ImportableExportableAdmin, NestedModelAd
 
         raise ValueError(f'Failed to parse related field: {name}')
 
-    def _import_and_save_image_date(self, request_files: MultiValueDict):
-        updated_images = 0
-        errors = {}
-
-        processed_product_ids = []
-
-        for f in request_files.getlist('image_dir'):
-            try:
-                if not f.content_type.startswith('image'):
-                    raise Exception('File is not an image')
-
-                sku, _ = os.path.splitext(f.name)
-
-                split_sku = sku.rsplit('_', 1)
-                sku = split_sku[0]
-                image_index = split_sku[1] if len(split_sku) > 1 else None
-
-                product = Product.objects.filter(sku=sku).first()
-
-                if not product:
-                    raise Exception('Product with provided sku was not found')
-
-                # delete existing product images if this is the first time we
-                # process this product
-                if product.id not in processed_product_ids:
-                    ProductImage.objects.filter(product=product).delete()
-                    processed_product_ids.append(product.id)
-
-                # the image will be set as main if its image index is none (aka
-                # its file name is '{sku}.png' with no image index), or if no
-                # other image is currently set as main. this should prevent an
-                # issue where all imported images have indices an so none will
-                # be set as main
-                is_main = (
-                    image_index is None
-                    or ProductImage.objects.filter(product=product, main=True).first()
-                    is None
-                )
-
-                new_image = ProductImage.objects.create(product=product, main=is_main)
-                new_image.image.save(f.name, ContentFile(f.read()))
-
-                updated_images += 1
-            except Exception as ex:
-                msg = str(ex)
-
-                if msg not in errors:
-                    errors[msg] = []
-
-                errors[msg].append(f.name)
-
-        if errors:
-            raise RecordImportError(errors)
-        else:
-            return 0, updated_images
+    def import_save_related_objects(self, name, values_by_record):
+        if name == 'images':
+            # the first image of each row is its product's main image
+            save_product_images(
+                (record, image_file, index == 0)
+                for record, image_files in values_by_record.items()
+                for index, image_file in enumerate(image_files)
+            )
 
     def duplicate(self, request, queryset):
         for obj in queryset:
@@ -0,0 +1,146 @@
+"""
+Batch operations on bundle products, which resolve and write the bundled items
+of many bundles with a few queries instead of a few queries per bundled item
+"""
+
+from typing import Iterable
+
+from django.conf import settings
+
+from .models import Product, ProductBundleItem
+
+
+def parse_bundle_sku(sku_string: str) -> list[tuple[str, int]]:
+    """
+    Parses a bundle SKU string in the format
+    'product_sku|quantity,product_sku|quantity,...' to (sku, quantity) pairs
+    """
+    entries = []
+
+    for entry in sku_string.split(','):
+        try:
+            product_sku, quantity_str = entry.split('|')
+            quantity = int(quantity_str)
+        except ValueError:
+            raise ValueError("Invalid SKU string format. Expected 'sku|quantity'")
+
+        if quantity < 0:
+            raise ValueError("Invalid SKU string format. Expected 'sku|quantity'")
+
+        entries.append((product_sku, quantity))
+
+    return entries
+
+
+def create_bundles_items_from_skus(
+    bundle_skus: Iterable[tuple[Product, str]],
+) -> tuple[list[ProductBundleItem], dict[Product, ValueError]]:
+    """
+    Replaces the bundled items of (bundle, bundle SKU string) pairs with the
+    items of their SKU strings. The bundled products of all bundles are
+    resolved with a single query and the items are written in bulk. Bundles
+    whose SKU string is invalid or refers to missing products are left
+    unchanged. Returns the created items and the errors of the failed bundles
+    """
+    errors = {}
+    entries_by_bundle = {}
+
+    for bundle, sku_string in bundle_skus:
+        try:
+            if not bundle.product_kind == Product.ProductKindEnum.BUNDLE.name:
+                raise ValueError('This method can only be called on bundle products')
+
+            entries_by_bundle[bundle] = parse_bundle_sku(sku_string)
+        except ValueError as ex:
+            errors[bundle] = ex
+
+    product_ids_by_sku = dict(
+        Product.objects.filter(
+            sku__in={
+                sku for entries in entries_by_bundle.values() for sku, _ in entries
+            }
+        ).values_list('sku', 'id')
+    )
+
+    bundles = []
+    bundle_items = []
+    for bundle, entries in entries_by_bundle.items():
+        missing_sku = next(
+            (sku for sku, _ in entries if sku not in product_ids_by_sku), None
+        )
+        if missing_sku is not None:
+            errors[bundle] = ValueError(
+                f'Product with SKU {missing_sku} does not exist'
+            )
+            continue
+
+        bundles.append(bundle)
+        bundle_items.extend(
+            ProductBundleItem(
+                bundle=bundle, product_id=product_ids_by_sku[sku], quantity=quantity
+            )
+            for sku, quantity in entries
+        )
+
+    ProductBundleItem.objects.filter(bundle__in=bundles).delete()
+    created_items = ProductBundleItem.objects.bulk_create(
+        bundle_items, batch_size=settings.IMPORT_BATCH_SIZE
+    )
+
+    return created_items, errors
+
+
+def update_bundles_calculated_fields(bundles: Iterable[Product]) -> None:
+    """
+    Recomputes the fields of bundles which are calculated from their bundled
+    items (supplier, brand, sku, cost price and google price). The items of
+    all bundles are read with a single query and the bundles are written with
+    a bulk update. Bundles without items are left unchanged
+    """
+    bundles = [
+        bundle
+        for bundle in bundles
+        if bundle.product_kind == Product.ProductKindEnum.BUNDLE.name
+    ]
+
+    items_by_bundle = {}
+    for item in (
+        ProductBundleItem.objects.filter(bundle__in=bundles)
+        .order_by('id')
+        .values_list(
+            'bundle_id',
+            'product__supplier_id',
+            'product__brand_id',
+            'product__sku',
+            'product__cost_price',
+            'product__google_price',
+            'quantity',
+        )
+    ):
+        items_by_bundle.setdefault(item[0], []).append(item)
+
+    updated_bundles = []
+    for bundle in bundles:
+        items = items_by_bundle.get(bundle.pk)
+        if not items:
+            continue
+
+        # the supplier and brand are taken from the first bundled product
+        _, bundle.supplier_id, bundle.brand_id, *_ = items[0]
+        bundle.sku = ','.join(
+            f'{sku}|{quantity}' for _, _, _, sku, _, _, quantity in items
+        )
+        bundle.cost_price = sum(
+            cost_price * quantity for _, _, _, _, cost_price, _, quantity in items
+        )
+        bundle.google_price = sum(
+            (google_price or 0) * quantity
+            for _, _, _, _, _, google_price, quantity in items
+        )
+        updated_bundles.append(bundle)
+
+    Product.objects.bulk_update(
+        updated_bundles,
+        ['supplier', 'brand', 'sku', 'cost_price', 'google_price'],
+        batch_size=settings.IMPORT_BATCH_SIZE,
+    )
@@ -0,0 +1,195 @@
+"""
+Ingestion of uploaded product images, which stores the images concurrently
+and records them with bulk queries instead of storing and saving them one at
+a time
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import mimetypes
+import os
+from typing import Iterable
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Max
+from django.utils.datastructures import MultiValueDict
+
+from imports.jobs import Importer, register_importer, start_import_job
+from imports.models import ImportJob
+
+from .models import Product, ProductImage
+
+
+def save_product_images(
+    images: Iterable[tuple[Product, File, bool]],
+    stored_names: dict[str, str] | None = None,
+) -> list[ProductImage]:
+    """
+    Stores and records images of (product, image file, main) triplets. Images
+    with identical content are stored once and share the stored file (like the
+    images of duplicated products), and the unique files are stored
+    concurrently by up to `PRODUCT_IMAGE_UPLOAD_WORKERS` threads. An image
+    becomes its product's main image if it is requested to or if its product
+    has no main image yet, and only the last main image of a product stays
+    main. `stored_names` maps content hashes to the names of files which were
+    already stored, and is updated with the newly stored files
+    """
+    images = list(images)
+    if not images:
+        return []
+
+    if stored_names is None:
+        stored_names = {}
+
+    field = ProductImage._meta.get_field('image')
+
+    image_hashes = []
+    unstored_files = {}
+    for _, image_file, _ in images:
+        content_hash = hashlib.sha256()
+        for chunk in image_file.chunks():
+            content_hash.update(chunk)
+
+        image_hash = content_hash.hexdigest()
+        image_hashes.append(image_hash)
+        if image_hash not in stored_names:
+            unstored_files.setdefault(image_hash, image_file)
+
+    def store(image_file: File) -> str:
+        return field.storage.save(
+            field.generate_filename(None, os.path.basename(image_file.name)),
+            image_file,
+        )
+
+    # storing is mostly waiting on the storage backend, so a bounded pool of
+    # threads keeps several uploads in flight
+    with ThreadPoolExecutor(
+        max_workers=settings.PRODUCT_IMAGE_UPLOAD_WORKERS
+    ) as executor:
+        stored_names.update(
+            zip(unstored_files.keys(), executor.map(store, unstored_files.values()))
+        )
+
+    products = {product.pk: product for product, _, _ in images}
+    products_with_main = set(
+        ProductImage.objects.filter(product__in=products, main=True).values_list(
+            'product_id', flat=True
+        )
+    )
+
+    product_images = []
+    main_images = {}
+    for (product, _, main), image_hash in zip(images, image_hashes):
+        product_image = ProductImage(product=product, image=stored_names[image_hash])
+
+        if main or product.pk not in products_with_main:
+            if product.pk in main_images:
+                main_images[product.pk].main = False
+
+            product_image.main = True
+            main_images[product.pk] = product_image
+            products_with_main.add(product.pk)
+
+        product_images.append(product_image)
+
+    # the previous main images of products which got a new one are unset like
+    # ProductImage.save does
+    ProductImage.objects.filter(product__in=main_images, main=True).update(main=False)
+
+    return ProductImage.objects.bulk_create(
+        product_images, batch_size=settings.IMPORT_BATCH_SIZE
+    )
+
+
+def start_product_images_import_job(files: MultiValueDict, requested_by=None):
+    """
+    Queues the import of an uploaded image directory, whose image file names
+    are the skus of their products with an optional `_<index>` suffix. The
+    images each product had before the upload are replaced by its uploaded
+    images
+    """
+    return start_import_job(
+        'inventory.productimage',
+        None,
+        requested_by=requested_by,
+        params={
+            'replaced_image_max_id': (
+                ProductImage.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+            )
+        },
+        files=files,
+        chunk_size=settings.PRODUCT_IMAGE_IMPORT_CHUNK_SIZE,
+    )
+
+
+class ProductImagesImporter(Importer):
+    """
+    Imports the images of an uploaded image directory in an import job, with
+    an image file per row
+    """
+
+    def iter_rows(self, worksheet, columns, files):
+        # the rows are numbered by their file names, which the row errors list
+        for image_file in files.getlist('image_dir'):
+            yield image_file.name, (image_file,)
+
+    def load_context(self, import_job: ImportJob, columns, files):
+        # images with identical content are stored once per run
+        return import_job.params['replaced_image_max_id'], {}
+
+    def import_rows(self, context, rows, files):
+        replaced_image_max_id, stored_names = context
+
+        errors = {}
+        image_rows = []
+
+        for file_name, (image_file,) in rows:
+            content_type, _ = mimetypes.guess_type(file_name)
+            if not content_type or not content_type.startswith('image'):
+                errors.setdefault('File is not an image', []).append(file_name)
+                continue
+
+            sku, _ = os.path.splitext(file_name)
+
+            split_sku = sku.rsplit('_', 1)
+            sku = split_sku[0]
+            image_index = split_sku[1] if len(split_sku) > 1 else None
+
+            image_rows.append((file_name, image_file, sku, image_index))
+
+        products_by_sku = Product.objects.in_bulk(
+            {sku for _, _, sku, _ in image_rows}, field_name='sku'
+        )
+
+        images = []
+        for file_name, image_file, sku, image_index in image_rows:
+            product = products_by_sku.get(sku)
+
+            if not product:
+                errors.setdefault('Product with provided sku was not found', []).append(
+                    file_name
+                )
+                continue
+
+            # the image will be set as main if its image index is none (aka
+            # its file name is '{sku}.png' with no image index), or if no
+            # other image is currently set as main. this should prevent an
+            # issue where all imported images have indices an so none will
+            # be set as main
+            images.append((product, image_file, image_index is None))
+
+        # the images the products had before the upload are deleted, while the
+        # images of previous chunks (which may belong to the same products) are
+        # kept
+        ProductImage.objects.filter(
+            product__in={product for product, _, _ in images},
+            id__lte=replaced_image_max_id,
+        ).delete()
+
+        save_product_images(images, stored_names)
+
+        return len(images), errors
+
+
+register_importer('inventory.productimage', ProductImagesImporter())
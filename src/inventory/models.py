@@ -186,30 +186,10 @@ class Product(models.Model):
     )
 
     def update_bundle_calculated_fields(self):
+        from .bundles import update_bundles_calculated_fields
+
         if self.product_kind == Product.ProductKindEnum.BUNDLE.name:
-            bundled_items = self.bundled_items.all()
-            self.supplier = bundled_items[0].product.supplier
-            self.brand = bundled_items[0].product.brand
-            self.sku = ','.join(
-                [f'{bi.product.sku}|{bi.quantity}' for bi in bundled_items]
-            )
-            self.cost_price = sum(
-                [bi.product.cost_price * bi.quantity for bi in bundled_items]
-            )
-            self.google_price = sum(
-                [(bi.product.google_price or 0) * bi.quantity for bi in bundled_items]
-            )
-            self.save(
-                update_fields=[
-                    'supplier',
-                    'brand',
-                    'sku',
-                    'cost_price',
-                    'delivery_price',
-                    'sale_price',
-                    'google_price',
-                ]
-            )
+            update_bundles_calculated_fields([self])
         else:
             # remove all bundled items if this is not a bundle (may have been
             # changed now)
@@ -231,41 +211,12 @@ class Product(models.Model):
             ValueError: If the SKU string format is invalid or if
             referenced products don't exist
         """
-        if not self.product_kind == Product.ProductKindEnum.BUNDLE.name:
-            raise ValueError('This method can only be called on bundle products')
-
-        # Clear existing bundle items
-        self.bundled_items.all().delete()
-
-        created_items = []
-
-        # Split the SKU string into individual product entries
-        product_entries = sku_string.split(',')
-
-        for entry in product_entries:
-            try:
-                # Split each entry into SKU and quantity
-                product_sku, quantity_str = entry.split('|')
-                quantity = int(quantity_str)
-
-                # Find the product with this SKU
-                try:
-                    product = Product.objects.get(sku=product_sku)
-                except Product.DoesNotExist:
-                    raise ValueError(f'Product with SKU {product_sku} does not exist')
-
-                # Create the bundle item
-                bundle_item = ProductBundleItem.objects.create(
-                    bundle=self, product=product, quantity=quantity
-                )
-                created_items.append(bundle_item)
-
-            except ValueError as e:
-                # Re-raise if it's our custom error
-                if 'Product with SKU' in str(e):
-                    raise
-                # Otherwise, the format was invalid
-                raise ValueError("Invalid SKU string format. Expected 'sku|quantity'")
+        from .bundles import create_bundles_items_from_skus
+
+        created_items, errors = create_bundles_items_from_skus([(self, sku_string)])
+        if errors:
+            raise errors[self]
+
         return created_items
 
     @property
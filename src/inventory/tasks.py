@@ -1,19 +1,26 @@
 from datetime import datetime, timezone
-from io import BytesIO
+from itertools import chain
 import logging
 import os
+from typing import Iterator
 import uuid
 
 from celery import shared_task
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
 from django.core.files.storage import storages
+from django.db.models import OuterRef, Prefetch, QuerySet, Subquery, Value
 from django.db.models.sql.query import Query
-from openpyxl import Workbook
+from modeltranslation.utils import build_localized_fieldname, get_language
 
 from campaign.models import (
     Campaign,
     EmployeeGroupCampaignProduct,
 )
+from export.utils import ExportTask, finish_export_job, start_export_job
+from lib.export_utils import get_export_fingerprint, write_xlsx_to_temporary_file
+from lib.iter_utils import chunked
+from lib.models import StringAgg
 from services.email import (
     send_export_download_email,
 )
@@ -22,6 +29,7 @@ from .models import (
     Product,
     ProductColorVariationImage,
     ProductTextVariation,
+    ProductVariation,
     Variation,
 )
 
@@ -29,24 +37,10 @@ from .models import (
 logger = logging.getLogger(__name__)
 
 
-def active_campaigns(obj):
-    campaign_ids = EmployeeGroupCampaignProduct.objects.filter(
-        product_id=obj
-    ).values_list('employee_group_campaign_id__campaign', flat=True)
-    campaigns = Campaign.objects.filter(
-        id__in=campaign_ids,
-        status__in=[
-            Campaign.CampaignStatusEnum.ACTIVE.name,
-            Campaign.CampaignStatusEnum.PREVIEW.name,
-        ],
-    ).values_list('name', flat=True)
-    active_campaign_str = ', '.join(campaigns)
-    return active_campaign_str
-
-
 # must use pickle task serializer for the query argument
-@shared_task(serializer='pickle')
+@shared_task(serializer='pickle', bind=True, base=ExportTask)
 def export_products_as_xlsx(
+    self,
     products_query: Query,
     exporter_user_id: int,
     exporter_email: str,
@@ -64,6 +58,19 @@ def export_products_as_xlsx(
     products_queryset = Product.objects.all()
     products_queryset.query = products_query
 
+    # an identical export which is still running is reused instead of
+    # generating it again, and sends its file to the exporter once done
+    export_job, reused = start_export_job(
+        exporter_user_id,
+        get_export_fingerprint(
+            'products', exporter_user_id, *products_query.sql_with_params()
+        ),
+        self.request.id,
+    )
+
+    if reused:
+        return True
+
     field_names = [
         'id',
         'brand',
@@ -100,63 +107,127 @@ def export_products_as_xlsx(
         'product_quantity',
     ]
 
-    variation_names = set()
-    for product in products_queryset:
-        for product_variation in product.productvariation_set.all():
-            variation = product_variation.variation
-            variation_names.add(variation.site_name)
-
-    variation_names = sorted(variation_names)
+    variation_names = sorted(
+        set(
+            Variation.objects.filter(
+                productvariation__product__in=products_queryset.order_by().values('pk')
+            ).values_list('site_name', flat=True)
+        )
+    )
 
     field_names = field_names[:13] + variation_names + field_names[13:]
 
-    workbook = Workbook()
-    worksheet = workbook.active
-
-    worksheet.append(field_names)
-
-    for product in products_queryset:
-        row_data = [
-            product.id,
-            product.brand.name,
-            product.supplier.name,
-            product.reference,
-            product.name_en,
-            product.name_he,
-            product.product_kind,
-            product.voucher_type,
-            product.client_discount_rate,
-            product.supplier_discount_rate,
-            product.product_type,
-            product.description_en,
-            product.description_he,
-        ]
-        variation_data = {variation: [] for variation in variation_names}
-        if product.product_kind == Product.ProductKindEnum.VARIATION.name:
-            for product_variation in product.productvariation_set.all():
-                variation = product_variation.variation
-                if variation.variation_kind == Variation.VariationKindEnum.COLOR.name:
-                    color_images = ProductColorVariationImage.objects.filter(
-                        product_variation=product_variation
-                    )
-                    for color_image in color_images:
-                        color_name = color_image.color.name
-                        variation_data[variation.site_name].append(color_name)
+    rows = _iter_product_export_rows(
+        products_queryset, variation_names, settings.EXPORT_CHUNK_SIZE
+    )
+
+    storage = storages['exports']
+    formatted_init_datetime = export_init_datetime.strftime('%Y_%m_%d_%H%M')
+
+    export_file_name = storage.generate_filename(
+        os.path.join(
+            str(uuid.uuid4()),
+            f'products_export_{formatted_init_datetime}.xlsx',
+        ),
+    )
+
+    private_export_file_name = storage.generate_filename(
+        os.path.join(
+            str(exporter_user_id),
+            export_file_name,
+        ),
+    )
+
+    with write_xlsx_to_temporary_file(chain([field_names], rows)) as export_file:
+        storage.save(private_export_file_name, File(export_file))
+
+    finish_export_job(export_job.id, export_file_name)
+
+    send_export_download_email(
+        'product', exporter_email, f'{base_export_download_url}{export_file_name}'
+    )
+
+    return True
 
-                elif variation.variation_kind == Variation.VariationKindEnum.TEXT.name:
-                    text_variations = ProductTextVariation.objects.filter(
-                        product_variation=product_variation
-                    )
-                    for text_variation in text_variations:
-                        text_value = text_variation.text.text
-                        variation_data[variation.site_name].append(text_value)
 
-        row_data.extend(
-            ', '.join(variation_data.get(name, [])) for name in variation_names
+def _iter_product_export_rows(
+    products_queryset: QuerySet, variation_names: list[str], chunk_size: int
+) -> Iterator[list]:
+    # the names of the active (or preview) campaigns each product is offered
+    # in, aggregated in the database
+    active_campaign_names = (
+        Campaign.objects.filter(
+            id__in=EmployeeGroupCampaignProduct.objects.filter(
+                product_id=OuterRef(OuterRef('pk'))
+            ).values('employee_group_campaign_id__campaign'),
+            status__in=[
+                Campaign.CampaignStatusEnum.ACTIVE.name,
+                Campaign.CampaignStatusEnum.PREVIEW.name,
+            ],
+        )
+        .order_by()
+        .annotate(group=Value(1))
+        .values('group')
+        .annotate(
+            names=StringAgg(
+                build_localized_fieldname('name', get_language()), Value(', ')
+            )
         )
+        .values('names')
+    )
 
-        row_data.extend(
+    products = (
+        products_queryset.select_related('brand', 'supplier')
+        .prefetch_related(
+            Prefetch(
+                'productvariation_set',
+                queryset=ProductVariation.objects.select_related('variation'),
+            ),
+            'categories',
+            'tags',
+        )
+        .annotate(active_campaign_names=Subquery(active_campaign_names))
+        .iterator(chunk_size=chunk_size)
+    )
+
+    for products_chunk in chunked(products, chunk_size):
+        variation_values = _get_product_variation_values(
             [
+                p.id
+                for p in products_chunk
+                if p.product_kind == Product.ProductKindEnum.VARIATION.name
+            ]
+        )
+
+        for product in products_chunk:
+            variation_data = {variation: [] for variation in variation_names}
+            if product.product_kind == Product.ProductKindEnum.VARIATION.name:
+                for product_variation in product.productvariation_set.all():
+                    variation_data[product_variation.variation.site_name].extend(
+                        variation_values.get(
+                            (
+                                product_variation.id,
+                                product_variation.variation.variation_kind,
+                            ),
+                            [],
+                        )
+                    )
+
+            yield [
+                product.id,
+                product.brand.name,
+                product.supplier.name,
+                product.reference,
+                product.name_en,
+                product.name_he,
+                product.product_kind,
+                product.voucher_type,
+                product.client_discount_rate,
+                product.supplier_discount_rate,
+                product.product_type,
+                product.description_en,
+                product.description_he,
+                *(', '.join(variation_data[name]) for name in variation_names),
                 product.sku,
                 product.link,
                 product.active,
@@ -175,37 +246,42 @@ def export_products_as_xlsx(
                 product.exchange_policy_he,
                 ', '.join(category.name for category in product.categories.all()),
                 ', '.join(tag.name for tag in product.tags.all()),
-                active_campaigns(obj=product),
+                product.active_campaign_names or '',
                 product.product_quantity,
             ]
-        )
 
-        worksheet.append(row_data)
 
-    storage = storages['exports']
-    formatted_init_datetime = export_init_datetime.strftime('%Y_%m_%d_%H%M')
+def _get_product_variation_values(product_ids: list[int]) -> dict[tuple, list[str]]:
+    """
+    Returns the color and text variation values of the given products, keyed
+    by (product variation id, variation kind)
+    """
 
-    export_file_name = storage.generate_filename(
-        os.path.join(
-            str(uuid.uuid4()),
-            f'products_export_{formatted_init_datetime}.xlsx',
-        ),
-    )
+    variation_values = {}
 
-    private_export_file_name = storage.generate_filename(
-        os.path.join(
-            str(exporter_user_id),
-            export_file_name,
-        ),
-    )
+    if not product_ids:
+        return variation_values
 
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-    storage.save(private_export_file_name, ContentFile(buffer.read()))
+    for product_variation_id, color_name in (
+        ProductColorVariationImage.objects.filter(
+            product_variation__product_id__in=product_ids
+        )
+        .order_by('id')
+        .values_list('product_variation_id', 'color__name')
+    ):
+        variation_values.setdefault(
+            (product_variation_id, Variation.VariationKindEnum.COLOR.name), []
+        ).append(color_name)
 
-    send_export_download_email(
-        'product', exporter_email, f'{base_export_download_url}{export_file_name}'
-    )
+    for product_variation_id, text in (
+        ProductTextVariation.objects.filter(
+            product_variation__product_id__in=product_ids
+        )
+        .order_by('id')
+        .values_list('product_variation_id', 'text__text')
+    ):
+        variation_values.setdefault(
+            (product_variation_id, Variation.VariationKindEnum.TEXT.name), []
+        ).append(text)
 
-    return True
+    return variation_values
@@ -1,8 +1,41 @@
+from io import BytesIO
+from unittest import mock
+
 from django.contrib.admin.options import ModelAdmin
 from django.contrib.admin.sites import AdminSite
-from django.test import TestCase
+from django.core import mail
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.datastructures import MultiValueDict
+from openpyxl import Workbook, load_workbook
 
-from inventory.models import Category
+from imports.models import ImportJob
+from inventory.admin import ProductAdmin, SupplierAdmin
+from inventory.bundles import (
+    create_bundles_items_from_skus,
+    update_bundles_calculated_fields,
+)
+from inventory.images import start_product_images_import_job
+from inventory.models import (
+    Category,
+    CategoryProduct,
+    ColorVariation,
+    Product,
+    ProductBundleItem,
+    ProductColorVariationImage,
+    ProductImage,
+    ProductTextVariation,
+    ProductVariation,
+    Supplier,
+    Tag,
+    TextVariation,
+    Variation,
+)
+from inventory.tasks import export_products_as_xlsx
+from lib.admin import RecordImportError
 
 
 class MockRequest:
@@ -40,3 +73,491 @@ class CategoryAdminTest(TestCase):
             data={'name': 'name en', 'name_en': 'name en', 'name_he': 'name he'}
         )
         self.assertTrue(form.is_valid())
+
+
+class ExportProductsAsXlsxTaskTest(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.storage = InMemoryStorage()
+
+        Product.objects.filter(pk=1).update(
+            product_kind=Product.ProductKindEnum.VARIATION.name
+        )
+        product = Product.objects.get(pk=1)
+
+        color_variation = Variation.objects.create(
+            variation_kind=Variation.VariationKindEnum.COLOR.name,
+            system_name='color',
+            site_name='Color',
+        )
+        product_color_variation = ProductVariation.objects.create(
+            product=product, variation=color_variation
+        )
+        for color_name in ['Red', 'Blue']:
+            ProductColorVariationImage.objects.create(
+                product_variation=product_color_variation,
+                product=product,
+                variation=color_variation,
+                color=ColorVariation.objects.create(name=color_name, color_code='#'),
+            )
+
+        text_variation = Variation.objects.create(
+            variation_kind=Variation.VariationKindEnum.TEXT.name,
+            system_name='size',
+            site_name='Size',
+        )
+        product_text_variation = ProductVariation.objects.create(
+            product=product, variation=text_variation
+        )
+        for text in ['S', 'M']:
+            ProductTextVariation.objects.create(
+                product_variation=product_text_variation,
+                product=product,
+                variation=text_variation,
+                text=TextVariation.objects.create(text=text),
+            )
+
+        category = Category.objects.create(name_en='category', name_he='category')
+        CategoryProduct.objects.create(category_id=category, product_id=product)
+
+    def _export(self, products_queryset):
+        with mock.patch('inventory.tasks.storages', {'exports': self.storage}):
+            export_products_as_xlsx(
+                products_queryset.query, 1, 'admin@test.com', 'http://test/export/'
+            )
+
+        export_file_name = self.storage.listdir('1')[0][0]
+        export_files = self.storage.listdir(f'1/{export_file_name}')[1]
+        self.assertEqual(len(export_files), 1)
+
+        with self.storage.open(f'1/{export_file_name}/{export_files[0]}') as f:
+            worksheet = load_workbook(f).active
+            return [list(row) for row in worksheet.iter_rows(values_only=True)]
+
+    def test_export_products(self):
+        rows = self._export(Product.objects.all().order_by('id'))
+
+        header = rows[0]
+        self.assertListEqual(header[12:15], ['description_he', 'Color', 'Size'])
+        self.assertEqual(header[15], 'sku')
+        self.assertEqual(len(rows), 5)
+
+        def column(row, name):
+            return row[header.index(name)]
+
+        self.assertListEqual(
+            [
+                (
+                    column(row, 'id'),
+                    column(row, 'Color'),
+                    column(row, 'Size'),
+                    column(row, 'categories'),
+                )
+                for row in rows[1:]
+            ],
+            [
+                (1, 'Red, Blue', 'S, M', 'category'),
+                (2, None, None, None),
+                (3, None, None, None),
+                (4, None, None, None),
+            ],
+        )
+
+        self.assertEqual(column(rows[1], 'brand'), 'brand name en 1')
+        self.assertEqual(column(rows[1], 'active_campaigns'), 'campaign name en 1')
+        self.assertListEqual(
+            sorted(column(rows[3], 'active_campaigns').split(', ')),
+            ['campaign name en 1', 'campaign name en 2'],
+        )
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_export_products_without_variations(self):
+        rows = self._export(Product.objects.filter(pk=2))
+
+        self.assertNotIn('Color', rows[0])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][0], 2)
+
+
+class ProductAdminImportTest(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    columns = [
+        'id',
+        'brand',
+        'supplier',
+        'name_en',
+        'name_he',
+        'product_kind',
+        'product_type',
+        'description_en',
+        'sku',
+        'cost_price',
+        'product_quantity',
+        'tags',
+    ]
+
+    def setUp(self):
+        self.product_admin = ProductAdmin(Product, AdminSite())
+
+        self.color_variation = Variation.objects.create(
+            variation_kind=Variation.VariationKindEnum.COLOR.name,
+            system_name='color',
+            site_name='Color',
+        )
+        for color_name in ['Red', 'Blue', 'Green']:
+            ColorVariation.objects.create(name=color_name, color_code='#')
+
+    def _product_row(self, sku, product_id=None, brand='Brand Name En 1', **kwargs):
+        return [
+            product_id,
+            brand,
+            'supplier name en 1',
+            f'name {sku}',
+            f'name he {sku}',
+            kwargs.get('product_kind', Product.ProductKindEnum.PHYSICAL.name),
+            Product.ProductTypeEnum.REGULAR.name,
+            'description',
+            sku,
+            kwargs.get('cost_price', 10),
+            kwargs.get('product_quantity', 100),
+            kwargs.get('tags'),
+        ] + kwargs.get('extra_values', [])
+
+    def _import(self, rows, extra_columns=()):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.append(self.columns + list(extra_columns))
+        for row in rows:
+            worksheet.append(row)
+
+        xlsx_file = BytesIO()
+        workbook.save(xlsx_file)
+
+        return self.product_admin.import_parse_and_save_xlsx_data(
+            {},
+            MultiValueDict(
+                {
+                    'xlsx_file': [
+                        SimpleUploadedFile('products.xlsx', xlsx_file.getvalue())
+                    ]
+                }
+            ),
+        )
+
+    def test_import_creates_and_updates_products(self):
+        Product.objects.filter(pk=1).update(alert_stock_sent=True)
+
+        created, updated = self._import(
+            [
+                self._product_row(
+                    'sku 1',
+                    product_id=1,
+                    product_kind=Product.ProductKindEnum.VARIATION.name,
+                    product_quantity=50,
+                    tags='tag en|||TAG EN 2',
+                    extra_values=['Red, Blue'],
+                ),
+                self._product_row('new sku', tags='tag en'),
+            ],
+            extra_columns=['Color'],
+        )
+
+        self.assertEqual((created, updated), (1, 1))
+
+        updated_product = Product.objects.get(pk=1)
+        self.assertEqual(updated_product.name_en, 'name sku 1')
+        self.assertEqual(updated_product.product_quantity, 50)
+        self.assertFalse(updated_product.alert_stock_sent)
+        self.assertSetEqual(
+            set(updated_product.tags.values_list('name_en', flat=True)),
+            {'tag en', 'tag en 2'},
+        )
+        self.assertSetEqual(
+            set(
+                ProductColorVariationImage.objects.filter(
+                    product=updated_product
+                ).values_list('color__name', flat=True)
+            ),
+            {'Red', 'Blue'},
+        )
+
+        created_product = Product.objects.get(sku='new sku')
+        self.assertEqual(created_product.brand_id, 1)
+        self.assertEqual(created_product.supplier_id, 1)
+        self.assertListEqual(
+            list(created_product.tags.all()), [Tag.objects.get(name_en='tag en')]
+        )
+
+        # a following import only applies the variation differences
+        self._import(
+            [
+                self._product_row(
+                    'sku 1',
+                    product_id=1,
+                    product_kind=Product.ProductKindEnum.VARIATION.name,
+                    extra_values=['Blue, Green'],
+                ),
+            ],
+            extra_columns=['Color'],
+        )
+
+        self.assertEqual(
+            ProductVariation.objects.filter(product_id=1).count(),
+            1,
+        )
+        self.assertSetEqual(
+            set(
+                ProductColorVariationImage.objects.filter(product_id=1).values_list(
+                    'color__name', flat=True
+                )
+            ),
+            {'Blue', 'Green'},
+        )
+
+    def test_import_reports_row_errors(self):
+        with self.assertRaises(RecordImportError) as cm:
+            self._import(
+                [
+                    self._product_row('new sku 1'),
+                    self._product_row('new sku 2', brand='missing brand'),
+                    self._product_row('sku 2'),
+                    self._product_row('new sku 1'),
+                    self._product_row(
+                        'new sku 3',
+                        product_kind=Product.ProductKindEnum.VARIATION.name,
+                        extra_values=['Purple'],
+                    ),
+                ],
+                extra_columns=['Color'],
+            )
+
+        self.assertDictEqual(
+            cm.exception.errors,
+            {
+                'Brand matching query does not exist.': [3],
+                'sku - Product with this Sku already exists': [4, 5],
+                "Color variation 'Purple' not found.": [6],
+            },
+        )
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small_import_queries:
+            self._import([self._product_row(f'small sku {i}') for i in range(2)])
+
+        with CaptureQueriesContext(connection) as large_import_queries:
+            self._import([self._product_row(f'large sku {i}') for i in range(20)])
+
+        self.assertEqual(
+            len(large_import_queries.captured_queries),
+            len(small_import_queries.captured_queries),
+        )
+        self.assertEqual(Product.objects.filter(sku__startswith='large').count(), 20)
+
+
+class SupplierImportTest(TestCase):
+    fixtures = ['src/fixtures/inventory.json']
+
+    def test_import_saves_records_with_their_save_logic(self):
+        supplier_admin = SupplierAdmin(Supplier, AdminSite())
+        updated_supplier = Supplier.objects.get(pk=1)
+        updated_at = updated_supplier.updated_at
+        updated_supplier.phone_number = '0501234567'
+
+        errors = {}
+        saved_rows = supplier_admin._import_save_records(
+            [
+                (2, (), {}, updated_supplier, False),
+                (
+                    3,
+                    (),
+                    {},
+                    Supplier(name='new', email='new@test.com', phone_number='invalid'),
+                    True,
+                ),
+            ],
+            errors,
+        )
+
+        # suppliers override save to normalize their phone number, so they are
+        # saved one by one instead of with bulk queries
+        self.assertListEqual([row[0] for row in saved_rows], [2])
+        self.assertDictEqual(errors, {'Invalid phone number: invalid': [3]})
+
+        updated_supplier.refresh_from_db()
+        self.assertEqual(updated_supplier.phone_number, '+972501234567')
+        self.assertGreater(updated_supplier.updated_at, updated_at)
+
+
+class ProductBundleItemsTest(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        Product.objects.filter(sku='sku 1').update(google_price=10)
+        Product.objects.filter(sku='sku 4').update(google_price=20)
+        Product.objects.filter(sku__in=['sku 2', 'sku 3']).update(
+            product_kind=Product.ProductKindEnum.BUNDLE.name
+        )
+        self.bundle = Product.objects.get(sku='sku 2')
+        self.other_bundle = Product.objects.get(sku='sku 3')
+
+        ProductBundleItem.objects.create(
+            bundle=self.bundle, product=Product.objects.get(sku='sku 3'), quantity=1
+        )
+
+    def test_create_bundle_items_from_sku(self):
+        # the bundled products are resolved with one query, and the existing
+        # items are replaced with a delete and an insert
+        with self.assertNumQueries(3):
+            created_items = self.bundle.create_bundle_items_from_sku('sku 4|2,sku 1|1')
+
+        self.assertEqual(len(created_items), 2)
+        self.assertListEqual(
+            list(
+                self.bundle.bundled_items.order_by('id').values_list(
+                    'product__sku', 'quantity'
+                )
+            ),
+            [('sku 4', 2), ('sku 1', 1)],
+        )
+
+    def test_create_bundle_items_from_invalid_sku(self):
+        with self.assertRaisesMessage(
+            ValueError, 'Product with SKU missing does not exist'
+        ):
+            self.bundle.create_bundle_items_from_sku('sku 1|1,missing|1')
+        with self.assertRaisesMessage(
+            ValueError, "Invalid SKU string format. Expected 'sku|quantity'"
+        ):
+            self.bundle.create_bundle_items_from_sku('sku 1|one')
+        with self.assertRaisesMessage(
+            ValueError, 'This method can only be called on bundle products'
+        ):
+            Product.objects.get(sku='sku 1').create_bundle_items_from_sku('sku 4|1')
+
+        # the existing items are kept when the sku string is invalid
+        self.assertListEqual(
+            list(self.bundle.bundled_items.values_list('product__sku', 'quantity')),
+            [('sku 3', 1)],
+        )
+
+    def test_create_bundles_items_from_skus(self):
+        product = Product.objects.get(sku='sku 1')
+
+        with self.assertNumQueries(3):
+            created_items, errors = create_bundles_items_from_skus(
+                [
+                    (self.bundle, 'sku 4|2,sku 1|1'),
+                    (self.other_bundle, 'sku 1|3'),
+                    (product, 'sku 4|1'),
+                ]
+            )
+
+        self.assertEqual(len(created_items), 3)
+        self.assertListEqual(
+            [str(error) for error in errors.values()],
+            ['This method can only be called on bundle products'],
+        )
+        self.assertListEqual(
+            list(
+                ProductBundleItem.objects.order_by('id').values_list(
+                    'bundle__sku', 'product__sku', 'quantity'
+                )
+            ),
+            [('sku 2', 'sku 4', 2), ('sku 2', 'sku 1', 1), ('sku 3', 'sku 1', 3)],
+        )
+
+    def test_update_bundles_calculated_fields(self):
+        self.bundle.create_bundle_items_from_sku('sku 4|2,sku 1|1')
+        self.other_bundle.create_bundle_items_from_sku('sku 1|3')
+
+        # the items of all bundles are read with one query and the bundles are
+        # written with a single update
+        with self.assertNumQueries(2):
+            update_bundles_calculated_fields([self.bundle, self.other_bundle])
+
+        self.bundle.refresh_from_db()
+        self.assertEqual(self.bundle.sku, 'sku 4|2,sku 1|1')
+        self.assertEqual(self.bundle.brand_id, 2)
+        self.assertEqual(self.bundle.supplier_id, 1)
+        self.assertEqual(self.bundle.cost_price, 3)
+        self.assertEqual(self.bundle.google_price, 50)
+
+        self.other_bundle.refresh_from_db()
+        self.assertEqual(self.other_bundle.sku, 'sku 1|3')
+        self.assertEqual(self.other_bundle.brand_id, 1)
+        self.assertEqual(self.other_bundle.cost_price, 3)
+        self.assertEqual(self.other_bundle.google_price, 30)
+
+
+@override_settings(PRODUCT_IMAGE_IMPORT_CHUNK_SIZE=2)
+class ProductImagesImportTest(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.image_storage = InMemoryStorage()
+
+        for patcher in (
+            mock.patch('imports.jobs.storages', {'imports': InMemoryStorage()}),
+            mock.patch.object(
+                ProductImage._meta.get_field('image'), 'storage', self.image_storage
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.replaced_image = ProductImage.objects.create(
+            product=Product.objects.get(sku='sku 1'), main=True, image='old.png'
+        )
+
+    def test_import_product_images(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            import_job = start_product_images_import_job(
+                MultiValueDict(
+                    {
+                        'image_dir': [
+                            SimpleUploadedFile('sku 1_1.png', b'image 1'),
+                            SimpleUploadedFile('sku 1.png', b'image 2'),
+                            SimpleUploadedFile('sku 2_1.png', b'image 1'),
+                            SimpleUploadedFile('missing.png', b'image 3'),
+                            SimpleUploadedFile('notes.txt', b'notes'),
+                        ]
+                    }
+                )
+            )
+
+        import_job.refresh_from_db()
+        self.assertEqual(
+            import_job.status, ImportJob.StatusEnum.COMPLETED_WITH_ERRORS.name
+        )
+        self.assertEqual(import_job.chunk_size, 2)
+        self.assertEqual(import_job.total_rows, 5)
+        self.assertEqual(import_job.imported_rows, 3)
+        self.assertDictEqual(
+            import_job.errors,
+            {
+                'Product with provided sku was not found': ['missing.png'],
+                'File is not an image': ['notes.txt'],
+            },
+        )
+
+        # the product's previous images are replaced and its image without an
+        # index is its main image
+        self.assertFalse(
+            ProductImage.objects.filter(id=self.replaced_image.id).exists()
+        )
+        first_image, main_image = ProductImage.objects.filter(
+            product__sku='sku 1'
+        ).order_by('id')
+        self.assertFalse(first_image.main)
+        self.assertTrue(main_image.main)
+
+        # a product without an image without an index gets its first image as
+        # main, and identical images are stored once
+        other_image = ProductImage.objects.get(product__sku='sku 2')
+        self.assertTrue(other_image.main)
+        self.assertEqual(other_image.image.name, first_image.image.name)
+        self.assertEqual(len(self.image_storage.listdir('')[1]), 2)
+        with self.image_storage.open(main_image.image.name) as image_file:
+            self.assertEqual(image_file.read(), b'image 2')
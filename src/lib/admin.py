@@ -1,17 +1,22 @@
 from datetime import datetime
-from typing import Any
+from typing import Any, Iterator
 
 from django import forms
+from django.conf import settings
 from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
-from django.http import HttpResponse
+from django.db.models.fields.files import ImageFieldFile
 from django.shortcuts import redirect, render
 from django.urls import path
+from django.utils import timezone
 from django.utils.datastructures import MultiValueDict
 from modeltranslation.admin import TranslationAdmin
-from openpyxl import Workbook, load_workbook
+from openpyxl import load_workbook
 
+from imports.jobs import Importer, register_importer, start_import_job
+from imports.models import ImportJob
+from inventory.bundles import create_bundles_items_from_skus
 from inventory.models import (
     ColorVariation,
     Product,
@@ -22,6 +27,8 @@ from inventory.models import (
     Variation,
     validate_sku_length,
 )
+from lib.export_utils import ExportFormatEnum, get_export_response
+from lib.iter_utils import chunked
 
 
 class XlsxImportForm(forms.Form):
@@ -43,6 +50,13 @@ class ImportableExportableAdmin(TranslationAdmin):
     import_excluded_fields: set[str] = ()
     import_excluded_fields_indexes: list = []
 
+    def __init__(self, model, admin_site):
+        super().__init__(model, admin_site)
+
+        # uploaded xlsx files are imported by import jobs, which refer to the
+        # admin's importer by the model's label
+        register_importer(self.opts.label_lower, ModelAdminImporter(self))
+
     def get_urls(self):
         """
         Adding a url to import data file in the existing urls.
@@ -60,7 +74,32 @@ class ImportableExportableAdmin(TranslationAdmin):
         """
         model_name = self.model._meta.model_name
 
-        if request.method == 'POST':
+        if request.method == 'POST' and 'xlsx_file' in request.FILES:
+            # the rows are imported in the background a chunk at a time, and
+            # the job's progress and row errors are listed in the import jobs
+            # page
+            request_files = request.FILES.copy()
+            import_job = start_import_job(
+                self.opts.label_lower,
+                request_files.pop('xlsx_file')[0],
+                requested_by=request.user,
+                params=kwargs,
+                files=request_files,
+            )
+
+            self.message_user(
+                request,
+                (
+                    f'Your data file is being imported as import job '
+                    f'#{import_job.id}, its progress and errors are listed in the '
+                    'import jobs page'
+                ),
+            )
+
+            return redirect(
+                f'admin:{self.model._meta.app_label}_{model_name}_changelist'
+            )
+        elif request.method == 'POST':
             try:
                 # use an atomic transaction so that no data is saved if any
                 # single object failed to save
@@ -108,12 +147,54 @@ class ImportableExportableAdmin(TranslationAdmin):
     def import_parse_and_save_xlsx_data(
         self, extra_params: dict[str, Any], request_files: MultiValueDict
     ) -> tuple[int, int]:
-        # load main xlsx file
+        """
+        Imports the records of the uploaded xlsx file. The rows are parsed and
+        validated in memory against lookups loaded once for the whole file,
+        and are then written with bulk queries in batches of
+        `IMPORT_BATCH_SIZE`. Errors are collected per row and raised together
+        as a `RecordImportError` once all rows were processed
+        """
+        # load main xlsx file. read-only mode streams the rows instead of
+        # loading the whole sheet in memory
         workbook = load_workbook(
             request_files.pop('xlsx_file')[0], data_only=True, read_only=True
         )
         worksheet = workbook.active
 
+        columns = self.import_read_columns(worksheet)
+        import_context = self.import_load_context(columns, extra_params)
+        rows = list(iter_import_rows(worksheet, len(columns) + 1))
+
+        workbook.close()
+
+        created, updated, errors = self.import_save_rows(
+            import_context, rows, request_files
+        )
+
+        if errors:
+            raise RecordImportError(errors)
+        else:
+            return created, updated
+
+    def import_read_columns(self, worksheet) -> list[str]:
+        """
+        Returns the imported columns, which are read from the sheet's first
+        row by default
+        """
+        return [
+            cell_value
+            for row in worksheet.iter_rows(max_row=1, values_only=True)
+            for cell_value in row
+            if cell_value
+        ]
+
+    def import_load_context(
+        self, columns: list[str], extra_params: dict[str, Any]
+    ) -> dict[str, Any]:
+        """
+        Loads what the imported rows refer to once per import, which is passed
+        to `import_save_rows`
+        """
         # Set of static columns to identify the variation columns
         static_columns = {
             'id',
@@ -151,141 +232,474 @@ class ImportableExportableAdmin(TranslationAdmin):
             'product_quantity',
         }
 
-        # Read the first row as column names
-        columns = [
-            cell_value
-            for row in worksheet.iter_rows(
-                max_row=1, max_col=worksheet.max_column, values_only=True
-            )
-            for cell_value in row
-            if cell_value
-        ]
+        # all variations are loaded with a single query. like a `.first()`
+        # lookup, the variation with the lowest id wins when a site name is
+        # shared
+        variations_by_site_name = {
+            variation.site_name: variation
+            for variation in Variation.objects.order_by('-id')
+        }
 
         # It will check with the help of static columns if its a variation column
         variation_columns = {}
         for idx, site_name in enumerate(columns):
             if site_name not in static_columns:
-                variation = Variation.objects.filter(site_name=site_name).first()
-                if not variation:
+                if site_name not in variations_by_site_name:
                     raise ValueError(f"Variation '{site_name}' not found")
-                variation_columns[idx] = site_name
+                variation_columns[idx] = variations_by_site_name[site_name]
+
+        return {
+            'columns': columns,
+            'variation_columns': variation_columns,
+            # model-specific lookups (for example brands by name) are passed to
+            # the field parsers with the extra params so they don't query per
+            # row
+            'parse_params': {
+                **extra_params,
+                'import_lookups': self.import_load_lookups(columns),
+            },
+        }
+
+    def import_save_rows(
+        self,
+        import_context: dict[str, Any],
+        rows: list[tuple[int, tuple]],
+        request_files: MultiValueDict,
+    ) -> tuple[int, int, dict[str, list[int]]]:
+        """
+        Parses, validates and saves (row number, row) pairs with bulk queries
+        in batches of `IMPORT_BATCH_SIZE`. Returns the numbers of created and
+        updated records and the row errors, mapped to the numbers of the rows
+        which failed with them
+        """
+        columns = import_context['columns']
+        variation_columns = import_context['variation_columns']
+        parse_params = import_context['parse_params']
+
         errors = {}
 
-        records_created = 0
-        records_updated = 0
+        parsed_rows = []
+        for row_number, row in rows:
+            try:
+                record_field_values = self._import_parse_row(
+                    columns, variation_columns, row, parse_params, request_files
+                )
+                parsed_rows.append((row_number, row, record_field_values))
+            except Exception as ex:
+                add_import_error(errors, ex, row_number)
 
-        for row_idx, row in enumerate(
-            worksheet.iter_rows(
-                min_row=2,
-                max_row=worksheet.max_row,
-                max_col=len(columns) + 1,
-                values_only=True,
+        prepared_rows = self._import_prepare_records(parsed_rows, errors)
+
+        # write the records before their related objects, which need their
+        # primary keys. models which override save (like suppliers, which
+        # normalize their phone number) are saved one by one so that their
+        # save logic runs, and the rest are written with bulk queries
+        if self.model.save is not models.Model.save:
+            prepared_rows = self._import_save_records(prepared_rows, errors)
+        else:
+            self._import_bulk_save_records(prepared_rows)
+
+        # the bundled items of all bundles are resolved and created at once
+        bundle_rows = [
+            (row_number, record, record_field_values.get('sku'))
+            for row_number, _, record_field_values, record, _ in prepared_rows
+            if record_field_values.get('product_kind')
+            == Product.ProductKindEnum.BUNDLE.name
+        ]
+        if bundle_rows:
+            _, bundle_errors = create_bundles_items_from_skus(
+                (record, sku) for _, record, sku in bundle_rows
             )
-        ):
-            # break if we hit an empty row since this should be th end of the
-            # sheet
-            if not row or all(v is None for v in row):
-                break
+            for row_number, record, _ in bundle_rows:
+                if record in bundle_errors:
+                    add_import_error(errors, bundle_errors[record], row_number)
+
+        self._import_save_related_fields(
+            prepared_rows, columns, parse_params, request_files, errors
+        )
 
-            record_field_values = {}
-            record_field_multi_values = {}
+        if variation_columns:
+            self._import_save_variations(prepared_rows, variation_columns, errors)
+
+        records_created = sum(1 for row in prepared_rows if row[4])
+        return records_created, len(prepared_rows) - records_created, errors
+
+    def _import_save_records(
+        self, rows: list[tuple], errors: dict[str, list[int]]
+    ) -> list[tuple]:
+        """
+        Saves the records of prepared rows one by one, and returns the rows
+        whose record was saved
+        """
+        saved_rows = []
+        for row in rows:
+            row_number, _, _, record, _ = row
 
             try:
-                shift = 0
-                for col_idx, current_column in enumerate(columns):
-                    if col_idx in self.import_excluded_fields_indexes:
-                        shift += 1
+                with transaction.atomic():
+                    record.save()
+                saved_rows.append(row)
+            except Exception as ex:
+                add_import_error(errors, ex, row_number)
 
-                    if (
-                        current_column not in self.import_related_fields
-                        and current_column not in variation_columns.values()
-                        and current_column != 'active_campaigns'
-                    ):
-                        parsed_value = self.import_parse_field(
-                            current_column,
-                            row[col_idx + shift],
-                            extra_params,
-                            request_files,
-                        )
-                        record_field_values[current_column] = parsed_value
+        return saved_rows
+
+    def _import_bulk_save_records(self, rows: list[tuple]):
+        """
+        Writes the records of prepared rows with bulk queries in batches of
+        `IMPORT_BATCH_SIZE`
+        """
+        batch_size = settings.IMPORT_BATCH_SIZE
+        created_records = []
+        updated_records = {}
+        for _, _, _, record, created in rows:
+            if created:
+                created_records.append(record)
+            else:
+                # the same record may be updated by more than one row
+                updated_records[record.pk] = record
+
+        self.model.objects.bulk_create(created_records, batch_size=batch_size)
+
+        if updated_records:
+            update_fields = [
+                f
+                for f in self.model._meta.concrete_fields
+                if not f.primary_key and not f.generated
+            ]
+
+            # bulk updates don't set auto_now fields like saves do
+            now = timezone.now()
+            for record in updated_records.values():
+                for field in update_fields:
+                    if getattr(field, 'auto_now', False):
+                        setattr(record, field.attname, now)
+
+            self.model.objects.bulk_update(
+                updated_records.values(),
+                [f.name for f in update_fields],
+                batch_size=batch_size,
+            )
+
+    def import_load_lookups(self, columns: list[str]) -> dict[str, Any]:
+        """
+        Loads the objects the imported columns refer to (for example brands by
+        name) before the rows are parsed. The returned lookups are passed to
+        `import_parse_field` and `import_parse_related_field` as the
+        `import_lookups` extra param
+        """
+        return {}
+
+    def _import_parse_row(
+        self,
+        columns: list[str],
+        variation_columns: dict[int, Variation],
+        row: tuple,
+        extra_params: dict[str, Any],
+        request_files: MultiValueDict,
+    ) -> dict[str, Any]:
+        record_field_values = {}
+
+        shift = 0
+        for col_idx, current_column in enumerate(columns):
+            if col_idx in self.import_excluded_fields_indexes:
+                shift += 1
+
+            if (
+                current_column not in self.import_related_fields
+                and col_idx not in variation_columns
+                and current_column != 'active_campaigns'
+            ):
+                parsed_value = self.import_parse_field(
+                    current_column,
+                    row[col_idx + shift],
+                    extra_params,
+                    request_files,
+                )
+                record_field_values[current_column] = parsed_value
+
+        if 'sku' in record_field_values:
+            # Validate SKU length based on product kind
+            validate_sku_length(
+                record_field_values['sku'], record_field_values.get('product_kind')
+            )
+
+        return record_field_values
 
-                # Get the product kind before validation
-                product_kind = record_field_values.get('product_kind')
-                if 'sku' in record_field_values:
-                    # Validate SKU length based on product kind
-                    validate_sku_length(record_field_values['sku'], product_kind)
+    def _import_prepare_records(
+        self, rows: list[tuple], errors: dict[str, list[int]]
+    ) -> list[tuple]:
+        """
+        Builds the created and updated records of the parsed rows, and
+        validates them against the existing records, which are loaded with a
+        query per batch instead of per row
+        """
+        pk_name = self.model._meta.pk.name
+
+        existing_records = {}
+        for batch in chunked(
+            [v[pk_name] for _, _, v in rows if v.get(pk_name)],
+            settings.IMPORT_BATCH_SIZE,
+        ):
+            existing_records.update(self.model.objects.in_bulk(batch))
+
+        # the values of unique fields which are already taken, mapped to the
+        # primary key of their record (or to the record itself for records
+        # created by this import), so they can be checked in memory
+        unique_fields = [
+            f.name
+            for f in self.model._meta.concrete_fields
+            if f.unique and not f.primary_key and any(f.name in v for _, _, v in rows)
+        ]
+        taken_values = {}
+        for field_name in unique_fields:
+            taken_values[field_name] = {}
+            for batch in chunked(
+                {v[field_name] for _, _, v in rows if v.get(field_name) is not None},
+                settings.IMPORT_BATCH_SIZE,
+            ):
+                taken_values[field_name].update(
+                    self.model._default_manager.filter(
+                        **{f'{field_name}__in': batch}
+                    ).values_list(field_name, 'pk')
+                )
+
+        prepared_rows = []
 
-                # the pk may or may not have been supplied
-                record_pk = record_field_values.pop(self.model._meta.pk.name, None)
+        for row_number, row, record_field_values in rows:
+            # the pk may or may not have been supplied
+            field_values = dict(record_field_values)
+            record_pk = field_values.pop(pk_name, None)
+            record = existing_records.get(record_pk) if record_pk else None
 
-                if record_pk:
+            try:
+                if record:
                     # update existing record
-                    try:
-                        record = self.model.objects.get(pk=record_pk)
-                        for k, v in record_field_values.items():
-                            setattr(record, k, v)
-                        if not record.cost_price:
-                            record.cost_price = 0
-                        record.save()
-
-                        records_updated += 1
-                    # handle the case when the product is not found
-                    except self.model.DoesNotExist:
-                        record = self.model(**record_field_values)
-                        if not record.cost_price:
-                            record.cost_price = 0
-                        record.full_clean()
-                        record.save()
-
-                        records_created += 1
+                    previous_values = {
+                        field_name: getattr(record, field_name)
+                        for field_name in unique_fields
+                    }
+
+                    # bulk updates skip the pre_save signal which resets the
+                    # stock alert when the product quantity is changed
+                    if (
+                        'product_quantity' in field_values
+                        and field_values['product_quantity'] != record.product_quantity
+                    ):
+                        record.alert_stock_sent = False
+
+                    for k, v in field_values.items():
+                        setattr(record, k, v)
+                    if not record.cost_price:
+                        record.cost_price = 0
+                    created = False
                 else:
-                    # create record
-                    record = self.model(**record_field_values)
+                    # create record (also when the supplied pk was not found)
+                    previous_values = {}
+                    record = self.model(**field_values)
                     if not record.cost_price:
                         record.cost_price = 0
-                    record.full_clean()
-                    record.save()
+                    created = True
+
+                # created and updated records are validated alike. unique
+                # values are checked below and related objects were resolved
+                # from the import lookups, so neither needs to be queried again
+                # for every row
+                record.full_clean(
+                    exclude=[
+                        k
+                        for k, v in field_values.items()
+                        if isinstance(v, models.Model)
+                    ],
+                    validate_unique=False,
+                )
 
-                    records_created += 1
+                for field_name in unique_fields:
+                    value = getattr(record, field_name)
+                    owner = taken_values[field_name].get(value)
+                    if owner is not None and owner not in (record, record.pk):
+                        raise ValidationError(
+                            {
+                                field_name: [
+                                    record.unique_error_message(
+                                        self.model, (field_name,)
+                                    )
+                                ]
+                            }
+                        )
+
+                for field_name, previous_value in previous_values.items():
+                    if taken_values[field_name].get(previous_value) == record.pk:
+                        del taken_values[field_name][previous_value]
+                for field_name in unique_fields:
+                    taken_values[field_name][getattr(record, field_name)] = (
+                        record.pk or record
+                    )
 
-                if product_kind == Product.ProductKindEnum.BUNDLE.name:
-                    sku_string = record_field_values.get('sku')
-                    record.create_bundle_items_from_sku(sku_string)
+                prepared_rows.append(
+                    (row_number, row, record_field_values, record, created)
+                )
+            except Exception as ex:
+                add_import_error(errors, ex, row_number)
+
+        return prepared_rows
+
+    def _import_save_related_fields(
+        self,
+        prepared_rows: list[tuple],
+        columns: list[str],
+        extra_params: dict[str, Any],
+        request_files: MultiValueDict,
+        errors: dict[str, list[int]],
+    ) -> None:
+        related_values = {}
 
+        for row_number, row, _, record, _ in prepared_rows:
+            try:
                 for col_idx, current_column in enumerate(columns):
                     if current_column in self.import_related_fields:
                         parsed_value = self.import_parse_related_field(
-                            current_column, row[col_idx], request_files, record
+                            current_column,
+                            row[col_idx],
+                            extra_params,
+                            request_files,
+                            record,
                         )
 
-                        record_field_multi_values[current_column] = parsed_value
+                        related_values.setdefault(current_column, {})[record] = (
+                            parsed_value
+                        )
+            except Exception as ex:
+                add_import_error(errors, ex, row_number)
+
+        # add related multi-value field values by replacing the through rows of
+        # a batch of records at once. reverse relations (for example images)
+        # are saved for all records at once by the admin
+        for field_name, values_by_record in related_values.items():
+            field = self.model._meta.get_field(field_name)
+            if not field.many_to_many:
+                self.import_save_related_objects(field_name, values_by_record)
+                continue
+
+            through_model = field.remote_field.through
+            source_field_name = field.m2m_field_name()
+            target_field_name = field.m2m_reverse_field_name()
+
+            for batch in chunked(values_by_record.items(), settings.IMPORT_BATCH_SIZE):
+                through_model.objects.filter(
+                    **{f'{source_field_name}__in': [record for record, _ in batch]}
+                ).delete()
+                through_model.objects.bulk_create(
+                    [
+                        through_model(
+                            **{source_field_name: record, target_field_name: value}
+                        )
+                        for record, values in batch
+                        for value in dict.fromkeys(values)
+                    ]
+                )
 
-                # add related multi-value field values
-                for k, v in record_field_multi_values.items():
-                    getattr(record, k).set(v)
+    def _import_save_variations(
+        self,
+        prepared_rows: list[tuple],
+        variation_columns: dict[int, Variation],
+        errors: dict[str, list[int]],
+    ) -> None:
+        """
+        Syncs the variation values of the imported variation products with the
+        variation columns. The existing variation values are loaded and the
+        changes are written with a few queries per batch of products
+        """
+        variation_rows = [
+            (row_number, row, record)
+            for row_number, row, _, record, _ in prepared_rows
+            if (record.product_kind or '').lower() == 'variation'
+        ]
+        if not variation_rows:
+            return
 
-                product_kind = row[columns.index('product_kind')]
-                if product_kind.lower() == 'variation':
-                    # Check if any variation column has data for this product
-                    has_variation_data = any(
-                        row[variation_index] for variation_index in variation_columns
-                    )
+        # like a `.first()` lookup, the value with the lowest id wins when
+        # names are shared
+        colors_by_name = {
+            color.name: color for color in ColorVariation.objects.order_by('-id')
+        }
+        texts_by_text = {
+            text.text: text for text in TextVariation.objects.order_by('-id')
+        }
+
+        for batch in chunked(variation_rows, settings.IMPORT_BATCH_SIZE):
+            records = [record for _, _, record in batch]
+
+            # Fetch existing variations from the database for the batch's
+            # products
+            product_variations = {}
+            product_variation_counts = {}
+            for product_variation in ProductVariation.objects.filter(
+                product__in=records
+            ).order_by('id'):
+                product_variations.setdefault(
+                    (product_variation.product_id, product_variation.variation_id),
+                    [],
+                ).append(product_variation)
+                product_variation_counts[product_variation.product_id] = (
+                    product_variation_counts.get(product_variation.product_id, 0) + 1
+                )
+
+            existing_values = {}
+            for (
+                product_color_variation_image
+            ) in ProductColorVariationImage.objects.filter(
+                product__in=records
+            ).select_related('color'):
+                existing_values.setdefault(
+                    (
+                        product_color_variation_image.product_id,
+                        product_color_variation_image.variation_id,
+                    ),
+                    {},
+                ).setdefault(product_color_variation_image.color.name, []).append(
+                    product_color_variation_image.id
+                )
+            for product_text_variation in ProductTextVariation.objects.filter(
+                product__in=records
+            ).select_related('text'):
+                existing_values.setdefault(
+                    (
+                        product_text_variation.product_id,
+                        product_text_variation.variation_id,
+                    ),
+                    {},
+                ).setdefault(product_text_variation.text.text, []).append(
+                    product_text_variation.id
+                )
 
-                    if not has_variation_data:
-                        # No variation data in any relevant column
-                        # delete existing variations if exists
-                        ProductVariation.objects.filter(product=record).delete()
-                        # saving the product as it does not have any variation
-                        if not record.cost_price:
-                            record.cost_price = 0
-                        record.save()
-                        # Continue on next row/product
-                        continue
-
-                    for variation_index, site_name in variation_columns.items():
-                        variation = Variation.objects.filter(
-                            site_name=site_name
-                        ).first()
+            cleared_records = []
+            synced_records = []
+            removed_ids = {
+                Variation.VariationKindEnum.COLOR.name: [],
+                Variation.VariationKindEnum.TEXT.name: [],
+            }
+            new_product_variations = []
+            new_color_variations = []
+            new_text_variations = []
+
+            for row_number, row, record in batch:
+                # Check if any variation column has data for this product
+                if not any(
+                    row[variation_index] for variation_index in variation_columns
+                ):
+                    # No variation data in any relevant column
+                    # delete existing variations if exists
+                    cleared_records.append(record)
+                    continue
+
+                row_removed_ids = []
+                row_product_variations = []
+                row_color_variations = []
+                row_text_variations = []
+
+                try:
+                    for variation_index, variation in variation_columns.items():
                         # Extract the list of variations from the current Excel row
                         list_variations = []
                         if row[variation_index]:
@@ -293,174 +707,117 @@ class ImportableExportableAdmin(TranslationAdmin):
                                 item.strip() for item in row[variation_index].split(',')
                             ]
                         new_values = set(list_variations)
-                        # Fetch existing variations from the database
-                        # for this product and variation
-                        product_variation = ProductVariation.objects.filter(
-                            product=record, variation=variation
-                        ).first()
-                        existing_values = set()
-                        if product_variation:
-                            if (
-                                product_variation.variation.variation_kind
-                                == Variation.VariationKindEnum.COLOR.name
-                            ):
-                                product_color_variation_images = (
-                                    ProductColorVariationImage.objects.filter(
-                                        product_variation=product_variation,
-                                        product=record,
-                                    ).all()
-                                )
-                                for (
-                                    product_color_variation_image
-                                ) in product_color_variation_images:
-                                    existing_values.add(
-                                        product_color_variation_image.color.name
-                                    )
-                            else:
-                                for (
-                                    text_variation
-                                ) in product_variation.variation.text_variation.all():
-                                    existing_values.add(text_variation.text)
+                        current_values = existing_values.get(
+                            (record.pk, variation.pk), {}
+                        )
 
                         # Find variations to add and remove
-                        to_add = new_values - existing_values
-                        to_remove = existing_values - new_values
+                        to_add = new_values - current_values.keys()
+                        to_remove = current_values.keys() - new_values
 
-                        # Add new variations
+                        for value in to_remove:
+                            row_removed_ids.append(
+                                (variation.variation_kind, current_values[value])
+                            )
+
+                        if not to_add:
+                            continue
+
+                        is_color = (
+                            variation.variation_kind
+                            == Variation.VariationKindEnum.COLOR.name
+                        )
                         for value in to_add:
+                            if is_color and value not in colors_by_name:
+                                raise ValueError(
+                                    f"Color variation '{value}' not found."
+                                )
+                            elif not is_color and value not in texts_by_text:
+                                raise ValueError(f"Text variation '{value}' not found.")
+
+                        existing_product_variations = product_variations.get(
+                            (record.pk, variation.pk)
+                        )
+                        if existing_product_variations:
+                            product_variation = existing_product_variations[0]
+                        else:
+                            # ProductVariation.save's limit, which bulk_create
+                            # skips
                             if (
-                                variation.variation_kind
-                                == Variation.VariationKindEnum.COLOR.name
+                                product_variation_counts.get(record.pk, 0)
+                                + len(row_product_variations)
+                                >= 5
                             ):
-                                color_variation = ColorVariation.objects.filter(
-                                    name=value
-                                ).first()
-                                if not color_variation:
-                                    raise ValueError(
-                                        f"Color variation '{value}' not found."
-                                    )
+                                raise ValueError(
+                                    f'Product {record.name} can only have up to 5 '
+                                    'variations.'
+                                )
+                            product_variation = ProductVariation(
+                                product=record, variation=variation
+                            )
+                            row_product_variations.append(product_variation)
 
-                                try:
-                                    product_variation, _ = (
-                                        ProductVariation.objects.get_or_create(
-                                            product=record, variation=variation
-                                        )
-                                    )
-                                except ProductVariation.MultipleObjectsReturned:
-                                    product_variation = ProductVariation.objects.filter(
-                                        product=record, variation=variation
-                                    ).first()
-                                short_name = ProductColorVariationImage
-                                try:
-                                    short_name.objects.get_or_create(
+                        # Add new variations
+                        for value in to_add:
+                            if is_color:
+                                row_color_variations.append(
+                                    ProductColorVariationImage(
                                         product_variation=product_variation,
                                         product=record,
                                         variation=variation,
-                                        color=color_variation,
-                                    )
-                                except short_name.MultipleObjectsReturned:
-                                    pass
-
-                            elif (
-                                variation.variation_kind
-                                == Variation.VariationKindEnum.TEXT.name
-                            ):
-                                text_variation = TextVariation.objects.filter(
-                                    text=value
-                                ).first()
-                                if not text_variation:
-                                    raise ValueError(
-                                        f"Text variation '{value}' not found."
-                                    )
-
-                                try:
-                                    product_variation, _ = (
-                                        ProductVariation.objects.get_or_create(
-                                            product=record, variation=variation
-                                        )
+                                        color=colors_by_name[value],
                                     )
-                                except ProductVariation.MultipleObjectsReturned:
-                                    product_variation = ProductVariation.objects.filter(
-                                        product=record, variation=variation
-                                    ).first()
-                                try:
-                                    ProductTextVariation.objects.get_or_create(
+                                )
+                            else:
+                                row_text_variations.append(
+                                    ProductTextVariation(
                                         product_variation=product_variation,
                                         product=record,
                                         variation=variation,
-                                        text=text_variation,
+                                        text=texts_by_text[value],
                                     )
-                                except ProductTextVariation.MultipleObjectsReturned:
-                                    pass
-
-                        # Remove stale variations
-                        for value in to_remove:
-                            if (
-                                variation.variation_kind
-                                == Variation.VariationKindEnum.COLOR.name
-                            ):
-                                color_variation = ColorVariation.objects.filter(
-                                    name=value
-                                ).first()
-                                if color_variation:
-                                    ProductColorVariationImage.objects.filter(
-                                        product_variation__product=record,
-                                        variation=variation,
-                                        color=color_variation,
-                                    ).delete()
-                            elif (
-                                variation.variation_kind
-                                == Variation.VariationKindEnum.TEXT.name
-                            ):
-                                text_variation = TextVariation.objects.filter(
-                                    text=value
-                                ).first()
-                                if text_variation:
-                                    ProductTextVariation.objects.filter(
-                                        product_variation__product=record,
-                                        variation=variation,
-                                        text=text_variation,
-                                    ).delete()
-
-                        # Clean up empty ProductVariation objects (if any)
-                        ProductVariation.objects.filter(
-                            product=record,
-                            variation=variation,
-                            productcolorvariationimage=None,
-                            producttextvariation=None,
-                        ).delete()
-
-                if not record.cost_price:
-                    record.cost_price = 0
-                record.save()
-            except ValidationError as ex:
-                for mk in ex.message_dict.keys():
-                    msg_details = ', '.join(
-                        [m.removesuffix('.') for m in ex.message_dict[mk]]
-                    )
-                    msg = f'{mk} - {msg_details}'
-
-                    if msg not in errors:
-                        errors[msg] = []
-
-                    # row_idx is 0-based, plus the first row is the field names
-                    errors[msg].append(row_idx + 2)
-            except (ValueError, Exception) as ex:
-                # ValueErrors are raised by model-specific import logic (for
-                # example product image matching). any other Exception should
-                # also be caught here and handled the same way
-                msg = str(ex)
-
-                if msg not in errors:
-                    errors[msg] = []
-
-                # row_idx is 0-based, plus the first row is the field names
-                errors[msg].append(row_idx + 2)
-
-        if errors:
-            raise RecordImportError(errors)
-        else:
-            return records_created, records_updated
+                                )
+                except Exception as ex:
+                    add_import_error(errors, ex, row_number)
+                    continue
+
+                for variation_kind, ids in row_removed_ids:
+                    removed_ids[variation_kind].extend(ids)
+                for product_variation in row_product_variations:
+                    product_variations[(record.pk, product_variation.variation_id)] = [
+                        product_variation
+                    ]
+                product_variation_counts[record.pk] = product_variation_counts.get(
+                    record.pk, 0
+                ) + len(row_product_variations)
+                new_product_variations.extend(row_product_variations)
+                new_color_variations.extend(row_color_variations)
+                new_text_variations.extend(row_text_variations)
+                synced_records.append(record)
+
+            if cleared_records:
+                ProductVariation.objects.filter(product__in=cleared_records).delete()
+
+            # Remove stale variations
+            ProductColorVariationImage.objects.filter(
+                id__in=removed_ids[Variation.VariationKindEnum.COLOR.name]
+            ).delete()
+            ProductTextVariation.objects.filter(
+                id__in=removed_ids[Variation.VariationKindEnum.TEXT.name]
+            ).delete()
+
+            ProductVariation.objects.bulk_create(new_product_variations)
+            ProductColorVariationImage.objects.bulk_create(new_color_variations)
+            ProductTextVariation.objects.bulk_create(new_text_variations)
+
+            # Clean up empty ProductVariation objects (if any)
+            if synced_records:
+                ProductVariation.objects.filter(
+                    product__in=synced_records,
+                    variation__in=variation_columns.values(),
+                    productcolorvariationimage=None,
+                    producttextvariation=None,
+                ).delete()
 
     def import_parse_field(
         self,
@@ -496,6 +853,7 @@ class ImportableExportableAdmin(TranslationAdmin):
         self,
         name: str,
         value: str,
+        extra_params: dict[str, Any],
         extra_files: MultiValueDict,
         main_record: models.Model,
     ):
@@ -505,6 +863,14 @@ class ImportableExportableAdmin(TranslationAdmin):
             'properly'
         )
 
+    def import_save_related_objects(
+        self, name: str, values_by_record: dict[models.Model, Any]
+    ) -> None:
+        """
+        Saves the parsed values of a reverse related field (for example
+        product images) of a batch of imported records, mapped to their record
+        """
+
     def _import_split_field_value(self, value: str):
         if not value:
             return []
@@ -515,23 +881,38 @@ class ImportableExportableAdmin(TranslationAdmin):
         """
         Method to write data queryset into an xlsx file.
         """
-        meta = self.model._meta
+        return get_export_response(
+            str(self.model._meta), self.iter_export_rows(queryset)
+        )
+
+    export_as_xlsx.short_description = 'Export as XLSX'
 
+    def export_as_csv(self, request, queryset):
+        """
+        Method to stream data queryset as a csv file, with the same columns as
+        the xlsx export.
+        """
+        return get_export_response(
+            str(self.model._meta),
+            self.iter_export_rows(queryset),
+            ExportFormatEnum.CSV,
+        )
+
+    export_as_csv.short_description = 'Export as CSV'
+
+    def iter_export_rows(self, queryset):
+        """
+        Yields the export header row and then a row per record, fetching the
+        records in chunks.
+        """
         if self.export_fields:
             field_names = self.export_fields
         else:
-            field_names = [field.name for field in meta.fields]
-
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename={}.xlsx'.format(meta)
+            field_names = [field.name for field in self.model._meta.fields]
 
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.append([f.split('__')[0] for f in field_names])
+        yield [f.split('__')[0] for f in field_names]
 
-        for obj in queryset:
+        for obj in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
             row = []
 
             for field_name in field_names:
@@ -550,7 +931,7 @@ class ImportableExportableAdmin(TranslationAdmin):
                         value = getattr(value, field_part)
 
                 # Handle ImageField specifically
-                if hasattr(value, 'url') and 'ImageField' in str(type(value)):
+                if isinstance(value, ImageFieldFile):
                     if value:
                         value = value.url
                     else:
@@ -558,13 +939,84 @@ class ImportableExportableAdmin(TranslationAdmin):
 
                 row.append(value)
 
-            worksheet.append(row)
+            yield row
 
-        workbook.save(response)
 
-        return response
+def add_import_error(errors: dict[str, list[int]], ex: Exception, row_number: int):
+    """
+    Adds the error messages of an exception raised while importing a row to the
+    import errors, which map each message to the numbers of the rows it was
+    raised for
+    """
+    if isinstance(ex, ValidationError) and hasattr(ex, 'error_dict'):
+        error_messages = [
+            f'{mk} - {", ".join(m.removesuffix(".") for m in mk_messages)}'
+            for mk, mk_messages in ex.message_dict.items()
+        ]
+    elif isinstance(ex, ValidationError):
+        error_messages = [', '.join(m.removesuffix('.') for m in ex.messages)]
+    else:
+        # ValueErrors are raised by model-specific import logic (for example
+        # product image matching). any other Exception should also be caught
+        # and handled the same way
+        error_messages = [str(ex)]
 
-    export_as_xlsx.short_description = 'Export as XLSX'
+    for msg in error_messages:
+        if msg not in errors:
+            errors[msg] = []
+
+        errors[msg].append(row_number)
+
+
+def iter_import_rows(worksheet, max_col: int) -> Iterator[tuple[int, tuple]]:
+    """
+    Yields the (row number, row) pairs of an imported sheet's rows after the
+    columns row, up to the first empty row
+    """
+    for row_idx, row in enumerate(
+        worksheet.iter_rows(min_row=2, max_col=max_col, values_only=True)
+    ):
+        # break if we hit an empty row since this should be th end of the
+        # sheet
+        if not row or all(v is None for v in row):
+            break
+
+        # row_idx is 0-based, plus the first row is the field names
+        yield row_idx + 2, row
+
+
+class ModelAdminImporter(Importer):
+    """
+    Runs the xlsx import of a model's importable admin in an import job, a
+    chunk of rows at a time
+    """
+
+    def __init__(self, model_admin: ImportableExportableAdmin):
+        self.model_admin = model_admin
+
+    def read_columns(self, worksheet) -> list[str]:
+        return self.model_admin.import_read_columns(worksheet)
+
+    def iter_rows(
+        self, worksheet, columns: list[str], files: MultiValueDict
+    ) -> Iterator[tuple[int, tuple]]:
+        return iter_import_rows(worksheet, len(columns) + 1)
+
+    def load_context(
+        self, import_job: ImportJob, columns: list[str], files: MultiValueDict
+    ) -> dict[str, Any]:
+        return self.model_admin.import_load_context(columns, import_job.params)
+
+    def import_rows(
+        self,
+        context: dict[str, Any],
+        rows: list[tuple[int, tuple]],
+        files: MultiValueDict,
+    ) -> tuple[int, dict[str, list[int]]]:
+        created, updated, errors = self.model_admin.import_save_rows(
+            context, rows, files
+        )
+        return created + updated, errors
 
 
 class RecordImportError(Exception):
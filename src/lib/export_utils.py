@@ -0,0 +1,156 @@
+import csv
+from enum import Enum
+import hashlib
+import json
+import tempfile
+from typing import IO, Any, Iterable, Iterator
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+
+class ExportFormatEnum(Enum):
+    XLSX = 'xlsx'
+    CSV = 'csv'
+
+
+EXPORT_CONTENT_TYPES = {
+    ExportFormatEnum.XLSX: (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ),
+    ExportFormatEnum.CSV: 'text/csv; charset=utf-8',
+}
+
+
+def get_export_format(value: str | None) -> ExportFormatEnum:
+    """
+    returns the export format of a requested format value (like the
+    `export_format` query parameter), falling back to xlsx for a missing or
+    unknown value
+    """
+
+    try:
+        return ExportFormatEnum(value)
+    except ValueError:
+        return ExportFormatEnum.XLSX
+
+
+def write_xlsx_to_temporary_file(
+    rows: Iterable[Iterable[Any]], sheet_title: str | None = None
+) -> IO[bytes]:
+    """
+    writes `rows` to a write-only xlsx workbook saved into a temporary file
+    and returns the file, rewound to its start. rows are consumed one at a
+    time and flushed by openpyxl, so passing a generator keeps memory usage
+    flat regardless of the number of rows
+    """
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=sheet_title)
+
+    for row in rows:
+        worksheet.append(row)
+
+    return save_workbook_to_temporary_file(workbook)
+
+
+def save_workbook_to_temporary_file(workbook: Workbook) -> IO[bytes]:
+    """
+    saves `workbook` into a temporary file and returns the file, rewound to its
+    start. the file is kept in memory up to `EXPORT_SPOOL_MAX_SIZE` bytes and
+    rolled over to disk beyond that, and is deleted when closed
+    """
+
+    temporary_file = tempfile.SpooledTemporaryFile(
+        max_size=settings.EXPORT_SPOOL_MAX_SIZE
+    )
+    workbook.save(temporary_file)
+    temporary_file.seek(0)
+
+    return temporary_file
+
+
+def write_csv_to_temporary_file(rows: Iterable[Iterable[Any]]) -> IO[bytes]:
+    """
+    writes `rows` as utf-8 csv into a temporary file and returns the file,
+    rewound to its start. like `save_workbook_to_temporary_file` the file is
+    rolled over to disk when large and deleted when closed
+    """
+
+    temporary_file = tempfile.SpooledTemporaryFile(
+        max_size=settings.EXPORT_SPOOL_MAX_SIZE
+    )
+
+    for line in iter_csv_lines(rows):
+        temporary_file.write(line.encode('utf-8'))
+
+    temporary_file.seek(0)
+
+    return temporary_file
+
+
+class _EchoBuffer:
+    """
+    a file-like object which returns what is written to it instead of storing
+    it, so a csv writer can be used to format rows one by one
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv_lines(rows: Iterable[Iterable[Any]]) -> Iterator[str]:
+    """
+    formats `rows` as csv lines one at a time. the first line is prefixed
+    with a byte order mark so excel detects the utf-8 encoding (required for
+    hebrew values)
+    """
+
+    writer = csv.writer(_EchoBuffer())
+
+    yield '\ufeff'
+
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def get_export_response(
+    file_name: str,
+    rows: Iterable[Iterable[Any]],
+    export_format: ExportFormatEnum = ExportFormatEnum.XLSX,
+    sheet_title: str | None = None,
+) -> FileResponse | StreamingHttpResponse:
+    """
+    returns a download response of `rows` (including the header row) in the
+    requested format. csv is streamed as rows are produced so the first bytes
+    are sent immediately, while xlsx is written to a temporary file first
+    (the xlsx format can not be streamed) and then streamed from it
+    """
+
+    if export_format == ExportFormatEnum.CSV:
+        response = StreamingHttpResponse(
+            iter_csv_lines(rows), content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
+    else:
+        response = FileResponse(
+            write_xlsx_to_temporary_file(rows, sheet_title),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+
+    response['Content-Disposition'] = (
+        f'attachment; filename="{file_name}.{export_format.value}"'
+    )
+
+    return response
+
+
+def get_export_fingerprint(*parts: Any) -> str:
+    """
+    returns a hash of an export's parameters (for example the exporter, the
+    export kind and its filters), identifying identical export requests
+    """
+
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
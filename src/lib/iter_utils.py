@@ -0,0 +1,18 @@
+from itertools import islice
+from typing import Iterable, Iterator, TypeVar
+
+
+T = TypeVar('T')
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """
+    yields lists of at most `size` items from `iterable` without materializing
+    it, so it can be used with queryset iterators to process large result sets
+    in fixed-size batches
+    """
+
+    iterator = iter(iterable)
+
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -3,11 +3,12 @@ import ssl
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 import pika
 
 from logistics.enums import LogisticsCenterEnum, LogisticsCenterMessageTypeEnum
 from logistics.models import LogisticsCenterMessage
-from logistics.tasks import process_logistics_center_message
+from logistics.tasks import process_logistics_center_messages
 
 
 class Command(BaseCommand):
@@ -16,6 +17,13 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Consumer initializing...')
 
+        # consumed messages are buffered and saved in batches, along with the
+        # channel they were delivered on and the timer which flushes a batch
+        # that didn't fill up in time
+        self.buffered_messages = []
+        self.buffer_channel = None
+        self.flush_timer = None
+
         # create a non-verifying ssl context since orian certificates are
         # self-signed
         ssl_context = ssl.create_default_context()
@@ -63,6 +71,12 @@ class Command(BaseCommand):
         connection.ioloop.stop()
 
     def handle_channel_open(self, channel):
+        # limit the unacked deliveries so that a burst is consumed in batches
+        # instead of all at once. the prefetch count should be larger than
+        # the batch size so that the next batch is delivered while the
+        # current one is saved
+        channel.basic_qos(prefetch_count=settings.ORIAN_RABBITMQ_PREFETCH_COUNT)
+
         # make sure not to auto delete or claim exclusivity, only check that
         # the queue exists
         channel.queue_declare(
@@ -118,37 +132,14 @@ class Command(BaseCommand):
         properties: pika.spec.BasicProperties,
         body: bytes,
     ):
-        self.stdout.write('Got message, parsing...')
-
-        try:
-            # parse body
-            body_json = json.loads(body)
-            receipt_number = body_json['DATACOLLECTION']['DATA']['RECEIPT']
-            self.stdout.write(f'Message receipt number: "{receipt_number}"')
-
-            # save raw message to database
-            message = LogisticsCenterMessage.objects.create(
-                center=LogisticsCenterEnum.ORIAN.name,
-                message_type=LogisticsCenterMessageTypeEnum.INBOUND_RECEIPT.name,
-                raw_body=body.decode('utf-8'),
-            )
-
-            # schedule async task to process the message
-            process_logistics_center_message.apply_async((message.pk,))
-
-            # we have handled the message and can ack it since it is in our db
-            # and can process it whenever we like
-            channel.basic_ack(delivery_tag=method.delivery_tag)
-
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Message receipt number "{receipt_number}" handled!'
-                )
-            )
-        except Exception as ex:
-            self.stderr.write(
-                f'Failed to handle message with error "{str(ex)})" and body "{body}"'
-            )
+        self.buffer_message(
+            channel,
+            method,
+            body,
+            LogisticsCenterMessageTypeEnum.INBOUND_RECEIPT,
+            'receipt number',
+            'RECEIPT',
+        )
 
     def handle_consumed_order_status_change_message(
         self,
@@ -157,35 +148,14 @@ class Command(BaseCommand):
         properties: pika.spec.BasicProperties,
         body: bytes,
     ):
-        self.stdout.write('Got message, parsing...')
-
-        try:
-            # parse body
-            body_json = json.loads(body)
-            order_id = body_json['DATACOLLECTION']['DATA']['ORDERID']
-            self.stdout.write(f'Message order id: "{order_id}"')
-
-            # save raw message to database
-            message = LogisticsCenterMessage.objects.create(
-                center=LogisticsCenterEnum.ORIAN.name,
-                message_type=LogisticsCenterMessageTypeEnum.ORDER_STATUS_CHANGE.name,
-                raw_body=body.decode('utf-8'),
-            )
-
-            # schedule async task to process the message
-            process_logistics_center_message.apply_async((message.pk,))
-
-            # we have handled the message and can ack it since it is in our db
-            # and can process it whenever we like
-            channel.basic_ack(delivery_tag=method.delivery_tag)
-
-            self.stdout.write(
-                self.style.SUCCESS(f'Message order_id "{order_id}" handled!')
-            )
-        except Exception as ex:
-            self.stderr.write(
-                f'Failed to handle message with error "{str(ex)})" and body "{body}"'
-            )
+        self.buffer_message(
+            channel,
+            method,
+            body,
+            LogisticsCenterMessageTypeEnum.ORDER_STATUS_CHANGE,
+            'order id',
+            'ORDERID',
+        )
 
     def handle_consumed_ship_order_message(
         self,
@@ -194,32 +164,111 @@ class Command(BaseCommand):
         properties: pika.spec.BasicProperties,
         body: bytes,
     ):
+        self.buffer_message(
+            channel,
+            method,
+            body,
+            LogisticsCenterMessageTypeEnum.SHIP_ORDER,
+            'order id',
+            'ORDERID',
+        )
+
+    def buffer_message(
+        self,
+        channel: pika.channel.Channel,
+        method: pika.spec.Basic.Deliver,
+        body: bytes,
+        message_type: LogisticsCenterMessageTypeEnum,
+        id_name: str,
+        id_key: str,
+    ):
+        """
+        Buffers a consumed message to be saved with the next batch, which is
+        saved once it has `ORIAN_RABBITMQ_BATCH_SIZE` messages or once its
+        first message was buffered for `ORIAN_RABBITMQ_BATCH_TIMEOUT_MS`
+        """
         self.stdout.write('Got message, parsing...')
 
         try:
             # parse body
             body_json = json.loads(body)
-            order_id = body_json['DATACOLLECTION']['DATA']['ORDERID']
-            self.stdout.write(f'Message order id: "{order_id}"')
-
-            # save raw message to database
-            message = LogisticsCenterMessage.objects.create(
-                center=LogisticsCenterEnum.ORIAN.name,
-                message_type=LogisticsCenterMessageTypeEnum.SHIP_ORDER.name,
-                raw_body=body.decode('utf-8'),
+            message_id = body_json['DATACOLLECTION']['DATA'][id_key]
+            raw_body = body.decode('utf-8')
+            self.stdout.write(f'Message {id_name}: "{message_id}"')
+        except Exception as ex:
+            self.stderr.write(
+                f'Failed to handle message with error "{str(ex)})" and body "{body}"'
             )
 
-            # schedule async task to process the message
-            process_logistics_center_message.apply_async((message.pk,))
+            # reject the message, since batches are acked together with all
+            # the messages delivered before them
+            channel.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+            return
 
-            # we have handled the message and can ack it since it is in our db
-            # and can process it whenever we like
-            channel.basic_ack(delivery_tag=method.delivery_tag)
+        self.buffered_messages.append((method.delivery_tag, message_type, raw_body))
+        self.buffer_channel = channel
 
-            self.stdout.write(
-                self.style.SUCCESS(f'Message oder id "{order_id}" handled!')
+        if len(self.buffered_messages) >= settings.ORIAN_RABBITMQ_BATCH_SIZE:
+            self.flush_messages()
+        elif not self.flush_timer:
+            self.flush_timer = channel.connection.ioloop.call_later(
+                settings.ORIAN_RABBITMQ_BATCH_TIMEOUT_MS / 1000, self.flush_messages
             )
+
+    def flush_messages(self):
+        """
+        Saves the buffered messages with a bulk insert, schedules a single task
+        to process them and acks them all at once after they are committed
+        """
+        channel = self.buffer_channel
+        buffered_messages = self.buffered_messages
+        self.buffered_messages = []
+
+        if self.flush_timer:
+            channel.connection.ioloop.remove_timeout(self.flush_timer)
+            self.flush_timer = None
+
+        if not buffered_messages:
+            return
+
+        # the last delivery tag of a batch acks (or rejects) all the messages
+        # which were delivered on the channel up to it
+        last_delivery_tag = buffered_messages[-1][0]
+
+        try:
+            with transaction.atomic():
+                # save raw messages to database
+                messages = LogisticsCenterMessage.objects.bulk_create(
+                    LogisticsCenterMessage(
+                        center=LogisticsCenterEnum.ORIAN.name,
+                        message_type=message_type.name,
+                        raw_body=raw_body,
+                    )
+                    for _, message_type, raw_body in buffered_messages
+                )
+                message_ids = [message.pk for message in messages]
+
+                # schedule async task to process the messages once they are
+                # committed
+                transaction.on_commit(
+                    lambda: process_logistics_center_messages.apply_async(
+                        (message_ids,)
+                    )
+                )
         except Exception as ex:
             self.stderr.write(
-                f'Failed to handle message with error "{str(ex)})" and body "{body}"'
+                f'Failed to save {len(buffered_messages)} messages with error '
+                f'"{str(ex)}", returning them to the queue'
+            )
+            channel.basic_nack(
+                delivery_tag=last_delivery_tag, multiple=True, requeue=True
             )
+            return
+
+        # we have handled the messages and can ack them since they are in our
+        # db and can process them whenever we like
+        channel.basic_ack(delivery_tag=last_delivery_tag, multiple=True)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{len(buffered_messages)} messages handled!')
+        )
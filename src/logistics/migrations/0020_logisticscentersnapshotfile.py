@@ -0,0 +1,52 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('logistics', '0019_purchaseorderproduct_order_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogisticsCenterSnapshotFile',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'center',
+                    models.CharField(
+                        choices=[
+                            ('ORIAN', 'Orian'),
+                            ('PICK_AND_PACK', 'Pick and Pack'),
+                        ],
+                        max_length=100,
+                    ),
+                ),
+                ('file_name', models.TextField()),
+                ('size', models.PositiveBigIntegerField()),
+                ('modified_date_time', models.DateTimeField()),
+                (
+                    'content_hash',
+                    models.CharField(blank=True, default='', max_length=64),
+                ),
+                ('synced_date_time', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('center', 'file_name'),
+                        name='unique_logistics_center_snapshot_file',
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('logistics', '0020_logisticscentersnapshotfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logisticscentermessage',
+            name='processed_date_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
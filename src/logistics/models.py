@@ -138,6 +138,9 @@ class LogisticsCenterMessage(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     raw_body = models.TextField()
+    # set once the message was processed, including messages whose state was
+    # superseded by a later message processed in the same batch
+    processed_date_time = models.DateTimeField(null=True, blank=True)
 
 
 class LogisticsCenterInboundStatus(models.Model):
@@ -236,3 +239,30 @@ class LogisticsCenterStockSnapshotLine(models.Model):
     )
     sku = models.TextField()
     quantity = models.PositiveIntegerField()
+
+
+class LogisticsCenterSnapshotFile(models.Model):
+    """
+    The manifest of the snapshot files which were synced from a logistics
+    center's server, used to download only new or changed files
+    """
+
+    center = models.CharField(
+        max_length=100,
+        choices=[(c.name, c.value) for c in LogisticsCenterEnum],
+    )
+    file_name = models.TextField()
+    size = models.PositiveBigIntegerField()
+    modified_date_time = models.DateTimeField()
+    # the sha256 hash of the file's content, which is empty for files that
+    # were stored before the manifest was kept
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    synced_date_time = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['center', 'file_name'],
+                name='unique_logistics_center_snapshot_file',
+            ),
+        ]
@@ -1,17 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
-from io import BytesIO
+import hashlib
 import logging
 import os
+import threading
 import time
-from typing import Generator
+from typing import Callable, Generator
+from xml.etree import ElementTree
 
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import storages
 from django.db import transaction
 import paramiko
-import requests
-import xmltodict
 
 from campaign.models import (
     DeliveryLocationEnum,
@@ -20,18 +21,25 @@ from campaign.models import (
     OrderProduct,
 )
 from inventory.models import Product, Supplier
+from services.http_client import http_client
+from services.rate_limit import OutboundProviderEnum, rate_limiter
 
-from ..enums import LogisticsCenterEnum
+from ..enums import LogisticsCenterEnum, LogisticsCenterMessageTypeEnum
 from ..models import (
     LogisticsCenterInboundReceipt,
     LogisticsCenterInboundReceiptLine,
     LogisticsCenterMessage,
     LogisticsCenterOrderStatus,
+    LogisticsCenterSnapshotFile,
     LogisticsCenterStockSnapshot,
-    LogisticsCenterStockSnapshotLine,
     PurchaseOrder,
     PurchaseOrderProduct,
 )
+from ..snapshots import (
+    iter_xml_snapshot_records,
+    save_stock_snapshot_lines,
+    update_products_snapshot_stock_lines,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -87,7 +95,9 @@ def _add_or_update_company(
         }
     }
 
-    response = requests.post(
+    rate_limiter.acquire(OutboundProviderEnum.ORIAN)
+    response = http_client.post(
+        OutboundProviderEnum.ORIAN,
         f'{settings.ORIAN_BASE_URL}/Company',
         # note that "bearer" must be all lower case
         headers={'Authorization': f'bearer {settings.ORIAN_API_TOKEN}'},
@@ -144,7 +154,9 @@ def add_or_update_product(product: Product) -> bool:
     product_name = product.name_he if product.name_he else product.name
     product_name = product_name.replace('"', '').replace("'", '').replace('`', '')
 
-    response = requests.post(
+    rate_limiter.acquire(OutboundProviderEnum.ORIAN)
+    response = http_client.post(
+        OutboundProviderEnum.ORIAN,
         f'{settings.ORIAN_BASE_URL}/Sku',
         # note that "bearer" must be all lower case
         headers={'Authorization': f'bearer {settings.ORIAN_API_TOKEN}'},
@@ -208,7 +220,9 @@ def add_or_update_product(product: Product) -> bool:
 def add_or_update_inbound(
     purchase_order: PurchaseOrder, inbound_date_time: datetime
 ) -> bool:
-    response = requests.post(
+    rate_limiter.acquire(OutboundProviderEnum.ORIAN)
+    response = http_client.post(
+        OutboundProviderEnum.ORIAN,
         f'{settings.ORIAN_BASE_URL}/Inbound',
         # note that "bearer" must be all lower case
         headers={'Authorization': f'bearer {settings.ORIAN_API_TOKEN}'},
@@ -385,7 +399,9 @@ def add_or_update_outbound(
         }
     }
 
-    response = requests.post(
+    rate_limiter.acquire(OutboundProviderEnum.ORIAN)
+    response = http_client.post(
+        OutboundProviderEnum.ORIAN,
         f'{settings.ORIAN_BASE_URL}/Outbound',
         # note that "bearer" must be all lower case
         headers={'Authorization': f'bearer {settings.ORIAN_API_TOKEN}'},
@@ -565,14 +581,303 @@ def handle_logistics_center_ship_order_message(
     )
 
 
-def _fetch_logistics_center_snapshots() -> (
-    Generator[tuple[str, datetime, bytes], None, None]
-):
+def handle_logistics_center_order_status_messages(
+    messages: list[tuple[LogisticsCenterMessage, dict]],
+) -> list[LogisticsCenterMessage]:
+    """
+    Handles a batch of order status change and ship order messages together.
+    The orders of all messages are loaded with one query and their status
+    records are created with a bulk insert, and each order's logistics center
+    status is then set once to its latest status, so an order which got
+    several status updates in a burst is saved once (and only if its status
+    changed). Returns the messages which could not be handled, like messages
+    of missing orders, which are left to be processed one by one
+    """
+    unhandled_messages = []
+    status_updates = []
+
+    for message, message_body in messages:
+        if message.message_type == LogisticsCenterMessageTypeEnum.SHIP_ORDER.name:
+            status_key, date_time_key = 'STATUS', 'SHIPPEDDATE'
+        else:
+            status_key, date_time_key = 'TOSTATUS', 'STATUSDATE'
+
+        try:
+            status_updates.append(
+                (
+                    message,
+                    message_body['ORDERID'],
+                    message_body[status_key],
+                    datetime.strptime(
+                        message_body[date_time_key], '%m/%d/%Y %I:%M:%S %p'
+                    ),
+                )
+            )
+        except (KeyError, ValueError):
+            unhandled_messages.append(message)
+
+    orian_order_ids = {orian_order_id for _, orian_order_id, _, _ in status_updates}
+    orders = {
+        order.order_id: order
+        for order in Order.objects.filter(order_id__in=orian_order_ids)
+    }
+
+    # try parsing the deprecated order id format. this can be removed in the
+    # future when we don't have any old orders pending updates
+    deprecated_order_ids = {
+        orian_id_to_platform_id(orian_order_id): orian_order_id
+        for orian_order_id in orian_order_ids - orders.keys()
+    }
+    deprecated_order_ids.pop(None, None)
+    if deprecated_order_ids:
+        for order in Order.objects.filter(pk__in=deprecated_order_ids):
+            orders[deprecated_order_ids[order.pk]] = order
+
+    # messages which were already handled don't create another status record
+    handled_message_ids = set(
+        LogisticsCenterOrderStatus.objects.filter(
+            logistics_center_message__in=[message for message, *_ in status_updates]
+        ).values_list('logistics_center_message_id', flat=True)
+    )
+
+    order_statuses = []
+    for message, orian_order_id, status, status_date_time in status_updates:
+        order = orders.get(orian_order_id)
+
+        if not order:
+            unhandled_messages.append(message)
+        elif message.pk not in handled_message_ids:
+            order_statuses.append(
+                LogisticsCenterOrderStatus(
+                    logistics_center_message=message,
+                    center=message.center,
+                    order=order,
+                    status=status,
+                    status_date_time=status_date_time,
+                )
+            )
+
+    LogisticsCenterOrderStatus.objects.bulk_create(order_statuses)
+
+    # the latest status of each order is the status with the latest date, since
+    # the messages might not arrive in order
+    latest_statuses = dict(
+        LogisticsCenterOrderStatus.objects.filter(
+            order__in={order.pk for order in orders.values()}
+        )
+        .order_by('status_date_time', 'id')
+        .values_list('order_id', 'status')
+    )
+
+    now = datetime.now(timezone.utc)
+    updated_orders = []
+    for order in {order.pk: order for order in orders.values()}.values():
+        latest_status = latest_statuses.get(order.pk)
+
+        if latest_status and order.logistics_center_status != latest_status:
+            # bulk updates skip Order.save, which tracks the status change time
+            order.logistics_center_status = latest_status
+            order.dc_status_last_changed = now
+            updated_orders.append(order)
+
+    Order.objects.bulk_update(
+        updated_orders, ['logistics_center_status', 'dc_status_last_changed']
+    )
+
+    logger.info(
+        f'Successfully processed {len(status_updates)} logistics center order '
+        f'status messages with {len(order_statuses)} created statuses and '
+        f'{len(updated_orders)} updated orders!'
+    )
+
+    return unhandled_messages
+
+
+def handle_logistics_center_inbound_receipt_messages(
+    messages: list[tuple[LogisticsCenterMessage, dict]],
+) -> list[LogisticsCenterMessage]:
+    """
+    Handles a batch of inbound receipt messages together. Each receipt is
+    updated once with the dates of its latest message, and the lines of all
+    messages are coalesced by receipt line so that only the latest state of
+    each purchase order line is written, with bulk queries. Returns the
+    messages which could not be handled, like messages of receipts whose
+    purchase order products are missing, which are left to be processed one
+    by one
+    """
+    unhandled_messages = []
+    receipts_data = {}
+    receipt_messages = {}
+    receipt_lines = {}
+
+    for message, message_body in messages:
+        try:
+            receipt_code = message_body['RECEIPT']
+            receipt_data = {
+                'receipt_start_date': datetime.strptime(
+                    message_body['STARTRECEIPTDATE'], '%m/%d/%Y %I:%M:%S %p'
+                ),
+                'receipt_close_date': datetime.strptime(
+                    message_body['CLOSERECEIPTDATE'], '%m/%d/%Y %I:%M:%S %p'
+                ),
+            }
+
+            # format lines - if there is only one line the LINE object is just
+            # a dict of that line, but if there are more the LINE object is a
+            # list of line dicts
+            lines_raw = message_body['LINES']['LINE']
+            lines = [
+                (
+                    int(line['RECEIPTLINE']),
+                    orian_id_to_platform_id(line['ORDERID']),
+                    line['SKU'],
+                    int(float(line['QTYRECEIVED'])),
+                )
+                for line in (lines_raw if isinstance(lines_raw, list) else [lines_raw])
+            ]
+        except (KeyError, TypeError, ValueError):
+            unhandled_messages.append(message)
+            continue
+
+        # a later message of a receipt overrides the receipt's dates and the
+        # lines of earlier messages
+        receipts_data[receipt_code] = receipt_data
+        receipt_messages.setdefault(receipt_code, []).append(message)
+        for receipt_line, purchase_order_id, sku, quantity_received in lines:
+            receipt_lines[(receipt_code, receipt_line)] = (
+                message,
+                purchase_order_id,
+                sku,
+                quantity_received,
+            )
+
+    purchase_order_products = PurchaseOrderProduct.objects.filter(
+        purchase_order_id__in={line[1] for line in receipt_lines.values()},
+        product_id__sku__in={line[2] for line in receipt_lines.values()},
+    ).values_list('purchase_order_id', 'product_id__sku', 'id')
+
+    purchase_order_product_ids = {}
+    for purchase_order_id, sku, purchase_order_product_id in purchase_order_products:
+        # a purchase order product which is not unique can't be resolved
+        purchase_order_product_ids[(purchase_order_id, sku)] = (
+            None
+            if (purchase_order_id, sku) in purchase_order_product_ids
+            else purchase_order_product_id
+        )
+
+    # receipts with a line whose purchase order product can't be resolved are
+    # not handled at all
+    for (receipt_code, _), (_, purchase_order_id, sku, _) in receipt_lines.items():
+        if not purchase_order_product_ids.get((purchase_order_id, sku)):
+            receipts_data.pop(receipt_code, None)
+
+    for receipt_code in receipt_messages.keys() - receipts_data.keys():
+        unhandled_messages.extend(receipt_messages[receipt_code])
+
+    receipts = {}
+    for receipt_code, receipt_data in receipts_data.items():
+        receipts[receipt_code], _ = (
+            LogisticsCenterInboundReceipt.objects.update_or_create(
+                center=LogisticsCenterEnum.ORIAN.name,
+                receipt_code=receipt_code,
+                defaults=receipt_data,
+                create_defaults=receipt_data,
+            )
+        )
+
+    existing_lines = {
+        (line.receipt_id, line.receipt_line): line
+        for line in LogisticsCenterInboundReceiptLine.objects.filter(
+            receipt__in=receipts.values()
+        )
+    }
+
+    created_lines = []
+    updated_lines = []
+    for (receipt_code, receipt_line), (
+        message,
+        purchase_order_id,
+        sku,
+        quantity_received,
+    ) in receipt_lines.items():
+        receipt = receipts.get(receipt_code)
+        if not receipt:
+            continue
+
+        line_data = {
+            'purchase_order_product_id': purchase_order_product_ids[
+                (purchase_order_id, sku)
+            ],
+            'quantity_received': quantity_received,
+            'logistics_center_message': message,
+        }
+        line = existing_lines.get((receipt.pk, receipt_line))
+
+        if not line:
+            created_lines.append(
+                LogisticsCenterInboundReceiptLine(
+                    receipt=receipt, receipt_line=receipt_line, **line_data
+                )
+            )
+        else:
+            for field_name, value in line_data.items():
+                setattr(line, field_name, value)
+            updated_lines.append(line)
+
+    LogisticsCenterInboundReceiptLine.objects.bulk_create(created_lines)
+    LogisticsCenterInboundReceiptLine.objects.bulk_update(
+        updated_lines,
+        ['purchase_order_product', 'quantity_received', 'logistics_center_message'],
+    )
+
+    logger.info(
+        f'Successfully processed logistics center inbound receipt messages '
+        f'with {len(receipts)} receipts, {len(created_lines)} created and '
+        f'{len(updated_lines)} updated receipt lines!'
+    )
+
+    return unhandled_messages
+
+
+def _get_snapshot_storage_file_name(snapshot_file_path: str) -> str:
+    return storages['logistics'].generate_filename(
+        os.path.join(
+            LogisticsCenterEnum.ORIAN.name,
+            snapshot_file_path,
+        ),
+    )
+
+
+def _get_snapshot_modified_date_time(
+    attributes: paramiko.SFTPAttributes,
+) -> datetime:
+    return datetime.fromtimestamp(attributes.st_mtime, timezone.utc)
+
+
+def _fetch_logistics_center_snapshots(
+    should_download: Callable[[paramiko.SFTPAttributes], bool],
+) -> Generator[tuple[paramiko.SFTPAttributes, datetime, bytes], None, None]:
     """
-    This generator connects to Orian's SFTP server, downloads snapshots and
-    yields the relevant ones
+    This generator connects to Orian's SFTP server, downloads the relevant
+    snapshots which `should_download` selects and yields them as soon as each
+    is downloaded. The snapshots are downloaded concurrently over up to
+    `ORIAN_SFTP_DOWNLOAD_WORKERS` SFTP channels of a single connection
     """
     transport = paramiko.Transport((settings.ORIAN_SFTP_HOST, settings.ORIAN_SFTP_PORT))
+    sftp_clients = []
+    thread_data = threading.local()
+
+    def download(snapshot_path: str) -> bytes:
+        # each download thread opens its own channel on the shared connection
+        if not hasattr(thread_data, 'sftp'):
+            thread_data.sftp = paramiko.SFTPClient.from_transport(transport)
+            sftp_clients.append(thread_data.sftp)
+
+        with thread_data.sftp.open(snapshot_path, 'rb') as f:
+            # request the file's blocks ahead instead of one read at a time,
+            # since the link is slow
+            f.prefetch()
+            return f.read()
 
     try:
         transport.connect(
@@ -581,74 +886,140 @@ def _fetch_logistics_center_snapshots() -> (
             settings.ORIAN_SFTP_PASSWORD,
         )
         sftp = paramiko.SFTPClient.from_transport(transport)
+        sftp_clients.append(sftp)
 
-        snapshot_files = sftp.listdir(settings.ORIAN_SFTP_SNAPSHOTS_DIR)
-
-        for snapshot_file in snapshot_files:
-            snapshot_path = f'{settings.ORIAN_SFTP_SNAPSHOTS_DIR}/{snapshot_file}'
-
-            snapshot_modified_time_epoch_seconds = sftp.stat(snapshot_path).st_mtime
-            max_snapshot_file_age_seconds = 60 * 60 * 24 * 7  # 1 week
+        max_snapshot_file_age_seconds = 60 * 60 * 24 * 7  # 1 week
 
+        # list the files with their attributes in one request instead of
+        # requesting each file's attributes
+        snapshot_files = [
+            attributes
+            for attributes in sftp.listdir_attr(settings.ORIAN_SFTP_SNAPSHOTS_DIR)
             # make sure snapshot is not too old
-            if (
-                int(time.time()) - snapshot_modified_time_epoch_seconds
-                < max_snapshot_file_age_seconds
-            ):
-                with sftp.open(snapshot_path, 'r') as f:
-                    snapshot_data = f.read()
+            if int(time.time()) - attributes.st_mtime < max_snapshot_file_age_seconds
+            and should_download(attributes)
+        ]
+
+        with ThreadPoolExecutor(
+            max_workers=settings.ORIAN_SFTP_DOWNLOAD_WORKERS
+        ) as executor:
+            downloads = {
+                executor.submit(
+                    download,
+                    f'{settings.ORIAN_SFTP_SNAPSHOTS_DIR}/{attributes.filename}',
+                ): attributes
+                for attributes in snapshot_files
+            }
+
+            for download_future in as_completed(downloads):
+                attributes = downloads[download_future]
 
                 # parse snapshot's date-time from its file name
                 snapshot_date_time = datetime.strptime(
-                    snapshot_file.split('_')[2], '%d%m%Y%H%M'
+                    attributes.filename.split('_')[2], '%d%m%Y%H%M'
                 )
 
-                yield (snapshot_file, snapshot_date_time, snapshot_data)
+                yield (attributes, snapshot_date_time, download_future.result())
     finally:
         try:
+            for sftp_client in sftp_clients:
+                sftp_client.close()
             transport.close()
         except Exception as _:
             pass
 
 
-def sync_logistics_center_snapshot_files() -> list[tuple[str, datetime]]:
+def sync_logistics_center_snapshot_files() -> (
+    Generator[tuple[str, datetime], None, None]
+):
+    """
+    This generator stores the snapshot files which are new or changed since
+    they were last synced, by their size and modified time in the synced
+    files manifest, and yields each snapshot as soon as it is stored so that
+    it can be processed while the other snapshots are still downloaded
+    """
     logger.info('Syncing with orian logistics center snapshots...')
 
+    storage = storages['logistics']
     snapshot_count = 0
-    synced_snapshots = []
+
+    synced_files = {
+        synced_file.file_name: synced_file
+        for synced_file in LogisticsCenterSnapshotFile.objects.filter(
+            center=LogisticsCenterEnum.ORIAN.name
+        )
+    }
+
+    def is_new_or_changed(attributes: paramiko.SFTPAttributes) -> bool:
+        synced_file = synced_files.get(attributes.filename)
+
+        if synced_file:
+            return synced_file.size != attributes.st_size or (
+                synced_file.modified_date_time
+                != _get_snapshot_modified_date_time(attributes)
+            )
+
+        # snapshots which were stored before the manifest was kept are
+        # recorded without downloading them again
+        if storage.exists(_get_snapshot_storage_file_name(attributes.filename)):
+            synced_files[attributes.filename] = (
+                LogisticsCenterSnapshotFile.objects.create(
+                    center=LogisticsCenterEnum.ORIAN.name,
+                    file_name=attributes.filename,
+                    size=attributes.st_size,
+                    modified_date_time=_get_snapshot_modified_date_time(attributes),
+                    synced_date_time=datetime.now(timezone.utc),
+                )
+            )
+            return False
+
+        return True
 
     for (
-        snapshot_file_path,
+        attributes,
         snapshot_date_time,
         snapshot_data,
-    ) in _fetch_logistics_center_snapshots():
+    ) in _fetch_logistics_center_snapshots(is_new_or_changed):
+        snapshot_file_path = attributes.filename
         logger.info(f'Fetched snapshot {snapshot_file_path}, saving it...')
 
-        storage = storages['logistics']
-        storage_file_name = storage.generate_filename(
-            os.path.join(
-                LogisticsCenterEnum.ORIAN.name,
-                snapshot_file_path,
-            ),
+        content_hash = hashlib.sha256(snapshot_data).hexdigest()
+        synced_file = synced_files.get(snapshot_file_path) or (
+            LogisticsCenterSnapshotFile(
+                center=LogisticsCenterEnum.ORIAN.name, file_name=snapshot_file_path
+            )
         )
+        is_changed = synced_file.content_hash != content_hash
 
-        # check if the snapshot is already in s3
-        if storage.exists(storage_file_name):
+        synced_file.size = attributes.st_size
+        synced_file.modified_date_time = _get_snapshot_modified_date_time(attributes)
+        synced_file.content_hash = content_hash
+        synced_file.synced_date_time = datetime.now(timezone.utc)
+
+        if not is_changed:
+            # the file was touched without changing its content
+            synced_file.save()
             logger.info(f'Fetched snapshot {snapshot_file_path} is already saved')
             continue
 
-        # otherwise put in s3
-        buffer = BytesIO(snapshot_data)
-        storage.save(storage_file_name, ContentFile(buffer.read()))
-        logger.info(f'Fetched snapshot {snapshot_file_path} saved!')
+        # a changed snapshot replaces the stored one
+        storage_file_name = _get_snapshot_storage_file_name(snapshot_file_path)
+        if storage.exists(storage_file_name):
+            storage.delete(storage_file_name)
 
-        synced_snapshots.append((snapshot_file_path, snapshot_date_time))
+        storage.save(storage_file_name, ContentFile(snapshot_data))
+        synced_file.save()
+        logger.info(f'Fetched snapshot {snapshot_file_path} saved!')
 
         snapshot_count += 1
 
+        yield (snapshot_file_path, snapshot_date_time)
+
     logger.info(f'Successfully synced {snapshot_count} snapshot files!')
 
-    return synced_snapshots
+
+def map_snapshot_record(element: ElementTree.Element) -> tuple[str, int]:
+    return element.findtext('SKU'), int(float(element.findtext('QTY')))
 
 
 def process_logistics_center_snapshot_file(
@@ -657,12 +1028,7 @@ def process_logistics_center_snapshot_file(
     logger.info(f'Processing orian logistics center snapshot {snapshot_file_path}...')
 
     storage = storages['logistics']
-    storage_file_name = storage.generate_filename(
-        os.path.join(
-            LogisticsCenterEnum.ORIAN.name,
-            snapshot_file_path,
-        ),
-    )
+    storage_file_name = _get_snapshot_storage_file_name(snapshot_file_path)
 
     # make sure the snapshot is already in s3
     if not storage.exists(storage_file_name):
@@ -671,13 +1037,8 @@ def process_logistics_center_snapshot_file(
         )
         return False
 
-    with storage.open(storage_file_name, 'r') as f:
-        snapshot_data = f.read()
-
-    snapshot_dict = xmltodict.parse(snapshot_data)
-
     # use transaction to make sure we have the entire snapshot in our db
-    with transaction.atomic():
+    with storage.open(storage_file_name, 'rb') as f, transaction.atomic():
         # create stock snapshot record
         stock_snapshot_data = {
             'snapshot_file_path': snapshot_file_path,
@@ -691,45 +1052,24 @@ def process_logistics_center_snapshot_file(
             create_defaults=stock_snapshot_data,
         )
 
-        # read snapshot lines list and convert value to list since with this
-        # xml format if a single line was provided there is no way of knowing
-        # it is part of an array
-        snapshot_lines = snapshot_dict['DATACOLLECTION'].get('DATA', [])
-        if not isinstance(snapshot_lines, list):
-            snapshot_lines = [snapshot_lines]
-
-        for snapshot_line in snapshot_lines:
-            # create stock snapshot line record
-            stock_snapshot_line_data = {'quantity': int(float(snapshot_line['QTY']))}
-
-            LogisticsCenterStockSnapshotLine.objects.update_or_create(
-                stock_snapshot=stock_snapshot,
-                sku=snapshot_line['SKU'],
-                defaults=stock_snapshot_line_data,
-                create_defaults=stock_snapshot_line_data,
-            )
+        # the snapshot's DATA lines are streamed from the file into the
+        # database in batches
+        created_lines, updated_lines = save_stock_snapshot_lines(
+            stock_snapshot,
+            iter_xml_snapshot_records(f, 'DATA', map_snapshot_record),
+        )
+
+        logger.info(
+            f'Successfully processed orian logistics center snapshot '
+            f'{snapshot_file_path} with {created_lines} created and '
+            f'{updated_lines} updated stock lines!'
+        )
+        logger.info("Updating products' snapshot stock values...")
+
+        updated_products = update_products_snapshot_stock_lines()
 
     logger.info(
-        f'Successfully processed orian logistics center snapshot {snapshot_file_path}!'
+        f"Successfully updated {updated_products} products' snapshot stock values!"
     )
-    logger.info("Updating products' snapshot stock values...")
-
-    # fetch the latest snapshot (the one we just processed may not be the
-    # latest)
-    latest_snapshot = LogisticsCenterStockSnapshot.objects.order_by(
-        '-snapshot_date_time'
-    )[0]
-    latest_snapshot_lines = {line.sku: line for line in latest_snapshot.lines.all()}
-
-    # new transaction for product updates
-    with transaction.atomic():
-        # update each product's logsitics snapshot stock
-        for product in Product.objects.all():
-            product.logistics_snapshot_stock_line = latest_snapshot_lines.get(
-                product.sku, None
-            )
-            product.save(update_fields=['logistics_snapshot_stock_line'])
-
-    logger.info("Successfully updated products' snapshot stock values!")
 
     return True
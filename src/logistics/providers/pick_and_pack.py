@@ -15,6 +15,8 @@ from campaign.models import (
     OrderProduct,
 )
 from inventory.models import Product
+from services.http_client import http_client
+from services.rate_limit import OutboundProviderEnum, rate_limiter
 
 from ..enums import LogisticsCenterEnum
 from ..models import (
@@ -24,10 +26,14 @@ from ..models import (
     LogisticsCenterMessage,
     LogisticsCenterOrderStatus,
     LogisticsCenterStockSnapshot,
-    LogisticsCenterStockSnapshotLine,
     PurchaseOrder,
     PurchaseOrderProduct,
 )
+from ..snapshots import (
+    save_stock_snapshot_lines,
+    summarize_snapshot_records,
+    update_products_snapshot_stock_lines,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -75,7 +81,9 @@ def add_or_update_inbound(
     if settings.PAP_VERBOSE:
         logger.info(f'pap sending inbound payload: {json.dumps(request_body)}')
 
-    response = requests.post(
+    rate_limiter.acquire(OutboundProviderEnum.PICK_AND_PACK)
+    response = http_client.post(
+        OutboundProviderEnum.PICK_AND_PACK,
         settings.PAP_INBOUND_URL,
         json=request_body,
     )
@@ -285,7 +293,9 @@ def add_or_update_outbound(
     if settings.PAP_VERBOSE:
         logger.info(f'pap sending outbound payload: {json.dumps(request_body)}')
 
-    response = requests.post(
+    rate_limiter.acquire(OutboundProviderEnum.PICK_AND_PACK)
+    response = http_client.post(
+        OutboundProviderEnum.PICK_AND_PACK,
         settings.PAP_OUTBOUND_URL,
         json=request_body,
     )
@@ -502,6 +512,10 @@ def handle_logistics_center_ship_order_message(
     )
 
 
+def map_snapshot_record(snapshot_line: dict) -> tuple[str, int]:
+    return snapshot_line['sku'], int(float(snapshot_line['quantity']))
+
+
 def handle_logistics_center_snapshot_message(
     message: LogisticsCenterMessage, message_body: dict
 ):
@@ -531,63 +545,30 @@ def handle_logistics_center_snapshot_message(
             )
         )
 
-        processed_created_lines = 0
-        processed_updated_lines = 0
-
         # summarize snapshot lines since pick and pack send us the same sku
         # multiple times in a snapshot and we need to sum the quantities
-        summarized_snapshot_lines = {}
-        for snapshot_line in snapshot_lines:
-            sku = snapshot_line['sku']
-            quantity = int(float(snapshot_line['quantity']))
-
-            if summarized_snapshot_lines.get(sku):
-                summarized_snapshot_lines[sku] += quantity
-            else:
-                summarized_snapshot_lines[sku] = quantity
-
-        for line_sku, line_quantity in summarized_snapshot_lines.items():
-            # update or create stock snapshot line record
-            stock_snapshot_line_data = {'quantity': line_quantity}
-
-            _line, created = LogisticsCenterStockSnapshotLine.objects.update_or_create(
-                stock_snapshot=stock_snapshot,
-                sku=line_sku,
-                defaults=stock_snapshot_line_data,
-                create_defaults=stock_snapshot_line_data,
-            )
-
-            if created:
-                processed_created_lines += 1
-            else:
-                processed_updated_lines += 1
+        summarized_snapshot_lines = summarize_snapshot_records(
+            map(map_snapshot_record, snapshot_lines)
+        )
 
-    logger.info(
-        f'Successfully processed pap logistics center snapshot message '
-        f'with {"created" if stock_created else "updated"} stock, '
-        f'{processed_created_lines} created and {processed_updated_lines} '
-        'updated stock lines!'
-    )
+        processed_created_lines, processed_updated_lines = save_stock_snapshot_lines(
+            stock_snapshot, summarized_snapshot_lines.items()
+        )
 
-    logger.info('Updating product snapshot stock values...')
+        logger.info(
+            f'Successfully processed pap logistics center snapshot message '
+            f'with {"created" if stock_created else "updated"} stock, '
+            f'{processed_created_lines} created and {processed_updated_lines} '
+            'updated stock lines!'
+        )
 
-    # fetch the latest snapshot (the one we just processed may not be the
-    # latest)
-    latest_snapshot = LogisticsCenterStockSnapshot.objects.order_by(
-        '-snapshot_date_time'
-    )[0]
-    latest_snapshot_lines = {line.sku: line for line in latest_snapshot.lines.all()}
+        logger.info('Updating product snapshot stock values...')
 
-    # new transaction for product updates
-    with transaction.atomic():
-        # update each product's logsitics snapshot stock
-        for product in Product.objects.all():
-            product.logistics_snapshot_stock_line = latest_snapshot_lines.get(
-                product.sku, None
-            )
-            product.save(update_fields=['logistics_snapshot_stock_line'])
+        updated_products = update_products_snapshot_stock_lines()
 
-    logger.info('Successfully updated product snapshot stock values!')
+    logger.info(
+        f'Successfully updated {updated_products} product snapshot stock values!'
+    )
 
 
 def remove_unsupported_chars(original_value: Optional[str]) -> str:
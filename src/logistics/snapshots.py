@@ -0,0 +1,144 @@
+"""
+Stock snapshot ingestion shared by the logistics center providers. Provider
+snapshots are read as streams of (sku, quantity) records, which are compared
+in batches with what is already stored so that only the snapshot lines and
+products that changed are written, with bulk queries
+"""
+
+from typing import IO, Callable, Iterable, Iterator
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db.models import Q
+
+from inventory.models import Product
+from lib.iter_utils import chunked
+
+from .models import LogisticsCenterStockSnapshot, LogisticsCenterStockSnapshotLine
+
+
+def iter_xml_snapshot_records(
+    xml_file: IO,
+    record_tag: str,
+    record_mapper: Callable[[ElementTree.Element], tuple[str, int]],
+) -> Iterator[tuple[str, int]]:
+    """
+    Incrementally parses an xml snapshot file and yields the (sku, quantity)
+    records which the provider's mapper maps the root's `record_tag` children
+    to. Each record element is discarded once mapped, so the file is never
+    held in memory as a whole
+    """
+    depth = 0
+    root = None
+
+    for event, element in ElementTree.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1:
+            if element.tag == record_tag:
+                yield record_mapper(element)
+
+            # drop the root's parsed children
+            root.clear()
+
+
+def summarize_snapshot_records(
+    records: Iterable[tuple[str, int]],
+) -> dict[str, int]:
+    """
+    Sums the quantities of records of the same sku, for providers which send
+    the same sku more than once in a snapshot
+    """
+    quantities = {}
+    for sku, quantity in records:
+        quantities[sku] = quantities.get(sku, 0) + quantity
+
+    return quantities
+
+
+def save_stock_snapshot_lines(
+    stock_snapshot: LogisticsCenterStockSnapshot,
+    records: Iterable[tuple[str, int]],
+) -> tuple[int, int]:
+    """
+    Saves a snapshot's (sku, quantity) records as its lines, in batches of
+    `LOGISTICS_SNAPSHOT_BATCH_SIZE` records. The snapshot's existing lines of
+    each batch (when a snapshot is processed again) are loaded with one query,
+    and only the missing and changed lines are written. A later record of the
+    same sku overrides an earlier one. Returns the numbers of created and
+    updated lines
+    """
+    created_count = 0
+    updated_count = 0
+
+    for batch in chunked(records, settings.LOGISTICS_SNAPSHOT_BATCH_SIZE):
+        quantities = dict(batch)
+        existing_lines = {
+            line.sku: line for line in stock_snapshot.lines.filter(sku__in=quantities)
+        }
+
+        created_lines = []
+        updated_lines = []
+        for sku, quantity in quantities.items():
+            line = existing_lines.get(sku)
+
+            if not line:
+                created_lines.append(
+                    LogisticsCenterStockSnapshotLine(
+                        stock_snapshot=stock_snapshot, sku=sku, quantity=quantity
+                    )
+                )
+            elif line.quantity != quantity:
+                line.quantity = quantity
+                updated_lines.append(line)
+
+        LogisticsCenterStockSnapshotLine.objects.bulk_create(created_lines)
+        LogisticsCenterStockSnapshotLine.objects.bulk_update(
+            updated_lines, ['quantity']
+        )
+
+        created_count += len(created_lines)
+        updated_count += len(updated_lines)
+
+    return created_count, updated_count
+
+
+def update_products_snapshot_stock_lines() -> int:
+    """
+    Links each product to its sku's line in the latest snapshot (the snapshot
+    which was just processed may not be the latest), or to no line if the
+    latest snapshot has none. Only the products whose line changes are
+    written, with a bulk update. Returns the number of updated products
+    """
+    latest_snapshot = LogisticsCenterStockSnapshot.objects.order_by(
+        '-snapshot_date_time'
+    ).first()
+
+    line_ids_by_sku = (
+        dict(latest_snapshot.lines.values_list('sku', 'id')) if latest_snapshot else {}
+    )
+
+    # products which are not linked to a line and whose sku has no line in the
+    # latest snapshot are left unchanged, so they are not loaded
+    updated_products = []
+    for product in Product.objects.filter(
+        Q(logistics_snapshot_stock_line__isnull=False) | Q(sku__in=line_ids_by_sku)
+    ).only('id', 'sku', 'logistics_snapshot_stock_line'):
+        line_id = line_ids_by_sku.get(product.sku)
+
+        if product.logistics_snapshot_stock_line_id != line_id:
+            product.logistics_snapshot_stock_line_id = line_id
+            updated_products.append(product)
+
+    Product.objects.bulk_update(
+        updated_products,
+        ['logistics_snapshot_stock_line'],
+        batch_size=settings.LOGISTICS_SNAPSHOT_BATCH_SIZE,
+    )
+
+    return len(updated_products)
@@ -1,21 +1,26 @@
 from datetime import datetime, timezone
 from io import BytesIO
+from itertools import chain
 import json
 import logging
 import os
+from typing import Iterator
 import uuid
 
 from celery import shared_task
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.base import File
 from django.core.files.storage import storages
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import QuerySet
 from django.db.models.sql.query import Query
 from openpyxl import Workbook
 import pytz
 
 from campaign.models import Order
+from export.utils import ExportTask, finish_export_job, start_export_job
 from inventory.models import Product, Variation
+from lib.export_utils import get_export_fingerprint, write_xlsx_to_temporary_file
 from services.email import send_export_download_email, send_purchase_order_email
 
 from .enums import LogisticsCenterEnum, LogisticsCenterMessageTypeEnum
@@ -27,7 +32,9 @@ from .providers.orian import (
     add_or_update_product as orian_add_or_update_product,
     add_or_update_supplier as orian_add_or_update_supplier,
     handle_logistics_center_inbound_receipt_message as orian_handle_logistics_center_inbound_receipt_message,  # noqa: E501
+    handle_logistics_center_inbound_receipt_messages as orian_handle_logistics_center_inbound_receipt_messages,  # noqa: E501
     handle_logistics_center_order_status_change_message as orian_handle_logistics_center_order_status_change_message,  # noqa: E501
+    handle_logistics_center_order_status_messages as orian_handle_logistics_center_order_status_messages,  # noqa: E501
     handle_logistics_center_ship_order_message as orian_handle_logistics_center_ship_order_message,  # noqa: E501
     process_logistics_center_snapshot_file as orian_process_logistics_center_snapshot_file,  # noqa: E501
     sync_logistics_center_snapshot_files as orian_sync_logistics_center_snapshot_files,
@@ -41,7 +48,7 @@ from .providers.pick_and_pack import (
     handle_logistics_center_ship_order_message as pick_and_pack_handle_logistics_center_ship_order_message,  # noqa: E501
     handle_logistics_center_snapshot_message as pick_and_pack_handle_logistics_center_snapshot_message,  # noqa: E501
 )
-from .utils import snake_to_title
+from .utils import get_variation_kinds_by_site_name, snake_to_title
 
 
 logger = logging.getLogger(__name__)
@@ -344,15 +351,107 @@ def process_logistics_center_message(message_id: int) -> bool:
     else:
         raise Exception(f'Unknown message type: {message.message_type}')
 
+    message.processed_date_time = datetime.now(timezone.utc)
+    message.save(update_fields=['processed_date_time'])
+
     logger.info(f'Successfully processed logistics center message {message_id}!')
     return True
 
 
+@shared_task
+def process_logistics_center_messages(message_ids: list[int]) -> bool:
+    """
+    Processes a batch of logistics center messages, for consumers which save
+    messages in batches. Orian's order status and inbound receipt messages are
+    coalesced by their orders and receipt lines and handled together, and are
+    all marked as processed with one update. The rest of the messages (and the
+    messages which could not be coalesced) are processed one by one in order,
+    and a message which fails to process is retried by its own processing task
+    """
+    logger.info(f'Processing {len(message_ids)} logistics center messages...')
+
+    coalesced_message_handlers = {
+        LogisticsCenterMessageTypeEnum.ORDER_STATUS_CHANGE.name: (
+            orian_handle_logistics_center_order_status_messages
+        ),
+        LogisticsCenterMessageTypeEnum.SHIP_ORDER.name: (
+            orian_handle_logistics_center_order_status_messages
+        ),
+        LogisticsCenterMessageTypeEnum.INBOUND_RECEIPT.name: (
+            orian_handle_logistics_center_inbound_receipt_messages
+        ),
+    }
+
+    messages_by_handler = {}
+    unhandled_message_ids = []
+    for message in LogisticsCenterMessage.objects.filter(
+        pk__in=message_ids, processed_date_time__isnull=True
+    ).order_by('pk'):
+        handler = (
+            coalesced_message_handlers.get(message.message_type)
+            if message.center == LogisticsCenterEnum.ORIAN.name
+            else None
+        )
+
+        try:
+            message_body = json.loads(message.raw_body)['DATACOLLECTION']['DATA']
+        except (KeyError, TypeError, ValueError):
+            handler = None
+
+        if handler:
+            messages_by_handler.setdefault(handler, []).append((message, message_body))
+        else:
+            unhandled_message_ids.append(message.pk)
+
+    with transaction.atomic():
+        coalesced_message_ids = []
+
+        for handler, messages in messages_by_handler.items():
+            try:
+                with transaction.atomic():
+                    handler_unhandled_message_ids = {
+                        message.pk for message in handler(messages)
+                    }
+            except Exception as ex:
+                logger.error(f'Failed coalescing logistics center messages: {ex}')
+                handler_unhandled_message_ids = {message.pk for message, _ in messages}
+
+            for message, _ in messages:
+                if message.pk in handler_unhandled_message_ids:
+                    unhandled_message_ids.append(message.pk)
+                else:
+                    coalesced_message_ids.append(message.pk)
+
+        LogisticsCenterMessage.objects.filter(pk__in=coalesced_message_ids).update(
+            processed_date_time=datetime.now(timezone.utc)
+        )
+
+    failed_message_ids = []
+    for message_id in sorted(unhandled_message_ids):
+        try:
+            process_logistics_center_message(message_id)
+        except Exception as ex:
+            logger.error(
+                f'Failed processing logistics center message {message_id}: {ex}'
+            )
+            failed_message_ids.append(message_id)
+
+            process_logistics_center_message.apply_async((message_id,), countdown=30)
+
+    logger.info(
+        f'Successfully processed {len(message_ids) - len(failed_message_ids)} '
+        'logistics center messages!'
+    )
+    return not failed_message_ids
+
+
 @shared_task
 def sync_logistics_center_snapshot_files() -> bool:
     logger.info('Syncing with logistics center snapshots...')
 
-    # only orian currently requires actively syncing snapshot files
+    # only orian currently requires actively syncing snapshot files. each
+    # snapshot is queued for processing as soon as it is stored, while the
+    # next ones are still downloaded
     synced_snapshots = orian_sync_logistics_center_snapshot_files()
 
     for snapshot_file_path, snapshot_date_time in synced_snapshots:
@@ -381,8 +480,9 @@ def process_logistics_center_snapshot_file(
 
 
 # must use pickle task serializer for the query argument
-@shared_task(serializer='pickle')
+@shared_task(serializer='pickle', bind=True, base=ExportTask)
 def export_order_summaries_as_xlsx_task(
+    self,
     order_summaries_query: Query,
     exporter_user_id: int,
     exporter_email: str,
@@ -396,6 +496,21 @@ def export_order_summaries_as_xlsx_task(
     order_summaries_queryset = EmployeeOrderProduct.objects.all()
     order_summaries_queryset.query = order_summaries_query
 
+    # an identical export which is still running is reused instead of
+    # generating it again, and sends its file to the exporter once done
+    export_job, reused = start_export_job(
+        exporter_user_id,
+        get_export_fingerprint(
+            'order summaries',
+            exporter_user_id,
+            *order_summaries_query.sql_with_params(),
+        ),
+        self.request.id,
+    )
+
+    if reused:
+        return True
+
     field_names = [
         'Name',
         'Supplier',
@@ -411,9 +526,49 @@ def export_order_summaries_as_xlsx_task(
         'Difference To Order',
     ]
 
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.append(field_names)
+    rows = _iter_order_summary_export_rows(
+        order_summaries_queryset, settings.EXPORT_CHUNK_SIZE
+    )
+
+    storage = storages['exports']
+
+    formatted_init_datetime = export_init_datetime.strftime('%Y_%m_%d_%H%M')
+    export_file_name = storage.generate_filename(
+        os.path.join(
+            str(uuid.uuid4()),
+            f'order_summaries_export_{formatted_init_datetime}.xlsx',
+        ),
+    )
+    private_export_file_name = storage.generate_filename(
+        os.path.join(
+            str(exporter_user_id),
+            export_file_name,
+        ),
+    )
+
+    # rows are written to a temporary file as they are fetched, which is then
+    # saved to the configured storage
+    with write_xlsx_to_temporary_file(chain([field_names], rows)) as export_file:
+        storage.save(private_export_file_name, File(export_file))
+
+    finish_export_job(export_job.id, export_file_name)
+
+    # send an email to the exporter with a link to download the file
+    send_export_download_email(
+        'order summaries',
+        exporter_email,
+        f'{base_export_download_url}{export_file_name}',
+    )
+
+    return True
+
+
+def _iter_order_summary_export_rows(
+    order_summaries_queryset: QuerySet, chunk_size: int
+) -> Iterator[list]:
+    # resolving the variation kind of all variation values up front instead
+    # of a query per value
+    variation_kinds = get_variation_kinds_by_site_name()
 
     for order_summary in order_summaries_queryset.values(
         'product_name',
@@ -428,21 +583,17 @@ def export_order_summaries_as_xlsx_task(
         'in_transit_stock',
         'dc_stock',
         'difference_to_order',
-    ):
-        color_variation = []
-        if order_summary['variations']:
-            for variation_type, variation_value in order_summary['variations'].items():
-                variation_instance = Variation.objects.filter(
-                    Q(site_name_he=variation_type) | Q(site_name_en=variation_type)
-                ).first()
-                if (
-                    variation_instance
-                    and Variation.VariationKindEnum.COLOR.name
-                    == variation_instance.variation_kind
-                ):
-                    color_variation.append(variation_value)
-
-        record = [
+    ).iterator(chunk_size=chunk_size):
+        color_variation = [
+            variation_value
+            for variation_type, variation_value in (
+                order_summary['variations'] or {}
+            ).items()
+            if variation_kinds.get(variation_type)
+            == Variation.VariationKindEnum.COLOR.name
+        ]
+
+        yield [
             order_summary['product_name'],
             order_summary['product_supplier'],
             order_summary['product_brand'],
@@ -456,36 +607,3 @@ def export_order_summaries_as_xlsx_task(
             order_summary['dc_stock'],
             order_summary['difference_to_order'],
         ]
-
-        worksheet.append(record)
-
-    storage = storages['exports']
-
-    formatted_init_datetime = export_init_datetime.strftime('%Y_%m_%d_%H%M')
-    export_file_name = storage.generate_filename(
-        os.path.join(
-            str(uuid.uuid4()),
-            f'order_summaries_export_{formatted_init_datetime}.xlsx',
-        ),
-    )
-    private_export_file_name = storage.generate_filename(
-        os.path.join(
-            str(exporter_user_id),
-            export_file_name,
-        ),
-    )
-
-    # save workbook to memory and then to the configured storage
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-    storage.save(private_export_file_name, ContentFile(buffer.read()))
-
-    # send an email to the exporter with a link to download the file
-    send_export_download_email(
-        'order summaries',
-        exporter_email,
-        f'{base_export_download_url}{export_file_name}',
-    )
-
-    return True
@@ -1,12 +1,17 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
 from io import BytesIO
 import json
+import os
+import time
 from unittest.mock import patch
 
 from celery.exceptions import Retry
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.storage import InMemoryStorage
 from django.test import TestCase, override_settings
+from paramiko import SFTPAttributes
 import responses
 
 from campaign.models import (
@@ -28,6 +33,7 @@ from logistics.models import (
     LogisticsCenterInboundReceiptLine,
     LogisticsCenterMessage,
     LogisticsCenterOrderStatus,
+    LogisticsCenterSnapshotFile,
     LogisticsCenterStockSnapshot,
     LogisticsCenterStockSnapshotLine,
     PurchaseOrder,
@@ -39,9 +45,11 @@ from logistics.providers.orian import (
     add_or_update_outbound as orian_add_or_update_outbound,
     add_or_update_product as orian_add_or_update_product,
     add_or_update_supplier as orian_add_or_update_supplier,
+    sync_logistics_center_snapshot_files as orian_sync_logistics_center_snapshot_files,
 )
 from logistics.tasks import (
     process_logistics_center_message,
+    process_logistics_center_messages,
     process_logistics_center_snapshot_file,
     send_order_to_logistics_center,
     sync_product_with_logistics_center,
@@ -1909,6 +1917,54 @@ class ProcessLogisticsCenterInboundReceiptMessageTestCase(TestCase):
             self.logistics_center_message_multi_line,
         )
 
+    def test_multi_line_receipt_with_update_coalesced(self):
+        process_logistics_center_messages(
+            [
+                self.logistics_center_message_multi_line.pk,
+                self.logistics_center_message_multi_line_quantity_update.pk,
+            ]
+        )
+
+        # one receipt was created with the dates of the latest message
+        self.assertEquals(len(LogisticsCenterInboundReceipt.objects.all()), 1)
+        receipt = LogisticsCenterInboundReceipt.objects.first()
+        self.assertEquals(receipt.receipt_code, 'CODE4')
+        self.assertEquals(
+            receipt.receipt_start_date,
+            datetime(year=2024, month=8, day=2, hour=13, minute=0, tzinfo=timezone.utc),
+        )
+
+        # the receipt lines were written once with the latest quantities
+        self.assertListEqual(
+            list(
+                LogisticsCenterInboundReceiptLine.objects.order_by(
+                    'receipt_line'
+                ).values_list(
+                    'receipt',
+                    'receipt_line',
+                    'purchase_order_product',
+                    'quantity_received',
+                    'logistics_center_message',
+                )
+            ),
+            [
+                (
+                    receipt.pk,
+                    1,
+                    self.purchase_order_product_2.pk,
+                    30,
+                    self.logistics_center_message_multi_line_quantity_update.pk,
+                ),
+                (
+                    receipt.pk,
+                    2,
+                    self.purchase_order_product_3.pk,
+                    150,
+                    self.logistics_center_message_multi_line_quantity_update.pk,
+                ),
+            ],
+        )
+
     def test_multi_line_receipt_with_update(self):
         process_logistics_center_message.apply_async(
             (self.logistics_center_message_multi_line.pk,)
@@ -2314,6 +2370,50 @@ class ProcessLogisticsCenterOrderStatusChangeMessageTestCase(TestCase):
         self.order.refresh_from_db()
         self.assertEquals(self.order.logistics_center_status, 'PICKED')
 
+    def test_order_status_updates_coalesced(self):
+        message_ids = [
+            self.logistics_center_message_order_picked_status_update.pk,
+            self.logistics_center_message_order_transported_status_update.pk,
+            self.logistics_center_message_order_received_late_status_update.pk,
+        ]
+
+        # the order is updated once for the whole batch with a bulk update
+        # instead of being saved for each message
+        with patch.object(Order, 'save') as mock_save:
+            self.assertTrue(process_logistics_center_messages(message_ids))
+        mock_save.assert_not_called()
+
+        # an order status record was created for each message
+        self.assertEquals(
+            set(
+                LogisticsCenterOrderStatus.objects.values_list(
+                    'logistics_center_message_id', 'status'
+                )
+            ),
+            {
+                (message_ids[0], 'PICKED'),
+                (message_ids[1], 'TRANSPORTED'),
+                (message_ids[2], 'RECEIVED'),
+            },
+        )
+
+        # logistics center status should have been set to the status with the
+        # latest status date
+        self.order.refresh_from_db()
+        self.assertEquals(self.order.logistics_center_status, 'TRANSPORTED')
+        self.assertIsNotNone(self.order.dc_status_last_changed)
+
+        # all messages were marked as processed
+        self.assertFalse(
+            LogisticsCenterMessage.objects.filter(
+                pk__in=message_ids, processed_date_time__isnull=True
+            ).exists()
+        )
+
+        # processed messages are not processed again
+        self.assertTrue(process_logistics_center_messages(message_ids))
+        self.assertEquals(len(LogisticsCenterOrderStatus.objects.all()), 3)
+
 
 class ProcessLogisticsCenterShipOrderMessageTestCase(TestCase):
     def setUp(self):
@@ -2971,3 +3071,128 @@ class ProcessLogisticsCenterSnapshotTestCase(TestCase):
         self.product_2.refresh_from_db()
         self.assertEquals(self.product_1.logistics_snapshot_stock_line, None)
         self.assertEquals(self.product_2.logistics_snapshot_stock_line, stock_line_3)
+
+
+class FakeSFTPFile(BytesIO):
+    def prefetch(self, file_size=None):
+        pass
+
+
+class FakeSFTPClient:
+    """
+    An sftp client of a snapshots directory, whose files are mapped to their
+    (content, modified time)
+    """
+
+    def __init__(self, files: dict[str, tuple[bytes, int]]):
+        self.files = files
+        self.downloaded_files = []
+
+    def listdir_attr(self, path):
+        return [
+            SFTPAttributes.from_stat(
+                os.stat_result((0, 0, 0, 0, 0, 0, len(content), 0, mtime, 0)),
+                file_name,
+            )
+            for file_name, (content, mtime) in self.files.items()
+        ]
+
+    def open(self, path, mode='r'):
+        file_name = os.path.basename(path)
+        self.downloaded_files.append(file_name)
+        return FakeSFTPFile(self.files[file_name][0])
+
+    def close(self):
+        pass
+
+
+@override_settings(ORIAN_SFTP_SNAPSHOTS_DIR='snapshots')
+class SyncLogisticsCenterSnapshotFilesTestCase(TestCase):
+    def setUp(self):
+        self.storage = InMemoryStorage()
+        self.now = int(time.time())
+        self.sftp = FakeSFTPClient(
+            {
+                'STOCK_NKS_010120251000_1.xml': (b'<DATACOLLECTION/>', self.now),
+                'STOCK_NKS_010120251100_1.xml': (b'<DATACOLLECTION/>', self.now),
+                # too old to be synced
+                'STOCK_NKS_010120240900_1.xml': (
+                    b'<DATACOLLECTION/>',
+                    self.now - 60 * 60 * 24 * 8,
+                ),
+            }
+        )
+
+        # the second snapshot was stored before the manifest was kept
+        self.storage.save(
+            'ORIAN/STOCK_NKS_010120251100_1.xml', BytesIO(b'<DATACOLLECTION/>')
+        )
+
+        for patcher in (
+            patch('logistics.providers.orian.storages', {'logistics': self.storage}),
+            patch('logistics.providers.orian.paramiko.Transport'),
+            patch(
+                'logistics.providers.orian.paramiko.SFTPClient.from_transport',
+                return_value=self.sftp,
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sync_downloads_new_and_changed_files(self):
+        self.assertListEqual(
+            list(orian_sync_logistics_center_snapshot_files()),
+            [('STOCK_NKS_010120251000_1.xml', datetime(2025, 1, 1, 10, 0))],
+        )
+        self.assertListEqual(
+            self.sftp.downloaded_files, ['STOCK_NKS_010120251000_1.xml']
+        )
+
+        # the snapshot which was already stored is recorded without its hash
+        self.assertListEqual(
+            list(
+                LogisticsCenterSnapshotFile.objects.order_by('file_name').values_list(
+                    'file_name', 'content_hash'
+                )
+            ),
+            [
+                (
+                    'STOCK_NKS_010120251000_1.xml',
+                    hashlib.sha256(b'<DATACOLLECTION/>').hexdigest(),
+                ),
+                ('STOCK_NKS_010120251100_1.xml', ''),
+            ],
+        )
+
+        # unchanged files are not downloaded again
+        self.sftp.downloaded_files = []
+        self.assertListEqual(list(orian_sync_logistics_center_snapshot_files()), [])
+        self.assertListEqual(self.sftp.downloaded_files, [])
+
+        # a touched file is downloaded but not synced again since its content
+        # is unchanged, while a changed file replaces the stored one
+        self.sftp.files['STOCK_NKS_010120251000_1.xml'] = (
+            b'<DATACOLLECTION/>',
+            self.now + 60,
+        )
+        self.sftp.files['STOCK_NKS_010120251100_1.xml'] = (
+            b'<DATACOLLECTION><DATA/></DATACOLLECTION>',
+            self.now + 60,
+        )
+
+        self.assertListEqual(
+            list(orian_sync_logistics_center_snapshot_files()),
+            [('STOCK_NKS_010120251100_1.xml', datetime(2025, 1, 1, 11, 0))],
+        )
+        self.assertCountEqual(
+            self.sftp.downloaded_files,
+            ['STOCK_NKS_010120251000_1.xml', 'STOCK_NKS_010120251100_1.xml'],
+        )
+        with self.storage.open('ORIAN/STOCK_NKS_010120251100_1.xml') as f:
+            self.assertEqual(f.read(), b'<DATACOLLECTION><DATA/></DATACOLLECTION>')
+        self.assertEqual(
+            LogisticsCenterSnapshotFile.objects.get(
+                file_name='STOCK_NKS_010120251000_1.xml'
+            ).modified_date_time,
+            datetime.fromtimestamp(self.now + 60, timezone.utc),
+        )
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from django.test import TestCase, override_settings
+
+from inventory.models import Brand, Product, Supplier
+from logistics.enums import LogisticsCenterEnum
+from logistics.models import LogisticsCenterStockSnapshot
+from logistics.providers.orian import map_snapshot_record
+from logistics.snapshots import (
+    iter_xml_snapshot_records,
+    save_stock_snapshot_lines,
+    summarize_snapshot_records,
+    update_products_snapshot_stock_lines,
+)
+
+
+class StockSnapshotsTestCase(TestCase):
+    def setUp(self):
+        supplier = Supplier.objects.create(name='supplier name')
+        brand = Brand.objects.create(name='brand name')
+        self.products = [
+            Product.objects.create(
+                brand=brand,
+                supplier=supplier,
+                name=f'product {sku} name',
+                sku=sku,
+                cost_price=50,
+                sale_price=60,
+            )
+            for sku in ['1', '2', '3']
+        ]
+
+    def _create_snapshot(self, snapshot_date_time):
+        return LogisticsCenterStockSnapshot.objects.create(
+            center=LogisticsCenterEnum.PICK_AND_PACK.name,
+            snapshot_date_time=snapshot_date_time,
+            snapshot_file_path='',
+            processed_date_time=snapshot_date_time,
+        )
+
+    def _product_lines(self):
+        return {
+            product.sku: product.logistics_snapshot_stock_line
+            for product in Product.objects.select_related(
+                'logistics_snapshot_stock_line'
+            )
+        }
+
+    def test_save_stock_snapshot_lines_writes_changed_lines(self):
+        stock_snapshot = self._create_snapshot(datetime.now(timezone.utc))
+
+        self.assertEqual(
+            save_stock_snapshot_lines(stock_snapshot, {'1': 1, '2': 2}.items()), (2, 0)
+        )
+
+        # the existing lines are loaded with one query, and only the new and
+        # changed lines are written
+        with self.assertNumQueries(3):
+            self.assertEqual(
+                save_stock_snapshot_lines(
+                    stock_snapshot, {'1': 1, '2': 5, '4': 4}.items()
+                ),
+                (1, 1),
+            )
+
+        self.assertListEqual(
+            list(stock_snapshot.lines.order_by('id').values_list('sku', 'quantity')),
+            [('1', 1), ('2', 5), ('4', 4)],
+        )
+
+    def test_iter_xml_snapshot_records(self):
+        xml_file = BytesIO(
+            b'<DATACOLLECTION><DATA><SKU>1</SKU><QTY>2.0000</QTY></DATA>'
+            b'<OTHER><DATA><SKU>5</SKU><QTY>5.0000</QTY></DATA></OTHER>'
+            b'<DATA><SKU>2</SKU><QTY>3.0000</QTY></DATA>'
+            b'<DATA><SKU>1</SKU><QTY>4.0000</QTY></DATA></DATACOLLECTION>'
+        )
+
+        # only the root's record elements are mapped to records
+        records = list(iter_xml_snapshot_records(xml_file, 'DATA', map_snapshot_record))
+
+        self.assertListEqual(records, [('1', 2), ('2', 3), ('1', 4)])
+        self.assertDictEqual(summarize_snapshot_records(records), {'1': 6, '2': 3})
+
+    @override_settings(LOGISTICS_SNAPSHOT_BATCH_SIZE=2)
+    def test_save_stock_snapshot_lines_in_batches(self):
+        stock_snapshot = self._create_snapshot(datetime.now(timezone.utc))
+
+        # a later record of a sku in another batch overrides the line of an
+        # earlier one
+        self.assertEqual(
+            save_stock_snapshot_lines(
+                stock_snapshot, iter([('1', 1), ('2', 2), ('3', 3), ('1', 4)])
+            ),
+            (3, 1),
+        )
+
+        self.assertListEqual(
+            list(stock_snapshot.lines.order_by('id').values_list('sku', 'quantity')),
+            [('1', 4), ('2', 2), ('3', 3)],
+        )
+
+    def test_update_products_snapshot_stock_lines(self):
+        first_snapshot = self._create_snapshot(datetime.now(timezone.utc))
+        save_stock_snapshot_lines(first_snapshot, {'1': 1, '2': 2}.items())
+
+        self.assertEqual(update_products_snapshot_stock_lines(), 2)
+        product_lines = self._product_lines()
+        self.assertEqual(product_lines['1'].quantity, 1)
+        self.assertEqual(product_lines['2'].quantity, 2)
+        self.assertIsNone(product_lines['3'])
+
+        # an earlier-dated snapshot changes no product
+        earlier_snapshot = self._create_snapshot(
+            datetime.now(timezone.utc) - timedelta(hours=1)
+        )
+        save_stock_snapshot_lines(earlier_snapshot, {'1': 7, '3': 8}.items())
+        self.assertEqual(update_products_snapshot_stock_lines(), 0)
+
+        # products are linked to the lines of a later snapshot, and products
+        # whose sku it doesn't have are unlinked
+        latest_snapshot = self._create_snapshot(
+            datetime.now(timezone.utc) + timedelta(hours=1)
+        )
+        save_stock_snapshot_lines(latest_snapshot, {'2': 3}.items())
+
+        self.assertEqual(update_products_snapshot_stock_lines(), 2)
+        product_lines = self._product_lines()
+        self.assertIsNone(product_lines['1'])
+        self.assertEqual(product_lines['2'].stock_snapshot, latest_snapshot)
+        self.assertEqual(product_lines['2'].quantity, 3)
+        self.assertIsNone(product_lines['3'])
@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.core.files.storage import InMemoryStorage
+from django.test import RequestFactory, TestCase
+from openpyxl import load_workbook
+
+from campaign.models import (
+    CampaignEmployee,
+    EmployeeGroupCampaignProduct,
+    Order,
+    OrderProduct,
+)
+from inventory.models import Product, Variation
+from logistics.admin import OrderSummaryAdmin
+from logistics.enums import LogisticsCenterEnum, LogisticsCenterMessageTypeEnum
+from logistics.models import EmployeeOrderProduct, LogisticsCenterMessage
+from logistics.tasks import (
+    export_order_summaries_as_xlsx_task,
+    process_logistics_center_messages,
+)
+
+
+class ExportOrderSummariesAsXlsxTaskTestCase(TestCase):
+    fixtures = ['src/fixtures/inventory.json', 'src/fixtures/campaign.json']
+
+    def setUp(self):
+        self.storage = InMemoryStorage()
+
+        Variation.objects.create(
+            variation_kind=Variation.VariationKindEnum.COLOR.name,
+            system_name_en='color',
+            site_name_en='Color',
+            site_name_he='צבע',
+        )
+        Variation.objects.create(
+            variation_kind=Variation.VariationKindEnum.TEXT.name,
+            system_name_en='size',
+            site_name_en='Size',
+            site_name_he='מידה',
+        )
+
+        Product.objects.filter(pk=1).update(
+            product_kind=Product.ProductKindEnum.VARIATION.name
+        )
+        order = Order.objects.create(
+            campaign_employee_id=CampaignEmployee.objects.get(pk=1),
+            order_date_time=datetime.now(timezone.utc),
+            cost_from_budget=0,
+            cost_added=0,
+            status=Order.OrderStatusEnum.PENDING.name,
+        )
+        OrderProduct.objects.create(
+            order_id=order,
+            product_id=EmployeeGroupCampaignProduct.objects.get(pk=1),
+            quantity=2,
+            variations={'צבע': 'Red', 'Size': 'L'},
+        )
+        OrderProduct.objects.create(
+            order_id=order,
+            product_id=EmployeeGroupCampaignProduct.objects.get(pk=2),
+            quantity=3,
+        )
+
+    def test_export_order_summaries(self):
+        request = RequestFactory().get('/admin/logistics/employeeorderproduct/')
+        queryset = OrderSummaryAdmin(EmployeeOrderProduct, AdminSite()).get_queryset(
+            request
+        )
+
+        with mock.patch('logistics.tasks.storages', {'exports': self.storage}):
+            # 2 queries for the export itself and 5 for the export job: failing
+            # timed out identical jobs, creating the job in a savepoint (3) and
+            # completing it
+            with self.assertNumQueries(7):
+                export_order_summaries_as_xlsx_task(
+                    queryset.query, 1, 'admin@test.com', 'http://test/export/'
+                )
+
+        export_file_name = self.storage.listdir('1')[0][0]
+        export_files = self.storage.listdir(f'1/{export_file_name}')[1]
+
+        with self.storage.open(f'1/{export_file_name}/{export_files[0]}') as f:
+            rows = [
+                list(row) for row in load_workbook(f).active.iter_rows(values_only=True)
+            ]
+
+        self.assertEqual(rows[0][3:5], ['SKU', 'Color Variations'])
+        self.assertListEqual(
+            sorted([row[3], row[4], row[6]] for row in rows[1:]),
+            [['sku 1', 'Red', 2], ['sku 2', None, 3]],
+        )
+
+
+class ProcessLogisticsCenterMessagesTaskTestCase(TestCase):
+    def test_process_logistics_center_messages(self):
+        message_ids = [
+            LogisticsCenterMessage.objects.create(
+                center=LogisticsCenterEnum.PICK_AND_PACK.name,
+                message_type=LogisticsCenterMessageTypeEnum.SNAPSHOT.name,
+                raw_body='{}',
+            ).pk
+            for _ in range(3)
+        ]
+
+        with mock.patch(
+            'logistics.tasks.process_logistics_center_message',
+            side_effect=[True, Exception('failed'), True],
+        ) as mock_process_message:
+            self.assertFalse(process_logistics_center_messages(message_ids))
+
+        # messages which are not coalesced are processed one by one in order,
+        # and the failed message is retried by its own task without failing
+        # the rest of the batch
+        self.assertListEqual(
+            mock_process_message.call_args_list,
+            [mock.call(message_id) for message_id in message_ids],
+        )
+        mock_process_message.apply_async.assert_called_once_with(
+            (message_ids[1],), countdown=30
+        )
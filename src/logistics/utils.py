@@ -14,6 +14,25 @@ def get_variation_type(variation):
     return var_obj.variation_kind
 
 
+def get_variation_kinds_by_site_name() -> dict[str, str]:
+    """
+    Returns the variation kind of every variation keyed by both its english
+    and hebrew site names, so the kind of many variation values can be
+    resolved with a single query. Like a `.first()` lookup, the variation with
+    the lowest id wins when a site name is shared
+    """
+
+    variation_kinds = {}
+
+    for site_name_en, site_name_he, variation_kind in Variation.objects.order_by(
+        '-id'
+    ).values_list('site_name_en', 'site_name_he', 'variation_kind'):
+        variation_kinds[site_name_en] = variation_kind
+        variation_kinds[site_name_he] = variation_kind
+
+    return variation_kinds
+
+
 def get_variations_string(variations: dict) -> str:
     variations = variations if isinstance(variations, dict) else {}
     variations_text = []
@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_ready
 
 
 # set the default django settings module for the celery app
@@ -16,3 +17,12 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # load task modules from all registered django apps
 app.autodiscover_tasks()
+
+
+@worker_ready.connect
+def run_periodic_tasks_on_worker_ready(**kwargs):
+    # the periodic tasks (which resume stale import jobs and send leftover order
+    # notifications) are also queued whenever a worker starts, so the work of a
+    # crashed worker is picked up once it is restarted
+    for schedule_entry in app.conf.beat_schedule.values():
+        app.send_task(schedule_entry['task'])
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 import os
 from pathlib import Path
 
+from boto3.s3.transfer import TransferConfig
 import environ
 
 
@@ -77,11 +78,15 @@ env = environ.Env(
     ORIAN_RABBITMQ_VIRTUAL_HOST=(str, None),
     ORIAN_RABBITMQ_USER=(str, None),
     ORIAN_RABBITMQ_PASSWORD=(str, None),
+    ORIAN_RABBITMQ_PREFETCH_COUNT=(int, 500),
+    ORIAN_RABBITMQ_BATCH_SIZE=(int, 200),
+    ORIAN_RABBITMQ_BATCH_TIMEOUT_MS=(int, 500),
     ORIAN_SFTP_HOST=(str, None),
     ORIAN_SFTP_PORT=(int, None),
     ORIAN_SFTP_USER=(str, None),
     ORIAN_SFTP_PASSWORD=(str, None),
     ORIAN_SFTP_SNAPSHOTS_DIR=(str, None),
+    ORIAN_SFTP_DOWNLOAD_WORKERS=(int, 4),
     PAP_INBOUND_URL=(str, None),
     PAP_OUTBOUND_URL=(str, None),
     PAP_CONSIGNEE=(str, None),
@@ -93,6 +98,20 @@ env = environ.Env(
     STOCK_LIMIT_THRESHOLD=(int, None),
     TAX_PERCENT=(int, 0),
     LOGISTICS_PROVIDER_AUTHENTICATION_KEYS=(dict, {}),
+    LOGISTICS_SNAPSHOT_BATCH_SIZE=(int, 1000),
+    CAMPAIGN_INVITATION_CHUNK_SIZE=(int, 200),
+    ORDER_NOTIFICATION_BATCH_SIZE=(int, 50),
+    EXPORT_CHUNK_SIZE=(int, 2000),
+    EXPORT_SHARD_SIZE=(int, 20000),
+    EXPORT_JOB_TIMEOUT=(int, 3600),
+    EXPORT_SPOOL_MAX_SIZE=(int, 5 * 1024 * 1024),
+    EXPORT_UPLOAD_PART_SIZE=(int, 8 * 1024 * 1024),
+    IMPORT_BATCH_SIZE=(int, 500),
+    IMPORT_JOB_CHUNK_SIZE=(int, 1000),
+    IMPORT_JOB_TIMEOUT=(int, 900),
+    PRODUCT_IMAGE_IMPORT_CHUNK_SIZE=(int, 100),
+    PRODUCT_IMAGE_UPLOAD_WORKERS=(int, 8),
+    RATE_LIMIT_REDIS_URL=(str, ''),
 )
 
 # read environ variables from .env file
@@ -149,6 +168,7 @@ INSTALLED_APPS = [
     'campaign',
     'payment',
     'export',
+    'imports',
     'logistics',
     'nested_inline',
     'django_admin_inline_paginator',
@@ -330,6 +350,9 @@ if DEBUG:
         'exports': {
             'BACKEND': 'django.core.files.storage.FileSystemStorage',
         },
+        'imports': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
         'logistics': {
             'BACKEND': 'django.core.files.storage.FileSystemStorage',
         },
@@ -354,6 +377,21 @@ else:
                 'location': 'exports',
                 'endpoint_url': env('DATA_STORAGE_ENDPOINT_URL'),
                 'querystring_expire': 60,
+                # export files are uploaded from disk in parts of this size
+                # instead of being read into memory in one piece
+                'transfer_config': TransferConfig(
+                    multipart_threshold=env('EXPORT_UPLOAD_PART_SIZE'),
+                    multipart_chunksize=env('EXPORT_UPLOAD_PART_SIZE'),
+                    max_concurrency=4,
+                ),
+            },
+        },
+        'imports': {
+            'BACKEND': 'storages.backends.s3.S3Storage',
+            'OPTIONS': {
+                'bucket_name': env('DATA_STORAGE_BUCKET_NAME'),
+                'location': 'imports',
+                'endpoint_url': env('DATA_STORAGE_ENDPOINT_URL'),
             },
         },
         'logistics': {
@@ -443,6 +481,63 @@ CELERY_TASK_ALWAYS_EAGER = env('CELERY_TASK_ALWAYS_EAGER')
 CELERY_TASK_EAGER_PROPAGATES = True
 CELERY_ACCEPT_CONTENT = ['json', 'pickle']
 
+# the number of employees each campaign invitation (welcome message) task
+# handles. invitations are fanned out to one task per chunk of employees
+CAMPAIGN_INVITATION_CHUNK_SIZE = env('CAMPAIGN_INVITATION_CHUNK_SIZE')
+
+# order notifications (e.g. the order confirmation email) are written to an
+# outbox table with the order and sent by a dispatcher task in batches of this
+# size. the dispatcher is triggered when an order is committed and is also
+# scheduled periodically to pick up anything left over (e.g. failed sends)
+ORDER_NOTIFICATION_BATCH_SIZE = env('ORDER_NOTIFICATION_BATCH_SIZE')
+
+# the periodic tasks, run by a single `celery -A np_cms beat` process (see the
+# readme) and also queued whenever a worker starts
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-order-notifications': {
+        'task': 'campaign.tasks.dispatch_order_notifications',
+        'schedule': 60,
+    },
+    'resume-stale-import-jobs': {
+        'task': 'imports.tasks.resume_stale_import_jobs',
+        'schedule': 60,
+    },
+}
+
+# the number of records fetched per query by background exports, which stream
+# their rows to a temporary file instead of loading everything in memory
+EXPORT_CHUNK_SIZE = env('EXPORT_CHUNK_SIZE')
+
+# the number of orders above which an orders export is split into shards of
+# this size which are exported by parallel workers
+EXPORT_SHARD_SIZE = env('EXPORT_SHARD_SIZE')
+
+# identical exports (same exporter and parameters) are reused instead of being
+# generated again while running. running exports are assumed to have crashed
+# after this number of seconds
+EXPORT_JOB_TIMEOUT = env('EXPORT_JOB_TIMEOUT')
+
+# the size in bytes up to which export files are kept in memory before being
+# rolled over to a temporary file on disk
+EXPORT_SPOOL_MAX_SIZE = env('EXPORT_SPOOL_MAX_SIZE')
+
+# the number of records admin xlsx imports write (and load the existing
+# related objects of) per bulk query
+IMPORT_BATCH_SIZE = env('IMPORT_BATCH_SIZE')
+
+# admin xlsx imports are stored and imported by a background job, which
+# commits its progress every chunk of this number of rows. jobs which did not
+# commit a chunk for the timeout (in seconds) are assumed to have crashed and
+# are resumed from their last committed chunk
+IMPORT_JOB_CHUNK_SIZE = env('IMPORT_JOB_CHUNK_SIZE')
+IMPORT_JOB_TIMEOUT = env('IMPORT_JOB_TIMEOUT')
+
+# uploaded product image directories are imported by a background job in
+# chunks of this number of images, each chunk's images being stored by up to
+# this number of concurrent uploads
+PRODUCT_IMAGE_IMPORT_CHUNK_SIZE = env('PRODUCT_IMAGE_IMPORT_CHUNK_SIZE')
+PRODUCT_IMAGE_UPLOAD_WORKERS = env('PRODUCT_IMAGE_UPLOAD_WORKERS')
+
 DATA_UPLOAD_MAX_NUMBER_FILES = 300
 DATA_UPLOAD_MAX_NUMBER_FIELDS = env('DATA_UPLOAD_MAX_NUMBER_FIELDS')
 
@@ -466,6 +561,13 @@ ORIAN_RABBITMQ_PORT = env('ORIAN_RABBITMQ_PORT')
 ORIAN_RABBITMQ_VIRTUAL_HOST = env('ORIAN_RABBITMQ_VIRTUAL_HOST')
 ORIAN_RABBITMQ_USER = env('ORIAN_RABBITMQ_USER')
 ORIAN_RABBITMQ_PASSWORD = env('ORIAN_RABBITMQ_PASSWORD')
+# the orian consumer saves consumed messages in batches of up to this number of
+# messages, waiting up to the timeout (in milliseconds) for a batch to fill
+# up. the prefetch count is the number of unacked messages the broker
+# delivers, which should be larger than the batch size
+ORIAN_RABBITMQ_PREFETCH_COUNT = env('ORIAN_RABBITMQ_PREFETCH_COUNT')
+ORIAN_RABBITMQ_BATCH_SIZE = env('ORIAN_RABBITMQ_BATCH_SIZE')
+ORIAN_RABBITMQ_BATCH_TIMEOUT_MS = env('ORIAN_RABBITMQ_BATCH_TIMEOUT_MS')
 ORIAN_SFTP_HOST = env('ORIAN_SFTP_HOST')
 ORIAN_SFTP_PORT = env('ORIAN_SFTP_PORT')
 ORIAN_SFTP_USER = env('ORIAN_SFTP_USER')
@@ -478,6 +580,9 @@ if PREFIXED_ORIAN_SFTP_PASSWORD:
 else:
     ORIAN_SFTP_PASSWORD = PREFIXED_ORIAN_SFTP_PASSWORD
 ORIAN_SFTP_SNAPSHOTS_DIR = env('ORIAN_SFTP_SNAPSHOTS_DIR')
+# the number of snapshot files downloaded concurrently, each over its own
+# channel of the sftp connection
+ORIAN_SFTP_DOWNLOAD_WORKERS = env('ORIAN_SFTP_DOWNLOAD_WORKERS')
 
 PAP_INBOUND_URL = env('PAP_INBOUND_URL')
 PAP_OUTBOUND_URL = env('PAP_OUTBOUND_URL')
@@ -507,3 +612,35 @@ except ValueError:
     TAX_PERCENT = 0
 
 LOGISTICS_PROVIDER_AUTHENTICATION_KEYS = env('LOGISTICS_PROVIDER_AUTHENTICATION_KEYS')
+
+# the number of stock snapshot lines and products written per bulk query when
+# a logistics center stock snapshot is processed
+LOGISTICS_SNAPSHOT_BATCH_SIZE = env('LOGISTICS_SNAPSHOT_BATCH_SIZE')
+
+# outbound provider calls are rate limited with a token bucket per provider.
+# `rate` is the number of calls per second and `capacity` is the maximum burst
+# size. buckets are shared between processes through redis if a url is set,
+# and are kept in memory per process otherwise. keys must match the names of
+# `services.rate_limit.OutboundProviderEnum`
+RATE_LIMIT_REDIS_URL = env('RATE_LIMIT_REDIS_URL')
+OUTBOUND_RATE_LIMITS = {
+    'SMS': {'rate': 10, 'capacity': 20},
+    'EMAIL': {'rate': 14, 'capacity': 14},
+    'GROW': {'rate': 5, 'capacity': 10},
+    'ORIAN': {'rate': 5, 'capacity': 10},
+    'PICK_AND_PACK': {'rate': 5, 'capacity': 10},
+}
+
+# outbound provider calls are sent with a session per provider, which keeps a
+# pool of up to `pool_size` keep-alive connections. calls time out after
+# `connect_timeout` and `read_timeout` seconds and are retried up to `retries`
+# times with exponential backoff from `backoff_factor` seconds, and a
+# provider's calls are rejected for `recovery_timeout` seconds after
+# `failure_threshold` consecutive failures. a provider's entry overrides the
+# defaults in `services.http_client.DEFAULT_HTTP_CLIENT_CONFIG`
+OUTBOUND_HTTP_CLIENTS = {
+    'SMS': {'read_timeout': 15},
+    'GROW': {'read_timeout': 20},
+    'ORIAN': {'read_timeout': 60},
+    'PICK_AND_PACK': {'read_timeout': 60},
+}
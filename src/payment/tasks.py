@@ -2,10 +2,11 @@ from datetime import datetime
 import logging
 
 from celery import shared_task
+from django.db import transaction
 
+from campaign.tasks import enqueue_order_confirmation_email
 from payment.models import PaymentInformation
 from payment.utils import approve_transaction
-from services.email import send_order_confirmation_email
 
 
 logger = logging.getLogger(__name__)
@@ -85,12 +86,12 @@ def process_payment(payload_data: dict[str, str]) -> bool:
                     ]
                 )
 
-                # update order status
-                employee_order.status = employee_order.OrderStatusEnum.PENDING.name
-                employee_order.save(update_fields=['status'])
-
-                # send order confirmation email to employee
-                send_order_confirmation_email(employee_order)
+                # update order status and queue the order confirmation email
+                # to the employee
+                with transaction.atomic():
+                    employee_order.status = employee_order.OrderStatusEnum.PENDING.name
+                    employee_order.save(update_fields=['status'])
+                    enqueue_order_confirmation_email(employee_order)
             else:
                 logger.info(f'payment approval failed for process {process_id}')
         else:
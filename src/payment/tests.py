@@ -14,6 +14,7 @@ from campaign.models import (
     Employee,
     EmployeeGroup,
     Order,
+    OrderNotificationOutbox,
     Organization,
 )
 from inventory.models import Brand, Category, Product, Supplier, Tag
@@ -538,3 +539,13 @@ class PaymentWebhookViewTest(TestCase):
         self.order.refresh_from_db()
         self.assertEqual(self.payment_info.is_paid, True)
         self.assertEqual(self.order.status, Order.OrderStatusEnum.PENDING.name)
+
+        # the order confirmation email was queued
+        self.assertListEqual(
+            list(
+                OrderNotificationOutbox.objects.filter(order=self.order).values_list(
+                    'kind', flat=True
+                )
+            ),
+            ['ORDER_CONFIRMATION_EMAIL'],
+        )
@@ -5,6 +5,13 @@ from django.conf import settings
 import requests
 
 from campaign.models import Order
+from services.http_client import http_client
+from services.rate_limit import (
+    OutboundProviderEnum,
+    RateLimitExceeded,
+    RateLimitPriorityEnum,
+    rate_limiter,
+)
 
 from .models import PaymentInformation
 
@@ -47,9 +54,22 @@ def initiate_payment(
         payload['pageField[fullName]'] = payer_full_name
         payload['pageField[phone]'] = payer_phone_number
 
-    response = requests.post(
-        f'{settings.GROW_BASE_URL}/createPaymentProcess', data=payload
-    )
+    try:
+        rate_limiter.acquire(OutboundProviderEnum.GROW, RateLimitPriorityEnum.CRITICAL)
+    except RateLimitExceeded as ex:
+        logger.error(f'initiate_payment failed to create payment process: {ex}')
+        return None
+
+    try:
+        response = http_client.post(
+            OutboundProviderEnum.GROW,
+            f'{settings.GROW_BASE_URL}/createPaymentProcess',
+            data=payload,
+        )
+    except requests.RequestException as ex:
+        logger.error(f'initiate_payment failed to create payment process: {ex}')
+        return None
+
     response_json = response.json()
 
     if response_json.get('status') != 1:
@@ -219,9 +239,22 @@ def approve_transaction(
         'processToken': process_token,
     }
 
-    response = requests.post(
-        f'{settings.GROW_BASE_URL}/approveTransaction', data=payload
-    )
+    try:
+        rate_limiter.acquire(OutboundProviderEnum.GROW, RateLimitPriorityEnum.CRITICAL)
+    except RateLimitExceeded as ex:
+        logger.error(f'approve_transaction failed to approve transaction: {ex}')
+        return False
+
+    try:
+        response = http_client.post(
+            OutboundProviderEnum.GROW,
+            f'{settings.GROW_BASE_URL}/approveTransaction',
+            data=payload,
+        )
+    except requests.RequestException as ex:
+        logger.error(f'approve_transaction failed to approve transaction: {ex}')
+        return False
+
     response_json = response.json()
 
     if response_json.get('status') != 1:
@@ -9,6 +9,8 @@ from django.template.loader import get_template
 from campaign.models import Order
 from logistics.models import PurchaseOrder
 
+from .rate_limit import OutboundProviderEnum, RateLimitPriorityEnum, rate_limiter
+
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +28,7 @@ def send_mail(
     plaintext_email_template: Optional[Union[str, bytes, os.PathLike]] = None,
     html_email_template: Optional[Union[str, bytes, os.PathLike]] = None,
     fail_silently: Optional[bool] = False,
+    priority: RateLimitPriorityEnum = RateLimitPriorityEnum.TRANSACTIONAL,
 ) -> bool:
     if reply_to is None:
         reply_to = [settings.REPLY_TO_EMAIL]
@@ -67,6 +70,7 @@ def send_mail(
 
     try:
         print(msg.__dict__)
+        rate_limiter.acquire(OutboundProviderEnum.EMAIL, priority)
         msg.send(fail_silently=fail_silently)
         return True
     except Exception as error:
@@ -90,6 +94,7 @@ def send_reset_password_email(email: str, reset_password_link: str):
         context=context,
         plaintext_email_template='emails/reset_password.txt',
         html_email_template='emails/reset_password.html',
+        priority=RateLimitPriorityEnum.CRITICAL,
     )
     return res
 
@@ -103,6 +108,7 @@ def send_otp_token_email(email: str, otp_token: str):
         context=context,
         plaintext_email_template='emails/otp_token.txt',
         html_email_template='emails/otp_token.html',
+        priority=RateLimitPriorityEnum.CRITICAL,
     )
     return res
 
@@ -119,6 +125,7 @@ def send_campaign_welcome_email(email: str, subject: str, body: str, link_url: s
         context=context,
         plaintext_email_template='emails/campaign_welcome.txt',
         html_email_template='emails/campaign_welcome.html',
+        priority=RateLimitPriorityEnum.BULK,
     )
     return res
 
@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .rate_limit import OutboundProviderEnum
+
+
+logger = logging.getLogger(__name__)
+
+
+# the configuration of a provider's client, which the provider's entry in the
+# `OUTBOUND_HTTP_CLIENTS` setting overrides. timeouts are in seconds
+DEFAULT_HTTP_CLIENT_CONFIG = {
+    'connect_timeout': 5,
+    'read_timeout': 30,
+    'pool_size': 10,
+    'retries': 2,
+    'backoff_factor': 0.5,
+    'failure_threshold': 5,
+    'recovery_timeout': 30,
+}
+
+# responses with these statuses are retried, but only for idempotent methods.
+# other methods (like the providers' POST calls) are only retried when the
+# connection failed, so a request is never sent twice
+RETRY_STATUSES = (502, 503, 504)
+
+
+class CircuitBreakerOpen(requests.RequestException):
+    def __init__(self, provider: OutboundProviderEnum):
+        self.provider = provider
+
+        super().__init__(f'Circuit breaker is open for {provider.value}')
+
+
+class CircuitBreaker:
+    """
+    Process-local circuit breaker of a provider. It opens once the provider
+    failed `failure_threshold` consecutive calls (by connection errors,
+    timeouts or server errors), and rejects calls while it is open so that a
+    provider which is down doesn't hold workers until their calls time out.
+    After `recovery_timeout` seconds calls are let through again, and the first
+    failure opens it again while a success closes it.
+    """
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    def allow(self) -> bool:
+        with self._lock:
+            return (
+                self._opened_at is None
+                or time.monotonic() - self._opened_at >= self.recovery_timeout
+            )
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> bool:
+        """
+        Records a failed call and returns whether the circuit breaker opened
+        """
+
+        with self._lock:
+            self._failures += 1
+
+            if self._failures < self.failure_threshold:
+                return False
+
+            self._opened_at = time.monotonic()
+            return True
+
+
+class ProviderHttpClient:
+    """
+    HTTP client shared by all outbound provider calls. Each provider has its
+    own session, configured by the `OUTBOUND_HTTP_CLIENTS` setting, which
+    keeps a pool of keep-alive connections to the provider, bounds each call
+    with connect and read timeouts, retries failed calls with backoff and
+    guards the provider with a circuit breaker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._circuit_breakers = {}
+
+    def request(
+        self, provider: OutboundProviderEnum, method: str, url: str, **kwargs
+    ) -> requests.Response:
+        """
+        Sends a request to the provider with the provider's session. Raises
+        `CircuitBreakerOpen` without sending the request if the provider's
+        circuit breaker is open, and the `requests` errors of failed calls
+        """
+
+        session, circuit_breaker, config = self._get_session(provider)
+
+        if not circuit_breaker.allow():
+            raise CircuitBreakerOpen(provider)
+
+        kwargs.setdefault(
+            'timeout', (config['connect_timeout'], config['read_timeout'])
+        )
+
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            self._record_failure(provider, circuit_breaker)
+            raise
+
+        if response.status_code >= 500:
+            self._record_failure(provider, circuit_breaker)
+        else:
+            circuit_breaker.record_success()
+
+        return response
+
+    def get(self, provider: OutboundProviderEnum, url: str, **kwargs):
+        return self.request(provider, 'GET', url, **kwargs)
+
+    def post(self, provider: OutboundProviderEnum, url: str, **kwargs):
+        return self.request(provider, 'POST', url, **kwargs)
+
+    def reset(self):
+        """
+        Closes the sessions and clears the circuit breakers, so that they are
+        created again with the current settings
+        """
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions = {}
+            self._circuit_breakers = {}
+
+    def _record_failure(
+        self, provider: OutboundProviderEnum, circuit_breaker: CircuitBreaker
+    ):
+        if circuit_breaker.record_failure():
+            logger.warning(
+                f'opened {provider.value} circuit breaker for '
+                f'{circuit_breaker.recovery_timeout}s after '
+                f'{circuit_breaker.failure_threshold} failed calls'
+            )
+
+    def _get_session(
+        self, provider: OutboundProviderEnum
+    ) -> tuple[requests.Session, CircuitBreaker, dict]:
+        config = {
+            **DEFAULT_HTTP_CLIENT_CONFIG,
+            **settings.OUTBOUND_HTTP_CLIENTS.get(provider.name, {}),
+        }
+
+        with self._lock:
+            if provider not in self._sessions:
+                adapter = HTTPAdapter(
+                    pool_maxsize=config['pool_size'],
+                    max_retries=Retry(
+                        total=config['retries'],
+                        backoff_factor=config['backoff_factor'],
+                        status_forcelist=RETRY_STATUSES,
+                        raise_on_status=False,
+                    ),
+                )
+
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+
+                self._sessions[provider] = session
+                self._circuit_breakers[provider] = CircuitBreaker(
+                    config['failure_threshold'], config['recovery_timeout']
+                )
+
+            return self._sessions[provider], self._circuit_breakers[provider], config
+
+
+http_client = ProviderHttpClient()
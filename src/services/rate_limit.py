@@ -0,0 +1,290 @@
+from enum import Enum
+import logging
+import threading
+import time
+
+from django.conf import settings
+import redis
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundProviderEnum(Enum):
+    SMS = 'ActiveTrail SMS'
+    EMAIL = 'SES email'
+    GROW = 'Grow payments'
+    ORIAN = 'Orian'
+    PICK_AND_PACK = 'Pick and Pack'
+
+
+class RateLimitPriorityEnum(Enum):
+    """
+    Priority classes for outbound calls. A lower priority call may only take a
+    token while enough tokens are left in the bucket for higher priority
+    calls (the reserve), so that for instance OTP messages are not delayed by
+    a burst of campaign invitations.
+    """
+
+    CRITICAL = 'Critical'
+    TRANSACTIONAL = 'Transactional'
+    BULK = 'Bulk'
+
+
+# the share of a bucket's capacity which must remain after a call of each
+# priority takes its token, and the maximum number of seconds it waits for a
+# token before being rejected
+PRIORITY_RESERVE_FRACTIONS = {
+    RateLimitPriorityEnum.CRITICAL: 0,
+    RateLimitPriorityEnum.TRANSACTIONAL: 0.2,
+    RateLimitPriorityEnum.BULK: 0.5,
+}
+PRIORITY_MAX_WAIT_SECONDS = {
+    RateLimitPriorityEnum.CRITICAL: 5,
+    RateLimitPriorityEnum.TRANSACTIONAL: 30,
+    RateLimitPriorityEnum.BULK: 120,
+}
+
+# refill the bucket and take a token atomically. returns the number of seconds
+# to wait before trying again, or 0 if the token was taken. the value is
+# returned as a string since lua numbers are truncated to integers in replies
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local redis_time = redis.call('TIME')
+local now = tonumber(redis_time[1]) + tonumber(redis_time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1])
+local updated_at = tonumber(state[2])
+if tokens == nil or updated_at == nil then
+    tokens = capacity
+    updated_at = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+
+local wait = 0
+if tokens - 1 >= reserve then
+    tokens = tokens - 1
+else
+    wait = (1 + reserve - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+
+return tostring(wait)
+"""
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, provider: OutboundProviderEnum, priority: RateLimitPriorityEnum):
+        self.provider = provider
+        self.priority = priority
+
+        super().__init__(
+            f'Rate limit exceeded for {provider.value} ({priority.value} priority)'
+        )
+
+
+class InMemoryTokenBuckets:
+    """
+    Process-local token buckets used when redis is not configured or not
+    available. Limits are then only enforced per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key: str, rate: float, capacity: float, reserve: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - updated_at) * rate)
+
+            wait = 0
+            if tokens - 1 >= reserve:
+                tokens -= 1
+            else:
+                wait = (1 + reserve - tokens) / rate
+
+            self._buckets[key] = (tokens, now)
+
+            return wait
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter shared by all outbound provider clients. Each
+    provider has its own bucket, configured by the `OUTBOUND_RATE_LIMITS`
+    setting, which is shared between all processes through redis if
+    `RATE_LIMIT_REDIS_URL` is set.
+    """
+
+    key_prefix = 'rate_limit'
+
+    def __init__(self):
+        self._redis_client = None
+        self._redis_script = None
+        self._memory_buckets = InMemoryTokenBuckets()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {}
+
+    def acquire(
+        self,
+        provider: OutboundProviderEnum,
+        priority: RateLimitPriorityEnum = RateLimitPriorityEnum.TRANSACTIONAL,
+        max_wait: float | None = None,
+    ) -> float:
+        """
+        Blocks until a token is available for the provider and returns the
+        number of seconds waited. Raises `RateLimitExceeded` if no token is
+        available within `max_wait` seconds (defaults to the priority's max
+        wait time).
+        """
+
+        limits = settings.OUTBOUND_RATE_LIMITS.get(provider.name)
+        if not limits:
+            # unlimited provider
+            return 0
+
+        rate = limits['rate']
+        capacity = limits['capacity']
+        # a single token must always be obtainable, even for small buckets
+        reserve = min(capacity * PRIORITY_RESERVE_FRACTIONS[priority], capacity - 1)
+
+        if max_wait is None:
+            max_wait = PRIORITY_MAX_WAIT_SECONDS[priority]
+
+        start_time = time.monotonic()
+        deadline = start_time + max_wait
+        slept = False
+
+        while True:
+            wait = self._take(provider, rate, capacity, reserve)
+            now = time.monotonic()
+
+            if not wait:
+                waited = now - start_time if slept else 0
+                self._record(provider, priority, 'acquired', waited)
+
+                if waited >= 1:
+                    logger.info(
+                        f'waited {waited:.2f}s for {provider.value} rate limit '
+                        f'({priority.value} priority)'
+                    )
+
+                return waited
+
+            if now + wait > deadline:
+                self._record(provider, priority, 'rejected', now - start_time)
+                logger.warning(
+                    f'rejected {provider.value} call after waiting '
+                    f'{now - start_time:.2f}s for rate limit '
+                    f'({priority.value} priority)'
+                )
+                raise RateLimitExceeded(provider, priority)
+
+            time.sleep(wait)
+            slept = True
+
+    def get_metrics(self) -> dict[str, dict[str, float]]:
+        """
+        Returns the acquired and rejected counts and the total wait time per
+        provider and priority, for example:
+        {'SMS:BULK': {'acquired': 10, 'rejected': 1, 'wait_seconds': 2.5}}
+        """
+
+        client = self._get_redis_client()
+        if client:
+            try:
+                metrics = {}
+                for key in client.scan_iter(f'{self.key_prefix}:metrics:*'):
+                    metrics[key.decode().split(':', 2)[2]] = {
+                        k.decode(): float(v) for k, v in client.hgetall(key).items()
+                    }
+                return metrics
+            except redis.RedisError as ex:
+                logger.warning(f'failed reading rate limit metrics from redis: {ex}')
+
+        with self._metrics_lock:
+            return {k: dict(v) for k, v in self._metrics.items()}
+
+    def reset(self):
+        """
+        Clears the process-local buckets and metrics
+        """
+
+        self._memory_buckets = InMemoryTokenBuckets()
+        with self._metrics_lock:
+            self._metrics = {}
+
+    def _take(
+        self,
+        provider: OutboundProviderEnum,
+        rate: float,
+        capacity: float,
+        reserve: float,
+    ) -> float:
+        key = f'{self.key_prefix}:bucket:{provider.name}'
+
+        client = self._get_redis_client()
+        if client:
+            try:
+                return float(
+                    self._redis_script(keys=[key], args=[rate, capacity, reserve])
+                )
+            except redis.RedisError as ex:
+                logger.warning(
+                    f'rate limiter failed using redis, falling back to in-memory '
+                    f'buckets: {ex}'
+                )
+
+        return self._memory_buckets.take(key, rate, capacity, reserve)
+
+    def _record(
+        self,
+        provider: OutboundProviderEnum,
+        priority: RateLimitPriorityEnum,
+        outcome: str,
+        waited: float,
+    ):
+        metrics_key = f'{provider.name}:{priority.name}'
+
+        client = self._get_redis_client()
+        if client:
+            try:
+                pipeline = client.pipeline()
+                pipeline.hincrby(f'{self.key_prefix}:metrics:{metrics_key}', outcome, 1)
+                pipeline.hincrbyfloat(
+                    f'{self.key_prefix}:metrics:{metrics_key}', 'wait_seconds', waited
+                )
+                pipeline.execute()
+                return
+            except redis.RedisError as ex:
+                logger.warning(f'failed recording rate limit metrics in redis: {ex}')
+
+        with self._metrics_lock:
+            metrics = self._metrics.setdefault(
+                metrics_key, {'acquired': 0, 'rejected': 0, 'wait_seconds': 0}
+            )
+            metrics[outcome] += 1
+            metrics['wait_seconds'] += waited
+
+    def _get_redis_client(self) -> redis.Redis | None:
+        if not settings.RATE_LIMIT_REDIS_URL:
+            return None
+
+        if not self._redis_client:
+            self._redis_client = redis.Redis.from_url(
+                settings.RATE_LIMIT_REDIS_URL, socket_timeout=1
+            )
+            self._redis_script = self._redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+        return self._redis_client
+
+
+rate_limiter = RateLimiter()
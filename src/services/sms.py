@@ -1,28 +1,62 @@
+import logging
+
 from django.conf import settings
 import requests
 
+from .http_client import http_client
+from .rate_limit import (
+    OutboundProviderEnum,
+    RateLimitExceeded,
+    RateLimitPriorityEnum,
+    rate_limiter,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _send_sms(
+    from_name: str,
+    content: str,
+    to: list[str],
+    priority: RateLimitPriorityEnum = RateLimitPriorityEnum.TRANSACTIONAL,
+):
+    try:
+        rate_limiter.acquire(OutboundProviderEnum.SMS, priority)
+    except RateLimitExceeded as ex:
+        logger.error(f'Failed sending sms to {to}: {ex}')
+        return False
 
-def _send_sms(from_name: str, content: str, to: list[str]):
-    res = requests.post(
-        f'{settings.SMS_ACTIVETRAIL_BASE_URL}/api/smscampaign/OperationalMessage',
-        headers={'Authorization': settings.SMS_ACTIVETRAIL_API_KEY},
-        json={
-            'details': {
-                'can_unsubscribe': False,
-                'name': 'Nicklas',  # not sure what effect this has
-                'from_name': from_name,
-                'content': content,
+    try:
+        res = http_client.post(
+            OutboundProviderEnum.SMS,
+            f'{settings.SMS_ACTIVETRAIL_BASE_URL}/api/smscampaign/OperationalMessage',
+            headers={'Authorization': settings.SMS_ACTIVETRAIL_API_KEY},
+            json={
+                'details': {
+                    'can_unsubscribe': False,
+                    'name': 'Nicklas',  # not sure what effect this has
+                    'from_name': from_name,
+                    'content': content,
+                },
+                'scheduling': {'send_now': True},
+                'mobiles': [{'phone_number': p} for p in to],
             },
-            'scheduling': {'send_now': True},
-            'mobiles': [{'phone_number': p} for p in to],
-        },
-    )
+        )
+    except requests.RequestException as ex:
+        logger.error(f'Failed sending sms to {to}: {ex}')
+        return False
 
     return res.status_code == 200
 
 
 def send_otp_token_sms(phone_number: str, otp_token: str):
-    res = _send_sms('Nicklas+', f'Your OTP code is: {otp_token}', [phone_number])
+    res = _send_sms(
+        'Nicklas+',
+        f'Your OTP code is: {otp_token}',
+        [phone_number],
+        priority=RateLimitPriorityEnum.CRITICAL,
+    )
     return res
 
 
@@ -31,5 +65,6 @@ def send_campaign_welcome_sms(sender_name: str, phone_number: str, message: str)
         sender_name,
         message,
         [phone_number],
+        priority=RateLimitPriorityEnum.BULK,
     )
     return res
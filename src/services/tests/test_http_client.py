@@ -0,0 +1,108 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+from django.test import TestCase, override_settings
+import requests
+
+from services.http_client import CircuitBreakerOpen, ProviderHttpClient
+from services.rate_limit import OutboundProviderEnum
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """
+    Responds with the status (and after the delay) which the stub server is
+    set to, and records the client port of each request
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._respond()
+
+    def _respond(self):
+        self.server.client_ports.append(self.client_address[1])
+        time.sleep(self.server.delay)
+
+        self.send_response(self.server.statuses.pop(0) if self.server.statuses else 200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(
+    OUTBOUND_HTTP_CLIENTS={
+        'ORIAN': {
+            'read_timeout': 0.5,
+            'retries': 1,
+            'backoff_factor': 0,
+            'failure_threshold': 2,
+            'recovery_timeout': 60,
+        }
+    }
+)
+class ProviderHttpClientTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+        self.server.client_ports = []
+        self.server.statuses = []
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self.http_client = ProviderHttpClient()
+
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(self.http_client.reset)
+
+    def test_connections_are_kept_alive(self):
+        for _ in range(3):
+            response = self.http_client.post(
+                OutboundProviderEnum.ORIAN, self.url, json={}
+            )
+            self.assertEqual(response.status_code, 200)
+
+        # all calls were sent over the same connection
+        self.assertEqual(len(self.server.client_ports), 3)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+
+    def test_idempotent_calls_are_retried(self):
+        self.server.statuses = [503]
+        response = self.http_client.get(OutboundProviderEnum.ORIAN, self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.client_ports), 2)
+
+        # a post is not sent twice
+        self.server.statuses = [503]
+        response = self.http_client.post(OutboundProviderEnum.ORIAN, self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.client_ports), 3)
+
+    def test_calls_time_out(self):
+        self.server.delay = 1
+
+        with self.assertRaises(requests.Timeout):
+            self.http_client.post(OutboundProviderEnum.ORIAN, self.url)
+
+    def test_circuit_breaker_opens_after_failures(self):
+        self.server.statuses = [500, 500]
+        for _ in range(2):
+            response = self.http_client.post(OutboundProviderEnum.ORIAN, self.url)
+            self.assertEqual(response.status_code, 500)
+
+        # the provider is not called while the circuit breaker is open
+        with self.assertRaises(CircuitBreakerOpen):
+            self.http_client.post(OutboundProviderEnum.ORIAN, self.url)
+        self.assertEqual(len(self.server.client_ports), 2)
+
+        # other providers are not affected
+        response = self.http_client.post(OutboundProviderEnum.SMS, self.url)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,77 @@
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from services.rate_limit import (
+    OutboundProviderEnum,
+    RateLimiter,
+    RateLimitExceeded,
+    RateLimitPriorityEnum,
+)
+
+
+@override_settings(
+    RATE_LIMIT_REDIS_URL='',
+    OUTBOUND_RATE_LIMITS={'SMS': {'rate': 0.01, 'capacity': 4}},
+)
+class RateLimiterTestCase(TestCase):
+    def setUp(self):
+        self.rate_limiter = RateLimiter()
+
+    def test_acquire_within_capacity(self):
+        for _ in range(4):
+            self.assertEqual(
+                self.rate_limiter.acquire(
+                    OutboundProviderEnum.SMS, RateLimitPriorityEnum.CRITICAL
+                ),
+                0,
+            )
+
+        with self.assertRaises(RateLimitExceeded):
+            self.rate_limiter.acquire(
+                OutboundProviderEnum.SMS, RateLimitPriorityEnum.CRITICAL, max_wait=0
+            )
+
+        metrics = self.rate_limiter.get_metrics()
+        self.assertEqual(metrics['SMS:CRITICAL']['acquired'], 4)
+        self.assertEqual(metrics['SMS:CRITICAL']['rejected'], 1)
+
+    def test_lower_priority_keeps_reserve(self):
+        # bulk calls must leave half of the capacity to higher priorities
+        for _ in range(2):
+            self.rate_limiter.acquire(
+                OutboundProviderEnum.SMS, RateLimitPriorityEnum.BULK
+            )
+
+        with self.assertRaises(RateLimitExceeded):
+            self.rate_limiter.acquire(
+                OutboundProviderEnum.SMS, RateLimitPriorityEnum.BULK, max_wait=0
+            )
+
+        # critical calls can still use the reserved tokens
+        for _ in range(2):
+            self.rate_limiter.acquire(
+                OutboundProviderEnum.SMS, RateLimitPriorityEnum.CRITICAL
+            )
+
+        metrics = self.rate_limiter.get_metrics()
+        self.assertEqual(metrics['SMS:BULK']['acquired'], 2)
+        self.assertEqual(metrics['SMS:BULK']['rejected'], 1)
+        self.assertEqual(metrics['SMS:CRITICAL']['acquired'], 2)
+
+    @override_settings(OUTBOUND_RATE_LIMITS={'SMS': {'rate': 10, 'capacity': 1}})
+    @patch('services.rate_limit.time.sleep')
+    def test_acquire_waits_for_refill(self, mock_sleep):
+        self.rate_limiter.acquire(OutboundProviderEnum.SMS)
+
+        # the next token is available after 0.1 seconds. sleeping is mocked, so
+        # the limiter keeps retrying until the real time passes
+        waited = self.rate_limiter.acquire(OutboundProviderEnum.SMS)
+
+        self.assertTrue(mock_sleep.called)
+        self.assertAlmostEqual(mock_sleep.call_args_list[0].args[0], 0.1, places=2)
+        self.assertGreater(waited, 0)
+
+    def test_unlimited_provider(self):
+        for _ in range(10):
+            self.assertEqual(self.rate_limiter.acquire(OutboundProviderEnum.EMAIL), 0)